@@ -16,4 +16,9 @@ async def test_analytics_admin_access(async_client):
         "/api/v1/analytics/summary",
         headers={"Authorization": f"Bearer {token}"}
     )
-    assert response.status_code in (200, 403) 
\ No newline at end of file
+    assert response.status_code in (200, 403) 
+
+@pytest.mark.asyncio
+async def test_utilization_requires_auth(async_client):
+    response = await async_client.get("/api/v1/analytics/utilization?start_date=2025-01-01&end_date=2025-01-31")
+    assert response.status_code == 401
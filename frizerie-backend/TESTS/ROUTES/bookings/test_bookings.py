@@ -31,4 +31,44 @@ async def test_create_booking_authenticated(async_client):
         json=booking_payload,
         headers={"Authorization": f"Bearer {token}"}
     )
-    assert response.status_code in (200, 201, 422)  # 422 if service_id doesn't exist 
\ No newline at end of file
+    assert response.status_code in (200, 201, 422)  # 422 if service_id doesn't exist 
+
+@pytest.mark.asyncio
+async def test_available_slots_any_stylist_requires_auth(async_client):
+    response = await async_client.get("/api/v1/bookings/available-slots/any/2025-01-01?service_id=1")
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_earliest_available_slots_requires_auth(async_client):
+    response = await async_client.get("/api/v1/bookings/available-slots/earliest?service_id=1&count=3")
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_my_calendar_feed_requires_auth(async_client):
+    response = await async_client.get("/api/v1/bookings/calendar/me.ics")
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_day_sheets_requires_auth(async_client):
+    response = await async_client.get("/api/v1/bookings/day-sheets?day=2025-01-01")
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_slot_hold_requires_auth(async_client):
+    response = await async_client.post("/api/v1/bookings/holds", json={})
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_calendar_feed_token_requires_auth(async_client):
+    response = await async_client.post("/api/v1/bookings/calendar/token")
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_rebooking_plan_requires_auth(async_client):
+    response = await async_client.get("/api/v1/bookings/admin/time-off/1/rebooking-plan")
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_availability_cache_stats_requires_auth(async_client):
+    response = await async_client.get("/api/v1/bookings/admin/availability-cache/stats")
+    assert response.status_code == 401
@@ -26,4 +26,17 @@ async def test_mark_notification_as_read(async_client):
         f"/api/v1/notifications/{notification_id}/read",
         headers={"Authorization": f"Bearer {token}"}
     )
-    assert response.status_code in (200, 404) 
\ No newline at end of file
+    assert response.status_code in (200, 404) 
+
+@pytest.mark.asyncio
+async def test_register_push_token_requires_auth(async_client):
+    response = await async_client.post(
+        "/api/v1/notifications/push-tokens",
+        json={"token": "device-token", "platform": "android"}
+    )
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_delivery_metrics_requires_auth(async_client):
+    response = await async_client.get("/api/v1/notifications/admin/delivery-metrics")
+    assert response.status_code == 401
@@ -0,0 +1,134 @@
+"""
+Push delivery against a local stand-in of the FCM v1 messages:send endpoint.
+
+The stand-in answers after --api-latency-ms. It rejects tokens starting
+with "stale-" as UNREGISTERED (404) and tokens starting with "garbage-"
+as invalid registration tokens (400), and accepts everything else. The
+Firebase app uses a static access token, so nothing leaves the machine.
+
+  per-token   one messaging.send per device (the old task)
+  dispatcher  PushDispatcher: payload groups, up to 500 tokens per multicast
+
+Usage (from frizerie-backend/):
+    python TESTS/benchmarks/push_dispatcher_benchmark.py --tokens 1000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+
+import firebase_admin
+import google.oauth2.credentials
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from firebase_admin import credentials, messaging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from external_services.push_dispatcher import PushDispatcher, PushRequest
+
+PROJECT_ID = "frizerie-offline"
+
+class StaticCredential(credentials.Base):
+    """Credential with a fixed access token, never refreshed."""
+
+    def get_credential(self):
+        return google.oauth2.credentials.Credentials(token="offline")
+
+def fcm_error(status_code, status, message, fcm_code=None):
+    details = [{"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": fcm_code}] if fcm_code else []
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"code": status_code, "message": message, "status": status, "details": details}}
+    )
+
+def fake_fcm(api_latency: float) -> FastAPI:
+    app = FastAPI()
+    counter = itertools.count(1)
+    app.state.requests = 0
+
+    @app.post("/v1/projects/{project_id}/messages:send")
+    async def send(project_id: str, request: Request):
+        await asyncio.sleep(api_latency)
+        app.state.requests += 1
+        token = (await request.json())["message"]["token"]
+        if token.startswith("stale-"):
+            return fcm_error(404, "NOT_FOUND", "Requested entity was not found.", "UNREGISTERED")
+        if token.startswith("garbage-"):
+            return fcm_error(400, "INVALID_ARGUMENT", "The registration token is not a valid FCM registration token", "INVALID_ARGUMENT")
+        return {"name": f"projects/{project_id}/messages/{next(counter)}"}
+
+    return app
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def build_requests(count, payloads):
+    requests = []
+    for index in range(count):
+        prefix = "stale-" if index % 50 == 0 else "garbage-" if index % 97 == 0 else "device-"
+        requests.append(PushRequest(
+            token=f"{prefix}{index:06d}",
+            title="Last minute slot",
+            body=f"Offer {index % payloads}",
+            data={"offer": str(index % payloads)},
+            reference=index
+        ))
+    return requests
+
+def per_token(requests, app):
+    sent = 0
+    for request in requests:
+        try:
+            messaging.send(messaging.Message(
+                notification=messaging.Notification(title=request.title, body=request.body),
+                data=request.data,
+                token=request.token
+            ), app=app)
+            sent += 1
+        except firebase_admin.exceptions.FirebaseError:
+            pass
+    return f"sent {sent}, failed {len(requests) - sent}, {len(requests)} calls"
+
+def dispatched(requests, dispatcher):
+    results = dispatcher.send(requests)
+    sent = sum(1 for result in results if result.success)
+    invalid = sum(1 for result in results if result.invalid)
+    return f"sent {sent}, failed {len(results) - sent} ({invalid} invalid tokens to prune), {dispatcher.calls} multicast calls"
+
+def timed(label, function, *args):
+    started = time.perf_counter()
+    summary = function(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<11} {elapsed:7.2f}s  {summary}")
+
+def main(args):
+    server = start_server(fake_fcm(args.api_latency_ms / 1000), args.port)
+    fcm_url = f"http://127.0.0.1:{args.port}/v1/projects/{PROJECT_ID}/messages:send"
+    app = firebase_admin.initialize_app(StaticCredential(), {"projectId": PROJECT_ID}, name="push-benchmark")
+    dispatcher = PushDispatcher(app=app, fcm_url=fcm_url)
+    try:
+        requests = build_requests(args.tokens, args.payloads)
+        print(f"{args.tokens} tokens, {args.payloads} distinct payloads")
+        if not args.skip_per_token:
+            timed("per-token", per_token, requests, app)
+        timed("dispatcher", dispatched, requests, dispatcher)
+    finally:
+        server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--payloads", type=int, default=3)
+    parser.add_argument("--api-latency-ms", type=float, default=20)
+    parser.add_argument("--skip-per-token", action="store_true")
+    parser.add_argument("--port", type=int, default=8040)
+    main(parser.parse_args())
@@ -0,0 +1,122 @@
+"""
+SMS dispatch against a local fake of Twilio's Messages API.
+
+The fake answers POST /2010-04-01/Accounts/{sid}/Messages.json after
+--api-latency-ms, and rejects with 429 (Twilio error 20429) any message over
+--provider-rate per second for the same From number. Two senders run against
+it:
+
+  naive       one new HTTP client per message, all at once, no throttling
+              (like one Celery task per SMS)
+  dispatcher  SMSDispatcher with a token bucket at --rate per sender number
+
+Usage (from frizerie-backend/):
+    python TESTS/benchmarks/sms_dispatcher_benchmark.py --messages 200 --senders 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Form
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from external_services.sms_dispatcher import SMSDispatcher, SMSJob, summarize
+
+ACCOUNT_SID = "ACfake"
+AUTH_TOKEN = "fake"
+
+def fake_twilio(provider_rate: float, api_latency: float) -> FastAPI:
+    app = FastAPI()
+    recent = defaultdict(deque)
+    app.state.accepted = 0
+    app.state.rejected = 0
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def create_message(account_sid: str, To: str = Form(...), From: str = Form(...), Body: str = Form(...)):
+        await asyncio.sleep(api_latency)
+        now = time.monotonic()
+        window = recent[From]
+        while window and now - window[0] >= 1:
+            window.popleft()
+        if len(window) >= provider_rate:
+            app.state.rejected += 1
+            return JSONResponse(status_code=429, content={"code": 20429, "message": "Too Many Requests", "status": 429})
+        window.append(now)
+        app.state.accepted += 1
+        return JSONResponse(status_code=201, content={"sid": f"SM{uuid.uuid4().hex}", "status": "queued", "to": To})
+
+    return app
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def build_jobs(count, senders):
+    return [
+        SMSJob(to=f"+4070000{index:04d}", body=f"Reminder {index}", from_=f"+4031000000{index % senders}", reference=index)
+        for index in range(count)
+    ]
+
+async def naive(base_url, jobs):
+    url = f"{base_url}/2010-04-01/Accounts/{ACCOUNT_SID}/Messages.json"
+
+    async def send(job):
+        async with httpx.AsyncClient(auth=(ACCOUNT_SID, AUTH_TOKEN)) as client:
+            response = await client.post(url, data={"To": job.to, "From": job.from_, "Body": job.body})
+            return response.status_code == 201
+
+    sent = sum(await asyncio.gather(*(send(job) for job in jobs)))
+    return {"sent": sent, "failed": len(jobs) - sent}
+
+async def dispatched(base_url, jobs, rate, burst, concurrency):
+    dispatcher = SMSDispatcher(
+        ACCOUNT_SID, AUTH_TOKEN, default_from="+40310000000", base_url=base_url,
+        rate_per_second=rate, burst=burst, concurrency=concurrency, backoff_base_seconds=0.25
+    )
+    results = await dispatcher.dispatch(jobs)
+    await dispatcher.close()
+    return summarize(results)
+
+async def timed(label, coroutine, count):
+    started = time.perf_counter()
+    summary = await coroutine
+    elapsed = time.perf_counter() - started
+    print(f"{label:<11} {count:>5} SMS  {elapsed:7.2f}s  {summary}")
+
+async def main(args):
+    app = fake_twilio(args.provider_rate, args.api_latency_ms / 1000)
+    server = start_server(app, args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        jobs = build_jobs(args.messages, args.senders)
+        await timed("naive", naive(base_url, jobs), len(jobs))
+        # Let the fake's rate windows drain between runs
+        await asyncio.sleep(1.1)
+        await timed("dispatcher", dispatched(base_url, jobs, args.rate, args.burst, args.concurrency), len(jobs))
+        print(f"fake Twilio accepted {app.state.accepted}, rejected {app.state.rejected} with 429")
+    finally:
+        server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--senders", type=int, default=2)
+    parser.add_argument("--provider-rate", type=float, default=30, help="messages/s the fake accepts per From number")
+    parser.add_argument("--rate", type=float, default=25, help="dispatcher token bucket rate per From number")
+    parser.add_argument("--burst", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--api-latency-ms", type=float, default=50)
+    parser.add_argument("--port", type=int, default=8030)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+"""
+Email throughput: one connection per message vs. the SMTP pool.
+
+Runs an aiosmtpd server on localhost that accepts AUTH PLAIN/LOGIN without
+TLS and discards mail, then sends the same messages three ways:
+
+  per-message  connect, EHLO, AUTH, send, QUIT for every email (the old task)
+  pooled       concurrent SMTPPool.send calls sharing --pool-size sessions
+  batch        SMTPPool.send_batch over one session, in --batch-size batches
+
+--handshake-delay-ms adds a delay to the server's greeting to stand in for
+the network round trips and TLS negotiation of a real provider.
+
+Usage (from frizerie-backend/, with requirements-dev.txt installed):
+    python TESTS/benchmarks/smtp_pool_benchmark.py --messages 1000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from email.mime.text import MIMEText
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP, AuthResult
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from external_services.smtp_pool import SMTPPool
+
+USERNAME = "bench"
+PASSWORD = "bench"
+
+class SinkHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == USERNAME.encode() and auth_data.password == PASSWORD.encode())
+
+class SlowGreetingSMTP(SMTP):
+    """Delays the greeting of each connection by ``handshake_delay`` seconds."""
+
+    handshake_delay = 0.0
+
+    async def push(self, status):
+        if status.startswith("220 ") and self.handshake_delay:
+            await asyncio.sleep(self.handshake_delay)
+        return await super().push(status)
+
+class SinkController(Controller):
+    def factory(self):
+        return SlowGreetingSMTP(
+            self.handler,
+            authenticator=authenticate,
+            auth_require_tls=False,
+            **self.SMTP_kwargs
+        )
+
+def build_messages(count):
+    messages = []
+    for index in range(count):
+        message = MIMEText(f"Reminder {index}: your appointment is tomorrow at 10:00.")
+        message["Subject"] = "Booking Reminder"
+        message["From"] = "noreply@frizerie.test"
+        message["To"] = f"client{index}@frizerie.test"
+        messages.append(message)
+    return messages
+
+async def per_message(host, port, messages):
+    for message in messages:
+        async with aiosmtplib.SMTP(hostname=host, port=port, start_tls=False) as smtp:
+            await smtp.login(USERNAME, PASSWORD)
+            await smtp.send_message(message)
+    return len(messages)
+
+async def pooled(host, port, messages, pool_size):
+    pool = SMTPPool(host, port, USERNAME, PASSWORD, start_tls=False, size=pool_size, max_messages=10 ** 6)
+    await asyncio.gather(*(pool.send(message) for message in messages))
+    await pool.close()
+    return pool.connects
+
+async def batched(host, port, messages, batch_size):
+    pool = SMTPPool(host, port, USERNAME, PASSWORD, start_tls=False, size=1, max_messages=10 ** 6)
+    for start in range(0, len(messages), batch_size):
+        results = await pool.send_batch(messages[start:start + batch_size])
+        assert not any(results), results
+    await pool.close()
+    return pool.connects
+
+async def timed(label, coroutine, count):
+    started = time.perf_counter()
+    connects = await coroutine
+    elapsed = time.perf_counter() - started
+    print(f"{label:<12} {count:>6} emails  {elapsed:8.3f}s  {count / elapsed:9.1f} emails/s  {connects:>6} connections")
+
+async def main(args):
+    # aiosmtpd logs a deprecation warning on every AUTH
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    handler = SinkHandler()
+    SlowGreetingSMTP.handshake_delay = args.handshake_delay_ms / 1000
+    controller = SinkController(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        messages = build_messages(args.messages)
+        host, port = controller.hostname, controller.port
+        await timed("per-message", per_message(host, port, messages), len(messages))
+        await timed("pooled", pooled(host, port, messages, args.pool_size), len(messages))
+        await timed("batch", batched(host, port, messages, args.batch_size), len(messages))
+        print(f"server received {handler.received} emails")
+    finally:
+        controller.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--handshake-delay-ms", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8025)
+    asyncio.run(main(parser.parse_args()))
@@ -1 +1,38 @@
- 
\ No newline at end of file
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+@pytest.fixture
+def session_factory():
+    """Session factory over a fresh in-memory SQLite database with every table."""
+    import main  # noqa: F401  registers every model
+    from config.database import Base
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def threaded_session_factory(tmp_path):
+    """File-backed SQLite, so code running sessions on several threads gets a connection per thread."""
+    import main  # noqa: F401  registers every model
+    from config.database import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'threaded.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def db_session(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from booking import availability
+from booking.availability import AvailabilitySnapshot
+from booking.schedule import DayTemplate, WeeklyTemplate
+
+MONDAY = datetime(2030, 1, 7)
+
+def at(hour, minute=0, day=MONDAY):
+    return day.replace(hour=hour, minute=minute)
+
+def template(stylist_id=1, break_start=None, break_end=None):
+    """Mondays 09:00-17:00 with an optional break; every other day off."""
+    monday = DayTemplate(9 * 60, 17 * 60, break_start, break_end)
+    return WeeklyTemplate(stylist_id, (monday, None, None, None, None, None, None))
+
+def booking(booking_id, start, end):
+    return SimpleNamespace(id=booking_id, start_time=start, end_time=end)
+
+def snapshot(schedule=None, time_off=(), bookings=(), start=MONDAY, days=7):
+    return AvailabilitySnapshot(
+        start,
+        start + timedelta(days=days),
+        {1: schedule} if schedule is not None else {},
+        {1: list(time_off)},
+        {1: list(bookings)}
+    )
+
+def test_merge_joins_overlapping_and_touching_intervals_only():
+    assert availability.merge_intervals([
+        (at(13), at(14)), (at(9), at(10)), (at(10), at(11)), (at(9, 30), at(9, 45)), (at(15), at(16))
+    ]) == [(at(9), at(11)), (at(13), at(14)), (at(15), at(16))]
+
+@pytest.mark.parametrize("busy, free", [
+    # Nothing busy
+    ([], [(at(9), at(17))]),
+    # Touching either edge leaves the rest free, and no zero-length gaps
+    ([(at(8), at(9)), (at(17), at(18))], [(at(9), at(17))]),
+    ([(at(9), at(10)), (at(16), at(17))], [(at(10), at(16))]),
+    # Busy intervals that touch each other leave nothing between them
+    ([(at(10), at(11)), (at(11), at(12))], [(at(9), at(10)), (at(12), at(17))]),
+    # Full overlap, exact and wider
+    ([(at(9), at(17))], []),
+    ([(at(8), at(18))], [])
+])
+def test_subtract_intervals(busy, free):
+    assert availability.subtract_intervals([(at(9), at(17))], busy) == free
+
+def test_subtract_from_nothing_leaves_nothing():
+    assert availability.subtract_intervals([], [(at(9), at(10))]) == []
+
+def test_subtract_sweeps_busy_intervals_across_several_windows():
+    next_monday = MONDAY + timedelta(days=7)
+    base = [(at(9), at(12)), (at(13), at(17)), (at(9, day=next_monday), at(17, day=next_monday))]
+    # The second busy interval spans the lunch gap; the third runs overnight into the next week
+    busy = [(at(8), at(9, 30)), (at(11), at(13, 30)), (at(16), at(10, day=next_monday))]
+    assert availability.subtract_intervals(base, busy) == [
+        (at(9, 30), at(11)),
+        (at(13, 30), at(16)),
+        (at(10, day=next_monday), at(17, day=next_monday))
+    ]
+
+def test_free_intervals_cut_the_break_time_off_and_bookings_out_of_the_working_day():
+    bookings = [booking("a", at(9), at(9, 30)), booking("b", at(15), at(15, 30))]
+    time_off = [(at(16), at(18))]
+    loaded = snapshot(template(break_start=12 * 60, break_end=13 * 60), time_off, bookings)
+    free = availability.compute_free_intervals(loaded, 1)
+    assert free == [(at(9, 30), at(12)), (at(13), at(15)), (at(15, 30), at(16))]
+
+def test_day_off_and_missing_schedule_have_no_intervals():
+    tuesday = MONDAY + timedelta(days=1)
+    assert availability.compute_day_intervals(snapshot(template()), 1, tuesday.date()) == ([], [])
+    assert availability.compute_free_intervals(snapshot(), 1) == []
+
+def test_day_intervals_separate_open_time_from_free_time():
+    bookings = [booking("a", at(10), at(11))]
+    open_intervals, free = availability.compute_day_intervals(
+        snapshot(template(), [(at(16), at(18))], bookings), 1, MONDAY.date()
+    )
+    assert open_intervals == [(at(9), at(16))]
+    assert free == [(at(9), at(10)), (at(11), at(16))]
+
+def test_slot_starts_snap_to_the_grid_and_fit_inside_the_interval():
+    free = [(at(9, 10), at(10)), (at(11), at(11, 20)), (at(12), at(12, 30))]
+    starts = availability.iter_slot_starts(free, timedelta(minutes=30), timedelta(minutes=15), MONDAY)
+    # 09:10 rounds up to 09:15; 11:00-11:20 is too short; 12:00-12:30 fits exactly once
+    assert list(starts) == [at(9, 15), at(9, 30), at(12)]
+
+def test_slot_starts_before_the_origin_start_at_the_origin():
+    starts = availability.iter_slot_starts([(at(8), at(10))], timedelta(minutes=30), timedelta(minutes=30), at(9))
+    assert list(starts) == [at(9), at(9, 30)]
+
+def test_no_slot_starts_without_free_time():
+    assert list(availability.iter_slot_starts([], timedelta(minutes=30), timedelta(minutes=15), MONDAY)) == []
+
+def test_validate_intervals_reports_each_conflict_in_input_order():
+    bookings = [booking("taken", at(11), at(12))]
+    time_off = [(at(14), at(15))]
+    candidates = [
+        (at(11, 30), at(12)),   # inside a booking
+        (at(10, 30), at(11)),   # touches the booking's start
+        (at(12), at(12, 30)),   # touches its end
+        (at(14, 30), at(15)),   # inside time off
+        (at(13, 30), at(14)),   # touches time off
+        (at(8, 30), at(9, 30)),  # starts before opening
+        (at(12, 15), at(13, 15)),  # overlaps the break
+        (at(10) + timedelta(days=1), at(11) + timedelta(days=1))  # day off
+    ]
+
+    results = availability.validate_intervals(
+        snapshot(template(break_start=13 * 60, break_end=13 * 60 + 30), time_off, bookings), 1, candidates
+    )
+
+    assert [result and result["type"] for result in results] == [
+        "double_booking", None, None, "time_off", None, "outside_availability", "break_time", "stylist_unavailable"
+    ]
+    assert results[0]["details"]["booking_id"] == "taken"
+
+def test_validate_intervals_without_a_schedule_marks_everything_unavailable():
+    results = availability.validate_intervals(snapshot(), 1, [(at(10), at(11)), (at(12), at(13))])
+    assert [result["type"] for result in results] == ["stylist_unavailable"] * 2
+
+def test_validate_intervals_agrees_with_the_free_intervals():
+    bookings = [booking("a", at(9, 30), at(10, 15)), booking("b", at(13), at(14))]
+    loaded = snapshot(template(), [(at(15, 45), at(17))], bookings)
+    free = availability.compute_free_intervals(loaded, 1)
+    candidates = [(at(9) + timedelta(minutes=15 * step), at(9, 30) + timedelta(minutes=15 * step)) for step in range(31)]
+
+    results = availability.validate_intervals(loaded, 1, candidates)
+
+    assert [start for (start, end), result in zip(candidates, results) if result is None] == [
+        start for start, end in candidates if availability.contains_slot(free, start, end)
+    ]
@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+
+from booking import availability_cache
+from booking.availability_cache import AvailabilityCache, MemoryBackend
+
+DAY = date(2030, 1, 7)
+ENTRY = {"open": [[540, 1020]], "free": [[540, 1020]]}
+
+def test_entry_is_served_until_invalidated():
+    cache = AvailabilityCache(MemoryBackend())
+    cache.set(cache.key(1, DAY), ENTRY)
+    assert cache.get(cache.key(1, DAY)) == ENTRY
+
+    cache.invalidate_range(1, datetime(2030, 1, 7, 10), datetime(2030, 1, 7, 11))
+    assert cache.get(cache.key(1, DAY)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_fill_racing_an_invalidation_is_not_served():
+    cache = AvailabilityCache(MemoryBackend())
+    key = cache.key(1, DAY)
+    # A booking commits and invalidates the day while the miss is being loaded
+    cache.invalidate_range(1, datetime(2030, 1, 7, 10), datetime(2030, 1, 7, 11))
+    cache.set(key, ENTRY)
+    assert cache.get(cache.key(1, DAY)) is None
+
+def test_stylist_invalidation_leaves_other_stylists_cached():
+    cache = AvailabilityCache(MemoryBackend())
+    cache.set(cache.key(1, DAY), ENTRY)
+    cache.set(cache.key(2, DAY), ENTRY)
+    cache.invalidate_stylist(1)
+    assert cache.get(cache.key(1, DAY)) is None
+    assert cache.get(cache.key(2, DAY)) == ENTRY
+
+def test_memory_entries_expire():
+    cache = AvailabilityCache(MemoryBackend(ttl_seconds=0))
+    cache.set(cache.key(1, DAY), ENTRY)
+    assert cache.get(cache.key(1, DAY)) is None
+    assert cache.stats()["size"] == 0
+
+def test_memory_stamps_expire_after_every_entry_stored_under_them(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(availability_cache.time, "monotonic", lambda: clock[0])
+    backend = MemoryBackend(ttl_seconds=60)
+    cache = AvailabilityCache(backend)
+    for offset in range(100):
+        start = datetime(2030, 1, 7, 10) + timedelta(days=offset)
+        cache.invalidate_range(1, start, start + timedelta(hours=1))
+    assert len(backend._stamps) == 100
+
+    # Stored under stamp 1 late in the stamp's life, which the read extends
+    clock[0] += 110
+    key = cache.key(1, DAY)
+    cache.set(key, ENTRY)
+    clock[0] += 50
+    assert cache.get(cache.key(1, DAY)) == ENTRY
+    assert list(backend._stamps) == ["1:2030-01-07"]
+
+    # Once every entry under it has expired, the stamp goes too and counting restarts
+    clock[0] += 121
+    assert cache.get(cache.key(1, DAY)) is None
+    assert backend._stamps == {}
+    cache.invalidate_range(1, datetime(2030, 1, 7, 10), datetime(2030, 1, 7, 11))
+    assert cache.key(1, DAY) == key and cache.get(key) is None
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from booking import availability_cache, schedule
+from booking.models import StylistAvailability
+from bookings import services as booking_services
+from services.models import Service
+from stylists.models import Stylist
+
+DAY = (datetime.now() + timedelta(days=3)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+@pytest.fixture
+def salon(db_session, monkeypatch):
+    monkeypatch.setattr(schedule, "_templates", {})
+    monkeypatch.setattr(availability_cache, "_cache", availability_cache.AvailabilityCache(
+        availability_cache.MemoryBackend()
+    ))
+    stylist = Stylist(name="Stylist")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([stylist, service])
+    db_session.flush()
+    db_session.add(StylistAvailability(
+        stylist_id=stylist.id, day_of_week=DAY.weekday(), start_time="09:00", end_time="10:00"
+    ))
+    db_session.commit()
+    return db_session, stylist, service
+
+@pytest.mark.parametrize("date", [
+    DAY,
+    DAY.replace(tzinfo=timezone.utc),
+    DAY.replace(hour=23, tzinfo=timezone(timedelta(hours=-5)))
+])
+def test_any_stylist_slots_accept_naive_and_offset_dates(salon, date):
+    db, stylist, service = salon
+    slots = booking_services.get_available_slots_any_stylist(db, date, service.id)
+    assert [slot["start_time"] for slot in slots] == [
+        (DAY + timedelta(hours=9, minutes=minutes)).isoformat() for minutes in (0, 15, 30)
+    ]
+    assert all(slot["stylist_ids"] == [stylist.id] for slot in slots)
@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+from fastapi import Depends
+from fastapi.testclient import TestClient
+
+from booking import calendar_feed
+from booking.models import Booking, BookingStatus
+from config.database import get_db
+from config.dependencies import get_current_user
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+START = datetime(2030, 1, 7, 10, 0)
+
+@pytest.fixture
+def salon(session_factory, monkeypatch):
+    import main
+
+    db = session_factory()
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    stylist_user = User(name="Stylist", email="stylist@example.com", password_hash="x")
+    admin = User(name="Admin", email="admin@example.com", password_hash="x", is_admin=True)
+    db.add_all([customer, stylist_user, admin])
+    db.flush()
+    stylist = Stylist(name="Ana", user_id=stylist_user.id)
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db.add_all([stylist, service])
+    db.flush()
+    db.add(Booking(
+        user_id=customer.id,
+        stylist_id=stylist.id,
+        service_id=service.id,
+        start_time=START,
+        end_time=START.replace(minute=30),
+        status=BookingStatus.CONFIRMED
+    ))
+    db.commit()
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    monkeypatch.setattr(calendar_feed, "SessionLocal", session_factory)
+    main.app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(main.app), db, customer, stylist_user, admin, stylist
+    main.app.dependency_overrides.clear()
+    db.close()
+
+def feed_path(client, path):
+    return next(route.path for route in client.app.routes if route.path.endswith(path))
+
+def issue_token(client, db, user):
+    user_id = user.id
+
+    def current_user(session=Depends(get_db)):
+        return session.get(User, user_id)
+
+    client.app.dependency_overrides[get_current_user] = current_user
+    response = client.post(feed_path(client, "/calendar/token"))
+    del client.app.dependency_overrides[get_current_user]
+    assert response.status_code == 200
+    return response.json()
+
+def test_feed_is_read_with_the_url_token(salon):
+    client, db, customer, *_ = salon
+    issued = issue_token(client, db, customer)
+    response = client.get(issued["feed_url"])
+    assert response.status_code == 200
+    assert "DTSTART:20300107T100000\r\n" in response.text
+    assert "DTEND:20300107T103000\r\n" in response.text
+
+def test_missing_or_revoked_token_is_rejected(salon):
+    client, db, customer, *_ = salon
+    me = feed_path(client, "/calendar/me.ics")
+    assert client.get(me).status_code == 401
+    assert client.get(me, params={"token": "guess"}).status_code == 401
+
+    first = issue_token(client, db, customer)["token"]
+    second = issue_token(client, db, customer)["token"]
+    assert client.get(me, params={"token": first}).status_code == 401
+    assert client.get(me, params={"token": second}).status_code == 200
+
+def test_stylist_feed_is_limited_to_the_stylist_and_admins(salon):
+    client, db, customer, stylist_user, admin, stylist = salon
+    path = feed_path(client, "/calendar/stylists/{stylist_id}.ics").replace("{stylist_id}", str(stylist.id))
+    for user, expected in ((customer, 403), (stylist_user, 200), (admin, 200)):
+        token = issue_token(client, db, user)["token"]
+        assert client.get(path, params={"token": token}).status_code == expected
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from booking import availability_cache, day_sheets, schedule, slot_events, time_off_index
+from booking.models import Booking, BookingStatus, StylistAvailability, StylistDaySheet
+from bookings import services as booking_services
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+TODAY = datetime.utcnow().date()
+DAY = datetime.combine(TODAY + timedelta(days=2), datetime.min.time())
+
+@pytest.fixture
+def salon(db_session, monkeypatch):
+    """A stylist working 09:00-17:00 every day, with sheets rolled over a five-day horizon."""
+    monkeypatch.setattr(schedule, "_templates", {})
+    monkeypatch.setattr(time_off_index, "_indexes", {})
+    monkeypatch.setattr(availability_cache, "_cache", availability_cache.AvailabilityCache(
+        availability_cache.MemoryBackend()
+    ))
+    monkeypatch.setattr(day_sheets.get_settings(), "DAY_SHEET_HORIZON_DAYS", 5)
+    freed = []
+    monkeypatch.setattr(slot_events, "emit_slot_freed", lambda *slot: freed.append(slot))
+
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    stylist = Stylist(name="Ana")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([customer, stylist, service])
+    db_session.flush()
+    db_session.add_all([
+        StylistAvailability(stylist_id=stylist.id, day_of_week=day, start_time="09:00", end_time="17:00")
+        for day in range(7)
+    ])
+    db_session.commit()
+    day_sheets.roll_horizon(db_session)
+    return db_session, customer, stylist, service, freed
+
+def stored(db, stylist):
+    return {
+        sheet.day: (sheet.busy_minutes, sheet.computed_at)
+        for sheet in db.query(StylistDaySheet).filter(StylistDaySheet.stylist_id == stylist.id).all()
+    }
+
+def test_roll_fills_the_horizon_and_moves_it_forward(salon, monkeypatch):
+    db, customer, stylist, service, freed = salon
+    assert sorted(stored(db, stylist)) == [TODAY + timedelta(days=offset) for offset in range(5)]
+
+    tomorrow = TODAY + timedelta(days=1)
+    monkeypatch.setattr(day_sheets, "horizon", lambda: (tomorrow, tomorrow + timedelta(days=4)))
+    assert day_sheets.roll_horizon(db) == 5
+
+    db.expire_all()
+    assert sorted(stored(db, stylist)) == [tomorrow + timedelta(days=offset) for offset in range(5)]
+
+def test_booking_writes_refresh_only_the_days_they_touch(salon):
+    db, customer, stylist, service, freed = salon
+    before = stored(db, stylist)
+
+    booking = booking_services.create_booking(db, customer.id, stylist.id, service.id, DAY.replace(hour=10))
+
+    db.expire_all()
+    after = stored(db, stylist)
+    assert after[DAY.date()][0] == 30
+    assert after[DAY.date()][1] > before[DAY.date()][1]
+    assert {day: sheet for day, sheet in after.items() if day != DAY.date()} == {
+        day: sheet for day, sheet in before.items() if day != DAY.date()
+    }
+
+    booking_services.cancel_booking(db, booking.id, customer.id)
+
+    db.expire_all()
+    assert stored(db, stylist)[DAY.date()][0] == 0
+    assert freed == [(stylist.id, booking.start_time, booking.end_time)]
+
+def test_failed_refresh_does_not_fail_the_committed_booking(salon, monkeypatch):
+    db, customer, stylist, service, freed = salon
+
+    def broken(*args):
+        raise RuntimeError("sheet store unavailable")
+
+    monkeypatch.setattr(day_sheets, "compute_sheets", broken)
+
+    booking = booking_services.create_booking(db, customer.id, stylist.id, service.id, DAY.replace(hour=10))
+
+    assert db.get(Booking, booking.id).status == BookingStatus.CONFIRMED
+    assert stored(db, stylist)[DAY.date()][0] == 0
+
+def test_reads_compute_missing_days_without_storing_them(salon):
+    db, customer, stylist, service, freed = salon
+    beyond = TODAY + timedelta(days=10)
+    db.query(StylistDaySheet).filter(StylistDaySheet.day == TODAY).delete()
+    db.commit()
+
+    sheets = day_sheets.get_sheets(db, [stylist.id], TODAY, TODAY)
+    sheets += day_sheets.get_sheets(db, [stylist.id], beyond, beyond)
+
+    assert [(sheet["day"], sheet["open_minutes"]) for sheet in sheets] == [(TODAY, 480), (beyond, 480)]
+    assert TODAY not in stored(db, stylist) and beyond not in stored(db, stylist)
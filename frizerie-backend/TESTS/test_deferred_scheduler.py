@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from notifications.models import Notification, NotificationChannel, NotificationStatus, NotificationType
+from notifications.preferences import CompiledPreferences
+from notifications.scheduler import DeferredScheduler
+from users.models import User
+
+@pytest.fixture
+def session_factory(threaded_session_factory):
+    return threaded_session_factory
+
+@pytest.fixture
+def deferred(session_factory):
+    """Add a notification with the given status and due time, returning its id."""
+    db = session_factory()
+    user = User(name="Customer", email="customer@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+
+    def add(due_in: timedelta, status=NotificationStatus.QUEUED) -> int:
+        notification = Notification(
+            user_id=user.id,
+            type=NotificationType.BOOKING_REMINDER,
+            channel=NotificationChannel.EMAIL,
+            title="Reminder",
+            message="Your appointment is tomorrow",
+            status=status,
+            scheduled_for=datetime.utcnow() + due_in
+        )
+        db.add(notification)
+        db.commit()
+        return notification.id
+
+    yield add
+    db.close()
+
+def statuses(session_factory, notification_ids):
+    db = session_factory()
+    try:
+        return [db.get(Notification, notification_id).status for notification_id in notification_ids]
+    finally:
+        db.close()
+
+async def run_until(schedulers, released, count, timeout=5.0):
+    for scheduler in schedulers:
+        scheduler.start()
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while len(released) < count and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.02)
+        # Give a duplicate release the chance to show up
+        await asyncio.sleep(0.2)
+    finally:
+        for scheduler in schedulers:
+            await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_due_notifications_are_released_in_order_and_others_left_queued(session_factory, deferred):
+    overdue = deferred(timedelta(seconds=-30))
+    soon = deferred(timedelta(milliseconds=300))
+    beyond_horizon = deferred(timedelta(hours=2))
+    already_pending = deferred(timedelta(seconds=-30), NotificationStatus.PENDING)
+    released = []
+    scheduler = DeferredScheduler(session_factory, released.append, horizon_seconds=60)
+
+    await run_until([scheduler], released, 2)
+
+    assert released == [overdue, soon]
+    assert statuses(session_factory, [overdue, soon, beyond_horizon, already_pending]) == [
+        NotificationStatus.PENDING, NotificationStatus.PENDING, NotificationStatus.QUEUED, NotificationStatus.PENDING
+    ]
+
+@pytest.mark.asyncio
+async def test_two_schedulers_release_each_notification_once(session_factory, deferred):
+    notification_ids = [deferred(timedelta(milliseconds=50 * index)) for index in range(20)]
+    released = []
+    schedulers = [
+        DeferredScheduler(session_factory, released.append, horizon_seconds=60, batch_size=3) for _ in range(2)
+    ]
+
+    await run_until(schedulers, released, len(notification_ids))
+
+    assert sorted(released) == notification_ids
+
+@pytest.mark.asyncio
+async def test_added_deferral_is_released_but_not_before_it_is_due(session_factory, deferred):
+    released = []
+    scheduler = DeferredScheduler(session_factory, released.append, horizon_seconds=60)
+    scheduler.start()
+    await asyncio.sleep(0.1)
+
+    # Tracked as due now, but the row was rescheduled for later before the release
+    rescheduled = deferred(timedelta(minutes=5))
+    scheduler.add(rescheduled, datetime.utcnow())
+    added = deferred(timedelta(milliseconds=200))
+    scheduler.add(added, datetime.utcnow() + timedelta(milliseconds=200))
+
+    await run_until([scheduler], released, 1)
+
+    assert released == [added]
+    assert statuses(session_factory, [rescheduled]) == [NotificationStatus.QUEUED]
+
+def test_quiet_hours_end_is_the_first_second_after_them():
+    preferences = CompiledPreferences(
+        user_id=1,
+        enabled_types=0,
+        quiet_start=22 * 60,
+        quiet_end=7 * 60,
+        tz=pytz.UTC,
+        urgent_channels=(),
+        other_channels=()
+    )
+    end = preferences.quiet_hours_end(datetime(2030, 1, 7, 23, 30))
+    assert end == datetime(2030, 1, 8, 7, 0, 1)
+    assert preferences.in_quiet_hours(None, end - timedelta(seconds=1))
+    assert not preferences.in_quiet_hours(None, end)
@@ -0,0 +1,292 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from notifications import delivery_worker
+from notifications.delivery_worker import DeliveryError, DeliveryWorker
+from notifications.models import (
+    Notification, NotificationAnalytics, NotificationChannel, NotificationPreference,
+    NotificationPriority, NotificationStatus, NotificationType
+)
+from notifications.preferences import PreferenceCache
+from users.models import User
+
+@pytest.fixture
+def session_factory(threaded_session_factory):
+    # The worker runs its sessions on several threads at once
+    return threaded_session_factory
+
+class FakeSender:
+    """Records every send; each call takes the next outcome, ``None`` meaning success."""
+
+    def __init__(self, outcomes=(), delays=(), gate=None):
+        self.outcomes = list(outcomes)
+        self.delays = list(delays)
+        self.gate = gate
+        self.calls = []
+        self.sent = []
+        self.closed = False
+
+    async def send(self, job):
+        self.calls.append((job.notification_id, job.attempt, time.monotonic()))
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome is not None:
+            raise outcome
+        self.sent.append(job.notification_id)
+        return {"provider": "fake"}
+
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def customer(session_factory, monkeypatch):
+    """A customer with default preferences: in-app and email, plus SMS for urgent notifications."""
+    monkeypatch.setattr(delivery_worker, "preference_cache", PreferenceCache())
+    db = session_factory()
+    user = User(name="Customer", email="customer@example.com", phone_number="+38640123456", password_hash="x")
+    db.add(user)
+    db.flush()
+    db.add(NotificationPreference(user_id=user.id))
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+def add(session_factory, user_id, priority=NotificationPriority.MEDIUM, status=NotificationStatus.PENDING, **values):
+    values.setdefault("channel", NotificationChannel.IN_APP)
+    db = session_factory()
+    try:
+        notification = Notification(
+            user_id=user_id,
+            type=NotificationType.BOOKING_CONFIRMATION,
+            title="Booked",
+            message="See you on Monday",
+            priority=priority,
+            status=status,
+            **values
+        )
+        db.add(notification)
+        db.commit()
+        return notification.id
+    finally:
+        db.close()
+
+def stored(session_factory, notification_ids):
+    db = session_factory()
+    try:
+        return [db.get(Notification, notification_id) for notification_id in notification_ids]
+    finally:
+        db.close()
+
+def statuses(session_factory, notification_ids):
+    return [notification.status for notification in stored(session_factory, notification_ids)]
+
+async def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.01)
+
+def worker_with(session_factory, senders, **options):
+    return DeliveryWorker(
+        session_factory=session_factory,
+        senders={NotificationChannel.IN_APP: FakeSender(), **senders},
+        **options
+    )
+
+@pytest.mark.asyncio
+async def test_pending_notifications_are_claimed_then_sent_on_every_allowed_channel(session_factory, customer):
+    gate = asyncio.Event()
+    email = FakeSender(gate=gate)
+    worker = worker_with(session_factory, {NotificationChannel.EMAIL: email, NotificationChannel.SMS: FakeSender()})
+    pending = add(session_factory, customer)
+    already_sent = add(session_factory, customer, status=NotificationStatus.SENT)
+    worker.start()
+    try:
+        worker.submit(pending)
+        worker.submit(already_sent)
+        await until(lambda: email.calls)
+        assert statuses(session_factory, [pending]) == [NotificationStatus.SENDING]
+
+        gate.set()
+        assert await worker.wait_idle(5)
+    finally:
+        await worker.stop()
+
+    notification = stored(session_factory, [pending])[0]
+    assert notification.status == NotificationStatus.SENT and notification.sent_at is not None
+    assert email.sent == [pending] and worker.senders[NotificationChannel.IN_APP].sent == [pending]
+    # Not urgent, so no SMS; and the row that was not PENDING is never claimed
+    assert worker.senders[NotificationChannel.SMS].calls == []
+    assert worker.claimed == 1 and email.closed
+
+@pytest.mark.asyncio
+async def test_a_blocked_channel_does_not_hold_up_the_others(session_factory, customer):
+    gate = asyncio.Event()
+    sms = FakeSender(gate=gate)
+    email = FakeSender()
+    worker = worker_with(
+        session_factory,
+        {NotificationChannel.EMAIL: email, NotificationChannel.SMS: sms},
+        concurrency={"sms": 1}
+    )
+    urgent = [add(session_factory, customer, NotificationPriority.URGENT) for _ in range(2)]
+    regular = [add(session_factory, customer) for _ in range(3)]
+    worker.start()
+    try:
+        for notification_id in urgent + regular:
+            worker.submit(notification_id)
+        await until(lambda: statuses(session_factory, regular) == [NotificationStatus.SENT] * 3)
+
+        # One SMS in flight, the other waiting for the lane's only slot
+        assert worker.metrics()["channels"]["sms"]["in_flight"] == 1 and len(sms.calls) == 1
+        assert statuses(session_factory, urgent) == [NotificationStatus.SENDING] * 2
+        assert sorted(email.sent) == regular
+
+        gate.set()
+        assert await worker.wait_idle(5)
+    finally:
+        await worker.stop()
+
+    assert statuses(session_factory, urgent) == [NotificationStatus.SENT] * 2
+    assert sorted(sms.sent) == urgent
+
+@pytest.mark.asyncio
+async def test_timeouts_are_retried_with_exponential_backoff(session_factory, customer, monkeypatch):
+    # The longest delay the jitter allows, so the backoff is exact
+    monkeypatch.setattr(delivery_worker.random, "uniform", lambda low, high: high)
+    sms = FakeSender(delays=[1.0, 1.0])
+    worker = worker_with(
+        session_factory,
+        {NotificationChannel.SMS: sms},
+        timeouts={"sms": 0.05},
+        backoff_seconds=0.1
+    )
+    notification_id = add(session_factory, customer, NotificationPriority.URGENT)
+    worker.start()
+    try:
+        worker.submit(notification_id)
+        await until(lambda: sms.sent)
+        assert await worker.wait_idle(5)
+    finally:
+        await worker.stop()
+
+    assert [attempt for _, attempt, _ in sms.calls] == [1, 2, 3]
+    first, second, third = [called for _, _, called in sms.calls]
+    assert second - first >= 0.05 + 0.1 and third - second >= 0.05 + 0.2
+    sms_lane = worker.metrics()["channels"]["sms"]
+    assert (sms_lane["timed_out"], sms_lane["retried"], sms_lane["sent"]) == (2, 2, 1)
+    assert statuses(session_factory, [notification_id]) == [NotificationStatus.SENT]
+
+    db = session_factory()
+    try:
+        analytics = db.query(NotificationAnalytics).filter(
+            NotificationAnalytics.channel == NotificationChannel.SMS
+        ).one()
+    finally:
+        db.close()
+    assert analytics.event_type == "sent" and analytics.notification_metadata["attempts"] == 3
+
+@pytest.mark.asyncio
+async def test_final_errors_and_exhausted_retries_fail_the_notification(session_factory, customer):
+    db = session_factory()
+    db.query(NotificationPreference).update({"in_app_enabled": False})
+    db.commit()
+    db.close()
+    rejected, throttled = DeliveryError("Invalid number"), DeliveryError("Throttled", retryable=True)
+    sms = FakeSender(outcomes=[rejected, throttled, throttled, throttled])
+    worker = worker_with(session_factory, {NotificationChannel.SMS: sms}, max_retries=2, backoff_seconds=0.01)
+    first = add(session_factory, customer, NotificationPriority.URGENT)
+    second = add(session_factory, customer, NotificationPriority.URGENT)
+    worker.start()
+    try:
+        worker.submit(first)
+        await until(lambda: statuses(session_factory, [first]) == [NotificationStatus.FAILED])
+        worker.submit(second)
+        await until(lambda: statuses(session_factory, [second]) == [NotificationStatus.FAILED])
+    finally:
+        await worker.stop()
+
+    assert [(notification_id, attempt) for notification_id, attempt, _ in sms.calls] == [
+        (first, 1), (second, 1), (second, 2), (second, 3)
+    ]
+    assert [notification.error_details for notification in stored(session_factory, [first, second])] == [
+        {"sms": "Invalid number"}, {"sms": "Throttled"}
+    ]
+
+@pytest.mark.asyncio
+async def test_notifications_left_sending_by_a_dead_worker_are_recovered(session_factory, customer):
+    email = FakeSender()
+    worker = worker_with(session_factory, {NotificationChannel.EMAIL: email}, stale_seconds=60)
+    abandoned = add(
+        session_factory, customer, status=NotificationStatus.SENDING,
+        updated_at=datetime.utcnow() - timedelta(minutes=5)
+    )
+    in_progress = add(session_factory, customer, status=NotificationStatus.SENDING, updated_at=datetime.utcnow())
+    worker.start()
+    try:
+        await until(lambda: statuses(session_factory, [abandoned]) == [NotificationStatus.SENT])
+    finally:
+        await worker.stop()
+
+    assert email.sent == [abandoned]
+    assert statuses(session_factory, [in_progress]) == [NotificationStatus.SENDING]
+
+@pytest.mark.asyncio
+async def test_results_are_written_in_one_batch(session_factory, customer):
+    gate = asyncio.Event()
+    email = FakeSender(gate=gate)
+    worker = worker_with(session_factory, {NotificationChannel.EMAIL: email}, concurrency={"email": 5})
+    notification_ids = [add(session_factory, customer) for _ in range(5)]
+    writes = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("UPDATE notifications ", "INSERT INTO notification_analytics ")):
+            writes.append((statement.split()[0], len(parameters) if executemany else 1))
+
+    engine = session_factory.kw["bind"]
+    worker.start()
+    try:
+        for notification_id in notification_ids:
+            worker.submit(notification_id)
+        # Everything but the emails done, so all five finish together
+        await until(lambda: len(email.calls) == 5 and len(worker.senders[NotificationChannel.IN_APP].sent) == 5)
+        event.listen(engine, "before_cursor_execute", record)
+        gate.set()
+        assert await worker.wait_idle(5)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        await worker.stop()
+
+    assert writes == [("UPDATE", 5), ("INSERT", 10)]
+    assert statuses(session_factory, notification_ids) == [NotificationStatus.SENT] * 5
+    assert worker.completed == 5
+
+@pytest.mark.asyncio
+async def test_rows_queued_for_the_batch_tasks_are_left_to_them(session_factory, customer):
+    email = FakeSender()
+    worker = worker_with(session_factory, {NotificationChannel.EMAIL: email})
+    # As stored by a fan-out, which queues its own Celery batch
+    fanned_out = add(session_factory, customer, status=NotificationStatus.QUEUED, channel=NotificationChannel.EMAIL)
+    deferred = add(
+        session_factory, customer, status=NotificationStatus.QUEUED,
+        scheduled_for=datetime.utcnow() - timedelta(seconds=1)
+    )
+    worker.start()
+    try:
+        worker.submit(fanned_out)
+        await until(lambda: statuses(session_factory, [deferred]) == [NotificationStatus.SENT])
+        assert await worker.wait_idle(5)
+    finally:
+        await worker.stop()
+
+    assert email.sent == [deferred]
+    assert statuses(session_factory, [fanned_out]) == [NotificationStatus.QUEUED]
+    assert worker.metrics()["scheduler"]["released"] == 1
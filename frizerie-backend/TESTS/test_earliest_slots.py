@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from booking import availability, availability_cache, optimized_services, schedule, time_off_index
+from booking.models import StylistAvailability, StylistTimeOff
+from services.models import Service
+from stylists.models import Stylist
+
+MONDAY = datetime(2030, 1, 7)
+
+@pytest.fixture
+def salon(db_session, monkeypatch):
+    """Two stylists working Mondays only: Ana 09:00-10:00 and Bea 09:30-11:00."""
+    monkeypatch.setattr(schedule, "_templates", {})
+    monkeypatch.setattr(time_off_index, "_indexes", {})
+    monkeypatch.setattr(availability_cache, "_cache", availability_cache.AvailabilityCache(
+        availability_cache.MemoryBackend()
+    ))
+    ana = Stylist(name="Ana")
+    bea = Stylist(name="Bea")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([ana, bea, service])
+    db_session.flush()
+    db_session.add_all([
+        StylistAvailability(stylist_id=ana.id, day_of_week=0, start_time="09:00", end_time="10:00"),
+        StylistAvailability(stylist_id=bea.id, day_of_week=0, start_time="09:30", end_time="11:00")
+    ])
+    db_session.commit()
+    return db_session, ana, bea, service
+
+def at(day, hour, minute=0):
+    return day.replace(hour=hour, minute=minute)
+
+def slots(found):
+    return [(slot.start_time, slot.stylist_id) for slot in found]
+
+def test_streams_merge_by_time_then_stylist_order(salon):
+    db, ana, bea, service = salon
+    found = optimized_services.get_earliest_slots(db, service.id, MONDAY, count=10)
+    assert slots(found)[:5] == [
+        (at(MONDAY, 9), ana.id),
+        (at(MONDAY, 9, 30), ana.id),
+        (at(MONDAY, 9, 30), bea.id),
+        (at(MONDAY, 10), bea.id),
+        (at(MONDAY, 10, 30), bea.id)
+    ]
+    assert all(slot.end_time - slot.start_time == timedelta(minutes=30) for slot in found)
+
+def test_search_stops_at_count(salon):
+    db, ana, bea, service = salon
+    found = optimized_services.get_earliest_slots(db, service.id, at(MONDAY, 9, 15), count=3)
+    assert slots(found) == [(at(MONDAY, 9, 30), ana.id), (at(MONDAY, 9, 30), bea.id), (at(MONDAY, 10), bea.id)]
+
+def test_selected_stylists_only(salon):
+    db, ana, bea, service = salon
+    found = optimized_services.get_earliest_slots(db, service.id, MONDAY, stylist_ids=[bea.id], count=2)
+    assert slots(found) == [(at(MONDAY, 9, 30), bea.id), (at(MONDAY, 10), bea.id)]
+
+@pytest.mark.parametrize("start_time", [
+    datetime(2030, 1, 7, 9, 0, tzinfo=timezone.utc),
+    datetime(2030, 1, 7, 10, 0, tzinfo=timezone(timedelta(hours=1)))
+])
+def test_offset_start_time_is_taken_as_utc(salon, start_time):
+    db, ana, bea, service = salon
+    found = optimized_services.get_earliest_slots(db, service.id, start_time, count=1)
+    assert slots(found) == [(at(MONDAY, 9), ana.id)]
+
+def test_search_crosses_chunk_boundaries_loading_only_the_chunks_it_reaches(salon, monkeypatch):
+    db, ana, bea, service = salon
+    loaded = []
+    get_day_intervals = availability.get_day_intervals
+
+    def recording(db, stylist_ids, start, end):
+        loaded.append((start, end))
+        return get_day_intervals(db, stylist_ids, start, end)
+
+    monkeypatch.setattr(availability, "get_day_intervals", recording)
+    # Ana is away for the first two Mondays, so her stream resumes in the third chunk
+    db.add(StylistTimeOff(
+        stylist_id=ana.id, start_date=MONDAY, end_date=MONDAY + timedelta(days=14), is_approved=True
+    ))
+    db.commit()
+
+    found = availability.earliest_slots(
+        db, [ana.id], MONDAY, timedelta(minutes=30), 4, timedelta(minutes=30), chunk_days=7
+    )
+
+    assert found == [
+        (at(MONDAY + timedelta(days=14), 9), ana.id),
+        (at(MONDAY + timedelta(days=14), 9, 30), ana.id),
+        (at(MONDAY + timedelta(days=21), 9), ana.id),
+        (at(MONDAY + timedelta(days=21), 9, 30), ana.id)
+    ]
+    assert [start for start, _ in loaded] == [MONDAY + timedelta(days=7 * week) for week in range(4)]
+    assert all(end - start == timedelta(days=6) for start, end in loaded)
+
+def test_search_gives_up_at_the_horizon(salon):
+    db, ana, bea, service = salon
+
+    def search(horizon_days):
+        return availability.earliest_slots(
+            db, [ana.id, bea.id], at(MONDAY, 11), timedelta(minutes=30), 5, timedelta(minutes=30),
+            horizon_days=horizon_days
+        )
+
+    assert search(6) == []
+    assert [slot_start for slot_start, _ in search(7)] == [
+        at(MONDAY + timedelta(days=7), hour, minute) for hour, minute in ((9, 0), (9, 30), (9, 30), (10, 0), (10, 30))
+    ]
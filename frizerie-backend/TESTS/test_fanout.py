@@ -0,0 +1,165 @@
+import pytest
+
+from notifications import fanout
+from notifications.models import (
+    Notification, NotificationChannel, NotificationStatus, NotificationType, PushDeviceToken
+)
+from notifications.preferences import PreferenceCache
+from users.models import User, UserSetting
+
+class FakeTask:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def delay(self, *args):
+        if self.error:
+            raise self.error
+        self.calls.append(args)
+
+@pytest.fixture
+def tasks(monkeypatch):
+    monkeypatch.setattr(fanout, "preference_cache", PreferenceCache())
+    tasks = {name: FakeTask() for name in ("send_email_batch", "send_sms_batch", "send_push_batch")}
+    for name, task in tasks.items():
+        monkeypatch.setattr(fanout, name, task)
+    return tasks
+
+def customers(db, count, **settings):
+    users = [
+        User(name=f"Customer {index}", email=f"customer{index}@example.com", password_hash="x")
+        for index in range(count)
+    ]
+    db.add_all(users)
+    db.flush()
+    db.add_all([UserSetting(user_id=user.id, **settings) for user in users])
+    db.commit()
+    return users
+
+def rows(db):
+    return db.query(Notification).order_by(Notification.user_id, Notification.channel).all()
+
+def test_recipients_are_read_in_keyset_chunks(db_session, tasks):
+    users = customers(db_session, 7)
+    seen = []
+
+    def on_progress(progress):
+        seen.append((progress.chunks, progress.recipients))
+        if progress.chunks == 1:
+            # A user of the next chunk leaves mid-run; paging by id, nobody after them is skipped
+            db_session.query(UserSetting).filter(UserSetting.user_id == users[4].id).delete()
+            db_session.query(User).filter(User.id == users[4].id).delete()
+            db_session.commit()
+
+    result = fanout.fan_out(
+        db_session, NotificationType.SPECIAL_EVENT, "Event", "Join us",
+        channel_selector=fanout.email_only, chunk_size=3, on_progress=on_progress
+    )
+
+    assert seen == [(1, 3), (2, 6)]
+    assert (result["chunks"], result["recipients"], result["notifications"]) == (2, 6, 6)
+    assert [row.user_id for row in rows(db_session)] == [user.id for user in users if user is not users[4]]
+
+def test_a_full_last_chunk_ends_on_an_empty_read(db_session, tasks):
+    customers(db_session, 6)
+    seen = []
+
+    result = fanout.fan_out(
+        db_session, NotificationType.SPECIAL_EVENT, "Event", "Join us",
+        chunk_size=3, on_progress=lambda progress: seen.append(progress.as_dict())
+    )
+
+    assert [(totals["chunks"], totals["recipients"], totals["notifications"]) for totals in seen] == [
+        (1, 3, 6), (2, 6, 12)
+    ]
+    assert [totals["queued"]["email"] for totals in seen] == [3, 6]
+    assert result["queued"] == {"email": 6, "sms": 0, "push": 0} and result["failed"] == 0
+
+def test_criteria_limit_the_recipients(db_session, tasks):
+    users = customers(db_session, 4)
+    result = fanout.fan_out(
+        db_session, NotificationType.SPECIAL_EVENT, "Event", "Join us",
+        criteria=[User.id.in_([users[1].id, users[2].id])], channel_selector=fanout.email_only
+    )
+    assert result["recipients"] == 2
+    assert [row.user_id for row in rows(db_session)] == [users[1].id, users[2].id]
+
+def test_one_row_per_recipient_and_channel(db_session, tasks):
+    quiet, everything, email_only = customers(db_session, 3)
+    db_session.query(UserSetting).filter(UserSetting.user_id == quiet.id).update({
+        "enable_notifications": False, "enable_email_notifications": False
+    })
+    db_session.query(UserSetting).filter(UserSetting.user_id == everything.id).update({
+        "enable_sms_notifications": True
+    })
+    everything.phone_number = "+40700000001"
+    # Two active devices still mean one push row; the inactive one counts for nothing
+    db_session.add_all([
+        PushDeviceToken(user_id=everything.id, token="phone"),
+        PushDeviceToken(user_id=everything.id, token="tablet"),
+        PushDeviceToken(user_id=email_only.id, token="old", is_active=False)
+    ])
+    db_session.commit()
+
+    fanout.fan_out(db_session, NotificationType.SPECIAL_EVENT, "Event", "Join us")
+
+    stored = rows(db_session)
+    assert sorted((row.user_id, row.channel.value) for row in stored) == sorted([
+        (everything.id, "in_app"), (everything.id, "email"), (everything.id, "sms"), (everything.id, "push"),
+        (email_only.id, "in_app"), (email_only.id, "email")
+    ])
+    for row in stored:
+        if row.channel == NotificationChannel.IN_APP:
+            assert row.status == NotificationStatus.SENT and row.sent_at is not None
+        else:
+            assert row.status == NotificationStatus.QUEUED and row.scheduled_for is None
+    ids = {(row.user_id, row.channel): row.id for row in stored}
+    assert tasks["send_email_batch"].calls == [(
+        [[ids[everything.id, NotificationChannel.EMAIL], everything.email],
+         [ids[email_only.id, NotificationChannel.EMAIL], email_only.email]],
+        "Event", "Join us"
+    )]
+    assert tasks["send_sms_batch"].calls == [([[ids[everything.id, NotificationChannel.SMS], "+40700000001"]], "Join us")]
+    assert tasks["send_push_batch"].calls == [([[ids[everything.id, NotificationChannel.PUSH], everything.id]], "Event", "Join us")]
+
+def test_batches_that_cannot_be_queued_are_marked_failed(db_session, tasks, monkeypatch):
+    monkeypatch.setattr(fanout.get_settings(), "NOTIFICATION_DELIVERY_BATCH_SIZE", 2)
+    customers(db_session, 5)
+    broken = FakeTask(ConnectionError("broker down"))
+    monkeypatch.setattr(fanout, "send_email_batch", broken)
+
+    result = fanout.fan_out(
+        db_session, NotificationType.SPECIAL_EVENT, "Event", "Join us", channel_selector=fanout.email_only
+    )
+
+    assert result["queued"]["email"] == 0 and result["failed"] == 5
+    db_session.expire_all()
+    stored = rows(db_session)
+    assert [row.status for row in stored] == [NotificationStatus.FAILED] * 5
+    assert all(row.error_details == {"error": "broker down"} for row in stored)
+
+def test_only_the_failing_batch_is_marked_failed(db_session, tasks, monkeypatch):
+    monkeypatch.setattr(fanout.get_settings(), "NOTIFICATION_DELIVERY_BATCH_SIZE", 2)
+    customers(db_session, 5)
+
+    class FlakyTask(FakeTask):
+        def delay(self, *args):
+            if len(self.calls) == 1:
+                self.calls.append(None)
+                raise ConnectionError("broker down")
+            self.calls.append(args)
+
+    flaky = FlakyTask()
+    monkeypatch.setattr(fanout, "send_email_batch", flaky)
+
+    result = fanout.fan_out(
+        db_session, NotificationType.SPECIAL_EVENT, "Event", "Join us", channel_selector=fanout.email_only
+    )
+
+    assert (result["queued"]["email"], result["failed"]) == (3, 2)
+    db_session.expire_all()
+    assert [row.status for row in rows(db_session)] == [
+        NotificationStatus.QUEUED, NotificationStatus.QUEUED,
+        NotificationStatus.FAILED, NotificationStatus.FAILED,
+        NotificationStatus.QUEUED
+    ]
@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+
+from booking import availability
+from booking.models import Booking, BookingStatus, WaitlistEntry
+from notifications.models import Notification, NotificationChannel, NotificationType
+from notifications.schemas import NotificationResponse
+from payments.models import Payment, PaymentGateway, PaymentMethod
+from payments.schemas import PaymentResponse
+from services.models import Service
+from stylists.models import Stylist
+from users.models import AuditLog, User
+from utils import loaders
+from validation.schemas import AuditLogResponse, BookingResponse, WaitlistEntryResponse
+
+START = datetime(2030, 1, 7, 10, 0)
+
+# Every *_response profile with the model it loads and the schema its rows are serialized through
+RESPONSE_PROFILES = {
+    "booking_response": (Booking, BookingResponse),
+    "payment_response": (Payment, PaymentResponse),
+    "notification_response": (Notification, NotificationResponse),
+    "audit_log_response": (AuditLog, AuditLogResponse),
+    "waitlist_entry_response": (WaitlistEntry, WaitlistEntryResponse)
+}
+
+@pytest.fixture
+def db(session_factory):
+    """Three of everything for one customer, read back through a fresh session."""
+    setup = session_factory()
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    stylist = Stylist(name="Ana")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    setup.add_all([customer, stylist, service])
+    setup.flush()
+    for index in range(3):
+        booking = Booking(
+            id=f"booking-{index}",
+            user_id=customer.id,
+            stylist_id=stylist.id,
+            service_id=service.id,
+            start_time=START + timedelta(hours=index),
+            end_time=START + timedelta(hours=index, minutes=30),
+            status=BookingStatus.CONFIRMED
+        )
+        setup.add_all([
+            booking,
+            Payment(
+                user_id=customer.id, booking_id=booking.id, amount=10.0,
+                method=PaymentMethod.CREDIT_CARD, gateway=PaymentGateway.STRIPE
+            ),
+            Notification(
+                user_id=customer.id, type=NotificationType.BOOKING_CONFIRMATION,
+                channel=NotificationChannel.IN_APP, title="Booked", message="See you"
+            ),
+            AuditLog(user_id=customer.id, action="create", resource_type="booking", resource_id=booking.id),
+            WaitlistEntry(booking_id=booking.id, user_id=customer.id, service_id=service.id)
+        ])
+    setup.commit()
+    setup.close()
+
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@contextmanager
+def selects(db):
+    """The SELECT statements issued while the block runs."""
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            queries.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def test_every_response_profile_is_covered():
+    assert set(RESPONSE_PROFILES) == {profile for profile in loaders._PROFILES if profile.endswith("_response")}
+
+@pytest.mark.parametrize("profile", sorted(RESPONSE_PROFILES))
+def test_a_response_page_serializes_in_one_query(db, profile):
+    model, schema = RESPONSE_PROFILES[profile]
+    with selects(db) as queries:
+        rows = loaders.with_profile(db.query(model), profile).all()
+        payload = [schema.model_validate(row).model_dump(mode="json") for row in rows]
+
+    assert len(payload) == 3
+    assert len(queries) == 1
+
+def test_a_nested_field_fails_until_its_profile_loads_it(db):
+    class CustomerName(BaseModel, from_attributes=True):
+        name: str
+
+    class BookingWithCustomer(BookingResponse):
+        user: CustomerName
+
+    rows = loaders.with_profile(db.query(Booking), "booking_response").all()
+    with pytest.raises(ValidationError, match="lazy='raise'"):
+        BookingWithCustomer.model_validate(rows[0])
+
+    # The detail profile loads it, still without a query per row
+    with selects(db) as queries:
+        rows = loaders.with_profile(db.query(Booking), "booking_detail").all()
+        names = [BookingWithCustomer.model_validate(row).user.name for row in rows]
+    assert names == ["Customer"] * 3
+    assert len(queries) == 2
+
+def test_response_rows_raise_on_lazy_loads_until_the_transaction_ends(db):
+    rows = loaders.with_profile(db.query(Booking), "booking_response").all()
+
+    # Later lookups return the same instances from the identity map, options included
+    booking = db.get(Booking, "booking-0")
+    assert booking is rows[0]
+    with pytest.raises(InvalidRequestError):
+        booking.user
+    with pytest.raises(InvalidRequestError):
+        db.query(Booking).filter(Booking.id == "booking-1").one().service
+
+    db.commit()
+    assert booking.user.name == "Customer"
+
+def test_availability_snapshots_leave_relationships_loadable(db):
+    bookings = availability.load_bookings(db, [1], START, START + timedelta(days=1))
+    assert [booking.id for booking in bookings[1]] == ["booking-0", "booking-1", "booking-2"]
+
+    # As a booking write in the same transaction would read them
+    booking = db.get(Booking, "booking-0")
+    assert booking is bookings[1][0]
+    assert booking.user.name == "Customer" and booking.service.name == "Cut"
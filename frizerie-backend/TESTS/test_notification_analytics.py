@@ -0,0 +1,113 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from notifications import analytics_rollup
+from notifications.models import (
+    Notification, NotificationAnalyticsHourly, NotificationChannel, NotificationStatus, NotificationType
+)
+from users.models import User
+
+BASE = datetime(2030, 1, 7, 8, 0)
+TYPES = [NotificationType.BOOKING_REMINDER, NotificationType.BOOKING_CONFIRMATION]
+
+@pytest.fixture
+def events(db_session):
+    """Notifications over a day, each sent, mostly delivered and sometimes read, recorded through the rollup."""
+    generator = random.Random(7)
+    user = User(name="Customer", email="customer@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.flush()
+
+    recorded = []
+    for index in range(150):
+        created_at = BASE + timedelta(minutes=generator.randrange(0, 12 * 60))
+        sent_at = created_at + timedelta(seconds=generator.randrange(1, 120))
+        delivered_at = sent_at + timedelta(seconds=generator.randrange(1, 600)) if index % 5 else None
+        notification = Notification(
+            user_id=user.id,
+            type=TYPES[index % 2],
+            channel=NotificationChannel.SMS if index % 3 == 0 else NotificationChannel.EMAIL,
+            title="Reminder",
+            message="Your appointment is tomorrow",
+            status=NotificationStatus.SENT,
+            created_at=created_at,
+            sent_at=sent_at,
+            delivered_at=delivered_at
+        )
+        db_session.add(notification)
+        db_session.flush()
+        moments = [("sent", sent_at)]
+        if delivered_at:
+            moments.append(("delivered", delivered_at))
+            if index % 3 == 0:
+                moments.append(("read", delivered_at + timedelta(minutes=generator.randrange(1, 90))))
+        batch = [
+            {
+                "notification_id": notification.id,
+                "channel": notification.channel,
+                "event_type": event_type,
+                "event_time": event_time
+            }
+            for event_type, event_time in moments
+        ]
+        analytics_rollup.record_events(db_session, batch)
+        recorded.extend((notification, event) for event in batch)
+    db_session.commit()
+    return db_session, recorded
+
+def expected(recorded, start, end, channel=None):
+    """The report's totals and latencies computed event by event."""
+    counts = {event_type: 0 for event_type in analytics_rollup.EVENT_TYPES}
+    latencies = {"delivered": [], "read": []}
+    for notification, event in recorded:
+        if not start <= event["event_time"] <= end or (channel and event["channel"] != channel):
+            continue
+        counts[event["event_type"]] += 1
+        if event["event_type"] == "delivered":
+            latencies["delivered"].append((event["event_time"] - notification.sent_at).total_seconds())
+        elif event["event_type"] == "read":
+            latencies["read"].append((event["event_time"] - notification.delivered_at).total_seconds())
+    average = {key: sum(values) / len(values) if values else 0 for key, values in latencies.items()}
+    return counts, average
+
+def test_rollup_holds_one_row_per_hour_channel_type_and_event(events):
+    db, recorded = events
+    keys = {
+        (event["event_time"].replace(minute=0, second=0), event["channel"], notification.type, event["event_type"])
+        for notification, event in recorded
+    }
+    rows = db.query(NotificationAnalyticsHourly).all()
+    assert len(rows) == len(keys)
+    assert sum(row.count for row in rows) == len(recorded)
+
+@pytest.mark.parametrize("start, end", [
+    (BASE, BASE + timedelta(days=1)),
+    (BASE + timedelta(minutes=37), BASE + timedelta(hours=6, minutes=5)),
+    (BASE + timedelta(hours=2, minutes=10), BASE + timedelta(hours=2, minutes=50)),
+    (BASE + timedelta(hours=3), BASE + timedelta(hours=5))
+])
+def test_report_matches_the_raw_events(events, start, end):
+    db, recorded = events
+    counts, average = expected(recorded, start, end)
+    assert counts["sent"] and counts["delivered"]
+
+    report = analytics_rollup.report(db, start, end)
+
+    assert (report["total_sent"], report["total_delivered"], report["total_read"]) == (
+        counts["sent"], counts["delivered"], counts["read"]
+    )
+    assert report["average_delivery_time"] == pytest.approx(average["delivered"])
+    assert report["average_read_time"] == pytest.approx(average["read"])
+    assert sum(period["total_sent"] for period in report["time_series"]) == counts["sent"]
+
+def test_report_filters_by_channel(events):
+    db, recorded = events
+    start, end = BASE + timedelta(minutes=20), BASE + timedelta(hours=9, minutes=40)
+    counts, _ = expected(recorded, start, end, NotificationChannel.SMS)
+
+    report = analytics_rollup.report(db, start, end, channel=NotificationChannel.SMS)
+
+    assert report["total_sent"] == counts["sent"]
+    assert report["channel_stats"][NotificationChannel.EMAIL]["total_sent"] == 0
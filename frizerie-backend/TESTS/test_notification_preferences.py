@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+import pytz
+from sqlalchemy import event
+
+from notifications import fanout, services
+from notifications.models import (
+    Notification, NotificationChannel, NotificationPreference, NotificationPriority, NotificationType
+)
+from notifications.preferences import TYPE_BITS, CompiledPreferences, PreferenceCache
+from notifications.schemas import NotificationPreferenceCreate, NotificationPreferenceUpdate
+from notifications.services import NotificationService
+from users.models import User, UserSetting
+
+BUCHAREST = pytz.timezone("Europe/Bucharest")
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = PreferenceCache(max_entries=100, ttl_seconds=300)
+    monkeypatch.setattr(services, "preference_cache", cache)
+    monkeypatch.setattr(fanout, "preference_cache", cache)
+    return cache
+
+@pytest.fixture
+def users(db_session):
+    """Three customers: one opted out of marketing, one opted in, one who never saved preferences."""
+    customers = [
+        User(name=name, email=f"{name.lower()}@example.com", password_hash="x")
+        for name in ("Opted-out", "Opted-in", "Default")
+    ]
+    db_session.add_all(customers)
+    db_session.flush()
+    db_session.add_all([UserSetting(user_id=customer.id) for customer in customers])
+    db_session.add_all([
+        NotificationPreference(user_id=customers[0].id, marketing_notifications=False),
+        NotificationPreference(user_id=customers[1].id, marketing_notifications=True)
+    ])
+    db_session.commit()
+    return db_session, customers
+
+class FakeTask:
+    def delay(self, *args):
+        pass
+
+@contextmanager
+def preference_queries(db):
+    """The SELECTs against the preference table while the block runs."""
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "FROM notification_preferences" in statement:
+            queries.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def overnight():
+    """Quiet hours from 22:00 to 07:00 Bucharest time."""
+    return CompiledPreferences(
+        user_id=1,
+        enabled_types=0,
+        quiet_start=22 * 60,
+        quiet_end=7 * 60,
+        tz=BUCHAREST,
+        urgent_channels=(),
+        other_channels=()
+    )
+
+def utc(local):
+    return BUCHAREST.localize(local).astimezone(pytz.UTC).replace(tzinfo=None)
+
+def test_type_bitmask_follows_the_category_switches(users):
+    db, (opted_out, opted_in, _) = users
+    compiled = CompiledPreferences.compile(
+        db.query(NotificationPreference).filter(NotificationPreference.user_id == opted_out.id).one()
+    )
+
+    assert compiled.allows(NotificationType.BOOKING_CONFIRMATION)
+    assert compiled.allows(NotificationType.URGENT_ALERT)
+    assert not compiled.allows(NotificationType.PROMOTIONAL_OFFER)
+    assert not compiled.allows(NotificationType.SPECIAL_EVENT)
+    assert not compiled.enabled_types & (TYPE_BITS[NotificationType.PROMOTIONAL_OFFER] | TYPE_BITS[NotificationType.NEW_SERVICE])
+    assert compiled.other_channels == (NotificationChannel.IN_APP, NotificationChannel.EMAIL)
+
+@pytest.mark.parametrize("local_time, quiet", [
+    (datetime(2030, 1, 7, 21, 59), False),
+    (datetime(2030, 1, 7, 22, 0), True),
+    (datetime(2030, 1, 7, 23, 30), True),
+    (datetime(2030, 1, 8, 0, 30), True),
+    (datetime(2030, 1, 8, 7, 0), True),
+    (datetime(2030, 1, 8, 7, 1), False),
+    (datetime(2030, 1, 8, 12, 0), False)
+])
+def test_overnight_quiet_hours_wrap_past_local_midnight(local_time, quiet):
+    preferences = overnight()
+    assert preferences.in_quiet_hours(NotificationPriority.MEDIUM, utc(local_time)) is quiet
+    assert not preferences.in_quiet_hours(NotificationPriority.URGENT, utc(local_time))
+
+@pytest.mark.parametrize("now, end", [
+    # Clocks go forward at 03:00 on 31 March: the night is an hour shorter in UTC
+    (datetime(2030, 3, 30, 23, 0), datetime(2030, 3, 31, 4, 0, 1)),
+    (datetime(2030, 3, 31, 2, 30), datetime(2030, 3, 31, 4, 0, 1)),
+    # Clocks go back at 04:00 on 27 October: an hour longer
+    (datetime(2030, 10, 26, 23, 0), datetime(2030, 10, 27, 5, 0, 1)),
+    (datetime(2030, 10, 27, 5, 30), datetime(2030, 10, 27, 5, 0, 1))
+])
+def test_quiet_hours_end_at_local_seven_across_dst_changes(now, end):
+    preferences = overnight()
+    assert preferences.quiet_hours_end(utc(now)) == end
+    assert not preferences.in_quiet_hours(None, end)
+
+def test_users_without_preferences_are_cached_too(users, cache):
+    db, (opted_out, opted_in, default) = users
+    with preference_queries(db) as queries:
+        first = cache.get_many(db, [opted_out.id, default.id])
+        second = cache.get_many(db, [opted_out.id, default.id])
+        assert cache.get(db, default.id) is None
+
+    assert set(first) == set(second) == {opted_out.id}
+    assert len(queries) == 1
+    assert cache.stats() == {"entries": 2, "hits": 3, "misses": 2}
+
+def test_least_recently_used_entries_are_evicted(users):
+    db, (opted_out, opted_in, default) = users
+    cache = PreferenceCache(max_entries=2)
+    cache.get_many(db, [opted_out.id])
+    cache.get_many(db, [opted_in.id])
+    cache.get(db, opted_out.id)
+    cache.get(db, default.id)
+
+    with preference_queries(db) as queries:
+        cache.get(db, opted_out.id)
+        cache.get(db, default.id)
+        cache.get(db, opted_in.id)
+
+    # Only the evicted user is loaded again
+    assert len(queries) == 1
+    assert cache.stats() == {"entries": 2, "hits": 3, "misses": 4}
+
+@pytest.mark.asyncio
+async def test_saving_preferences_invalidates_the_cached_entry(users, cache):
+    db, (opted_out, opted_in, default) = users
+    service = NotificationService(db)
+    assert not cache.get(db, opted_out.id).allows(NotificationType.PROMOTIONAL_OFFER)
+    assert cache.get(db, default.id) is None
+
+    await service.update_notification_preference(
+        opted_out.id, NotificationPreferenceUpdate(marketing_notifications=True)
+    )
+    await service.create_notification_preference(NotificationPreferenceCreate(user_id=default.id, sms_enabled=False))
+
+    assert cache.get(db, opted_out.id).allows(NotificationType.PROMOTIONAL_OFFER)
+    assert NotificationChannel.SMS not in cache.get(db, default.id).urgent_channels
+
+def test_fan_out_skips_users_whose_preferences_disable_the_type(users, cache, monkeypatch):
+    db, (opted_out, opted_in, default) = users
+    for name in ("send_email_batch", "send_sms_batch", "send_push_batch"):
+        monkeypatch.setattr(fanout, name, FakeTask())
+
+    progress = fanout.fan_out(db, NotificationType.PROMOTIONAL_OFFER, "Offer", "20% off")
+    recipients = {notification.user_id for notification in db.query(Notification).all()}
+    assert recipients == {opted_in.id, default.id}
+    assert progress["opted_out"] == 1 and progress["recipients"] == 3
+
+    with preference_queries(db) as queries:
+        fanout.fan_out(
+            db, NotificationType.URGENT_ALERT, "Closed", "Closed today",
+            channel_selector=fanout.all_channels, respect_preferences=False
+        )
+        fanout.fan_out(db, NotificationType.SPECIAL_EVENT, "Event", "Join us")
+    assert queries == []
+    assert {
+        notification.user_id
+        for notification in db.query(Notification).filter(Notification.type == NotificationType.SPECIAL_EVENT).all()
+    } == {opted_in.id, default.id}
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from fastapi.testclient import TestClient
+
+from booking.models import Booking, BookingStatus
+from config.database import get_db
+from config.dependencies import get_current_user
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+from utils import pagination
+
+START = datetime(2030, 1, 7, 10, 0)
+
+@pytest.fixture
+def bookings(db_session):
+    """Seven bookings for one customer; three share a start time so only the id breaks the tie."""
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    stylist = Stylist(name="Ana")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([customer, stylist, service])
+    db_session.flush()
+    starts = [START + timedelta(hours=offset) for offset in (0, 1, 1, 1, 2, 3, 4)]
+    db_session.add_all([
+        Booking(
+            user_id=customer.id,
+            stylist_id=stylist.id,
+            service_id=service.id,
+            start_time=start,
+            end_time=start + timedelta(minutes=30),
+            status=BookingStatus.CONFIRMED
+        )
+        for start in starts
+    ])
+    db_session.commit()
+    return db_session, customer
+
+def walk(db, descending, limit=2):
+    """Every page of the customer's bookings, following the cursors to the end."""
+    pages, cursor = [], None
+    while True:
+        page = pagination.paginate(
+            db.query(Booking), Booking.start_time, Booking.id, cursor, limit=limit, descending=descending
+        )
+        pages.append([booking.id for booking in page])
+        cursor = pagination.next_cursor(page, limit, "start_time")
+        if not cursor:
+            return pages
+
+@pytest.mark.parametrize("sort_value", [START.replace(microsecond=250), "Cut", 42, None])
+def test_cursor_round_trips(sort_value):
+    cursor = pagination.encode_cursor(sort_value, 17)
+    assert "=" not in cursor
+    assert pagination.decode_cursor(cursor) == (sort_value, 17)
+
+def test_malformed_cursor_is_a_bad_request():
+    with pytest.raises(HTTPException) as error:
+        pagination.decode_cursor("not-a-cursor")
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_pages_cover_every_row_once_across_sort_key_ties(bookings, descending):
+    db, _ = bookings
+    ordered = sorted(db.query(Booking).all(), key=lambda booking: (booking.start_time, booking.id), reverse=descending)
+
+    pages = walk(db, descending)
+
+    assert [booking_id for page in pages for booking_id in page] == [booking.id for booking in ordered]
+    assert all(len(page) == 2 for page in pages[:-1])
+
+def test_headers_carry_the_next_cursor_only_while_pages_are_full(bookings):
+    db, _ = bookings
+    page = pagination.paginate(db.query(Booking), Booking.start_time, Booking.id, limit=3)
+    response = Response()
+    pagination.set_page_headers(response, page, 3, "start_time", total=7)
+    assert pagination.decode_cursor(response.headers[pagination.NEXT_CURSOR_HEADER]) == (
+        page[-1].start_time, page[-1].id
+    )
+    assert response.headers[pagination.TOTAL_ESTIMATE_HEADER] == "7"
+
+    last = Response()
+    pagination.set_page_headers(last, page[:2], 3, "start_time")
+    assert pagination.NEXT_CURSOR_HEADER not in last.headers
+    assert pagination.TOTAL_ESTIMATE_HEADER not in last.headers
+
+def test_my_bookings_route_pages_by_the_next_cursor_header(session_factory, bookings):
+    import main
+
+    db, customer = bookings
+    user_id = customer.id
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    main.app.dependency_overrides[get_current_user] = lambda: db.get(User, user_id)
+    try:
+        client = TestClient(main.app)
+        path = next(route.path for route in main.app.routes if route.path.endswith("/bookings/my-bookings"))
+        seen, params = [], {"limit": 3}
+        while True:
+            response = client.get(path, params=params)
+            assert response.status_code == 200
+            seen.extend(booking["id"] for booking in response.json())
+            cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+            if not cursor:
+                break
+            params = {"limit": 3, "cursor": cursor}
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert seen == [booking_id for page in walk(db, descending=True) for booking_id in page]
@@ -0,0 +1,136 @@
+import pytest
+from firebase_admin import exceptions, messaging
+
+from external_services import push_dispatcher
+from external_services.push_dispatcher import PushDispatcher, PushRequest, PushResult
+from notifications import fanout, push
+from notifications.models import (
+    Notification, NotificationChannel, NotificationStatus, NotificationType, PushDeviceToken
+)
+from users.models import User, UserSetting
+
+class FakeDispatcher:
+    """Answers every token with the outcome given for it."""
+
+    def __init__(self, outcomes=None):
+        self.outcomes = outcomes or {}
+        self.calls = 0
+        self.sent = []
+
+    def send(self, requests):
+        self.calls += 1
+        self.sent.extend(request.token for request in requests)
+        results = []
+        for request in requests:
+            outcome = self.outcomes.get(request.token, "ok")
+            results.append(PushResult(
+                token=request.token,
+                reference=request.reference,
+                success=outcome == "ok",
+                error=None if outcome == "ok" else outcome,
+                invalid=outcome == "invalid",
+                retryable=outcome == "unavailable"
+            ))
+        return results
+
+class FakeTask:
+    def __init__(self):
+        self.calls = []
+
+    def delay(self, *args):
+        self.calls.append(args)
+
+@pytest.fixture
+def users(db_session):
+    with_device = User(name="Phone", email="phone@example.com", password_hash="x")
+    without_device = User(name="Nophone", email="nophone@example.com", password_hash="x")
+    db_session.add_all([with_device, without_device])
+    db_session.flush()
+    db_session.add_all([
+        UserSetting(user_id=with_device.id, enable_promotional_messages=True),
+        UserSetting(user_id=without_device.id, enable_promotional_messages=True),
+        PushDeviceToken(user_id=with_device.id, token="token-a"),
+        PushDeviceToken(user_id=with_device.id, token="token-b")
+    ])
+    db_session.commit()
+    return db_session, with_device, without_device
+
+def queued(db, user, title="Offer"):
+    notification_id = push.queue_push(db, user.id, NotificationType.PROMOTIONAL_OFFER, title, "20% off")
+    return push.QueuedPush(notification_id, user.id, title, "20% off")
+
+def test_fan_out_queues_push_for_users_with_devices(users, monkeypatch):
+    db, with_device, without_device = users
+    tasks = {name: FakeTask() for name in ("send_email_batch", "send_sms_batch", "send_push_batch")}
+    for name, task in tasks.items():
+        monkeypatch.setattr(fanout, name, task)
+
+    progress = fanout.fan_out(
+        db, NotificationType.PROMOTIONAL_OFFER, "Offer", "20% off",
+        criteria=[UserSetting.enable_promotional_messages == True]
+    )
+
+    pushes = db.query(Notification).filter(Notification.channel == NotificationChannel.PUSH).all()
+    assert [notification.user_id for notification in pushes] == [with_device.id]
+    assert pushes[0].status == NotificationStatus.QUEUED
+    assert tasks["send_push_batch"].calls == [([[pushes[0].id, with_device.id]], "Offer", "20% off")]
+    assert progress["queued"]["push"] == 1
+
+def test_queue_push_skips_users_without_devices(users):
+    db, with_device, without_device = users
+    assert push.queue_push(db, without_device.id, NotificationType.PROMOTIONAL_OFFER, "Offer", "20% off") is None
+
+def test_queued_push_is_sent_once(users):
+    db, with_device, without_device = users
+    notification = queued(db, with_device)
+    dispatcher = FakeDispatcher()
+
+    stats = push.send_queued(db, dispatcher, [notification])
+    assert stats["sent"] == 1
+    assert sorted(dispatcher.sent) == ["token-a", "token-b"]
+    assert db.get(Notification, notification.id).status == NotificationStatus.SENT
+
+    # A second sender (the sweep, or a duplicate task) finds nothing to claim
+    assert push.send_queued(db, dispatcher, [notification])["notifications"] == 0
+    assert push.dispatch_pending(db, dispatcher, 100)["notifications"] == 0
+    assert dispatcher.calls == 1
+
+def test_transient_failure_is_retried_then_failed(users, monkeypatch):
+    db, with_device, without_device = users
+    monkeypatch.setattr(push.get_settings(), "PUSH_MAX_ATTEMPTS", 2)
+    notification = queued(db, with_device)
+    dispatcher = FakeDispatcher({"token-a": "unavailable", "token-b": "unavailable"})
+
+    stats = push.send_queued(db, dispatcher, [notification])
+    assert stats["retrying"] == 1
+    row = db.get(Notification, notification.id)
+    db.refresh(row)
+    assert row.status == NotificationStatus.QUEUED
+    assert row.notification_metadata["push_attempts"] == 1
+
+    stats = push.dispatch_pending(db, dispatcher, 100)
+    assert stats["failed"] == 1
+    db.refresh(row)
+    assert row.status == NotificationStatus.FAILED
+
+def test_permanent_failure_prunes_token_and_fails(users):
+    db, with_device, without_device = users
+    notification = queued(db, with_device)
+    dispatcher = FakeDispatcher({"token-a": "invalid", "token-b": "invalid"})
+
+    stats = push.send_queued(db, dispatcher, [notification])
+    assert stats["failed"] == 1 and stats["pruned"] == 2
+    assert db.query(PushDeviceToken).filter(PushDeviceToken.is_active == True).count() == 0
+
+def test_dispatcher_flags_transient_fcm_errors(monkeypatch):
+    def unavailable(message, dry_run=False, app=None):
+        raise exceptions.UnavailableError("FCM is unavailable")
+
+    monkeypatch.setattr(messaging, "send_each_for_multicast", unavailable)
+    results = PushDispatcher().send([PushRequest(token="token-a", title="Offer", body="20% off")])
+    assert results[0].retryable and not results[0].success and not results[0].invalid
+
+def test_transient_and_token_errors_are_told_apart():
+    assert push_dispatcher.is_transient_error(messaging.QuotaExceededError("quota", None))
+    assert push_dispatcher.is_transient_error(exceptions.InternalError("internal"))
+    assert not push_dispatcher.is_transient_error(messaging.UnregisteredError("gone", None))
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Depends, HTTPException
+from fastapi.testclient import TestClient
+
+from auth import dependencies as auth_dependencies
+from booking import schedule
+from booking.models import Booking, BookingStatus, StylistAvailability, StylistTimeOff
+from bookings import rebooking
+from config.database import get_db
+from notifications.models import Notification, NotificationChannel, NotificationStatus, NotificationType
+from services.models import Service
+from stylists.models import Stylist
+from users.models import Role, User, UserSetting
+
+START = (datetime.utcnow() + timedelta(days=5)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+class FakeTask:
+    def __init__(self):
+        self.calls = []
+
+    def delay(self, *args):
+        self.calls.append(args)
+
+@pytest.fixture
+def emails(monkeypatch):
+    task = FakeTask()
+    monkeypatch.setattr(rebooking, "send_email_batch", task)
+    monkeypatch.setattr(schedule, "_templates", {})
+    return task.calls
+
+@pytest.fixture
+def salon(db_session):
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    admin = User(name="Admin", email="admin@example.com", password_hash="x", is_admin=True)
+    away = Stylist(name="Ana")
+    cover = Stylist(name="Bea")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([customer, admin, away, cover, service])
+    db_session.flush()
+    db_session.add(UserSetting(user_id=customer.id, enable_email_notifications=True))
+    db_session.add_all([
+        StylistAvailability(stylist_id=stylist.id, day_of_week=day, start_time="08:00", end_time="20:00")
+        for stylist in (away, cover)
+        for day in range(7)
+    ])
+    booking = Booking(
+        user_id=customer.id,
+        stylist_id=away.id,
+        service_id=service.id,
+        start_time=START,
+        end_time=START + timedelta(minutes=30),
+        status=BookingStatus.CONFIRMED
+    )
+    time_off = StylistTimeOff(
+        stylist_id=away.id,
+        start_date=START.replace(hour=0),
+        end_date=START.replace(hour=0) + timedelta(days=1)
+    )
+    db_session.add_all([booking, time_off])
+    db_session.commit()
+    return db_session, customer, admin, away, cover, booking, time_off
+
+def test_displaced_booking_moves_to_another_stylist_and_customer_is_told(salon, emails):
+    db, customer, admin, away, cover, booking, time_off = salon
+
+    result = rebooking.approve_time_off_with_rebooking(db, time_off.id, admin.id)
+
+    assert result["applied"] and result["unplaced"] == []
+    assert [(move["booking_id"], move["to_stylist_id"]) for move in result["moves"]] == [(booking.id, cover.id)]
+    db.refresh(booking)
+    db.refresh(time_off)
+    assert (booking.stylist_id, booking.start_time) == (cover.id, START)
+    assert booking.last_modified_by == admin.id
+    assert time_off.is_approved and time_off.approved_by == admin.id
+
+    notification, email = db.query(Notification).order_by(Notification.id).all()
+    assert notification.user_id == customer.id
+    assert notification.type == NotificationType.BOOKING_MODIFICATION
+    assert notification.notification_metadata == {"booking_id": booking.id}
+    assert (email.channel, email.status, email.message) == (
+        NotificationChannel.EMAIL, NotificationStatus.QUEUED, notification.message
+    )
+    assert emails == [([[email.id, "customer@example.com"]], notification.title, notification.message)]
+
+def test_email_rows_fail_when_the_batch_cannot_be_queued(salon, monkeypatch):
+    db, customer, admin, away, cover, booking, time_off = salon
+
+    class BrokenTask:
+        def delay(self, *args):
+            raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(rebooking, "send_email_batch", BrokenTask())
+    monkeypatch.setattr(schedule, "_templates", {})
+
+    assert rebooking.approve_time_off_with_rebooking(db, time_off.id, admin.id)["applied"]
+    email = db.query(Notification).filter(Notification.channel == NotificationChannel.EMAIL).one()
+    db.refresh(email)
+    assert email.status == NotificationStatus.FAILED
+
+def test_plan_is_a_dry_run(salon, emails):
+    db, customer, admin, away, cover, booking, time_off = salon
+
+    plan = rebooking.plan_time_off_rebooking(db, time_off.id)
+
+    assert not plan["applied"] and len(plan["moves"]) == 1
+    db.refresh(booking)
+    assert booking.stylist_id == away.id
+    assert db.query(Notification).count() == 0
+    assert emails == []
+
+def test_unplaced_booking_conflicts_unless_cancelled(salon, emails):
+    db, customer, admin, away, cover, booking, time_off = salon
+    cover.is_active = False
+    time_off.start_date = datetime.utcnow()
+    time_off.end_date = START + timedelta(days=10)
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        rebooking.approve_time_off_with_rebooking(db, time_off.id, admin.id)
+    assert error.value.status_code == 409
+    assert error.value.headers["X-Unplaced-Bookings"] == booking.id
+
+    result = rebooking.approve_time_off_with_rebooking(db, time_off.id, admin.id, cancel_unplaced=True)
+    assert result["unplaced"] == [booking.id]
+    db.refresh(booking)
+    assert booking.status == BookingStatus.CANCELLED
+    assert {notification.type for notification in db.query(Notification).all()} == {NotificationType.BOOKING_CANCELLATION}
+    assert emails[0][0][0][1] == "customer@example.com"
+
+def test_rebooking_routes_need_the_admin_role(session_factory, salon, emails):
+    import main
+
+    db, customer, admin, away, cover, booking, time_off = salon
+    admin.roles.append(Role(name="admin"))
+    db.commit()
+    user_ids = {"customer": customer.id, "admin": admin.id}
+    current = {}
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def current_user(session=Depends(get_db)):
+        return session.get(User, user_ids[current["as"]])
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    main.app.dependency_overrides[auth_dependencies.get_current_user] = current_user
+    try:
+        client = TestClient(main.app)
+        path = next(route.path for route in main.app.routes if route.path.endswith("/rebooking-plan"))
+        url = path.replace("{time_off_id}", time_off.id)
+        current["as"] = "customer"
+        denied = client.get(url)
+        current["as"] = "admin"
+        allowed = client.get(url)
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert denied.status_code == 403
+    assert allowed.status_code == 200 and len(allowed.json()["moves"]) == 1
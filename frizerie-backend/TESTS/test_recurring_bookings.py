@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Depends, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from booking import availability_cache, recurring_services, schedule, slot_events, time_off_index
+from booking.models import Booking, BookingStatus, RecurrenceType, StylistAvailability, StylistTimeOff
+from config.database import get_db
+from config.dependencies import get_current_user
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+from validation.schemas import BookingCreate, RecurringBookingCreate
+
+# A Monday far enough ahead that every occurrence is in the future
+START = datetime(2030, 1, 7, 10, 0)
+
+@pytest.fixture
+def salon(db_session, monkeypatch):
+    """A stylist working Mondays 09:00-17:00, away the third Monday and booked the fourth at 10:00."""
+    monkeypatch.setattr(schedule, "_templates", {})
+    monkeypatch.setattr(time_off_index, "_indexes", {})
+    monkeypatch.setattr(availability_cache, "_cache", availability_cache.AvailabilityCache(
+        availability_cache.MemoryBackend()
+    ))
+    effects = {"invalidated": [], "freed": []}
+    monkeypatch.setattr(availability_cache, "invalidate_booking", lambda *slot: effects["invalidated"].append(slot))
+    monkeypatch.setattr(slot_events, "emit_slot_freed", lambda *slot: effects["freed"].append(slot))
+
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    other = User(name="Other", email="other@example.com", password_hash="x")
+    stylist = Stylist(name="Ana")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([customer, other, stylist, service])
+    db_session.flush()
+    db_session.add_all([
+        StylistAvailability(stylist_id=stylist.id, day_of_week=0, start_time="09:00", end_time="17:00"),
+        StylistTimeOff(
+            stylist_id=stylist.id,
+            start_date=START.replace(hour=0) + timedelta(weeks=2),
+            end_date=START.replace(hour=0) + timedelta(weeks=2, days=1),
+            is_approved=True
+        ),
+        Booking(
+            user_id=other.id,
+            stylist_id=stylist.id,
+            service_id=service.id,
+            start_time=START + timedelta(weeks=3),
+            end_time=START + timedelta(weeks=3, minutes=30),
+            status=BookingStatus.CONFIRMED
+        )
+    ])
+    db_session.commit()
+    return db_session, customer, stylist, service, effects
+
+def series(customer, stylist, service, start=START, weeks=5):
+    return RecurringBookingCreate(
+        base_booking=BookingCreate(
+            user_id=customer.id,
+            stylist_id=stylist.id,
+            service_id=service.id,
+            start_time=start,
+            end_time=start + timedelta(minutes=30)
+        ),
+        recurrence_type=RecurrenceType.WEEKLY,
+        recurrence_end_date=start + timedelta(weeks=weeks - 1)
+    )
+
+def test_conflicting_dates_are_skipped_and_reported(salon):
+    db, customer, stylist, service, effects = salon
+
+    parent, children, skipped = recurring_services.create_recurring_bookings(
+        db, series(customer, stylist, service), customer.id
+    )
+
+    assert parent.start_time == START and parent.recurrence_type == RecurrenceType.WEEKLY
+    assert [child.start_time for child in children] == [START + timedelta(weeks=week) for week in (1, 4)]
+    assert [(skip["date"], skip["reason"]) for skip in skipped] == [
+        (START + timedelta(weeks=2), "time_off"),
+        (START + timedelta(weeks=3), "double_booking")
+    ]
+    stored = db.query(Booking).filter(Booking.parent_booking_id == parent.id).order_by(Booking.start_time).all()
+    assert [booking.id for booking in stored] == [child.id for child in children]
+    assert len(effects["invalidated"]) == 3
+
+def test_children_are_written_in_one_bulk_insert(salon):
+    db, customer, stylist, service, effects = salon
+    inserts = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO bookings"):
+            inserts.append(len(parameters) if executemany else 1)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        recurring_services.create_recurring_bookings(
+            db, series(customer, stylist, service, START + timedelta(weeks=5), weeks=10), customer.id
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert inserts == [1, 9]
+
+def test_conflict_on_the_first_date_rejects_the_series(salon):
+    db, customer, stylist, service, effects = salon
+    with pytest.raises(HTTPException) as error:
+        recurring_services.create_recurring_bookings(
+            db, series(customer, stylist, service, START + timedelta(weeks=3)), customer.id
+        )
+    assert error.value.status_code == 409
+    assert db.query(Booking).filter(Booking.user_id == customer.id).count() == 0
+
+def test_cancel_frees_every_future_occurrence(salon):
+    db, customer, stylist, service, effects = salon
+    parent, children, _ = recurring_services.create_recurring_bookings(
+        db, series(customer, stylist, service), customer.id
+    )
+    effects["invalidated"].clear()
+
+    _, cancelled = recurring_services.cancel_recurring_bookings(db, parent.id, customer.id)
+
+    slots = [(stylist.id, booking.start_time, booking.end_time) for booking in [parent] + children]
+    assert sorted(booking.id for booking in cancelled) == sorted(booking.id for booking in [parent] + children)
+    assert all(db.get(Booking, booking.id).status == BookingStatus.CANCELLED for booking in cancelled)
+    assert sorted(effects["invalidated"]) == sorted(slots)
+    assert sorted(effects["freed"]) == sorted(slots)
+
+def test_update_replaces_the_series_and_frees_only_dropped_slots(salon):
+    db, customer, stylist, service, effects = salon
+    parent, children, _ = recurring_services.create_recurring_bookings(
+        db, series(customer, stylist, service), customer.id
+    )
+
+    new_parent, new_children, skipped = recurring_services.update_recurring_bookings(
+        db, parent.id, series(customer, stylist, service, weeks=2), customer.id
+    )
+
+    assert [booking.start_time for booking in [new_parent] + new_children] == [START, START + timedelta(weeks=1)]
+    assert skipped == []
+    assert db.get(Booking, parent.id).status == BookingStatus.CANCELLED
+    assert effects["freed"] == [(stylist.id, START + timedelta(weeks=4), START + timedelta(weeks=4, minutes=30))]
+
+def test_other_users_cannot_touch_the_series(salon):
+    db, customer, stylist, service, effects = salon
+    parent, _, _ = recurring_services.create_recurring_bookings(db, series(customer, stylist, service), customer.id)
+    with pytest.raises(HTTPException) as error:
+        recurring_services.cancel_recurring_bookings(db, parent.id, customer.id + 1)
+    assert error.value.status_code == 403
+
+def test_recurring_route_reports_skipped_dates(session_factory, salon):
+    import main
+
+    db, customer, stylist, service, effects = salon
+    user_id = customer.id
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def current_user(session=Depends(get_db)):
+        return session.get(User, user_id)
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    main.app.dependency_overrides[get_current_user] = current_user
+    try:
+        client = TestClient(main.app)
+        path = next(route.path for route in main.app.routes if route.path.endswith("/bookings/recurring"))
+        response = client.post(path, json=series(customer, stylist, service).model_dump(mode="json"))
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["recurring_bookings"]) == 2
+    assert [skip["reason"] for skip in body["skipped_dates"]] == ["time_off", "double_booking"]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from booking import availability_cache, schedule, time_off_index
+from booking.models import StylistAvailability, StylistTimeOff
+from stylists.models import Stylist
+
+@pytest.fixture
+def stylist(db_session, monkeypatch):
+    monkeypatch.setattr(schedule, "_templates", {})
+    monkeypatch.setattr(availability_cache, "_cache", availability_cache.AvailabilityCache(
+        availability_cache.MemoryBackend()
+    ))
+    stylist = Stylist(name="Stylist")
+    db_session.add(stylist)
+    db_session.flush()
+    db_session.add(StylistAvailability(stylist_id=stylist.id, day_of_week=0, start_time="09:00", end_time="17:00"))
+    db_session.commit()
+    return db_session, stylist
+
+def rewrite_elsewhere(db, stylist):
+    """A schedule change made by another worker, whose generation bump this process never sees."""
+    db.query(StylistAvailability).filter(StylistAvailability.stylist_id == stylist.id).update(
+        {"start_time": "11:00"}
+    )
+    db.commit()
+
+def test_template_is_reused_within_the_local_ttl(stylist):
+    db, stylist = stylist
+    first = schedule.get_template(db, stylist.id)
+    rewrite_elsewhere(db, stylist)
+    assert schedule.get_template(db, stylist.id) is first
+
+def test_template_is_recompiled_once_the_local_ttl_passes(stylist, monkeypatch):
+    db, stylist = stylist
+    schedule.get_template(db, stylist.id)
+    rewrite_elsewhere(db, stylist)
+    monkeypatch.setattr(availability_cache.get_settings(), "AVAILABILITY_CACHE_LOCAL_TTL_SECONDS", 0)
+    assert schedule.get_template(db, stylist.id).for_weekday(0).start == 11 * 60
+
+def test_generation_bump_recompiles_in_this_worker(stylist):
+    db, stylist = stylist
+    schedule.get_template(db, stylist.id)
+    rewrite_elsewhere(db, stylist)
+    availability_cache.get_cache().invalidate_stylist(stylist.id)
+    assert schedule.get_template(db, stylist.id).for_weekday(0).start == 11 * 60
+
+def test_time_off_index_is_reloaded_once_the_local_ttl_passes(stylist, monkeypatch):
+    db, stylist = stylist
+    monkeypatch.setattr(time_off_index, "_indexes", {})
+    start = datetime(2030, 1, 7, 9, 0)
+    assert not time_off_index.get_index(db, stylist.id)
+    db.add(StylistTimeOff(stylist_id=stylist.id, start_date=start, end_date=start + timedelta(days=1), is_approved=True))
+    db.commit()
+    assert not time_off_index.get_index(db, stylist.id)
+    monkeypatch.setattr(availability_cache.get_settings(), "AVAILABILITY_CACHE_LOCAL_TTL_SECONDS", 0)
+    assert time_off_index.get_index(db, stylist.id).overlaps(start, start + timedelta(hours=1))
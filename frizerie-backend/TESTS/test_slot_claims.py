@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from booking import slot_claims
+from booking.models import Booking, BookingSlotClaim, BookingStatus
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+DAY = datetime(2030, 1, 7)
+
+@pytest.fixture
+def salon(db_session):
+    user = User(name="Client", email="client@example.com", password_hash="x")
+    stylist = Stylist(name="Stylist")
+    service = Service(name="Cut", price=10.0, duration_minutes=7)
+    db_session.add_all([user, stylist, service])
+    db_session.commit()
+    return db_session, user, stylist, service
+
+def book(db, user, stylist, service, start, end):
+    booking = Booking(
+        user_id=user.id,
+        stylist_id=stylist.id,
+        service_id=service.id,
+        start_time=start,
+        end_time=end,
+        status=BookingStatus.CONFIRMED
+    )
+    db.add(booking)
+    slot_claims.claim(db, [booking])
+    db.commit()
+    return booking
+
+def test_adjacent_off_grid_bookings_do_not_conflict(salon):
+    db, user, stylist, service = salon
+    book(db, user, stylist, service, DAY.replace(hour=10), DAY.replace(hour=10, minute=7))
+    book(db, user, stylist, service, DAY.replace(hour=10, minute=7), DAY.replace(hour=10, minute=15))
+    book(db, user, stylist, service, DAY.replace(hour=10, minute=15), DAY.replace(hour=10, minute=22))
+    assert db.query(BookingSlotClaim).count() == 22
+
+def test_overlapping_bookings_are_rejected(salon):
+    db, user, stylist, service = salon
+    book(db, user, stylist, service, DAY.replace(hour=10), DAY.replace(hour=10, minute=7))
+    with pytest.raises(IntegrityError) as error:
+        book(db, user, stylist, service, DAY.replace(hour=10, minute=6), DAY.replace(hour=10, minute=13))
+    db.rollback()
+    assert slot_claims.is_overlap_error(error.value)
+
+def test_overlap_with_another_stylist_is_allowed(salon):
+    db, user, stylist, service = salon
+    other = Stylist(name="Other")
+    db.add(other)
+    db.commit()
+    book(db, user, stylist, service, DAY.replace(hour=10), DAY.replace(hour=10, minute=30))
+    book(db, user, other, service, DAY.replace(hour=10), DAY.replace(hour=10, minute=30))
+
+def test_released_claims_free_the_slot(salon):
+    db, user, stylist, service = salon
+    first = book(db, user, stylist, service, DAY.replace(hour=10), DAY.replace(hour=10, minute=30))
+    first.status = BookingStatus.CANCELLED
+    slot_claims.release(db, [first.id])
+    db.commit()
+    book(db, user, stylist, service, DAY.replace(hour=10, minute=10), DAY.replace(hour=10, minute=40))
+
+def test_booking_off_the_minute_grid_is_rejected(salon):
+    db, user, stylist, service = salon
+    with pytest.raises(HTTPException) as error:
+        book(db, user, stylist, service, DAY.replace(hour=10, second=30), DAY.replace(hour=10, minute=7))
+    assert error.value.status_code == 400
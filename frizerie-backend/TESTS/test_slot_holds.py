@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from booking import holds
+from bookings import services as booking_services
+from booking.models import Booking
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+START = (datetime.now() + timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+@pytest.fixture
+def store(monkeypatch):
+    store = holds.MemoryHoldStore()
+    monkeypatch.setattr(holds, "_store", store)
+    return store
+
+@pytest.fixture
+def salon(db_session):
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    other = User(name="Other", email="other@example.com", password_hash="x")
+    stylist = Stylist(name="Stylist")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([customer, other, stylist, service])
+    db_session.commit()
+    return db_session, customer, other, stylist, service
+
+def hold_for(user_id, stylist_id, start=START, minutes=30, expires_in=timedelta(minutes=10)):
+    return holds.SlotHold(
+        f"hold-{user_id}-{start.isoformat()}",
+        user_id,
+        stylist_id,
+        start,
+        start + timedelta(minutes=minutes),
+        datetime.utcnow() + expires_in
+    )
+
+def test_overlapping_hold_is_refused(store):
+    assert store.add(hold_for(1, 1))
+    assert not store.add(hold_for(2, 1, START + timedelta(minutes=15)))
+    assert store.add(hold_for(2, 1, START + timedelta(minutes=30)))
+    assert store.add(hold_for(2, 2))
+
+def test_expired_hold_is_dropped_on_read(store):
+    expired = hold_for(1, 1, expires_in=timedelta(seconds=-1))
+    assert store.add(expired)
+    assert store.get(expired.id) is None
+    assert store.active([1], START, START + timedelta(hours=1)) == []
+    assert expired.id not in store._holds
+    assert store.add(hold_for(2, 1))
+
+def test_booking_a_slot_held_by_someone_else_conflicts(salon, store):
+    db, customer, other, stylist, service = salon
+    store.add(hold_for(other.id, stylist.id))
+    with pytest.raises(HTTPException) as error:
+        booking_services.create_booking(db, customer.id, stylist.id, service.id, START)
+    assert error.value.status_code == 409
+    assert db.query(Booking).count() == 0
+
+def test_booking_consumes_own_hold(salon, store):
+    db, customer, other, stylist, service = salon
+    hold = hold_for(customer.id, stylist.id)
+    store.add(hold)
+    booking = booking_services.create_booking(db, customer.id, stylist.id, service.id, START, hold_id=hold.id)
+    assert booking.end_time == START + timedelta(minutes=30)
+    assert store.get(hold.id) is None
+
+def test_booking_with_someone_elses_hold_id_conflicts(salon, store):
+    db, customer, other, stylist, service = salon
+    hold = hold_for(other.id, stylist.id)
+    store.add(hold)
+    with pytest.raises(HTTPException) as error:
+        booking_services.create_booking(db, customer.id, stylist.id, service.id, START, hold_id=hold.id)
+    assert error.value.status_code == 409
+    assert store.get(hold.id) is not None
+
+@pytest.mark.parametrize("start", [START - timedelta(minutes=15), START + timedelta(minutes=15), START + timedelta(hours=2)])
+def test_own_hold_must_cover_the_booked_time(salon, store, start):
+    db, customer, other, stylist, service = salon
+    hold = hold_for(customer.id, stylist.id)
+    store.add(hold)
+    with pytest.raises(HTTPException) as error:
+        booking_services.create_booking(db, customer.id, stylist.id, service.id, start, hold_id=hold.id)
+    assert (error.value.status_code, error.value.detail) == (409, "Slot hold does not match this booking")
+    assert store.get(hold.id) is not None
+
+def test_booking_after_the_hold_expires_succeeds(salon, store):
+    db, customer, other, stylist, service = salon
+    store.add(hold_for(other.id, stylist.id, expires_in=timedelta(seconds=-1)))
+    booking_services.create_booking(db, customer.id, stylist.id, service.id, START)
+    assert db.query(Booking).count() == 1
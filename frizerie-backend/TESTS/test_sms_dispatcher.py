@@ -0,0 +1,194 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from external_services import sms_dispatcher
+from external_services.sms_dispatcher import SMSDispatcher, SMSJob, TokenBucket, summarize
+
+URL = "https://api.twilio.test/2010-04-01/Accounts/ACtest/Messages.json"
+
+class FakeClock:
+    """Stands in for the module's ``time``; only sleeping moves it forward."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        sleeps.append(round(delay, 6))
+        clock.now += delay
+        await real_sleep(0)
+
+    monkeypatch.setattr(sms_dispatcher, "time", clock)
+    monkeypatch.setattr(sms_dispatcher.asyncio, "sleep", sleep)
+    clock.sleeps = sleeps
+    return clock
+
+def twilio(responses, clock=None, latency=0.0):
+    """A MockTransport answering with the given (status, headers, body) in turn, recording each request."""
+    requests = []
+    responses = list(responses)
+
+    def handler(request):
+        requests.append(request)
+        if clock is not None:
+            clock.now += latency
+        status_code, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        return httpx.Response(status_code, headers=headers, json=body)
+
+    transport = httpx.MockTransport(handler)
+    transport.requests = requests
+    return transport
+
+def created(sid="SM1"):
+    return (201, {}, {"sid": sid, "status": "queued"})
+
+def throttled(retry_after=None):
+    return (429, {"Retry-After": retry_after} if retry_after else {}, {"code": 20429, "message": "Too Many Requests"})
+
+def dispatcher(transport, **options):
+    options.setdefault("rate_per_second", 1000.0)
+    options.setdefault("burst", 100.0)
+    return SMSDispatcher(
+        "ACtest", "secret", "+40310000000", base_url="https://api.twilio.test/", transport=transport, **options
+    )
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3.0)
+    for _ in range(5):
+        await bucket.acquire()
+    # Three at once, then one every half second
+    assert clock.sleeps == [0.5, 0.5] and clock.now == 1.0
+
+    # Idle time refills up to the capacity, never beyond
+    clock.now += 10
+    clock.sleeps.clear()
+    for _ in range(4):
+        await bucket.acquire()
+    assert clock.sleeps == [0.5]
+
+@pytest.mark.asyncio
+async def test_concurrent_acquisitions_are_spaced_by_the_rate(clock):
+    bucket = TokenBucket(rate=4.0, capacity=1.0)
+    acquired = []
+
+    async def take(index):
+        await bucket.acquire()
+        acquired.append((index, clock.now))
+
+    await asyncio.gather(*(take(index) for index in range(4)))
+    assert acquired == [(0, 0.0), (1, 0.25), (2, 0.5), (3, 0.75)]
+
+@pytest.mark.asyncio
+async def test_a_message_is_posted_as_a_form_with_basic_auth(clock):
+    transport = twilio([created("SM42")])
+    sms = dispatcher(transport)
+    try:
+        result = await sms.send("+40700000001", "See you at 10:00")
+    finally:
+        await sms.close()
+
+    request = transport.requests[0]
+    assert str(request.url) == URL and request.method == "POST"
+    assert request.headers["Authorization"].startswith("Basic ")
+    assert parse_qs(request.content.decode()) == {
+        "To": ["+40700000001"], "From": ["+40310000000"], "Body": ["See you at 10:00"]
+    }
+    assert (result.sent, result.sid, result.status_code, result.attempts) == (True, "SM42", 201, 1)
+
+@pytest.mark.asyncio
+async def test_429_waits_for_retry_after_and_records_latency(clock):
+    transport = twilio([throttled("3"), throttled("2"), created()], clock, latency=0.2)
+    sms = dispatcher(transport, backoff_max_seconds=30.0)
+    try:
+        result = await sms.send("+40700000001", "Hello")
+    finally:
+        await sms.close()
+
+    assert clock.sleeps == [3.0, 2.0]
+    assert (result.sent, result.attempts, result.throttled) == (True, 3, 2)
+    # Three requests of 200 ms plus five seconds waiting, and the last request alone
+    assert result.latency_ms == pytest.approx(5600)
+    assert result.request_ms == pytest.approx(200)
+
+@pytest.mark.asyncio
+async def test_429_without_retry_after_backs_off_exponentially_up_to_the_cap(clock, monkeypatch):
+    monkeypatch.setattr(sms_dispatcher.random, "uniform", lambda low, high: high)
+    transport = twilio([throttled(), throttled("soon"), throttled(), throttled("120")])
+    sms = dispatcher(transport, max_retries=3, backoff_base_seconds=1.0, backoff_max_seconds=3.0)
+    try:
+        result = await sms.send("+40700000001", "Hello")
+    finally:
+        await sms.close()
+
+    # An unreadable Retry-After falls back to the backoff; the last 429 is not retried
+    assert clock.sleeps == [1.0, 2.0, 3.0]
+    assert (result.sent, result.attempts, result.throttled, result.status_code) == (False, 4, 3, 429)
+    assert result.error == "Twilio error 20429: Too Many Requests"
+    assert len(transport.requests) == 4
+
+@pytest.mark.asyncio
+async def test_retry_after_is_capped(clock):
+    transport = twilio([throttled("120"), created()])
+    sms = dispatcher(transport, backoff_max_seconds=30.0)
+    try:
+        result = await sms.send("+40700000001", "Hello")
+    finally:
+        await sms.close()
+    assert clock.sleeps == [30.0] and result.sent
+
+@pytest.mark.asyncio
+async def test_other_errors_fail_at_once(clock):
+    transport = twilio([(400, {}, {"code": 21211, "message": "Invalid 'To' Phone Number"})])
+    sms = dispatcher(transport)
+    try:
+        result = await sms.send("+40", "Hello")
+    finally:
+        await sms.close()
+
+    assert (result.sent, result.attempts, result.status_code) == (False, 1, 400)
+    assert result.error == "Twilio error 21211: Invalid 'To' Phone Number"
+    assert clock.sleeps == []
+
+@pytest.mark.asyncio
+async def test_dispatch_throttles_each_sender_number_on_its_own():
+    # Real time: the two numbers' buckets must wait side by side, not one after the other
+    transport = twilio([created()])
+    sms = dispatcher(transport, rate_per_second=20.0, burst=1.0, concurrency=8)
+    jobs = [
+        SMSJob(to=f"+4070000000{index}", body="Hello", from_=f"+4031000000{index % 2}", reference=index)
+        for index in range(8)
+    ]
+    started = time.perf_counter()
+    try:
+        results = await sms.dispatch(jobs)
+    finally:
+        await sms.close()
+    elapsed = time.perf_counter() - started
+
+    # Four messages per number at 20 per second: three waits of 50 ms each
+    assert 0.14 <= elapsed < 0.28
+    assert [result.reference for result in results] == list(range(8))
+    assert all(result.sent for result in results)
+    for sender in (0, 1):
+        latencies = [result.latency_ms for result in results if result.reference % 2 == sender]
+        assert latencies == sorted(latencies) and latencies[-1] >= 140
+
+    report = summarize(results)
+    assert (report["sent"], report["failed"], report["throttled"]) == (8, 0, 0)
+    assert report["latency_ms"]["max"] == round(max(result.latency_ms for result in results), 2)
@@ -0,0 +1,104 @@
+import socket
+from email.mime.text import MIMEText
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+
+from external_services.smtp_pool import SMTPPool
+
+REFUSED = "refused@frizerie.test"
+
+class Handler:
+    def __init__(self):
+        self.received = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def server():
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller
+    controller.stop()
+
+def pool_for(controller, **kwargs):
+    return SMTPPool(controller.hostname, controller.port, start_tls=False, **kwargs)
+
+def message(to):
+    message = MIMEText("Your appointment is tomorrow at 10:00.")
+    message["Subject"] = "Booking Reminder"
+    message["From"] = "noreply@frizerie.test"
+    message["To"] = to
+    return message
+
+@pytest.mark.asyncio
+async def test_refused_recipient_returns_session_to_pool(server):
+    handler, controller = server
+    pool = pool_for(controller, size=1)
+    with pytest.raises(aiosmtplib.SMTPRecipientsRefused):
+        await pool.send(message(REFUSED))
+    assert len(pool._idle) == 1
+
+    await pool.send(message("client@frizerie.test"))
+    assert handler.received == ["client@frizerie.test"]
+    assert pool.connects == 1
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_dropped_session_is_reconnected_and_kept(server):
+    handler, controller = server
+    pool = pool_for(controller, size=1)
+    await pool.send(message("first@frizerie.test"))
+    dropped = pool._idle[0].smtp
+    dropped.close()
+
+    await pool.send(message("second@frizerie.test"))
+    assert handler.received == ["first@frizerie.test", "second@frizerie.test"]
+    assert pool.connects == 2
+    assert len(pool._idle) == 1
+    assert pool._idle[0].smtp is not dropped
+    assert pool._idle[0].smtp.is_connected
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_session_reaching_message_cap_is_replaced(server):
+    handler, controller = server
+    pool = pool_for(controller, size=1, max_messages=2)
+    for index in range(5):
+        await pool.send(message(f"client{index}@frizerie.test"))
+    assert len(handler.received) == 5
+    assert pool.connects == 3
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_batch_reports_refused_messages_and_keeps_session(server):
+    handler, controller = server
+    pool = pool_for(controller, size=1)
+    results = await pool.send_batch([message("a@frizerie.test"), message(REFUSED), message("b@frizerie.test")])
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], aiosmtplib.SMTPRecipientsRefused)
+    assert handler.received == ["a@frizerie.test", "b@frizerie.test"]
+    assert len(pool._idle) == 1
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_unreachable_server_fails_whole_batch():
+    pool = SMTPPool("127.0.0.1", 1, start_tls=False, timeout=2)
+    results = await pool.send_batch([message("a@frizerie.test"), message("b@frizerie.test")])
+    assert all(isinstance(result, (OSError, aiosmtplib.SMTPException)) for result in results)
+    assert pool._idle == []
@@ -0,0 +1,193 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from analytics import utilization
+from booking import schedule
+from booking.models import Booking, BookingStatus, StylistAvailability, StylistTimeOff
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+MONDAY = date(2030, 1, 7)
+
+def at(day, hour, minute=0):
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+
+@pytest.fixture
+def salon(db_session, monkeypatch):
+    """Two stylists working Mondays 09:00-17:00; the shortest active service takes 30 minutes."""
+    monkeypatch.setattr(schedule, "_templates", {})
+    utilization.clear_cache()
+    customer = User(name="Customer", email="customer@example.com", password_hash="x")
+    stylists = [Stylist(name="Ana"), Stylist(name="Ioana")]
+    services = [
+        Service(name="Cut", price=10.0, duration_minutes=30),
+        Service(name="Trim", price=5.0, duration_minutes=10, is_active=False)
+    ]
+    db_session.add_all([customer, *stylists, *services])
+    db_session.flush()
+    db_session.add_all([
+        StylistAvailability(stylist_id=stylist.id, day_of_week=0, start_time="09:00", end_time="17:00")
+        for stylist in stylists
+    ])
+    db_session.commit()
+    yield db_session, customer, stylists, services[0]
+    utilization.clear_cache()
+
+def book(db, customer, stylist, service, start, end, status=BookingStatus.CONFIRMED):
+    db.add(Booking(
+        user_id=customer.id,
+        stylist_id=stylist.id,
+        service_id=service.id,
+        start_time=start,
+        end_time=end,
+        status=status
+    ))
+    db.commit()
+
+def by_stylist(report):
+    return {row["stylist_id"]: row for row in report["stylists"]}
+
+def test_occupancy_marks_working_time_minus_time_off_and_booked_buckets(salon):
+    db, customer, (ana, ioana), service = salon
+    book(db, customer, ana, service, at(MONDAY, 10), at(MONDAY, 10, 30))
+    # Rounded out to whole buckets; the part inside time off is not counted as booked
+    book(db, customer, ioana, service, at(MONDAY, 12, 52), at(MONDAY, 13, 31))
+    db.add(StylistTimeOff(stylist_id=ioana.id, start_date=at(MONDAY, 13), end_date=at(MONDAY, 23), is_approved=True))
+    db.add(StylistTimeOff(stylist_id=ana.id, start_date=at(MONDAY, 9), end_date=at(MONDAY, 17), is_approved=False))
+    db.commit()
+
+    matrix = utilization.build_occupancy(db, [ana.id, ioana.id], MONDAY, MONDAY + timedelta(days=1))
+
+    assert matrix.available.shape == (2, 2, utilization.BUCKETS_PER_DAY)
+    assert matrix.available.sum(axis=2).tolist() == [[96, 0], [48, 0]]
+    assert matrix.booked.sum(axis=2).tolist() == [[6, 0], [2, 0]]
+    assert matrix.booked[0, 0, 10 * 12:10 * 12 + 6].all()
+    assert matrix.booked[1, 0, 12 * 12 + 10:12 * 12 + 12].all()
+    assert not (matrix.booked & ~matrix.available).any()
+
+def test_one_stylist_day_by_hand(salon):
+    db, customer, (ana, ioana), service = salon
+    book(db, customer, ana, service, at(MONDAY, 10), at(MONDAY, 10, 30))
+    book(db, customer, ana, service, at(MONDAY, 10, 45), at(MONDAY, 11, 45))
+    book(db, customer, ana, service, at(MONDAY, 15), at(MONDAY, 16), BookingStatus.CANCELLED)
+
+    used = by_stylist(utilization.get_utilization(db, MONDAY, MONDAY, [ana.id]))[ana.id]
+    gaps = utilization.get_idle_gaps(db, MONDAY, MONDAY, [ana.id])
+
+    assert (used["available_minutes"], used["booked_minutes"], used["utilization"]) == (480, 90, 0.1875)
+    hour_10 = next(row for row in used["hours"] if row["hour"] == 10)
+    assert (hour_10["available_minutes"], hour_10["booked_minutes"]) == (60, 45)
+    assert len(used["hours"]) == 8
+    # The time before the first and after the last appointment is idle but not a gap
+    assert gaps["short_gap_threshold_minutes"] == 30
+    assert by_stylist(gaps)[ana.id] == {
+        "stylist_id": ana.id,
+        "idle_minutes": 390,
+        "gap_count": 1,
+        "gap_minutes": 15,
+        "average_gap_minutes": 15.0,
+        "short_gap_count": 1,
+        "short_gap_minutes": 15
+    }
+
+def test_gaps_stay_inside_their_day_and_long_ones_are_not_short(salon):
+    db, customer, (ana, ioana), service = salon
+    next_monday = MONDAY + timedelta(weeks=1)
+    # Monday ends and the next Monday starts with a booking: no gap across the week between them
+    book(db, customer, ana, service, at(MONDAY, 16), at(MONDAY, 17))
+    book(db, customer, ana, service, at(next_monday, 9), at(next_monday, 10))
+    book(db, customer, ana, service, at(next_monday, 11), at(next_monday, 12))
+    book(db, customer, ioana, service, at(MONDAY, 9), at(MONDAY, 9, 30))
+    book(db, customer, ioana, service, at(MONDAY, 9, 50), at(MONDAY, 10, 30))
+    book(db, customer, ioana, service, at(MONDAY, 11), at(MONDAY, 11, 30))
+
+    gaps = by_stylist(utilization.get_idle_gaps(db, MONDAY, next_monday))
+
+    assert (gaps[ana.id]["gap_count"], gaps[ana.id]["gap_minutes"], gaps[ana.id]["short_gap_count"]) == (1, 60, 0)
+    assert gaps[ana.id]["idle_minutes"] == 2 * 480 - 180
+    assert (gaps[ioana.id]["gap_count"], gaps[ioana.id]["gap_minutes"]) == (2, 50)
+    assert (gaps[ioana.id]["short_gap_count"], gaps[ioana.id]["short_gap_minutes"]) == (1, 20)
+    assert gaps[ioana.id]["average_gap_minutes"] == 25.0
+
+def test_utilization_over_several_weeks_starting_midweek(salon):
+    db, customer, (ana, ioana), service = salon
+    first, last = MONDAY + timedelta(days=2), MONDAY + timedelta(days=15)
+    second_monday, third_monday = MONDAY + timedelta(weeks=1), MONDAY + timedelta(weeks=2)
+    # Outside the range on either side
+    book(db, customer, ana, service, at(MONDAY, 10), at(MONDAY, 11))
+    book(db, customer, ana, service, at(MONDAY + timedelta(weeks=3), 10), at(MONDAY + timedelta(weeks=3), 11))
+    book(db, customer, ana, service, at(second_monday, 10), at(second_monday, 11))
+    book(db, customer, ana, service, at(third_monday, 10), at(third_monday, 10, 30))
+    db.add(StylistTimeOff(
+        stylist_id=ana.id, start_date=at(second_monday, 13), end_date=at(second_monday + timedelta(days=1), 0),
+        is_approved=True
+    ))
+    db.commit()
+
+    matrix = utilization.build_occupancy(db, [ana.id], first, last)
+    available, booked = matrix.weekly_minutes()
+    report = by_stylist(utilization.get_utilization(db, first, last, [ana.id]))[ana.id]
+
+    # Wednesday to the Tuesday two weeks later touches three calendar weeks
+    assert available.shape == (1, 3, 7, 24)
+    assert available[0, :, 0, 10].tolist() == [0, 60, 60]
+    assert booked[0, :, 0, 10].tolist() == [0, 60, 30]
+    assert (report["available_minutes"], report["booked_minutes"]) == (2 * 480 - 240, 90)
+    hours = {row["hour"]: row for row in report["hours"]}
+    assert (hours[10]["available_minutes"], hours[10]["booked_minutes"], hours[10]["utilization"]) == (120, 90, 0.75)
+    assert (hours[14]["available_minutes"], hours[14]["utilization"]) == (60, 0.0)
+
+def test_capacity_forecast_smooths_past_weeks_over_future_hours(salon, monkeypatch):
+    db, customer, (ana, ioana), service = salon
+    today = MONDAY + timedelta(weeks=2)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return at(today, 8)
+
+    monkeypatch.setattr(utilization, "datetime", FrozenDatetime)
+    # 10:00 fully booked two weeks ago and free last week; 11:00 never booked before
+    book(db, customer, ana, service, at(MONDAY, 10), at(MONDAY, 11))
+    book(db, customer, ana, service, at(today, 11), at(today, 11, 30))
+    db.add(StylistTimeOff(stylist_id=ana.id, start_date=at(today, 15), end_date=at(today, 17), is_approved=True))
+    db.commit()
+
+    forecast = utilization.get_capacity_forecast(db, weeks=2, history_weeks=2, stylist_ids=[ana.id])
+    ana_forecast = by_stylist(forecast)[ana.id]
+    hours = {row["hour"]: row for row in ana_forecast["hours"]}
+
+    assert (forecast["history_start"], forecast["history_end"]) == (MONDAY, today - timedelta(days=1))
+    assert (forecast["forecast_start"], forecast["forecast_end"]) == (today, today + timedelta(days=13))
+    # Two Mondays ahead, the first with two hours off
+    assert ana_forecast["available_minutes"] == 2 * 480 - 120
+    assert hours[15]["available_minutes"] == 60
+    # Weights 0.5 and 1 for the older and newer week: (1 * 0.5 + 0 * 1) / 1.5
+    assert hours[10]["forecast_utilization"] == 0.3333
+    assert hours[10]["expected_booked_minutes"] == 40
+    # Never below what is already booked
+    assert (hours[11]["forecast_utilization"], hours[11]["expected_booked_minutes"]) == (0.0, 30)
+    assert ana_forecast["booked_minutes"] == 30
+    assert ana_forecast["expected_booked_minutes"] == 70
+
+def test_reports_are_cached_until_cleared(salon):
+    db, customer, (ana, ioana), service = salon
+    first = utilization.get_utilization(db, MONDAY, MONDAY, [ana.id])
+    book(db, customer, ana, service, at(MONDAY, 10), at(MONDAY, 11))
+
+    assert utilization.get_utilization(db, MONDAY, MONDAY, [ana.id]) is first
+    utilization.clear_cache()
+    assert by_stylist(utilization.get_utilization(db, MONDAY, MONDAY, [ana.id]))[ana.id]["booked_minutes"] == 60
+
+@pytest.mark.parametrize("start, end", [
+    (MONDAY, MONDAY - timedelta(days=1)),
+    (MONDAY, MONDAY + timedelta(days=366))
+])
+def test_invalid_ranges_are_rejected(salon, start, end):
+    db = salon[0]
+    with pytest.raises(HTTPException) as error:
+        utilization.get_utilization(db, start, end)
+    assert error.value.status_code == 400
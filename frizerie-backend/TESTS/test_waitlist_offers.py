@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from booking import holds, schedule, waitlist_index, waitlist_services
+from booking.models import (
+    Booking, BookingStatus, StylistAvailability, WaitlistEntry, WaitlistNotification, WaitlistWatermark
+)
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+SLOT_START = (datetime.utcnow() + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+@pytest.fixture
+def offers(monkeypatch):
+    sent = []
+    monkeypatch.setattr(waitlist_index, "_index", None)
+    monkeypatch.setattr(schedule, "_templates", {})
+    monkeypatch.setattr(holds, "_store", holds.MemoryHoldStore())
+    monkeypatch.setattr(
+        waitlist_services.notification_services,
+        "create_notification",
+        lambda db, user_id, type, **kwargs: sent.append((user_id, type))
+    )
+    return sent
+
+@pytest.fixture
+def salon(db_session):
+    users = [User(name=f"User {i}", email=f"user{i}@example.com", password_hash="x") for i in range(3)]
+    stylist = Stylist(name="Stylist")
+    service = Service(name="Cut", price=10.0, duration_minutes=30)
+    db_session.add_all([*users, stylist, service])
+    db_session.flush()
+    db_session.add_all([
+        StylistAvailability(stylist_id=stylist.id, day_of_week=day, start_time="08:00", end_time="20:00")
+        for day in range(7)
+    ])
+    freed = Booking(
+        user_id=users[0].id,
+        stylist_id=stylist.id,
+        service_id=service.id,
+        start_time=SLOT_START,
+        end_time=SLOT_START + timedelta(minutes=30),
+        status=BookingStatus.CANCELLED,
+        updated_at=datetime.utcnow() - timedelta(minutes=5)
+    )
+    db_session.add(freed)
+    db_session.commit()
+    return db_session, users, stylist, service, freed
+
+def wait(db, user, service, freed, priority):
+    entry = WaitlistEntry(
+        booking_id=freed.id,
+        user_id=user.id,
+        service_id=service.id,
+        preferred_date_range={
+            "start": SLOT_START.date().isoformat(),
+            "end": (SLOT_START + timedelta(days=1)).date().isoformat()
+        },
+        status=BookingStatus.WAITLISTED,
+        priority=priority,
+        expires_at=datetime.utcnow() + timedelta(days=7)
+    )
+    db.add(entry)
+    db.commit()
+    return entry
+
+def offer(db, entry, sent_at):
+    entry.notification_sent = True
+    db.add(WaitlistNotification(
+        waitlist_entry_id=entry.id, notification_type="SLOT_AVAILABLE", status="SENT", sent_at=sent_at
+    ))
+    db.commit()
+
+def test_freed_slot_is_offered_once_across_runs(salon, offers):
+    db, users, stylist, service, freed = salon
+    best = wait(db, users[1], service, freed, priority=5)
+    wait(db, users[2], service, freed, priority=1)
+
+    waitlist_services.process_waitlist_entries(db)
+    assert offers == [(users[1].id, "WAITLIST_SLOT_AVAILABLE")]
+    db.refresh(best)
+    assert best.notification_sent
+
+    watermark = db.query(WaitlistWatermark).one()
+    assert watermark.processed_until > freed.updated_at
+
+    waitlist_services.process_waitlist_entries(db)
+    assert len(offers) == 1
+    assert db.query(WaitlistNotification).count() == 1
+
+def test_entry_with_outstanding_offer_is_passed_over(salon, offers):
+    db, users, stylist, service, freed = salon
+    best = wait(db, users[1], service, freed, priority=5)
+    wait(db, users[2], service, freed, priority=1)
+    offer(db, best, datetime.utcnow() - timedelta(minutes=10))
+
+    waitlist_services.process_waitlist_entries(db)
+    assert offers == [(users[2].id, "WAITLIST_SLOT_AVAILABLE")]
+
+def test_lapsed_offer_does_not_block_a_new_one(salon, offers):
+    db, users, stylist, service, freed = salon
+    best = wait(db, users[1], service, freed, priority=5)
+    offer(db, best, datetime.utcnow() - timedelta(days=1))
+
+    waitlist_services.process_waitlist_entries(db)
+    assert offers == [(users[1].id, "WAITLIST_SLOT_AVAILABLE")]
+
+def test_cancellations_before_the_watermark_are_skipped(salon, offers):
+    db, users, stylist, service, freed = salon
+    wait(db, users[1], service, freed, priority=5)
+    db.add(WaitlistWatermark(name=waitlist_services.PROCESS_WATERMARK, processed_until=datetime.utcnow()))
+    db.commit()
+
+    waitlist_services.process_waitlist_entries(db)
+    assert offers == []
+
+def test_index_picks_up_entries_written_by_another_worker(salon, offers):
+    db, users, stylist, service, freed = salon
+    window = (SLOT_START, SLOT_START + timedelta(minutes=30))
+    assert waitlist_index.get_index(db).match(stylist.id, *window) == []
+
+    # Written without index_entry, as another worker's write would be
+    entry = wait(db, users[1], service, freed, priority=5)
+    assert [indexed.entry_id for indexed, _ in waitlist_index.get_index(db).match(stylist.id, *window)] == [entry.id]
+
+    entry.status = BookingStatus.CANCELLED
+    db.commit()
+    assert waitlist_index.get_index(db).match(stylist.id, *window) == []
+
+def test_one_write_is_synced_without_reloading_the_index(salon, offers, monkeypatch):
+    db, users, stylist, service, freed = salon
+    for user in users:
+        wait(db, user, service, freed, priority=1)
+    # Already applied by the load; with no overlap only later writes are read
+    monkeypatch.setattr(waitlist_index.get_settings(), "WAITLIST_INDEX_SYNC_OVERLAP_SECONDS", 0)
+    db.query(WaitlistEntry).update({"updated_at": datetime.utcnow() - timedelta(hours=1)})
+    db.commit()
+    index = waitlist_index.get_index(db)
+    assert len(index) == 3
+
+    calls = {"load": 0, "applied": []}
+    sync = waitlist_index.WaitlistIndex.sync
+
+    def counting_sync(self, db):
+        calls["applied"].append(sync(self, db))
+        return calls["applied"][-1]
+
+    monkeypatch.setattr(waitlist_index.WaitlistIndex, "load", lambda self, db: calls.update(load=calls["load"] + 1))
+    monkeypatch.setattr(waitlist_index.WaitlistIndex, "sync", counting_sync)
+
+    wait(db, users[0], service, freed, priority=9)
+    assert len(waitlist_index.get_index(db)) == 4
+    assert calls == {"load": 0, "applied": [1]}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from datetime import datetime
@@ -6,6 +6,7 @@ from datetime import datetime
 from config.database import get_db
 from auth.dependencies import get_current_admin
 from users import services as user_services
+from utils import pagination
 from users.models import User, Role, Permission, AuditLog # Import User model for dependency type hint
 from validation import UserCreate, UserUpdate, UserResponse # Import user schemas
 
@@ -521,6 +522,7 @@ async def update_user_roles(
 # Audit Log Routes
 @router.get("/audit-logs", response_model=List[AuditLogResponse])
 async def get_audit_logs(
+    response: Response,
     user_id: Optional[int] = None,
     resource_type: Optional[str] = None,
     resource_id: Optional[str] = None,
@@ -528,11 +530,12 @@ async def get_audit_logs(
     end_date: Optional[datetime] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     admin_user: User = Depends(get_current_admin)
 ):
     """Get audit logs with optional filtering."""
-    return user_services.get_audit_logs(
+    audit_logs = user_services.get_audit_logs(
         db,
         user_id=user_id,
         resource_type=resource_type,
@@ -540,5 +543,8 @@ async def get_audit_logs(
         start_date=start_date,
         end_date=end_date,
         skip=skip,
-        limit=limit
-    ) 
\ No newline at end of file
+        limit=limit,
+        cursor=cursor
+    )
+    pagination.set_page_headers(response, audit_logs, limit, "created_at")
+    return audit_logs 
\ No newline at end of file
@@ -1,7 +1,7 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from config.database import get_db
 from auth.dependencies import get_current_admin
@@ -27,9 +27,13 @@ from analytics.schemas import (
     Dashboard as DashboardSchema,
     DashboardWidget as DashboardWidgetSchema,
     VisualizationData,
-    WidgetData
+    WidgetData,
+    UtilizationReport,
+    IdleGapReport,
+    CapacityForecast
 )
 from analytics import services as analytics_services
+from analytics import utilization
 from analytics.services import (
     get_analytics_summary,
     get_revenue_analytics,
@@ -381,6 +385,36 @@ async def get_customer_analytics(
     """Get customer analytics metrics."""
     return analytics_services.get_customer_analytics(db, date_range)
 
+@router.get("/utilization", response_model=UtilizationReport)
+async def get_stylist_utilization(
+    start_date: date,
+    end_date: date,
+    stylist_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Booked / available minutes per stylist and hour of week."""
+    return utilization.get_utilization(db, start_date, end_date, stylist_ids)
+
+@router.get("/utilization/idle-gaps", response_model=IdleGapReport)
+async def get_stylist_idle_gaps(
+    start_date: date,
+    end_date: date,
+    stylist_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Unbooked working time between appointments per stylist."""
+    return utilization.get_idle_gaps(db, start_date, end_date, stylist_ids)
+
+@router.get("/utilization/forecast", response_model=CapacityForecast)
+async def get_capacity_forecast(
+    weeks: int = Query(4, ge=1, le=12),
+    history_weeks: int = Query(8, ge=1, le=52),
+    stylist_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Expected utilization per stylist and hour of week for the coming weeks."""
+    return utilization.get_capacity_forecast(db, weeks, history_weeks, stylist_ids)
+
 @router.get("/daily-analytics/{date}")
 async def get_daily_analytics(
     date: datetime,
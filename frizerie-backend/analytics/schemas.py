@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel, Field
 from .models import EventType
@@ -193,4 +193,62 @@ class WidgetData(BaseModel):
     widget_id: str
     data: VisualizationData
     last_updated: datetime
-    next_update: datetime 
\ No newline at end of file
+    next_update: datetime 
+
+class HourOfWeekUtilization(BaseModel):
+    day_of_week: int  # 0 = Monday
+    hour: int
+    available_minutes: int
+    booked_minutes: int
+    utilization: Optional[float] = None
+
+class StylistUtilization(BaseModel):
+    stylist_id: int
+    available_minutes: int
+    booked_minutes: int
+    utilization: Optional[float] = None
+    hours: List[HourOfWeekUtilization]
+
+class UtilizationReport(BaseModel):
+    start_date: date
+    end_date: date
+    resolution_minutes: int
+    stylists: List[StylistUtilization]
+
+class StylistIdleGaps(BaseModel):
+    stylist_id: int
+    idle_minutes: int
+    gap_count: int
+    gap_minutes: int
+    average_gap_minutes: float
+    short_gap_count: int
+    short_gap_minutes: int
+
+class IdleGapReport(BaseModel):
+    start_date: date
+    end_date: date
+    short_gap_threshold_minutes: int
+    stylists: List[StylistIdleGaps]
+
+class HourOfWeekForecast(BaseModel):
+    day_of_week: int  # 0 = Monday
+    hour: int
+    available_minutes: int
+    booked_minutes: int
+    forecast_utilization: Optional[float] = None
+    expected_booked_minutes: int
+
+class StylistCapacityForecast(BaseModel):
+    stylist_id: int
+    available_minutes: int
+    booked_minutes: int
+    expected_booked_minutes: int
+    forecast_utilization: Optional[float] = None
+    hours: List[HourOfWeekForecast]
+
+class CapacityForecast(BaseModel):
+    history_start: date
+    history_end: date
+    forecast_start: date
+    forecast_end: date
+    stylists: List[StylistCapacityForecast]
@@ -0,0 +1,390 @@
+"""
+Vectorized stylist utilization, idle gaps and capacity forecasting.
+
+Bookings and working hours over a date range are rasterized once into an
+occupancy matrix of shape (stylists, days, 5-minute buckets): working hours
+come from the compiled weekly templates minus approved time off, booked
+buckets from one bookings query read into pandas and marked with a
+difference array. Every report is then a handful of array reductions:
+
+* utilization per stylist and hour of week (booked / available minutes),
+* idle gaps, the unbooked working time stranded between two appointments,
+* a capacity forecast from an exponentially weighted average of past weekly
+  utilization applied to the coming weeks' working hours.
+
+Reports are cached per (report, date range, stylists) for
+``UTILIZATION_CACHE_TTL_SECONDS``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from booking.models import Booking, BookingStatus, StylistTimeOff
+from booking.occupancy import BUCKETS_PER_DAY, RESOLUTION_MINUTES
+from booking.schedule import at_minute, get_templates
+from config.settings import get_settings
+from services.models import Service
+from stylists.models import Stylist
+
+BUCKETS_PER_HOUR = 60 // RESOLUTION_MINUTES
+
+# Bookings that occupy their stylist's time
+OCCUPYING_STATUSES = [
+    BookingStatus.PENDING,
+    BookingStatus.CONFIRMED,
+    BookingStatus.COMPLETED,
+    BookingStatus.NO_SHOW
+]
+
+# Weight of the most recent week in the forecast's moving average
+FORECAST_ALPHA = 0.5
+
+# Reports cached at most
+CACHE_MAX_ENTRIES = 128
+
+class OccupancyMatrix:
+    """Available and booked 5-minute buckets per stylist and day.
+
+    ``available`` and ``booked`` are boolean arrays of shape
+    (stylists, days, BUCKETS_PER_DAY); booked buckets are always available.
+    """
+
+    def __init__(self, stylist_ids: List[int], first_day: date, available: np.ndarray, booked: np.ndarray):
+        self.stylist_ids = stylist_ids
+        self.first_day = first_day
+        self.available = available
+        self.booked = booked
+
+    @property
+    def days(self) -> int:
+        return self.available.shape[1]
+
+    @property
+    def weekdays(self) -> np.ndarray:
+        return (np.arange(self.days) + self.first_day.weekday()) % 7
+
+    def weekly_minutes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Available and booked minutes as (stylists, weeks, weekday, hour) arrays.
+
+        Weeks are counted from the first day, so each day lands on its own
+        (week, weekday) cell.
+        """
+        stylists, days = len(self.stylist_ids), self.days
+        weeks = -(-(days + self.first_day.weekday()) // 7)
+        week_index = (np.arange(days) + self.first_day.weekday()) // 7
+        shape = (stylists, weeks, 7, 24)
+        result = []
+        for matrix in (self.available, self.booked):
+            hourly = matrix.reshape(stylists, days, 24, BUCKETS_PER_HOUR).sum(axis=3) * RESOLUTION_MINUTES
+            weekly = np.zeros(shape, dtype=np.int64)
+            weekly[:, week_index, self.weekdays, :] = hourly
+            result.append(weekly)
+        return result[0], result[1]
+
+def _weekly_masks(db: Session, stylist_ids: List[int]) -> np.ndarray:
+    """Working-hour buckets as a (stylists, weekday, BUCKETS_PER_DAY) mask."""
+    masks = np.zeros((len(stylist_ids), 7, BUCKETS_PER_DAY), dtype=bool)
+    templates = get_templates(db, stylist_ids)
+    # Any Monday works as a reference week for the minute offsets
+    reference_monday = date(2024, 1, 1)
+    for row, stylist_id in enumerate(stylist_ids):
+        template = templates.get(stylist_id)
+        if not template:
+            continue
+        for weekday in range(7):
+            day = reference_monday + timedelta(days=weekday)
+            day_start = at_minute(day, 0)
+            for start, end in template.working_intervals(day):
+                first = int((start - day_start).total_seconds() // 60) // RESOLUTION_MINUTES
+                last = -(-int((end - day_start).total_seconds() // 60) // RESOLUTION_MINUTES)
+                masks[row, weekday, first:min(last, BUCKETS_PER_DAY)] = True
+    return masks
+
+def _span_mask(
+    frame: pd.DataFrame,
+    row_of: Dict[int, int],
+    stylists: int,
+    range_start: datetime,
+    buckets: int
+) -> np.ndarray:
+    """(stylists, buckets) mask of the buckets touched by the frame's [start, end) spans."""
+    diff = np.zeros((stylists, buckets + 1), dtype=np.int32)
+    if not frame.empty:
+        step = pd.Timedelta(minutes=RESOLUTION_MINUTES)
+        rows = frame["stylist_id"].map(row_of).to_numpy()
+        starts = np.floor((pd.to_datetime(frame["start"]) - range_start) / step).to_numpy()
+        ends = np.ceil((pd.to_datetime(frame["end"]) - range_start) / step).to_numpy()
+        starts = np.clip(starts, 0, buckets).astype(np.int64)
+        ends = np.clip(ends, 0, buckets).astype(np.int64)
+        np.add.at(diff, (rows, starts), 1)
+        np.add.at(diff, (rows, ends), -1)
+    return np.cumsum(diff, axis=1)[:, :buckets] > 0
+
+def build_occupancy(db: Session, stylist_ids: List[int], first_day: date, last_day: date) -> OccupancyMatrix:
+    """Rasterize working hours, time off and bookings for the stylists and days (inclusive)."""
+    days = (last_day - first_day).days + 1
+    stylists = len(stylist_ids)
+    buckets = days * BUCKETS_PER_DAY
+    range_start = at_minute(first_day, 0)
+    range_end = at_minute(last_day, 0) + timedelta(days=1)
+    row_of = {stylist_id: row for row, stylist_id in enumerate(stylist_ids)}
+
+    weekdays = (np.arange(days) + first_day.weekday()) % 7
+    available = _weekly_masks(db, stylist_ids)[:, weekdays, :].reshape(stylists, buckets)
+
+    time_off = pd.DataFrame(
+        db.query(StylistTimeOff.stylist_id, StylistTimeOff.start_date, StylistTimeOff.end_date).filter(
+            and_(
+                StylistTimeOff.stylist_id.in_(stylist_ids),
+                StylistTimeOff.is_approved == True,
+                StylistTimeOff.start_date < range_end,
+                StylistTimeOff.end_date > range_start
+            )
+        ).all(),
+        columns=["stylist_id", "start", "end"]
+    )
+    available &= ~_span_mask(time_off, row_of, stylists, range_start, buckets)
+
+    bookings = pd.DataFrame(
+        db.query(Booking.stylist_id, Booking.start_time, Booking.end_time).filter(
+            and_(
+                Booking.stylist_id.in_(stylist_ids),
+                Booking.status.in_(OCCUPYING_STATUSES),
+                Booking.start_time < range_end,
+                Booking.end_time > range_start
+            )
+        ).all(),
+        columns=["stylist_id", "start", "end"]
+    )
+    booked = _span_mask(bookings, row_of, stylists, range_start, buckets) & available
+
+    return OccupancyMatrix(
+        stylist_ids,
+        first_day,
+        available.reshape(stylists, days, BUCKETS_PER_DAY),
+        booked.reshape(stylists, days, BUCKETS_PER_DAY)
+    )
+
+# Report cache
+
+_cache: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cached(key: Tuple, build: Callable[[], Any]) -> Any:
+    """Serve a report from the cache, building and storing it on a miss."""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > now:
+            _cache.move_to_end(key)
+            return entry[1]
+    value = build()
+    with _cache_lock:
+        _cache[key] = (now + get_settings().UTILIZATION_CACHE_TTL_SECONDS, value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+# Reports
+
+def _resolve_stylists(db: Session, stylist_ids: Optional[Sequence[int]]) -> List[int]:
+    query = db.query(Stylist.id)
+    if stylist_ids:
+        query = query.filter(Stylist.id.in_(stylist_ids))
+    else:
+        query = query.filter(Stylist.is_active == True)
+    return [stylist_id for (stylist_id,) in query.order_by(Stylist.id).all()]
+
+def _validate_range(start_date: date, end_date: date) -> None:
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    max_days = get_settings().UTILIZATION_MAX_RANGE_DAYS
+    if (end_date - start_date).days + 1 > max_days:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must not exceed {max_days} days"
+        )
+
+def _ratio(booked: float, available: float) -> Optional[float]:
+    return round(float(booked) / float(available), 4) if available else None
+
+def _hours(
+    available: np.ndarray,
+    booked: np.ndarray,
+    utilization: Optional[np.ndarray] = None,
+    expected: Optional[np.ndarray] = None
+) -> List[Dict[str, Any]]:
+    """Hour-of-week rows with working time, from (weekday, hour) arrays."""
+    hours = []
+    for weekday, hour in zip(*np.nonzero(available)):
+        row = {
+            "day_of_week": int(weekday),
+            "hour": int(hour),
+            "available_minutes": int(available[weekday, hour]),
+            "booked_minutes": int(booked[weekday, hour])
+        }
+        if utilization is None:
+            row["utilization"] = _ratio(booked[weekday, hour], available[weekday, hour])
+        else:
+            value = utilization[weekday, hour]
+            row["forecast_utilization"] = None if np.isnan(value) else round(float(value), 4)
+            row["expected_booked_minutes"] = int(round(expected[weekday, hour]))
+        hours.append(row)
+    return hours
+
+def get_utilization(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    stylist_ids: Optional[Sequence[int]] = None
+) -> Dict[str, Any]:
+    """Booked / available minutes per stylist and hour of week over the range."""
+    _validate_range(start_date, end_date)
+    stylist_ids = _resolve_stylists(db, stylist_ids)
+
+    def build() -> Dict[str, Any]:
+        matrix = build_occupancy(db, stylist_ids, start_date, end_date)
+        available, booked = matrix.weekly_minutes()
+        available, booked = available.sum(axis=1), booked.sum(axis=1)
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "resolution_minutes": RESOLUTION_MINUTES,
+            "stylists": [
+                {
+                    "stylist_id": stylist_id,
+                    "available_minutes": int(available[row].sum()),
+                    "booked_minutes": int(booked[row].sum()),
+                    "utilization": _ratio(booked[row].sum(), available[row].sum()),
+                    "hours": _hours(available[row], booked[row])
+                }
+                for row, stylist_id in enumerate(stylist_ids)
+            ]
+        }
+
+    return _cached(("utilization", start_date, end_date, tuple(stylist_ids)), build)
+
+def get_idle_gaps(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    stylist_ids: Optional[Sequence[int]] = None
+) -> Dict[str, Any]:
+    """Unbooked working time stranded between two appointments, per stylist.
+
+    Gaps shorter than the shortest active service cannot be sold at all and
+    are reported separately.
+    """
+    _validate_range(start_date, end_date)
+    stylist_ids = _resolve_stylists(db, stylist_ids)
+    threshold = db.query(func.min(Service.duration_minutes)).filter(Service.is_active == True).scalar() or 0
+
+    def build() -> Dict[str, Any]:
+        matrix = build_occupancy(db, stylist_ids, start_date, end_date)
+        stylists, days = len(stylist_ids), matrix.days
+        # 0 = closed, 1 = idle, 2 = booked; a closed column on each side keeps runs inside their day
+        states = matrix.available.astype(np.int8) + matrix.booked.astype(np.int8)
+        states = np.pad(states.reshape(stylists * days, BUCKETS_PER_DAY), ((0, 0), (1, 1)))
+        flat = states.ravel()
+        edges = np.diff((flat == 1).astype(np.int8))
+        run_starts = np.nonzero(edges == 1)[0] + 1
+        run_ends = np.nonzero(edges == -1)[0] + 1
+        between = (flat[run_starts - 1] == 2) & (flat[run_ends] == 2)
+        lengths = (run_ends - run_starts)[between] * RESOLUTION_MINUTES
+        rows = run_starts[between] // (BUCKETS_PER_DAY + 2) // days
+        short = lengths < threshold
+
+        idle = (matrix.available & ~matrix.booked).sum(axis=(1, 2)) * RESOLUTION_MINUTES
+        gap_count = np.bincount(rows, minlength=stylists)
+        gap_minutes = np.bincount(rows, weights=lengths, minlength=stylists)
+        short_count = np.bincount(rows[short], minlength=stylists)
+        short_minutes = np.bincount(rows[short], weights=lengths[short], minlength=stylists)
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "short_gap_threshold_minutes": int(threshold),
+            "stylists": [
+                {
+                    "stylist_id": stylist_id,
+                    "idle_minutes": int(idle[row]),
+                    "gap_count": int(gap_count[row]),
+                    "gap_minutes": int(gap_minutes[row]),
+                    "average_gap_minutes": round(float(gap_minutes[row]) / int(gap_count[row]), 1) if gap_count[row] else 0.0,
+                    "short_gap_count": int(short_count[row]),
+                    "short_gap_minutes": int(short_minutes[row])
+                }
+                for row, stylist_id in enumerate(stylist_ids)
+            ]
+        }
+
+    return _cached(("idle_gaps", start_date, end_date, tuple(stylist_ids), threshold), build)
+
+def get_capacity_forecast(
+    db: Session,
+    weeks: int = 4,
+    history_weeks: int = 8,
+    stylist_ids: Optional[Sequence[int]] = None
+) -> Dict[str, Any]:
+    """Expected utilization per stylist and hour of week for the coming weeks.
+
+    Each hour's weekly utilization over the history is smoothed with an
+    exponentially weighted average; the result times the coming weeks'
+    working minutes is the expected booked time, never below what is
+    already booked.
+    """
+    today = datetime.utcnow().date()
+    history_start = today - timedelta(weeks=history_weeks)
+    history_end = today - timedelta(days=1)
+    forecast_end = today + timedelta(weeks=weeks) - timedelta(days=1)
+    _validate_range(history_start, history_end)
+    _validate_range(today, forecast_end)
+    stylist_ids = _resolve_stylists(db, stylist_ids)
+
+    def build() -> Dict[str, Any]:
+        past_available, past_booked = build_occupancy(db, stylist_ids, history_start, history_end).weekly_minutes()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weekly = np.where(past_available > 0, past_booked / past_available, np.nan)
+        # Weeks as rows, one column per (stylist, weekday, hour)
+        stylists = len(stylist_ids)
+        series = pd.DataFrame(weekly.transpose(1, 0, 2, 3).reshape(weekly.shape[1], stylists * 7 * 24))
+        smoothed = series.ewm(alpha=FORECAST_ALPHA, ignore_na=True).mean().ffill().iloc[-1]
+        utilization = smoothed.to_numpy().reshape(stylists, 7, 24)
+
+        future_available, future_booked = build_occupancy(db, stylist_ids, today, forecast_end).weekly_minutes()
+        future_available, future_booked = future_available.sum(axis=1), future_booked.sum(axis=1)
+        expected = np.maximum(np.nan_to_num(utilization) * future_available, future_booked)
+        return {
+            "history_start": history_start,
+            "history_end": history_end,
+            "forecast_start": today,
+            "forecast_end": forecast_end,
+            "stylists": [
+                {
+                    "stylist_id": stylist_id,
+                    "available_minutes": int(future_available[row].sum()),
+                    "booked_minutes": int(future_booked[row].sum()),
+                    "expected_booked_minutes": int(round(expected[row].sum())),
+                    "forecast_utilization": _ratio(expected[row].sum(), future_available[row].sum()),
+                    "hours": _hours(future_available[row], future_booked[row], utilization[row], expected[row])
+                }
+                for row, stylist_id in enumerate(stylist_ids)
+            ]
+        }
+
+    return _cached(("forecast", today, weeks, history_weeks, tuple(stylist_ids)), build)
@@ -48,11 +48,7 @@ async def get_current_active_user(
     """
     Get the current active user.
     """
-    if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
-        )
+    # Users have no is_active flag (only is_admin); every authenticated user is active
     return current_user
 
 async def get_current_admin(
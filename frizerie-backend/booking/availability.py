@@ -0,0 +1,482 @@
+"""
+Interval-sweep availability engine.
+
+Loads each stylist's weekly schedule, approved time off and active bookings for
+a whole date range with one query per table, then derives free intervals with a
+sorted sweep instead of probing the database once per candidate slot.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from datetime import datetime, timedelta, date
+from typing import Any, List, Optional, Dict, Tuple, Iterable, Iterator
+from collections import defaultdict
+from bisect import bisect_right
+import heapq
+
+from booking.models import Booking, BookingStatus, StylistTimeOff
+from booking import availability_cache, holds
+from booking.schedule import WeeklyTemplate, at_minute as _at_minute, get_templates
+
+Interval = Tuple[datetime, datetime]
+
+class AvailabilitySnapshot:
+    """Everything needed to answer availability questions for a date range.
+
+    Holds per-stylist weekly schedules, approved time off and active bookings,
+    each loaded with a single query and kept sorted by start time.
+    """
+
+    def __init__(
+        self,
+        range_start: datetime,
+        range_end: datetime,
+        schedules: Dict[int, WeeklyTemplate],
+        time_off: Dict[int, List[Interval]],
+        bookings: Dict[int, List[Booking]]
+    ):
+        self.range_start = range_start
+        self.range_end = range_end
+        self.schedules = schedules
+        self.time_off = time_off
+        self.bookings = bookings
+
+    def busy_intervals(self, stylist_id: int) -> List[Interval]:
+        """Time off and bookings for a stylist, merged into sorted intervals."""
+        intervals = list(self.time_off.get(stylist_id, []))
+        intervals.extend(
+            (booking.start_time, booking.end_time)
+            for booking in self.bookings.get(stylist_id, [])
+        )
+        return merge_intervals(intervals)
+
+def load_snapshot(
+    db: Session,
+    stylist_ids: List[int],
+    range_start: datetime,
+    range_end: datetime,
+    exclude_booking_id: Optional[str] = None
+) -> AvailabilitySnapshot:
+    """Load compiled schedules, time off and bookings for the stylists in one query per table."""
+    schedules: Dict[int, WeeklyTemplate] = {}
+    time_off: Dict[int, List[Interval]] = defaultdict(list)
+    bookings: Dict[int, List[Booking]] = defaultdict(list)
+
+    if not stylist_ids:
+        return AvailabilitySnapshot(range_start, range_end, schedules, time_off, bookings)
+
+    schedules = get_templates(db, stylist_ids)
+
+    time_off_rows = db.query(StylistTimeOff).filter(
+        and_(
+            StylistTimeOff.stylist_id.in_(stylist_ids),
+            StylistTimeOff.is_approved == True,
+            StylistTimeOff.start_date < range_end,
+            StylistTimeOff.end_date > range_start
+        )
+    ).order_by(StylistTimeOff.start_date).all()
+    for row in time_off_rows:
+        time_off[row.stylist_id].append((row.start_date, row.end_date))
+
+    booking_query = db.query(Booking).filter(
+        and_(
+            Booking.stylist_id.in_(stylist_ids),
+            Booking.status != BookingStatus.CANCELLED,
+            Booking.start_time < range_end,
+            Booking.end_time > range_start
+        )
+    )
+    if exclude_booking_id:
+        booking_query = booking_query.filter(Booking.id != exclude_booking_id)
+    for booking in booking_query.order_by(Booking.start_time).all():
+        bookings[booking.stylist_id].append(booking)
+
+    return AvailabilitySnapshot(range_start, range_end, schedules, time_off, bookings)
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals and merge the ones that overlap or touch."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(base: List[Interval], busy: List[Interval]) -> List[Interval]:
+    """Remove sorted, merged busy intervals from sorted base intervals in one sweep."""
+    free: List[Interval] = []
+    i = 0
+    for start, end in base:
+        cursor = start
+        # Skip busy intervals that finished before this window opens
+        while i < len(busy) and busy[i][1] <= cursor:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            busy_start, busy_end = busy[j]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            if cursor >= end:
+                break
+            j += 1
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+def schedule_intervals(
+    snapshot: AvailabilitySnapshot,
+    stylist_id: int,
+    range_start: Optional[datetime] = None,
+    range_end: Optional[datetime] = None
+) -> List[Interval]:
+    """Working intervals for every day in the range, clipped to the range."""
+    range_start = range_start or snapshot.range_start
+    range_end = range_end or snapshot.range_end
+    schedule = snapshot.schedules.get(stylist_id)
+    if not schedule:
+        return []
+
+    intervals: List[Interval] = []
+    day = range_start.date()
+    while day <= range_end.date():
+        for start, end in schedule.working_intervals(day):
+            start = max(start, range_start)
+            end = min(end, range_end)
+            if start < end:
+                intervals.append((start, end))
+        day += timedelta(days=1)
+    return intervals
+
+def compute_free_intervals(
+    snapshot: AvailabilitySnapshot,
+    stylist_id: int,
+    range_start: Optional[datetime] = None,
+    range_end: Optional[datetime] = None
+) -> List[Interval]:
+    """Free intervals for a stylist: working hours minus time off and bookings."""
+    return subtract_intervals(
+        schedule_intervals(snapshot, stylist_id, range_start, range_end),
+        snapshot.busy_intervals(stylist_id)
+    )
+
+def iter_slot_starts(
+    free_intervals: List[Interval],
+    duration: timedelta,
+    step: timedelta,
+    origin: datetime
+) -> Iterator[datetime]:
+    """Yield slot starts on the ``origin + k * step`` grid that fit inside a free interval."""
+    for start, end in free_intervals:
+        offset = start - origin
+        steps = -(-offset // step) if offset > timedelta(0) else 0
+        slot_start = origin + steps * step
+        while slot_start + duration <= end:
+            yield slot_start
+            slot_start += step
+
+def validate_intervals(
+    snapshot: AvailabilitySnapshot,
+    stylist_id: int,
+    intervals: List[Interval]
+) -> List[Optional[Dict[str, Any]]]:
+    """Check many candidate bookings against a loaded snapshot in one sweep.
+
+    Returns one entry per interval, in the same order: ``None`` when the slot
+    is bookable, otherwise a conflict dict shaped like the ones produced by
+    ``optimized_services.validate_booking_time``.
+    """
+    schedule = snapshot.schedules.get(stylist_id)
+    time_off = snapshot.time_off.get(stylist_id, [])
+    bookings = snapshot.bookings.get(stylist_id, [])
+    results: List[Optional[Dict[str, Any]]] = [None] * len(intervals)
+
+    next_time_off = next_booking = 0
+    active_time_off: List[Interval] = []
+    active_bookings: List[Booking] = []
+    for index in sorted(range(len(intervals)), key=lambda i: intervals[i]):
+        start, end = intervals[index]
+        if schedule is None:
+            results[index] = {
+                "type": "stylist_unavailable",
+                "details": "Stylist is not available on this day"
+            }
+            continue
+        conflict = schedule.check(start, end)
+        if conflict:
+            results[index] = conflict
+            continue
+
+        # Candidates are visited in start order, so both lists only move forward
+        while next_time_off < len(time_off) and time_off[next_time_off][0] < end:
+            active_time_off.append(time_off[next_time_off])
+            next_time_off += 1
+        active_time_off = [period for period in active_time_off if period[1] > start]
+        overlapping_time_off = [period for period in active_time_off if period[0] < end]
+        if overlapping_time_off:
+            off_start, off_end = overlapping_time_off[0]
+            results[index] = {
+                "type": "time_off",
+                "details": f"Stylist is on time off from {off_start} to {off_end}"
+            }
+            continue
+
+        while next_booking < len(bookings) and bookings[next_booking].start_time < end:
+            active_bookings.append(bookings[next_booking])
+            next_booking += 1
+        active_bookings = [booking for booking in active_bookings if booking.end_time > start]
+        overlapping = [booking for booking in active_bookings if booking.start_time < end]
+        if overlapping:
+            results[index] = {
+                "type": "double_booking",
+                "details": {
+                    "booking_id": overlapping[0].id,
+                    "message": "Time slot is already booked"
+                }
+            }
+
+    return results
+
+# Cached (stylist, day) availability
+
+DayIntervals = Tuple[List[Interval], List[Interval]]
+
+def intervals_to_minutes(intervals: List[Interval], day_start: datetime) -> List[List[int]]:
+    return [
+        [int((start - day_start).total_seconds() // 60), int((end - day_start).total_seconds() // 60)]
+        for start, end in intervals
+    ]
+
+def intervals_from_minutes(intervals: List[List[int]], day_start: datetime) -> List[Interval]:
+    return [
+        (day_start + timedelta(minutes=start), day_start + timedelta(minutes=end))
+        for start, end in intervals
+    ]
+
+def compute_day_intervals(snapshot: AvailabilitySnapshot, stylist_id: int, day: date) -> DayIntervals:
+    """Open (working minus time off) and free (open minus bookings) intervals for one day."""
+    day_start = _at_minute(day, 0)
+    day_end = day_start + timedelta(days=1)
+    open_intervals = subtract_intervals(
+        schedule_intervals(snapshot, stylist_id, day_start, day_end),
+        merge_intervals(snapshot.time_off.get(stylist_id, []))
+    )
+    booked = merge_intervals(
+        (booking.start_time, booking.end_time)
+        for booking in snapshot.bookings.get(stylist_id, [])
+    )
+    return open_intervals, subtract_intervals(open_intervals, booked)
+
+def get_day_intervals(
+    db: Session,
+    stylist_ids: List[int],
+    range_start: datetime,
+    range_end: datetime
+) -> Dict[Tuple[int, date], DayIntervals]:
+    """Open and free intervals per (stylist, day) in the range, served from the cache.
+
+    Misses are filled with a single snapshot load covering every missing
+    stylist and day, then written back under the keys taken before the load,
+    so a fill that raced an invalidation is never read. Active slot holds are
+    subtracted from the free intervals afterwards.
+    """
+    cache = availability_cache.get_cache()
+    days = []
+    day = range_start.date()
+    while day <= range_end.date():
+        days.append(day)
+        day += timedelta(days=1)
+
+    result: Dict[Tuple[int, date], DayIntervals] = {}
+    missing: List[Tuple[int, date]] = []
+    keys: Dict[Tuple[int, date], Optional[str]] = {}
+    for stylist_id in stylist_ids:
+        for day in days:
+            key = cache.key(stylist_id, day)
+            entry = cache.get(key)
+            if entry is None:
+                missing.append((stylist_id, day))
+                keys[(stylist_id, day)] = key
+            else:
+                day_start = _at_minute(day, 0)
+                result[(stylist_id, day)] = (
+                    intervals_from_minutes(entry["open"], day_start),
+                    intervals_from_minutes(entry["free"], day_start)
+                )
+
+    if missing:
+        first_day = min(day for _, day in missing)
+        last_day = max(day for _, day in missing)
+        snapshot = load_snapshot(
+            db,
+            sorted({stylist_id for stylist_id, _ in missing}),
+            _at_minute(first_day, 0),
+            _at_minute(last_day, 0) + timedelta(days=1)
+        )
+        for stylist_id, day in missing:
+            open_intervals, free_intervals = compute_day_intervals(snapshot, stylist_id, day)
+            result[(stylist_id, day)] = (open_intervals, free_intervals)
+            day_start = _at_minute(day, 0)
+            cache.set(keys[(stylist_id, day)], {
+                "open": intervals_to_minutes(open_intervals, day_start),
+                "free": intervals_to_minutes(free_intervals, day_start)
+            })
+
+    # Holds live for minutes, so they are applied on every read instead of cached
+    held: Dict[int, List[Interval]] = defaultdict(list)
+    for hold in holds.active_holds(stylist_ids, _at_minute(days[0], 0), _at_minute(days[-1], 0) + timedelta(days=1)):
+        held[hold.stylist_id].append((hold.start_time, hold.end_time))
+    for (stylist_id, day), (open_intervals, free_intervals) in list(result.items()):
+        if stylist_id in held:
+            result[(stylist_id, day)] = (
+                open_intervals,
+                subtract_intervals(free_intervals, merge_intervals(held[stylist_id]))
+            )
+
+    return result
+
+def clip_intervals(intervals: Iterable[Interval], range_start: datetime, range_end: datetime) -> List[Interval]:
+    """Clip intervals to [range_start, range_end], dropping the empty ones."""
+    clipped = []
+    for start, end in intervals:
+        start = max(start, range_start)
+        end = min(end, range_end)
+        if start < end:
+            clipped.append((start, end))
+    return clipped
+
+def get_range_intervals(
+    db: Session,
+    stylist_ids: List[int],
+    range_start: datetime,
+    range_end: datetime
+) -> Dict[int, DayIntervals]:
+    """Open and free intervals per stylist across the range, clipped to it."""
+    day_intervals = get_day_intervals(db, stylist_ids, range_start, range_end)
+    result: Dict[int, DayIntervals] = {}
+    for stylist_id in stylist_ids:
+        open_intervals: List[Interval] = []
+        free_intervals: List[Interval] = []
+        for (entry_stylist_id, day) in sorted(key for key in day_intervals if key[0] == stylist_id):
+            day_open, day_free = day_intervals[(entry_stylist_id, day)]
+            open_intervals.extend(clip_intervals(day_open, range_start, range_end))
+            free_intervals.extend(clip_intervals(day_free, range_start, range_end))
+        result[stylist_id] = (open_intervals, free_intervals)
+    return result
+
+def load_bookings(
+    db: Session,
+    stylist_ids: List[int],
+    range_start: datetime,
+    range_end: datetime
+) -> Dict[int, List[Booking]]:
+    """Active bookings per stylist overlapping the range, in one query.
+
+    Rows are loaded without the ``booking_response`` profile: the writes that
+    follow share them through the identity map, and raiseload would stay on
+    them until the transaction ends. Serializing a conflict reads columns only.
+    """
+    bookings: Dict[int, List[Booking]] = defaultdict(list)
+    if not stylist_ids:
+        return bookings
+    rows = db.query(Booking).filter(
+        and_(
+            Booking.stylist_id.in_(stylist_ids),
+            Booking.status != BookingStatus.CANCELLED,
+            Booking.start_time < range_end,
+            Booking.end_time > range_start
+        )
+    ).order_by(Booking.start_time).all()
+    for booking in rows:
+        bookings[booking.stylist_id].append(booking)
+    return bookings
+
+def contains_slot(free_intervals: List[Interval], slot_start: datetime, slot_end: datetime) -> bool:
+    """Whether [slot_start, slot_end] lies entirely inside one of the sorted free intervals."""
+    index = bisect_right(free_intervals, (slot_start, datetime.max)) - 1
+    return index >= 0 and free_intervals[index][0] <= slot_start and slot_end <= free_intervals[index][1]
+
+# Earliest-slot search
+
+class _ChunkedDayIntervals:
+    """Day intervals for a set of stylists, loaded a chunk of days at a time on demand."""
+
+    def __init__(self, db: Session, stylist_ids: List[int], chunk_days: int):
+        self.db = db
+        self.stylist_ids = stylist_ids
+        self.chunk_days = chunk_days
+        self._intervals: Dict[Tuple[int, date], DayIntervals] = {}
+
+    def free(self, stylist_id: int, day: date) -> List[Interval]:
+        if (stylist_id, day) not in self._intervals:
+            # Load the chunk for every stylist at once; the merge advances them together
+            chunk_start = _at_minute(day, 0)
+            self._intervals.update(get_day_intervals(
+                self.db,
+                self.stylist_ids,
+                chunk_start,
+                chunk_start + timedelta(days=self.chunk_days - 1)
+            ))
+        return self._intervals[(stylist_id, day)][1]
+
+def _iter_stylist_slots(
+    loader: _ChunkedDayIntervals,
+    stylist_id: int,
+    start: datetime,
+    until: datetime,
+    duration: timedelta,
+    step: timedelta
+) -> Iterator[datetime]:
+    """Lazily yield a stylist's feasible slot starts from ``start``, one day at a time."""
+    day = start.date()
+    while _at_minute(day, 0) < until:
+        origin = _at_minute(day, 0)
+        for slot_start in iter_slot_starts(loader.free(stylist_id, day), duration, step, origin):
+            if slot_start >= until:
+                return
+            if slot_start >= start:
+                yield slot_start
+        day += timedelta(days=1)
+
+def earliest_slots(
+    db: Session,
+    stylist_ids: List[int],
+    start: datetime,
+    duration: timedelta,
+    count: int,
+    step: timedelta,
+    horizon_days: int = 60,
+    chunk_days: int = 7
+) -> List[Tuple[datetime, int]]:
+    """The first ``count`` (slot_start, stylist_id) pairs at or after ``start``.
+
+    Each stylist's free slots are an ordered lazy stream; a heap merges the
+    streams and the search stops as soon as enough slots are found, so only
+    the days actually reached are ever loaded.
+    """
+    loader = _ChunkedDayIntervals(db, stylist_ids, chunk_days)
+    until = start + timedelta(days=horizon_days)
+    streams = [
+        _iter_stylist_slots(loader, stylist_id, start, until, duration, step)
+        for stylist_id in stylist_ids
+    ]
+
+    heap: List[Tuple[datetime, int]] = []
+    for order, stream in enumerate(streams):
+        slot_start = next(stream, None)
+        if slot_start is not None:
+            heap.append((slot_start, order))
+    heapq.heapify(heap)
+
+    results: List[Tuple[datetime, int]] = []
+    while heap and len(results) < count:
+        slot_start, order = heapq.heappop(heap)
+        results.append((slot_start, stylist_ids[order]))
+        if len(results) == count:
+            # Advancing the stream now could load a chunk no result needs
+            break
+        next_start = next(streams[order], None)
+        if next_start is not None:
+            heapq.heappush(heap, (next_start, order))
+    return results
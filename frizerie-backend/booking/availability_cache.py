@@ -0,0 +1,307 @@
+"""
+Cache of computed availability intervals keyed by (stylist, day).
+
+Entries only change when a booking is written, time off is approved or a
+stylist's weekly schedule is replaced, so those write paths invalidate the
+affected keys explicitly. Every stylist also carries a generation number that
+is part of the key, which lets a whole stylist be invalidated in O(1) on any
+backend, and every (stylist, day) an invalidation stamp. Readers take the key
+before loading a miss from the database, so an entry computed before a
+concurrent invalidation is stored under a key that is no longer read.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Cached value: {"open": [[start_minute, end_minute], ...], "free": [...]}
+DayEntry = Dict[str, List[List[int]]]
+
+class CacheBackend:
+    """Interface for availability cache storage backends."""
+
+    # Whether generation bumps are seen by every worker
+    shared = False
+
+    def get(self, key: str) -> Optional[DayEntry]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: DayEntry) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def generation(self, stylist_id: int) -> int:
+        raise NotImplementedError
+
+    def bump_generation(self, stylist_id: int) -> None:
+        raise NotImplementedError
+
+    def stamp(self, stylist_id: int, day: date) -> int:
+        raise NotImplementedError
+
+    def bump_stamp(self, stylist_id: int, day: date) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU backend; the default for single-worker deployments.
+
+    Invalidations only reach this process, so entries also expire after
+    ``ttl_seconds`` to bound how stale other workers' copies can get. Stamps
+    expire too, ``2 * ttl_seconds`` after they were last read or bumped, so
+    that they outlive every entry stored under them and the stamp map stays
+    bounded by the days invalidated recently.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expiry on the monotonic clock, value)
+        self._entries: "OrderedDict[str, Tuple[float, DayEntry]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        # "stylist:day" -> (expiry on the monotonic clock, stamp), oldest expiry first
+        self._stamps: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[DayEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: DayEntry) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def generation(self, stylist_id: int) -> int:
+        return self._generations.get(stylist_id, 0)
+
+    def bump_generation(self, stylist_id: int) -> None:
+        with self._lock:
+            self._generations[stylist_id] = self._generations.get(stylist_id, 0) + 1
+
+    def _touch_stamp(self, key: str, value: int, now: float) -> None:
+        # Every expiry is now + 2 * ttl, so moving the touched stamp to the end keeps the map in expiry order
+        self._stamps[key] = (now + self.ttl_seconds * 2, value)
+        self._stamps.move_to_end(key)
+        while self._stamps:
+            oldest = next(iter(self._stamps.values()))
+            if oldest[0] > now:
+                break
+            self._stamps.popitem(last=False)
+
+    def stamp(self, stylist_id: int, day: date) -> int:
+        key = f"{stylist_id}:{day.isoformat()}"
+        with self._lock:
+            entry = self._stamps.get(key)
+            if entry is None:
+                return 0
+            now = time.monotonic()
+            if entry[0] <= now:
+                del self._stamps[key]
+                return 0
+            # Readers store an entry under this stamp next; it must not expire before that entry does
+            self._touch_stamp(key, entry[1], now)
+            return entry[1]
+
+    def bump_stamp(self, stylist_id: int, day: date) -> None:
+        key = f"{stylist_id}:{day.isoformat()}"
+        with self._lock:
+            now = time.monotonic()
+            entry = self._stamps.get(key)
+            stamp = entry[1] if entry is not None and entry[0] > now else 0
+            self._touch_stamp(key, stamp + 1, now)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisBackend(CacheBackend):
+    """Redis-compatible backend shared by every worker."""
+
+    shared = True
+
+    def __init__(self, url: str, ttl_seconds: int = 3600, prefix: str = "availability"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[DayEntry]:
+        raw = self.client.get(f"{self.prefix}:{key}")
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: DayEntry) -> None:
+        self.client.set(f"{self.prefix}:{key}", json.dumps(value), ex=self.ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(f"{self.prefix}:{key}")
+
+    def generation(self, stylist_id: int) -> int:
+        raw = self.client.get(f"{self.prefix}:gen:{stylist_id}")
+        return int(raw) if raw else 0
+
+    def bump_generation(self, stylist_id: int) -> None:
+        self.client.incr(f"{self.prefix}:gen:{stylist_id}")
+
+    def stamp(self, stylist_id: int, day: date) -> int:
+        raw = self.client.get(f"{self.prefix}:stamp:{stylist_id}:{day.isoformat()}")
+        return int(raw) if raw else 0
+
+    def bump_stamp(self, stylist_id: int, day: date) -> None:
+        key = f"{self.prefix}:stamp:{stylist_id}:{day.isoformat()}"
+        pipeline = self.client.pipeline()
+        pipeline.incr(key)
+        # Outlive every entry stored under an older stamp, so a reset to 0 cannot revive one
+        pipeline.expire(key, self.ttl_seconds * 2)
+        pipeline.execute()
+
+    def size(self) -> int:
+        # Entry keys start with the stylist id; generation and stamp keys are not counted
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}:[0-9]*", count=1000))
+
+class AvailabilityCache:
+    """Per (stylist, day) availability cache with hit/miss accounting."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, stylist_id: int, day: date) -> Optional[str]:
+        """Current key of a (stylist, day), or None when the backend cannot be read.
+
+        Take the key before loading a miss and store the result under it.
+        """
+        try:
+            generation = self.backend.generation(stylist_id)
+            stamp = self.backend.stamp(stylist_id, day)
+        except Exception as e:
+            logger.warning(f"Availability cache read failed: {str(e)}")
+            return None
+        return f"{stylist_id}:{generation}:{day.isoformat()}:{stamp}"
+
+    def generation(self, stylist_id: int) -> int:
+        """Current generation of a stylist, bumped on schedule rewrites."""
+        try:
+            return self.backend.generation(stylist_id)
+        except Exception as e:
+            logger.warning(f"Availability cache read failed: {str(e)}")
+            return 0
+
+    def local_ttl(self) -> Optional[int]:
+        """Seconds a per-process copy tagged with a generation may be reused.
+
+        None when the backend is shared and every worker sees a bump. The
+        memory backend's generations live in one process, so copies held by
+        the other workers have to expire instead.
+        """
+        return None if self.backend.shared else get_settings().AVAILABILITY_CACHE_LOCAL_TTL_SECONDS
+
+    def get(self, key: Optional[str]) -> Optional[DayEntry]:
+        value = None
+        if key is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"Availability cache read failed: {str(e)}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Optional[str], value: DayEntry) -> None:
+        if key is None:
+            return
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"Availability cache write failed: {str(e)}")
+
+    def invalidate_range(self, stylist_id: int, start: datetime, end: datetime) -> None:
+        """Drop the cached days touched by [start, end] for a stylist."""
+        day = start.date()
+        while day <= end.date():
+            key = self.key(stylist_id, day)
+            try:
+                if key is not None:
+                    self.backend.delete(key)
+                self.backend.bump_stamp(stylist_id, day)
+            except Exception as e:
+                logger.warning(f"Availability cache invalidation failed: {str(e)}")
+            self.invalidations += 1
+            day += timedelta(days=1)
+
+    def invalidate_stylist(self, stylist_id: int) -> None:
+        """Drop every cached day for a stylist, e.g. after a schedule rewrite."""
+        try:
+            self.backend.bump_generation(stylist_id)
+        except Exception as e:
+            logger.warning(f"Availability cache invalidation failed: {str(e)}")
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total > 0 else 0,
+            "invalidations": self.invalidations,
+            "size": size
+        }
+
+_cache: Optional[AvailabilityCache] = None
+
+def get_cache() -> AvailabilityCache:
+    """Return the process-wide availability cache, creating it from settings."""
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        if settings.AVAILABILITY_CACHE_BACKEND == "redis":
+            backend = RedisBackend(
+                settings.AVAILABILITY_CACHE_REDIS_URL,
+                ttl_seconds=settings.AVAILABILITY_CACHE_TTL_SECONDS
+            )
+        else:
+            backend = MemoryBackend(
+                settings.AVAILABILITY_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.AVAILABILITY_CACHE_LOCAL_TTL_SECONDS
+            )
+        _cache = AvailabilityCache(backend)
+    return _cache
+
+def invalidate_booking(stylist_id: Optional[int], start: Optional[datetime], end: Optional[datetime]) -> None:
+    """Invalidate the days covered by a booking that was created, moved or cancelled."""
+    if stylist_id is None or start is None or end is None:
+        return
+    get_cache().invalidate_range(stylist_id, start, end)
@@ -0,0 +1,204 @@
+"""
+iCalendar (.ics) feeds of bookings for stylists and customers.
+
+Calendar apps poll their feeds, so each feed carries an ETag computed from a
+single aggregate over the feed's bookings (latest ``updated_at`` and row
+count). A poll with a matching ``If-None-Match`` is answered with 304 before
+any booking row is read. Otherwise the feed is streamed event by event from
+a server-side cursor instead of being built in memory.
+
+Calendar apps cannot send a bearer header, so feeds are authorized by a
+secret token in the URL. Each user has at most one; issuing a new one
+revokes the old, and only its SHA-256 is stored.
+
+Booking times are salon wall-clock times, so events use floating times
+(no ``Z`` or ``TZID``), which calendar apps show as the same wall-clock time.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from booking.models import Booking, BookingStatus
+from config.database import SessionLocal
+from services.models import Service
+from stylists.models import Stylist
+from users.models import User
+
+# Feeds cover bookings from this many days back onwards
+FEED_PAST_DAYS = 90
+
+# Rows fetched per round trip while streaming
+FEED_BATCH_SIZE = 500
+
+PRODID = "-//Frizerie//Bookings//EN"
+
+_ICS_STATUS = {
+    BookingStatus.PENDING: "TENTATIVE",
+    BookingStatus.WAITLISTED: "TENTATIVE",
+    BookingStatus.CANCELLED: "CANCELLED",
+}
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _save_token_hash(db: Session, user: User, token_hash: Optional[str]) -> None:
+    try:
+        user.calendar_token_hash = token_hash
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update calendar feed token"
+        )
+
+def issue_feed_token(db: Session, user: User) -> str:
+    """Give the user a new feed token, revoking the previous one."""
+    token = secrets.token_urlsafe(32)
+    _save_token_hash(db, user, _token_hash(token))
+    return token
+
+def revoke_feed_token(db: Session, user: User) -> None:
+    """Revoke the user's feed token; their feed URLs stop working."""
+    _save_token_hash(db, user, None)
+
+def feed_user(db: Session, token: Optional[str]) -> Optional[User]:
+    """The user a feed token belongs to, if it is current."""
+    if not token:
+        return None
+    return db.query(User).filter(User.calendar_token_hash == _token_hash(token)).first()
+
+def can_read_stylist_feed(user: User, stylist: Stylist) -> bool:
+    """Only the stylist themselves and admins may read a stylist's feed."""
+    return bool(user.is_admin) or (stylist.user_id is not None and stylist.user_id == user.id)
+
+def _feed_filter(stylist_id: Optional[int], user_id: Optional[int], window_start: datetime):
+    criteria = [Booking.end_time >= window_start]
+    if stylist_id is not None:
+        criteria.append(Booking.stylist_id == stylist_id)
+    if user_id is not None:
+        criteria.append(Booking.user_id == user_id)
+    return and_(*criteria)
+
+def _window_start() -> datetime:
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=FEED_PAST_DAYS)
+
+def feed_etag(db: Session, stylist_id: Optional[int] = None, user_id: Optional[int] = None) -> str:
+    """ETag of a feed from one aggregate query; changes whenever a booking in it does."""
+    window_start = _window_start()
+    latest, count = db.query(
+        func.max(Booking.updated_at),
+        func.count(Booking.id)
+    ).filter(_feed_filter(stylist_id, user_id, window_start)).one()
+    digest = hashlib.sha1(
+        f"{stylist_id}:{user_id}:{window_start.date()}:{latest}:{count}".encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [
+        tag[2:] if tag.startswith("W/") else tag for tag in candidates
+    ]
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+def _format_floating(value: datetime) -> str:
+    # Booking times are naive salon-local times
+    return value.strftime("%Y%m%dT%H%M%S")
+
+def _format_utc(value: datetime) -> str:
+    # updated_at comes from the database clock, which runs in UTC
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+def _line(content: str) -> str:
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    encoded = content.encode("utf-8")
+    if len(encoded) <= 75:
+        return content + "\r\n"
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Never split a multi-byte character
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+def _event(booking_id, start_time, end_time, status, updated_at, service_name, stylist_name) -> str:
+    summary = service_name or "Booking"
+    if stylist_name:
+        summary = f"{summary} with {stylist_name}"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{booking_id}@frizerie",
+        f"DTSTAMP:{_format_utc(updated_at or datetime.utcnow())}",
+        f"DTSTART:{_format_floating(start_time)}",
+        f"DTEND:{_format_floating(end_time)}",
+        f"SUMMARY:{_escape(summary)}",
+        f"STATUS:{_ICS_STATUS.get(status, 'CONFIRMED')}",
+        "END:VEVENT",
+    ]
+    return "".join(_line(line) for line in lines)
+
+def iter_feed(
+    calendar_name: str,
+    stylist_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> Iterator[str]:
+    """Stream a feed as iCalendar text.
+
+    The generator runs after the request's own session has been closed, so it
+    reads through a session of its own.
+    """
+    yield _line("BEGIN:VCALENDAR")
+    yield _line("VERSION:2.0")
+    yield _line(f"PRODID:{PRODID}")
+    yield _line("CALSCALE:GREGORIAN")
+    yield _line(f"X-WR-CALNAME:{_escape(calendar_name)}")
+
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            Booking.id,
+            Booking.start_time,
+            Booking.end_time,
+            Booking.status,
+            Booking.updated_at,
+            Service.name,
+            Stylist.name
+        ).outerjoin(
+            Service, Service.id == Booking.service_id
+        ).outerjoin(
+            Stylist, Stylist.id == Booking.stylist_id
+        ).filter(
+            _feed_filter(stylist_id, user_id, _window_start())
+        ).order_by(Booking.start_time).yield_per(FEED_BATCH_SIZE)
+
+        for booking_id, start_time, end_time, status, updated_at, service_name, stylist_name in rows:
+            # The stylist's own feed does not repeat their name on every event
+            yield _event(
+                booking_id, start_time, end_time, status, updated_at, service_name,
+                stylist_name if stylist_id is None else None
+            )
+    finally:
+        db.close()
+
+    yield _line("END:VCALENDAR")
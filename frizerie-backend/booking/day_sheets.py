@@ -0,0 +1,229 @@
+"""
+Materialized stylist day sheets over a rolling horizon.
+
+Front-desk screens read each stylist's day (open, busy and free intervals
+plus utilization) from ``stylist_day_sheets`` instead of recomputing it from
+bookings, schedules and time off on every request. Booking and time-off
+writes refresh the affected days right after they commit; the nightly roll
+drops past days and rebuilds the whole horizon, which also repairs any
+refresh that failed. Days without a stored row are computed on the fly;
+reads never write.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from booking.models import StylistDaySheet
+from booking import availability
+from booking.schedule import at_minute
+from config.settings import get_settings
+from stylists.models import Stylist
+
+logger = logging.getLogger(__name__)
+
+MinuteIntervals = List[List[int]]
+
+def horizon() -> Tuple[date, date]:
+    """First and last day covered by stored sheets."""
+    today = datetime.utcnow().date()
+    return today, today + timedelta(days=get_settings().DAY_SHEET_HORIZON_DAYS - 1)
+
+def _days(first_day: date, last_day: date) -> List[date]:
+    days = []
+    day = first_day
+    while day <= last_day:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def _minutes(intervals: MinuteIntervals) -> int:
+    return sum(end - start for start, end in intervals)
+
+def compute_sheets(
+    db: Session,
+    stylist_ids: List[int],
+    first_day: date,
+    last_day: date
+) -> Dict[Tuple[int, date], Dict[str, Any]]:
+    """Sheet values per (stylist, day), from one availability snapshot."""
+    if not stylist_ids or first_day > last_day:
+        return {}
+    snapshot = availability.load_snapshot(
+        db, stylist_ids, at_minute(first_day, 0), at_minute(last_day + timedelta(days=1), 0)
+    )
+    sheets: Dict[Tuple[int, date], Dict[str, Any]] = {}
+    for stylist_id in stylist_ids:
+        for day in _days(first_day, last_day):
+            day_start = at_minute(day, 0)
+            open_intervals, free_intervals = availability.compute_day_intervals(snapshot, stylist_id, day)
+            busy_intervals = availability.subtract_intervals(open_intervals, free_intervals)
+            open_minutes = availability.intervals_to_minutes(open_intervals, day_start)
+            busy_minutes = availability.intervals_to_minutes(busy_intervals, day_start)
+            total_open = _minutes(open_minutes)
+            total_busy = _minutes(busy_minutes)
+            sheets[(stylist_id, day)] = {
+                "stylist_id": stylist_id,
+                "day": day,
+                "open_intervals": open_minutes,
+                "busy_intervals": busy_minutes,
+                "free_intervals": availability.intervals_to_minutes(free_intervals, day_start),
+                "open_minutes": total_open,
+                "busy_minutes": total_busy,
+                "utilization": round(total_busy / total_open, 4) if total_open else 0.0,
+                "computed_at": datetime.utcnow()
+            }
+    return sheets
+
+def _store(db: Session, sheets: Dict[Tuple[int, date], Dict[str, Any]]) -> None:
+    """Upsert computed sheets into the current transaction."""
+    if not sheets:
+        return
+    stylist_ids = sorted({stylist_id for stylist_id, _ in sheets})
+    days = [day for _, day in sheets]
+    existing = {
+        (sheet.stylist_id, sheet.day): sheet
+        for sheet in db.query(StylistDaySheet).filter(
+            and_(
+                StylistDaySheet.stylist_id.in_(stylist_ids),
+                StylistDaySheet.day >= min(days),
+                StylistDaySheet.day <= max(days)
+            )
+        ).all()
+    }
+    for key, values in sheets.items():
+        sheet = existing.get(key)
+        if sheet is None:
+            db.add(StylistDaySheet(**values))
+        else:
+            for field, value in values.items():
+                setattr(sheet, field, value)
+
+def refresh(db: Session, stylist_id: Optional[int], start: Optional[datetime], end: Optional[datetime]) -> None:
+    """Recompute the stored days touched by [start, end] for a stylist."""
+    refresh_spans(db, [(stylist_id, start, end)])
+
+def refresh_spans(db: Session, spans: Iterable[Tuple[Optional[int], Optional[datetime], Optional[datetime]]]) -> None:
+    """Refresh the stored days covered by several (stylist_id, start, end) spans, once per stylist.
+
+    Called after a booking or time-off write has committed. Sheets are written
+    in a session of their own on the caller's engine, so the caller's
+    transaction is never committed or rolled back here; a failure is logged
+    and left for the nightly roll to repair.
+    """
+    horizon_start, horizon_end = horizon()
+    bounds: Dict[int, Tuple[date, date]] = {}
+    for stylist_id, start, end in spans:
+        if stylist_id is None or start is None or end is None:
+            continue
+        first_day = max(horizon_start, start.date())
+        last_day = min(horizon_end, end.date())
+        if first_day > last_day:
+            continue
+        if stylist_id in bounds:
+            first_day = min(first_day, bounds[stylist_id][0])
+            last_day = max(last_day, bounds[stylist_id][1])
+        bounds[stylist_id] = (first_day, last_day)
+    if not bounds:
+        return
+
+    session = Session(bind=db.get_bind(), autoflush=False)
+    try:
+        for stylist_id, (first_day, last_day) in bounds.items():
+            try:
+                _store(session, compute_sheets(session, [stylist_id], first_day, last_day))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.warning(f"Day sheet refresh failed for stylist {stylist_id}: {str(e)}")
+    finally:
+        session.close()
+
+def refresh_bookings(db: Session, bookings: Iterable[Any]) -> None:
+    """Refresh the days spanned by several bookings, once per stylist."""
+    refresh_spans(db, [(booking.stylist_id, booking.start_time, booking.end_time) for booking in bookings])
+
+def refresh_stylist(db: Session, stylist_id: int) -> None:
+    """Recompute a stylist's whole horizon, e.g. after a schedule rewrite."""
+    first_day, last_day = horizon()
+    refresh(db, stylist_id, at_minute(first_day, 0), at_minute(last_day, 0))
+
+def roll_horizon(db: Session) -> int:
+    """Drop past sheets and rebuild the horizon for every active stylist; returns the row count."""
+    first_day, last_day = horizon()
+    stylist_ids = [
+        stylist_id for (stylist_id,) in db.query(Stylist.id).filter(Stylist.is_active == True).all()
+    ]
+    try:
+        db.query(StylistDaySheet).filter(
+            StylistDaySheet.day < first_day
+        ).delete(synchronize_session=False)
+        sheets = compute_sheets(db, stylist_ids, first_day, last_day)
+        _store(db, sheets)
+        db.commit()
+        return len(sheets)
+    except Exception as e:
+        db.rollback()
+        raise e
+
+def get_sheets(
+    db: Session,
+    stylist_ids: Iterable[int],
+    first_day: date,
+    last_day: date
+) -> List[Dict[str, Any]]:
+    """Sheets for the stylists and days, read from the table where stored.
+
+    Days without a row (outside the horizon, a new stylist, or before the
+    first nightly roll) are computed on the fly; reads never write, the
+    refreshes and the nightly roll fill the table.
+    """
+    stylist_ids = list(stylist_ids)
+    if not stylist_ids or first_day > last_day:
+        return []
+    sheets: Dict[Tuple[int, date], Dict[str, Any]] = {
+        (sheet.stylist_id, sheet.day): {
+            column.name: getattr(sheet, column.name)
+            for column in StylistDaySheet.__table__.columns
+            if column.name != "id"
+        }
+        for sheet in db.query(StylistDaySheet).filter(
+            and_(
+                StylistDaySheet.stylist_id.in_(stylist_ids),
+                StylistDaySheet.day >= first_day,
+                StylistDaySheet.day <= last_day
+            )
+        ).all()
+    }
+
+    missing = [
+        (stylist_id, day)
+        for stylist_id in stylist_ids
+        for day in _days(first_day, last_day)
+        if (stylist_id, day) not in sheets
+    ]
+    if missing:
+        missing_ids = sorted({stylist_id for stylist_id, _ in missing})
+        missing_days = [day for _, day in missing]
+        computed = compute_sheets(db, missing_ids, min(missing_days), max(missing_days))
+        for key in missing:
+            sheets[key] = computed[key]
+
+    return [
+        to_response(sheets[(stylist_id, day)])
+        for day in _days(first_day, last_day)
+        for stylist_id in stylist_ids
+    ]
+
+def to_response(sheet: Dict[str, Any]) -> Dict[str, Any]:
+    """Expand stored minute intervals into datetimes for the API."""
+    day_start = at_minute(sheet["day"], 0)
+    response = dict(sheet)
+    for field in ("open_intervals", "busy_intervals", "free_intervals"):
+        response[field] = [
+            {"start_time": start, "end_time": end}
+            for start, end in availability.intervals_from_minutes(sheet[field], day_start)
+        ]
+    return response
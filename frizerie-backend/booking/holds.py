@@ -0,0 +1,263 @@
+"""
+Short-lived slot holds taken while a customer goes through checkout.
+
+A hold reserves (stylist, start, end) for a few minutes in a TTL store, never
+in the bookings table. Availability treats active holds as busy, booking
+validation rejects slots held by someone else, and ``create_booking``
+consumes the hold it was given. Holds expire inside the store that is read:
+Redis keys carry their own TTL and every store drops expired index entries
+as it reads them, so no sweeper process is involved.
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+class SlotHold:
+    """A reserved slot for one user until ``expires_at``."""
+
+    __slots__ = ("id", "user_id", "stylist_id", "start_time", "end_time", "expires_at")
+
+    def __init__(
+        self,
+        id: str,
+        user_id: int,
+        stylist_id: int,
+        start_time: datetime,
+        end_time: datetime,
+        expires_at: datetime
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.stylist_id = stylist_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.expires_at = expires_at
+
+    def is_active(self, now: Optional[datetime] = None) -> bool:
+        return self.expires_at > (now or datetime.utcnow())
+
+    def overlaps(self, start_time: datetime, end_time: datetime) -> bool:
+        return self.start_time < end_time and self.end_time > start_time
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "stylist_id": self.stylist_id,
+            "start_time": self.start_time.isoformat(),
+            "end_time": self.end_time.isoformat(),
+            "expires_at": self.expires_at.isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "SlotHold":
+        return cls(
+            data["id"],
+            data["user_id"],
+            data["stylist_id"],
+            datetime.fromisoformat(data["start_time"]),
+            datetime.fromisoformat(data["end_time"]),
+            datetime.fromisoformat(data["expires_at"])
+        )
+
+class HoldStore:
+    """Interface for slot hold storage backends."""
+
+    def add(self, hold: SlotHold) -> bool:
+        """Store the hold unless it overlaps another active hold for the stylist."""
+        raise NotImplementedError
+
+    def get(self, hold_id: str) -> Optional[SlotHold]:
+        raise NotImplementedError
+
+    def delete(self, hold_id: str) -> None:
+        raise NotImplementedError
+
+    def active(self, stylist_ids: Iterable[int], start_time: datetime, end_time: datetime) -> List[SlotHold]:
+        """Active holds for the stylists that overlap [start_time, end_time)."""
+        raise NotImplementedError
+
+class MemoryHoldStore(HoldStore):
+    """In-process store; only for single-worker deployments.
+
+    Every process has its own holds, so with several API workers use the
+    Redis store instead.
+    """
+
+    def __init__(self):
+        self._holds: Dict[str, SlotHold] = {}
+        self._by_stylist: Dict[int, Dict[str, SlotHold]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, stylist_id: int, now: datetime) -> Dict[str, SlotHold]:
+        """The stylist's holds, dropping the expired ones; the lock must be held."""
+        stylist_holds = self._by_stylist.get(stylist_id, {})
+        for hold in [hold for hold in stylist_holds.values() if not hold.is_active(now)]:
+            del stylist_holds[hold.id]
+            self._holds.pop(hold.id, None)
+        if not stylist_holds:
+            self._by_stylist.pop(stylist_id, None)
+        return stylist_holds
+
+    def add(self, hold: SlotHold) -> bool:
+        with self._lock:
+            for other in self._live(hold.stylist_id, datetime.utcnow()).values():
+                if other.overlaps(hold.start_time, hold.end_time):
+                    return False
+            self._holds[hold.id] = hold
+            self._by_stylist.setdefault(hold.stylist_id, {})[hold.id] = hold
+            return True
+
+    def get(self, hold_id: str) -> Optional[SlotHold]:
+        with self._lock:
+            hold = self._holds.get(hold_id)
+            if hold and not hold.is_active():
+                self._live(hold.stylist_id, datetime.utcnow())
+                return None
+            return hold
+
+    def delete(self, hold_id: str) -> None:
+        with self._lock:
+            hold = self._holds.pop(hold_id, None)
+            if hold:
+                self._by_stylist.get(hold.stylist_id, {}).pop(hold_id, None)
+
+    def active(self, stylist_ids: Iterable[int], start_time: datetime, end_time: datetime) -> List[SlotHold]:
+        now = datetime.utcnow()
+        with self._lock:
+            return [
+                hold
+                for stylist_id in stylist_ids
+                for hold in self._live(stylist_id, now).values()
+                if hold.overlaps(start_time, end_time)
+            ]
+
+class RedisHoldStore(HoldStore):
+    """Redis-compatible store shared by every worker.
+
+    Each hold is a JSON key with a TTL. A sorted set per stylist, scored by
+    expiry, indexes the holds; ``add`` trims its expired members and the set
+    itself expires with its last hold. Overlap checks on ``add`` run under
+    WATCH on that set so concurrent holds cannot both win.
+    """
+
+    def __init__(self, url: str, prefix: str = "slot_holds"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _hold_key(self, hold_id: str) -> str:
+        return f"{self.prefix}:hold:{hold_id}"
+
+    def _stylist_key(self, stylist_id: int) -> str:
+        return f"{self.prefix}:stylist:{stylist_id}"
+
+    def _load(self, hold_ids: List[str]) -> List[SlotHold]:
+        if not hold_ids:
+            return []
+        raw_holds = self.client.mget([self._hold_key(hold_id) for hold_id in hold_ids])
+        return [SlotHold.from_dict(json.loads(raw)) for raw in raw_holds if raw]
+
+    def add(self, hold: SlotHold) -> bool:
+        import redis
+
+        stylist_key = self._stylist_key(hold.stylist_id)
+        now = datetime.utcnow()
+        ttl_ms = max(int((hold.expires_at - now).total_seconds() * 1000), 1)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(stylist_key)
+                    hold_ids = [
+                        hold_id.decode() if isinstance(hold_id, bytes) else hold_id
+                        for hold_id in pipe.zrangebyscore(stylist_key, now.timestamp(), "+inf")
+                    ]
+                    for other in self._load(hold_ids):
+                        if other.is_active(now) and other.overlaps(hold.start_time, hold.end_time):
+                            pipe.unwatch()
+                            return False
+                    pipe.multi()
+                    pipe.set(self._hold_key(hold.id), json.dumps(hold.to_dict()), px=ttl_ms)
+                    pipe.zremrangebyscore(stylist_key, "-inf", now.timestamp())
+                    pipe.zadd(stylist_key, {hold.id: hold.expires_at.timestamp()})
+                    # Every hold has the same TTL, so the newest one expires last
+                    pipe.pexpire(stylist_key, ttl_ms)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    def get(self, hold_id: str) -> Optional[SlotHold]:
+        holds = self._load([hold_id])
+        return holds[0] if holds and holds[0].is_active() else None
+
+    def delete(self, hold_id: str) -> None:
+        hold = self.get(hold_id)
+        self.client.delete(self._hold_key(hold_id))
+        if hold:
+            self.client.zrem(self._stylist_key(hold.stylist_id), hold_id)
+
+    def active(self, stylist_ids: Iterable[int], start_time: datetime, end_time: datetime) -> List[SlotHold]:
+        now = datetime.utcnow()
+        stylist_ids = list(stylist_ids)
+        if not stylist_ids:
+            return []
+        pipe = self.client.pipeline()
+        for stylist_id in stylist_ids:
+            pipe.zrangebyscore(self._stylist_key(stylist_id), now.timestamp(), "+inf")
+        hold_ids = [
+            hold_id.decode() if isinstance(hold_id, bytes) else hold_id
+            for result in pipe.execute()
+            for hold_id in result
+        ]
+        return [
+            hold for hold in self._load(hold_ids)
+            if hold.is_active(now) and hold.overlaps(start_time, end_time)
+        ]
+
+_store: Optional[HoldStore] = None
+
+def get_store() -> HoldStore:
+    """Return the process-wide hold store, creating it from settings."""
+    global _store
+    if _store is None:
+        settings = get_settings()
+        if settings.SLOT_HOLD_BACKEND == "redis":
+            _store = RedisHoldStore(settings.SLOT_HOLD_REDIS_URL)
+        else:
+            _store = MemoryHoldStore()
+    return _store
+
+def new_hold(user_id: int, stylist_id: int, start_time: datetime, end_time: datetime) -> SlotHold:
+    """Build a hold that expires after the configured TTL."""
+    return SlotHold(
+        str(uuid.uuid4()),
+        user_id,
+        stylist_id,
+        start_time,
+        end_time,
+        datetime.utcnow() + timedelta(minutes=get_settings().SLOT_HOLD_TTL_MINUTES)
+    )
+
+def active_holds(stylist_ids: Iterable[int], start_time: datetime, end_time: datetime) -> List[SlotHold]:
+    """Active holds overlapping the range; an unreachable store counts as no holds."""
+    try:
+        return get_store().active(stylist_ids, start_time, end_time)
+    except Exception as e:
+        logger.warning(f"Slot hold lookup failed: {str(e)}")
+        return []
+
+def discard(hold_id: str) -> None:
+    """Drop a hold consumed by a booking; an unreachable store leaves it to expire."""
+    try:
+        get_store().delete(hold_id)
+    except Exception as e:
+        logger.warning(f"Slot hold release failed: {str(e)}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON, Float, Enum, Table
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, JSON, Float, Enum, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from config.database import Base
@@ -82,6 +82,25 @@ class WaitlistEntry(Base):
     service = relationship("Service")
     preferred_stylist = relationship("Stylist")
 
+class WaitlistNotification(Base):
+    __tablename__ = "waitlist_notifications"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    waitlist_entry_id = Column(String(36), ForeignKey("waitlist_entries.id", ondelete="CASCADE"), nullable=False, index=True)
+    notification_type = Column(String(20), nullable=False)  # SLOT_AVAILABLE, EXPIRING_SOON, EXPIRED
+    sent_at = Column(DateTime, server_default=func.now(), nullable=False)
+    status = Column(String(20), nullable=False)  # SENT, READ, FAILED
+
+    # Relationships
+    waitlist_entry = relationship("WaitlistEntry")
+
+class WaitlistWatermark(Base):
+    """How far a periodic waitlist job has processed, so each run resumes there."""
+    __tablename__ = "waitlist_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    processed_until = Column(DateTime, nullable=False)
+
 class BookingConflict(Base):
     __tablename__ = "booking_conflicts"
 
@@ -131,6 +150,45 @@ class StylistTimeOff(Base):
     stylist = relationship("Stylist", back_populates="time_off")
     approver = relationship("User", foreign_keys=[approved_by])
 
+class BookingSlotClaim(Base):
+    """One fixed-width time bucket held by an active booking.
+
+    The unique (stylist_id, slot_start) constraint makes overlapping bookings
+    for a stylist fail at insert time on databases without exclusion
+    constraints (see booking/slot_claims.py).
+    """
+    __tablename__ = "booking_slot_claims"
+    __table_args__ = (
+        UniqueConstraint("stylist_id", "slot_start", name="uq_booking_slot_claims_stylist_slot"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    booking_id = Column(String(36), ForeignKey("bookings.id", ondelete="CASCADE"), nullable=False, index=True)
+    stylist_id = Column(Integer, ForeignKey("stylists.id"), nullable=False)
+    slot_start = Column(DateTime, nullable=False)
+
+class StylistDaySheet(Base):
+    """Materialized view of one stylist's day over the rolling horizon.
+
+    Intervals are stored as [start_minute, end_minute] pairs relative to
+    midnight of ``day`` (see booking/day_sheets.py).
+    """
+    __tablename__ = "stylist_day_sheets"
+    __table_args__ = (
+        UniqueConstraint("stylist_id", "day", name="uq_stylist_day_sheets_stylist_day"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    stylist_id = Column(Integer, ForeignKey("stylists.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    open_intervals = Column(JSON, nullable=False)  # Working hours minus time off
+    busy_intervals = Column(JSON, nullable=False)  # Booked time within open hours
+    free_intervals = Column(JSON, nullable=False)
+    open_minutes = Column(Integer, nullable=False, default=0)
+    busy_minutes = Column(Integer, nullable=False, default=0)
+    utilization = Column(Float, nullable=False, default=0.0)
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 # Update existing relationships in User and Stylist models
 from users.models import User
 from stylists.models import Stylist
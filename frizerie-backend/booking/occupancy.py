@@ -0,0 +1,84 @@
+"""
+Per-stylist day occupancy bitmaps for multi-stylist slot search.
+
+Each stylist's day is a row of fixed-size buckets (5 minutes by default) in a
+NumPy matrix, so "does a slot of length D fit at t" is answered for every
+stylist at once with a prefix-sum sliding window instead of a Python loop.
+"""
+import numpy as np
+from datetime import datetime, timedelta, date
+from typing import List, Sequence, Tuple
+
+from booking.availability import Interval
+
+# Width of a single occupancy bucket
+RESOLUTION_MINUTES = 5
+BUCKETS_PER_DAY = 24 * 60 // RESOLUTION_MINUTES
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+def _mark_intervals(row: np.ndarray, intervals: Sequence[Interval], day_start: datetime) -> None:
+    """Set the buckets fully covered by the intervals to 1."""
+    for start, end in intervals:
+        start_minute = (start - day_start).total_seconds() / 60
+        end_minute = (end - day_start).total_seconds() / 60
+        first = int(np.ceil(start_minute / RESOLUTION_MINUTES))
+        last = int(np.floor(end_minute / RESOLUTION_MINUTES))
+        first = max(first, 0)
+        last = min(last, BUCKETS_PER_DAY)
+        if first < last:
+            row[first:last] = 1
+
+def build_day_bitmaps(free_intervals: Sequence[Sequence[Interval]], day: date) -> np.ndarray:
+    """Build a (rows x buckets) uint8 matrix where 1 means the row is free.
+
+    Each row is one stylist's free intervals for the day, typically the open
+    or free intervals served by ``availability.get_day_intervals``.
+    """
+    day_start, _ = _day_bounds(day)
+    bitmaps = np.zeros((len(free_intervals), BUCKETS_PER_DAY), dtype=np.uint8)
+
+    for row, intervals in enumerate(free_intervals):
+        _mark_intervals(bitmaps[row], intervals, day_start)
+
+    return bitmaps
+
+def fit_matrix(
+    bitmaps: np.ndarray,
+    day_start: datetime,
+    slot_starts: Sequence[datetime],
+    duration: timedelta
+) -> np.ndarray:
+    """Return a (stylists x slot_starts) boolean matrix of slots that fit entirely.
+
+    Uses prefix sums over each bitmap so every stylist/slot pair is checked
+    with one vectorized subtraction.
+    """
+    if not len(slot_starts):
+        return np.zeros((bitmaps.shape[0], 0), dtype=bool)
+
+    offsets = np.array(
+        [(start - day_start).total_seconds() / 60 for start in slot_starts]
+    )
+    first = np.floor(offsets / RESOLUTION_MINUTES).astype(np.int64)
+    last = np.ceil((offsets + duration.total_seconds() / 60) / RESOLUTION_MINUTES).astype(np.int64)
+    in_day = (first >= 0) & (last <= BUCKETS_PER_DAY)
+    first = np.clip(first, 0, BUCKETS_PER_DAY)
+    last = np.clip(last, 0, BUCKETS_PER_DAY)
+
+    prefix = np.zeros((bitmaps.shape[0], BUCKETS_PER_DAY + 1), dtype=np.int32)
+    np.cumsum(bitmaps, axis=1, out=prefix[:, 1:])
+    free_buckets = prefix[:, last] - prefix[:, first]
+
+    return (free_buckets == (last - first)) & in_day
+
+def slot_grid(range_start: datetime, range_end: datetime, step: timedelta) -> List[datetime]:
+    """Candidate slot starts on the ``range_start + k * step`` grid."""
+    starts = []
+    current = range_start
+    while current < range_end:
+        starts.append(current)
+        current += step
+    return starts
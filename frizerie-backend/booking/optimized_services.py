@@ -4,11 +4,11 @@ This replaces the mock implementation with proper database queries and validatio
 """
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, extract
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from dateutil.parser import parse
 
 from booking.models import (
     Booking, BookingStatus, StylistAvailability, StylistTimeOff,
@@ -19,12 +19,16 @@ from validation.schemas import (
     WaitlistEntryCreate, WaitlistEntryUpdate,
     StylistAvailabilityCreate, StylistTimeOffCreate,
     BookingSearchParams, BookingAvailabilityParams,
-    TimeSlotResponse
+    TimeSlotResponse, SlotHoldCreate
 )
 from users.models import User
 from stylists.models import Stylist
 from services.models import Service
 from notifications import services as notification_services
+from booking import availability, holds, schedule, slot_claims, slot_events, time_off_index
+
+# Granularity of candidate slot start times
+SLOT_INTERVAL_MINUTES = 30
 
 def get_stylist_availability(
     db: Session,
@@ -47,23 +51,11 @@ def check_stylist_time_off(
     start_time: datetime,
     end_time: datetime
 ) -> Optional[StylistTimeOff]:
-    """Check if stylist has approved time off during the given period."""
-    return db.query(StylistTimeOff).filter(
-        and_(
-            StylistTimeOff.stylist_id == stylist_id,
-            StylistTimeOff.is_approved == True,
-            or_(
-                and_(
-                    StylistTimeOff.start_date <= start_time,
-                    StylistTimeOff.end_date >= start_time
-                ),
-                and_(
-                    StylistTimeOff.start_date <= end_time,
-                    StylistTimeOff.end_date >= end_time
-                )
-            )
-        )
-    ).first()
+    """Check if stylist has approved time off overlapping the given period."""
+    period = time_off_index.get_index(db, stylist_id).find(start_time, end_time)
+    if period is None:
+        return None
+    return db.query(StylistTimeOff).filter(StylistTimeOff.id == period[2]).first()
 
 def get_existing_bookings(
     db: Session,
@@ -95,44 +87,18 @@ def validate_booking_time(
     stylist_id: int,
     start_time: datetime,
     end_time: datetime,
-    exclude_booking_id: Optional[str] = None
+    exclude_booking_id: Optional[str] = None,
+    exclude_hold_id: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """Validate if a booking can be made at the given time."""
     conflicts = []
     
-    # Check stylist availability
-    availability = get_stylist_availability(db, stylist_id, start_time)
-    if not availability:
-        conflicts.append({
-            "type": "stylist_unavailable",
-            "details": "Stylist is not available on this day"
-        })
-        return conflicts
-    
-    # Convert availability times to datetime for comparison
-    avail_start = parse(f"{start_time.strftime('%Y-%m-%d')} {availability.start_time}")
-    avail_end = parse(f"{start_time.strftime('%Y-%m-%d')} {availability.end_time}")
-    
-    # Check if booking is within stylist's available hours
-    if start_time < avail_start or end_time > avail_end:
-        conflicts.append({
-            "type": "outside_availability",
-            "details": f"Booking must be between {availability.start_time} and {availability.end_time}"
-        })
+    # Check working hours and breaks against the compiled weekly template
+    schedule_conflict = schedule.get_template(db, stylist_id).check(start_time, end_time)
+    if schedule_conflict:
+        conflicts.append(schedule_conflict)
         return conflicts
     
-    # Check for breaks
-    if availability.break_start and availability.break_end:
-        break_start = parse(f"{start_time.strftime('%Y-%m-%d')} {availability.break_start}")
-        break_end = parse(f"{start_time.strftime('%Y-%m-%d')} {availability.break_end}")
-        
-        if (start_time < break_end and end_time > break_start):
-            conflicts.append({
-                "type": "break_time",
-                "details": f"Booking overlaps with stylist's break time ({availability.break_start}-{availability.break_end})"
-            })
-            return conflicts
-    
     # Check for time off
     time_off = check_stylist_time_off(db, stylist_id, start_time, end_time)
     if time_off:
@@ -142,6 +108,18 @@ def validate_booking_time(
         })
         return conflicts
     
+    # Check for slots held by other customers during checkout
+    held = [
+        hold for hold in holds.active_holds([stylist_id], start_time, end_time)
+        if hold.id != exclude_hold_id
+    ]
+    if held:
+        conflicts.append({
+            "type": "slot_held",
+            "details": f"Slot is held until {held[0].expires_at.isoformat()}"
+        })
+        return conflicts
+    
     # Check for existing bookings
     existing_bookings = get_existing_bookings(db, stylist_id, start_time, end_time, exclude_booking_id)
     if existing_bookings:
@@ -181,66 +159,178 @@ def get_available_slots(
     else:
         stylists = db.query(Stylist).all()
     
+    stylist_ids = [stylist.id for stylist in stylists]
+    slot_length = timedelta(minutes=duration)
+    step = timedelta(minutes=SLOT_INTERVAL_MINUTES)
+    # Slots may start right up to end_date, so cover the tail as well
+    range_end = params.end_date + slot_length
+    intervals = availability.get_range_intervals(db, stylist_ids, params.start_date, range_end)
+    
+    candidates = []
+    for order, stylist_id in enumerate(stylist_ids):
+        # Open windows are working hours minus time off; slots blocked only by
+        # bookings are still reported, together with their conflicts
+        open_windows, free_windows = intervals[stylist_id]
+        for slot_start in availability.iter_slot_starts(open_windows, slot_length, step, params.start_date):
+            if slot_start >= params.end_date:
+                break
+            slot_end = slot_start + slot_length
+            is_available = availability.contains_slot(free_windows, slot_start, slot_end)
+            candidates.append((slot_start, order, stylist_id, slot_end, is_available))
+    
+    # Conflicts are only needed for blocked slots, so load them in one query on demand
+    blocked = [candidate for candidate in candidates if not candidate[4]]
+    bookings = availability.load_bookings(
+        db,
+        sorted({candidate[2] for candidate in blocked}),
+        min(candidate[0] for candidate in blocked),
+        max(candidate[3] for candidate in blocked)
+    ) if blocked else {}
+    
     available_slots = []
-    current_time = params.start_date
-    
-    while current_time < params.end_date:
-        for stylist in stylists:
-            # Skip if stylist is not available for this day
-            availability = get_stylist_availability(db, stylist.id, current_time)
-            if not availability:
-                continue
-            
-            # Convert availability times to datetime
-            avail_start = parse(f"{current_time.strftime('%Y-%m-%d')} {availability.start_time}")
-            avail_end = parse(f"{current_time.strftime('%Y-%m-%d')} {availability.end_time}")
-            
-            # Skip if current time is outside availability
-            if current_time < avail_start or current_time + timedelta(minutes=duration) > avail_end:
-                continue
-            
-            # Check for breaks
-            if availability.break_start and availability.break_end:
-                break_start = parse(f"{current_time.strftime('%Y-%m-%d')} {availability.break_start}")
-                break_end = parse(f"{current_time.strftime('%Y-%m-%d')} {availability.break_end}")
-                
-                if (current_time < break_end and current_time + timedelta(minutes=duration) > break_start):
-                    continue
-            
-            # Check for time off
-            if check_stylist_time_off(db, stylist.id, current_time, current_time + timedelta(minutes=duration)):
-                continue
-            
-            # Check for existing bookings
-            conflicts = validate_booking_time(
-                db,
-                stylist.id,
-                current_time,
-                current_time + timedelta(minutes=duration)
-            )
-            
-            slot = TimeSlotResponse(
-                start_time=current_time,
-                end_time=current_time + timedelta(minutes=duration),
-                stylist_id=stylist.id,
-                is_available=len(conflicts) == 0,
-                conflicting_bookings=[
-                    BookingResponse.from_orm(booking)
-                    for conflict in conflicts
-                    if conflict["type"] == "double_booking"
-                    for booking in [db.query(Booking).filter(
-                        Booking.id == conflict["details"]["booking_id"]
-                    ).first()]
-                    if booking
-                ] if conflicts else None
+    for slot_start, order, stylist_id, slot_end, is_available in candidates:
+        conflicting = [] if is_available else [
+            booking for booking in bookings.get(stylist_id, [])
+            if booking.start_time < slot_end and booking.end_time > slot_start
+        ]
+        available_slots.append((slot_start, order, TimeSlotResponse(
+            start_time=slot_start,
+            end_time=slot_end,
+            stylist_id=stylist_id,
+            is_available=is_available,
+            conflicting_bookings=[
+                BookingResponse.from_orm(booking) for booking in conflicting
+            ] if conflicting else None
+        )))
+    
+    # Preserve the time-major, stylist-minor ordering of the response
+    available_slots.sort(key=lambda item: (item[0], item[1]))
+    return [slot for _, _, slot in available_slots]
+
+def get_earliest_slots(
+    db: Session,
+    service_id: int,
+    start_time: Optional[datetime] = None,
+    stylist_ids: Optional[List[int]] = None,
+    count: int = 5,
+    horizon_days: int = 60
+) -> List[TimeSlotResponse]:
+    """Get the next available slots for a service across all or selected stylists."""
+    service = db.query(Service).filter(Service.id == service_id).first()
+    if not service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Service not found"
+        )
+    
+    query = db.query(Stylist.id)
+    if stylist_ids:
+        query = query.filter(Stylist.id.in_(stylist_ids))
+    candidate_ids = [row.id for row in query.order_by(Stylist.id).all()]
+    if stylist_ids and not candidate_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stylist not found"
+        )
+    
+    # Slots are naive UTC, so an offset on the request is converted before comparing with now
+    now = datetime.utcnow()
+    if start_time and start_time.tzinfo:
+        start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    slot_length = timedelta(minutes=service.duration_minutes)
+    found = availability.earliest_slots(
+        db,
+        candidate_ids,
+        max(start_time or now, now),
+        slot_length,
+        count,
+        timedelta(minutes=SLOT_INTERVAL_MINUTES),
+        horizon_days=horizon_days
+    )
+    
+    return [
+        TimeSlotResponse(
+            start_time=slot_start,
+            end_time=slot_start + slot_length,
+            stylist_id=stylist_id,
+            is_available=True
+        )
+        for slot_start, stylist_id in found
+    ]
+
+# Slot Holds
+def create_slot_hold(
+    db: Session,
+    hold_data: SlotHoldCreate,
+    user_id: int
+) -> holds.SlotHold:
+    """Hold a slot for the user while they complete checkout."""
+    service = db.query(Service).filter(Service.id == hold_data.service_id).first()
+    if not service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Service not found"
+        )
+    
+    end_time = hold_data.start_time + timedelta(minutes=service.duration_minutes)
+    conflicts = validate_booking_time(db, hold_data.stylist_id, hold_data.start_time, end_time)
+    if conflicts:
+        conflict = conflicts[0]
+        if conflict["type"] in ("double_booking", "slot_held"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The selected time slot is not available"
             )
-            
-            available_slots.append(slot)
-        
-        # Move to next time slot (30-minute intervals)
-        current_time += timedelta(minutes=30)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=conflict["details"]
+        )
     
-    return available_slots
+    hold = holds.new_hold(user_id, hold_data.stylist_id, hold_data.start_time, end_time)
+    # The store re-checks overlap atomically, so two concurrent holds cannot both win
+    if not holds.get_store().add(hold):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The selected time slot is not available"
+        )
+    return hold
+
+def release_slot_hold(hold_id: str, user_id: int) -> None:
+    """Release a hold before it expires, e.g. when checkout is abandoned."""
+    hold = holds.get_store().get(hold_id)
+    if not hold:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Slot hold not found or expired"
+        )
+    if hold.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to release this hold"
+        )
+    holds.get_store().delete(hold_id)
+
+def get_consumable_hold(
+    hold_id: str,
+    user_id: int,
+    stylist_id: int,
+    start_time: datetime,
+    end_time: datetime
+) -> holds.SlotHold:
+    """Return the user's live hold if it covers the booking being created."""
+    hold = holds.get_store().get(hold_id)
+    if not hold or hold.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Slot hold not found or expired"
+        )
+    if hold.stylist_id != stylist_id or start_time < hold.start_time or end_time > hold.end_time:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Slot hold does not match this booking"
+        )
+    return hold
 
 def create_booking(
     db: Session,
@@ -258,17 +348,22 @@ def create_booking(
     
     end_time = booking_data.start_time + timedelta(minutes=service.duration_minutes)
     
+    # A hold taken during checkout must still be live and cover this booking
+    if booking_data.hold_id:
+        get_consumable_hold(booking_data.hold_id, user_id, booking_data.stylist_id, booking_data.start_time, end_time)
+    
     # Validate booking time
     conflicts = validate_booking_time(
         db,
         booking_data.stylist_id,
         booking_data.start_time,
-        end_time
+        end_time,
+        exclude_hold_id=booking_data.hold_id
     )
     
     if conflicts:
         conflict = conflicts[0]
-        if conflict["type"] == "double_booking":
+        if conflict["type"] in ("double_booking", "slot_held"):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="The selected time slot is already booked"
@@ -293,26 +388,40 @@ def create_booking(
     
     try:
         db.add(booking)
+        slot_claims.claim(db, [booking])
         db.commit()
         db.refresh(booking)
-        
-        # Create notification for the booking
-        notification_services.create_notification(
-            db=db,
-            user_id=user_id,
-            type="BOOKING_CONFIRMED",
-            title="Booking Confirmed",
-            message=f"Your booking for {service.name} has been confirmed for {booking_data.start_time.strftime('%Y-%m-%d %H:%M')}",
-            data={"booking_id": booking.id}
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise slot_claims.overlap_exception()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create booking"
         )
-        
-        return booking
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create booking"
         )
+    
+    # The booking is committed; nothing below may report it as failed
+    slot_events.after_write(db, [(booking.stylist_id, booking.start_time, booking.end_time)])
+    if booking_data.hold_id:
+        holds.discard(booking_data.hold_id)
+    
+    # Create notification for the booking
+    notification_services.create_notification(
+        db=db,
+        user_id=user_id,
+        type="BOOKING_CONFIRMED",
+        title="Booking Confirmed",
+        message=f"Your booking for {service.name} has been confirmed for {booking_data.start_time.strftime('%Y-%m-%d %H:%M')}",
+        data={"booking_id": booking.id}
+    )
+    
+    return booking
 
 def update_booking(
     db: Session,
@@ -335,6 +444,8 @@ def update_booking(
             detail="Not authorized to update this booking"
         )
     
+    previous_slot = (booking.stylist_id, booking.start_time, booking.end_time)
+    
     # If updating time, validate the new time slot
     if booking_data.start_time:
         service = db.query(Service).filter(Service.id == booking.service_id).first()
@@ -350,7 +461,7 @@ def update_booking(
         
         if conflicts:
             conflict = conflicts[0]
-            if conflict["type"] == "double_booking":
+            if conflict["type"] in ("double_booking", "slot_held"):
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
                     detail="The selected time slot is already booked"
@@ -369,26 +480,43 @@ def update_booking(
         booking.notes = booking_data.notes
     
     try:
+        slot_claims.sync(db, [booking])
         db.commit()
         db.refresh(booking)
-        
-        # Create notification for the update
-        notification_services.create_notification(
-            db=db,
-            user_id=user_id,
-            type="BOOKING_UPDATED",
-            title="Booking Updated",
-            message=f"Your booking has been updated to {booking.start_time.strftime('%Y-%m-%d %H:%M')}",
-            data={"booking_id": booking.id}
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise slot_claims.overlap_exception()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update booking"
         )
-        
-        return booking
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update booking"
         )
+    
+    # The update is committed; nothing below may report it as failed
+    current_slot = (booking.stylist_id, booking.start_time, booking.end_time)
+    slot_events.after_write(
+        db,
+        [previous_slot, current_slot],
+        freed=[previous_slot] if previous_slot != current_slot else []
+    )
+    
+    # Create notification for the update
+    notification_services.create_notification(
+        db=db,
+        user_id=user_id,
+        type="BOOKING_UPDATED",
+        title="Booking Updated",
+        message=f"Your booking has been updated to {booking.start_time.strftime('%Y-%m-%d %H:%M')}",
+        data={"booking_id": booking.id}
+    )
+    
+    return booking
 
 def cancel_booking(
     db: Session,
@@ -420,23 +548,28 @@ def cancel_booking(
     booking.status = BookingStatus.CANCELLED
     
     try:
+        slot_claims.release(db, [booking.id])
         db.commit()
         db.refresh(booking)
-        
-        # Create notification for the cancellation
-        notification_services.create_notification(
-            db=db,
-            user_id=user_id,
-            type="BOOKING_CANCELLED",
-            title="Booking Cancelled",
-            message="Your booking has been cancelled",
-            data={"booking_id": booking.id}
-        )
-        
-        return booking
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to cancel booking"
-        ) 
\ No newline at end of file
+        )
+    
+    # The cancellation is committed; nothing below may report it as failed
+    freed_slot = (booking.stylist_id, booking.start_time, booking.end_time)
+    slot_events.after_write(db, [freed_slot], freed=[freed_slot])
+    
+    # Create notification for the cancellation
+    notification_services.create_notification(
+        db=db,
+        user_id=user_id,
+        type="BOOKING_CANCELLED",
+        title="Booking Cancelled",
+        message="Your booking has been cancelled",
+        data={"booking_id": booking.id}
+    )
+    
+    return booking 
\ No newline at end of file
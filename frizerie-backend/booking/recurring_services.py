@@ -1,170 +1,173 @@
 """
 Recurring booking services for handling series of recurring appointments.
+
+A series is its parent booking, which carries the recurrence settings, plus
+the child bookings that point at it through ``parent_booking_id``; the
+parent's id identifies the series.
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from dateutil.rrule import rrule, WEEKLY, MONTHLY
-from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
 
-from booking.models import (
-    Booking, BookingStatus, StylistAvailability,
-    RecurringBooking, RecurringBookingStatus
-)
-from validation.schemas import (
-    RecurringBookingCreate, RecurringBookingUpdate,
-    RecurringBookingResponse, BookingResponse
-)
-from users.models import User
+from booking.models import Booking, BookingStatus, RecurrenceType
+from validation.schemas import RecurringBookingCreate
 from services.models import Service
-from notifications import services as notification_services
-from booking import optimized_services as booking_services
+from stylists.models import Stylist
+from booking import availability, slot_claims, slot_events
+
+# rrule frequency and interval per recurrence type; CUSTOM reads both from the pattern
+RECURRENCE_RULES = {
+    RecurrenceType.DAILY: (DAILY, 1),
+    RecurrenceType.WEEKLY: (WEEKLY, 1),
+    RecurrenceType.BIWEEKLY: (WEEKLY, 2),
+    RecurrenceType.MONTHLY: (MONTHLY, 1)
+}
+CUSTOM_FREQUENCIES = {"daily": DAILY, "weekly": WEEKLY, "monthly": MONTHLY}
+
+def _occurrence_starts(booking_data: RecurringBookingCreate) -> List[datetime]:
+    """Start times of every occurrence in the series, the first one included."""
+    if booking_data.recurrence_type in RECURRENCE_RULES:
+        freq, interval = RECURRENCE_RULES[booking_data.recurrence_type]
+    elif booking_data.recurrence_type == RecurrenceType.CUSTOM:
+        pattern = booking_data.recurrence_pattern or {}
+        freq = CUSTOM_FREQUENCIES.get(str(pattern.get("frequency", "")).lower())
+        interval = pattern.get("interval", 1)
+        if freq is None or not isinstance(interval, int) or interval < 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Custom recurrence needs a daily, weekly or monthly frequency and a positive interval"
+            )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid recurrence type"
+        )
+
+    return list(rrule(
+        freq,
+        dtstart=booking_data.base_booking.start_time,
+        until=booking_data.recurrence_end_date,
+        interval=interval
+    ))
 
 def create_recurring_bookings(
     db: Session,
     booking_data: RecurringBookingCreate,
     user_id: int
-) -> Tuple[Booking, List[Booking]]:
-    """Create a series of recurring bookings."""
-    # Validate service exists
-    service = db.query(Service).filter(Service.id == booking_data.service_id).first()
+) -> Tuple[Booking, List[Booking], List[Dict[str, Any]]]:
+    """Create a series of recurring bookings.
+
+    Returns the parent booking, the created child bookings and the dates that
+    were skipped together with the conflict that caused each skip. The first
+    occurrence is the parent, so a conflict there rejects the whole series.
+    """
+    base_booking = booking_data.base_booking
+    service = db.query(Service).filter(Service.id == base_booking.service_id).first()
     if not service:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Service not found"
         )
-    
-    # Validate stylist if specified
-    if booking_data.stylist_id:
-        stylist = db.query(User).filter(
-            and_(
-                User.id == booking_data.stylist_id,
-                User.is_stylist == True
-            )
-        ).first()
-        if not stylist:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Stylist not found"
-            )
-    
-    # Calculate all booking dates
-    if booking_data.recurrence_type == "WEEKLY":
-        dates = list(rrule(
-            WEEKLY,
-            dtstart=booking_data.start_date,
-            until=booking_data.end_date,
-            interval=booking_data.recurrence_interval
-        ))
-    elif booking_data.recurrence_type == "MONTHLY":
-        dates = list(rrule(
-            MONTHLY,
-            dtstart=booking_data.start_date,
-            until=booking_data.end_date,
-            interval=booking_data.recurrence_interval
-        ))
-    else:
+    if not db.query(Stylist.id).filter(Stylist.id == base_booking.stylist_id).first():
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid recurrence type"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stylist not found"
         )
-    
-    if not dates:
+
+    starts = _occurrence_starts(booking_data)
+    if not starts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No valid dates found for the recurrence pattern"
         )
-    
-    # Create parent booking
+
+    # Validate every occurrence against one snapshot of the full series span
+    duration = base_booking.end_time - base_booking.start_time
+    if duration <= timedelta(0):
+        duration = timedelta(minutes=service.duration_minutes)
+    occurrences = [(start_time, start_time + duration) for start_time in starts]
+    snapshot = availability.load_snapshot(
+        db,
+        [base_booking.stylist_id],
+        occurrences[0][0],
+        occurrences[-1][1]
+    )
+    conflicts = availability.validate_intervals(snapshot, base_booking.stylist_id, occurrences)
+    if conflicts[0]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=conflicts[0]["details"]
+        )
+
+    now = datetime.utcnow()
     parent_booking = Booking(
         id=str(uuid.uuid4()),
         user_id=user_id,
-        stylist_id=booking_data.stylist_id,
-        service_id=booking_data.service_id,
-        start_time=booking_data.start_date,
-        end_time=booking_data.start_date + timedelta(minutes=service.duration_minutes),
+        stylist_id=base_booking.stylist_id,
+        service_id=base_booking.service_id,
+        start_time=occurrences[0][0],
+        end_time=occurrences[0][1],
         status=BookingStatus.CONFIRMED,
-        notes=booking_data.notes,
-        is_recurring=True
-    )
-    
-    # Create recurring booking record
-    recurring_booking = RecurringBooking(
-        id=str(uuid.uuid4()),
-        parent_booking_id=parent_booking.id,
+        notes=base_booking.notes,
         recurrence_type=booking_data.recurrence_type,
-        recurrence_interval=booking_data.recurrence_interval,
-        start_date=booking_data.start_date,
-        end_date=booking_data.end_date,
-        status=RecurringBookingStatus.ACTIVE
+        recurrence_end_date=booking_data.recurrence_end_date,
+        recurrence_pattern=booking_data.recurrence_pattern,
+        last_modified_by=user_id
     )
-    
-    # Create child bookings
+
     child_bookings = []
-    for date in dates[1:]:  # Skip first date as it's the parent booking
-        # Calculate booking time
-        booking_time = datetime.combine(
-            date.date(),
-            booking_data.start_date.time()
-        )
-        
-        # Validate booking time
-        conflicts = booking_services.validate_booking_time(
-            db,
-            booking_data.stylist_id,
-            booking_time,
-            booking_time + timedelta(minutes=service.duration_minutes)
-        )
-        
-        if conflicts:
-            # Skip this date if there's a conflict
+    skipped_dates = []
+    for (start_time, end_time), conflict in zip(occurrences[1:], conflicts[1:]):
+        if conflict:
+            # Skip this date if there's a conflict, but report why
+            skipped_dates.append({
+                "date": start_time,
+                "reason": conflict["type"],
+                "details": conflict["details"]
+            })
             continue
-        
-        # Create child booking
-        child_booking = Booking(
+
+        child_bookings.append(Booking(
             id=str(uuid.uuid4()),
             user_id=user_id,
-            stylist_id=booking_data.stylist_id,
-            service_id=booking_data.service_id,
-            start_time=booking_time,
-            end_time=booking_time + timedelta(minutes=service.duration_minutes),
+            stylist_id=base_booking.stylist_id,
+            service_id=base_booking.service_id,
+            start_time=start_time,
+            end_time=end_time,
             status=BookingStatus.CONFIRMED,
-            notes=booking_data.notes,
-            is_recurring=True,
-            parent_booking_id=parent_booking.id
-        )
-        child_bookings.append(child_booking)
-    
+            notes=base_booking.notes,
+            recurrence_type=booking_data.recurrence_type,
+            recurrence_end_date=booking_data.recurrence_end_date,
+            parent_booking_id=parent_booking.id,
+            last_modified_by=user_id,
+            # Bulk inserts skip refreshes, so fill server-side defaults up front
+            created_at=now,
+            updated_at=now,
+            reminder_sent=False,
+            no_show_count=0
+        ))
+
     try:
-        # Save all bookings
+        # Children go in one executemany without refreshes
         db.add(parent_booking)
-        db.add(recurring_booking)
-        for booking in child_bookings:
-            db.add(booking)
-        
+        db.flush()
+        db.bulk_save_objects(child_bookings)
+        slot_claims.claim(db, [parent_booking] + child_bookings)
         db.commit()
         db.refresh(parent_booking)
-        for booking in child_bookings:
-            db.refresh(booking)
-        
-        # Create notification for the recurring booking series
-        notification_services.create_notification(
-            db=db,
-            user_id=user_id,
-            type="RECURRING_BOOKING_CREATED",
-            title="Recurring Bookings Created",
-            message=f"Your recurring bookings for {service.name} have been created",
-            data={
-                "parent_booking_id": parent_booking.id,
-                "recurring_booking_id": recurring_booking.id,
-                "total_bookings": len(child_bookings) + 1
-            }
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise slot_claims.overlap_exception()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create recurring bookings"
         )
-        
-        return parent_booking, child_bookings
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -172,166 +175,111 @@ def create_recurring_bookings(
             detail="Failed to create recurring bookings"
         )
 
-def update_recurring_bookings(
-    db: Session,
-    recurring_booking_id: str,
-    booking_data: RecurringBookingUpdate,
-    user_id: int
-) -> Tuple[Booking, List[Booking]]:
-    """Update a series of recurring bookings."""
-    # Get recurring booking record
-    recurring_booking = db.query(RecurringBooking).filter(
-        RecurringBooking.id == recurring_booking_id
-    ).first()
-    
-    if not recurring_booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Recurring booking not found"
-        )
-    
-    # Get parent booking
+    slot_events.after_write(db, [
+        (booking.stylist_id, booking.start_time, booking.end_time)
+        for booking in [parent_booking] + child_bookings
+    ])
+    return parent_booking, child_bookings, skipped_dates
+
+def _get_series(db: Session, parent_booking_id: str, user_id: int) -> Tuple[Booking, List[Booking]]:
+    """The user's series parent and its children in start order."""
     parent_booking = db.query(Booking).filter(
-        Booking.id == recurring_booking.parent_booking_id
+        and_(
+            Booking.id == parent_booking_id,
+            Booking.parent_booking_id.is_(None),
+            Booking.recurrence_type != RecurrenceType.NONE
+        )
     ).first()
-    
     if not parent_booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Parent booking not found"
+            detail="Recurring booking not found"
         )
-    
-    # Check if user has permission to update the bookings
     if parent_booking.user_id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to update these bookings"
+            detail="Not authorized to access these bookings"
         )
-    
-    # Get all child bookings
+
     child_bookings = db.query(Booking).filter(
-        and_(
-            Booking.parent_booking_id == parent_booking.id,
-            Booking.id != parent_booking.id
-        )
-    ).all()
-    
-    # Cancel all future bookings
+        Booking.parent_booking_id == parent_booking.id
+    ).order_by(Booking.start_time).all()
+    return parent_booking, child_bookings
+
+def _cancel(db: Session, bookings: List[Booking], user_id: int, reason: str) -> List[Booking]:
+    """Mark the active bookings cancelled and release their slots in the current transaction."""
+    now = datetime.utcnow()
+    cancelled = [booking for booking in bookings if booking.status != BookingStatus.CANCELLED]
+    for booking in cancelled:
+        booking.status = BookingStatus.CANCELLED
+        booking.cancellation_reason = reason
+        booking.cancellation_time = now
+        booking.last_modified_by = user_id
+    slot_claims.release(db, [booking.id for booking in cancelled])
+    # The replacement series validates against the database, which must not see these as active
+    db.flush()
+    return cancelled
+
+def update_recurring_bookings(
+    db: Session,
+    parent_booking_id: str,
+    booking_data: RecurringBookingCreate,
+    user_id: int
+) -> Tuple[Booking, List[Booking], List[Dict[str, Any]]]:
+    """Replace the future occurrences of a series with a new series.
+
+    The cancellation and the new series commit together, so a new series
+    that cannot be created leaves the old one untouched.
+    """
+    parent_booking, child_bookings = _get_series(db, parent_booking_id, user_id)
+
     current_time = datetime.utcnow()
-    for booking in [parent_booking] + child_bookings:
-        if booking.start_time > current_time:
-            booking.status = BookingStatus.CANCELLED
-    
-    # Create new recurring booking series
-    new_parent, new_children = create_recurring_bookings(
+    cancelled = _cancel(
         db,
-        RecurringBookingCreate(
-            service_id=parent_booking.service_id,
-            stylist_id=parent_booking.stylist_id,
-            start_date=booking_data.start_date or parent_booking.start_time,
-            end_date=booking_data.end_date or recurring_booking.end_date,
-            recurrence_type=booking_data.recurrence_type or recurring_booking.recurrence_type,
-            recurrence_interval=booking_data.recurrence_interval or recurring_booking.recurrence_interval,
-            notes=booking_data.notes or parent_booking.notes
-        ),
-        user_id
+        [booking for booking in [parent_booking] + child_bookings if booking.start_time > current_time],
+        user_id,
+        "Recurring series updated"
     )
-    
-    # Update recurring booking record
-    recurring_booking.status = RecurringBookingStatus.UPDATED
-    recurring_booking.updated_at = datetime.utcnow()
-    
+    freed_slots = [(booking.stylist_id, booking.start_time, booking.end_time) for booking in cancelled]
+
+    # Commits the cancellation with the new series, or rolls both back
     try:
-        db.commit()
-        db.refresh(new_parent)
-        for booking in new_children:
-            db.refresh(booking)
-        
-        return new_parent, new_children
-    except Exception as e:
+        new_parent, new_children, skipped_dates = create_recurring_bookings(db, booking_data, user_id)
+    except HTTPException:
         db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update recurring bookings"
-        )
+        raise
+
+    new_slots = {
+        (booking.stylist_id, booking.start_time, booking.end_time) for booking in [new_parent] + new_children
+    }
+    slot_events.after_write(
+        db,
+        freed_slots,
+        freed=[slot for slot in freed_slots if slot not in new_slots]
+    )
+    return new_parent, new_children, skipped_dates
 
 def cancel_recurring_bookings(
     db: Session,
-    recurring_booking_id: str,
+    parent_booking_id: str,
     user_id: int,
     cancel_future_only: bool = True
 ) -> Tuple[Booking, List[Booking]]:
-    """Cancel a series of recurring bookings."""
-    # Get recurring booking record
-    recurring_booking = db.query(RecurringBooking).filter(
-        RecurringBooking.id == recurring_booking_id
-    ).first()
-    
-    if not recurring_booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Recurring booking not found"
-        )
-    
-    # Get parent booking
-    parent_booking = db.query(Booking).filter(
-        Booking.id == recurring_booking.parent_booking_id
-    ).first()
-    
-    if not parent_booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Parent booking not found"
-        )
-    
-    # Check if user has permission to cancel the bookings
-    if parent_booking.user_id != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to cancel these bookings"
-        )
-    
-    # Get all child bookings
-    child_bookings = db.query(Booking).filter(
-        and_(
-            Booking.parent_booking_id == parent_booking.id,
-            Booking.id != parent_booking.id
-        )
-    ).all()
-    
-    # Cancel bookings
+    """Cancel a series, or only its future occurrences; returns the parent and the cancelled bookings."""
+    parent_booking, child_bookings = _get_series(db, parent_booking_id, user_id)
+
     current_time = datetime.utcnow()
-    cancelled_bookings = []
-    
-    for booking in [parent_booking] + child_bookings:
-        if not cancel_future_only or booking.start_time > current_time:
-            booking.status = BookingStatus.CANCELLED
-            cancelled_bookings.append(booking)
-    
-    # Update recurring booking record
-    recurring_booking.status = RecurringBookingStatus.CANCELLED
-    recurring_booking.updated_at = datetime.utcnow()
-    
     try:
-        db.commit()
-        for booking in cancelled_bookings:
-            db.refresh(booking)
-        
-        # Create notification for the cancellation
-        notification_services.create_notification(
-            db=db,
-            user_id=user_id,
-            type="RECURRING_BOOKING_CANCELLED",
-            title="Recurring Bookings Cancelled",
-            message="Your recurring bookings have been cancelled",
-            data={
-                "parent_booking_id": parent_booking.id,
-                "recurring_booking_id": recurring_booking.id,
-                "cancelled_count": len(cancelled_bookings)
-            }
+        cancelled = _cancel(
+            db,
+            [
+                booking for booking in [parent_booking] + child_bookings
+                if not cancel_future_only or booking.start_time > current_time
+            ],
+            user_id,
+            "Recurring series cancelled"
         )
-        
-        return parent_booking, child_bookings
+        db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -339,70 +287,39 @@ def cancel_recurring_bookings(
             detail="Failed to cancel recurring bookings"
         )
 
+    freed_slots = [(booking.stylist_id, booking.start_time, booking.end_time) for booking in cancelled]
+    slot_events.after_write(db, freed_slots, freed=freed_slots)
+    return parent_booking, cancelled
+
 def get_recurring_bookings(
     db: Session,
     user_id: Optional[int] = None,
-    status: Optional[str] = None,
+    status: Optional[BookingStatus] = None,
     skip: int = 0,
     limit: int = 100
-) -> List[RecurringBooking]:
-    """Get recurring bookings with optional filtering."""
-    query = db.query(RecurringBooking).join(
-        Booking,
-        Booking.id == RecurringBooking.parent_booking_id
+) -> List[Booking]:
+    """Get series parents with optional filtering."""
+    query = db.query(Booking).filter(
+        and_(
+            Booking.parent_booking_id.is_(None),
+            Booking.recurrence_type != RecurrenceType.NONE
+        )
     )
-    
+
     if user_id:
         query = query.filter(Booking.user_id == user_id)
-    
+
     if status:
-        query = query.filter(RecurringBooking.status == status)
-    
+        query = query.filter(Booking.status == status)
+
     return query.order_by(
-        RecurringBooking.created_at.desc()
+        Booking.created_at.desc()
     ).offset(skip).limit(limit).all()
 
 def get_recurring_booking_details(
     db: Session,
-    recurring_booking_id: str,
+    parent_booking_id: str,
     user_id: int
-) -> Tuple[RecurringBooking, Booking, List[Booking]]:
-    """Get detailed information about a recurring booking series."""
-    # Get recurring booking record
-    recurring_booking = db.query(RecurringBooking).filter(
-        RecurringBooking.id == recurring_booking_id
-    ).first()
-    
-    if not recurring_booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Recurring booking not found"
-        )
-    
-    # Get parent booking
-    parent_booking = db.query(Booking).filter(
-        Booking.id == recurring_booking.parent_booking_id
-    ).first()
-    
-    if not parent_booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Parent booking not found"
-        )
-    
-    # Check if user has permission to view the bookings
-    if parent_booking.user_id != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to view these bookings"
-        )
-    
-    # Get all child bookings
-    child_bookings = db.query(Booking).filter(
-        and_(
-            Booking.parent_booking_id == parent_booking.id,
-            Booking.id != parent_booking.id
-        )
-    ).order_by(Booking.start_time).all()
-    
-    return recurring_booking, parent_booking, child_bookings 
\ No newline at end of file
+) -> Tuple[Booking, List[Booking]]:
+    """Get a series parent and its child bookings."""
+    return _get_series(db, parent_booking_id, user_id)
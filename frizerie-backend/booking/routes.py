@@ -1,7 +1,7 @@
 """
 Booking routes using the optimized booking services.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -11,6 +11,8 @@ from auth.dependencies import get_current_user, get_current_stylist, get_current
 from users.models import User
 from stylists.models import Stylist
 from booking import optimized_services as booking_services
+from booking import recurring_services
+from utils import loaders, pagination
 from validation.schemas import (
     BookingCreate, BookingUpdate, BookingResponse,
     WaitlistEntryCreate, WaitlistEntryUpdate, WaitlistEntryResponse,
@@ -40,22 +42,29 @@ async def create_recurring_bookings(
     current_user: User = Depends(get_current_user)
 ):
     """Create a series of recurring bookings."""
-    bookings = booking_services.create_recurring_bookings(db, booking_data, current_user.id)
+    parent_booking, recurring_bookings, skipped_dates = recurring_services.create_recurring_bookings(
+        db, booking_data, current_user.id
+    )
     return RecurringBookingResponse(
-        parent_booking=bookings[0],
-        recurring_bookings=bookings[1:]
+        parent_booking=parent_booking,
+        recurring_bookings=recurring_bookings,
+        skipped_dates=skipped_dates
     )
 
 @router.get("", response_model=List[BookingResponse])
 async def search_bookings(
     params: BookingSearchParams,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Search bookings with various filters."""
-    return booking_services.search_bookings(db, params, skip, limit)
+    bookings = booking_services.search_bookings(db, params, skip, limit, cursor)
+    pagination.set_page_headers(response, bookings, limit, "start_time")
+    return bookings
 
 @router.get("/available-slots", response_model=List[TimeSlotResponse])
 async def get_available_slots(
@@ -66,6 +75,21 @@ async def get_available_slots(
     """Get available time slots for a service and optional stylist."""
     return booking_services.get_available_slots(db, params)
 
+@router.get("/available-slots/earliest", response_model=List[TimeSlotResponse])
+async def get_earliest_slots(
+    service_id: int,
+    start_time: Optional[datetime] = None,
+    stylist_ids: Optional[List[int]] = Query(None),
+    count: int = Query(5, ge=1, le=50),
+    horizon_days: int = Query(60, ge=1, le=365),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the next available slots for a service across stylists."""
+    return booking_services.get_earliest_slots(
+        db, service_id, start_time, stylist_ids, count, horizon_days
+    )
+
 @router.get("/{booking_id}", response_model=BookingResponse)
 async def get_booking(
     booking_id: str,
@@ -207,38 +231,48 @@ async def request_time_off(
 
 @router.get("/stylist/me", response_model=List[BookingResponse])
 async def get_my_stylist_bookings(
+    response: Response,
     include_past: bool = False,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_stylist: Stylist = Depends(get_current_stylist)
 ):
     """Get all bookings for the current stylist."""
-    return booking_services.get_stylist_bookings(
+    bookings = booking_services.get_stylist_bookings(
         db,
         current_stylist.id,
         include_past,
         skip,
-        limit
+        limit,
+        cursor
     )
+    pagination.set_page_headers(response, bookings, limit, "start_time")
+    return bookings
 
 # User-specific Routes
 @router.get("/user/me", response_model=List[BookingResponse])
 async def get_my_bookings(
+    response: Response,
     include_past: bool = False,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all bookings for the current user."""
-    return booking_services.get_user_bookings(
+    bookings = booking_services.get_user_bookings(
         db,
         current_user.id,
         include_past,
         skip,
-        limit
+        limit,
+        cursor
     )
+    pagination.set_page_headers(response, bookings, limit, "start_time")
+    return bookings
 
 # Admin Routes
 @router.get("/admin/all", response_model=List[BookingResponse])
@@ -259,7 +293,7 @@ async def get_all_waitlist_entries(
     current_user: User = Depends(get_current_admin_user)
 ):
     """Get all waitlist entries (admin only)."""
-    return db.query(WaitlistEntry).order_by(
+    return loaders.with_profile(db.query(WaitlistEntry), "waitlist_entry_response").order_by(
         WaitlistEntry.created_at.desc()
     ).offset(skip).limit(limit).all()
 
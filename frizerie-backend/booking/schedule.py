@@ -0,0 +1,193 @@
+"""
+Compiled weekly schedule templates.
+
+``StylistAvailability`` stores hours as "HH:MM" strings. Parsing those inside
+slot loops dominated availability checks, so each stylist's rows are compiled
+once into a ``WeeklyTemplate`` of minute-of-day integers and shared by slot
+search, booking validation and waitlist matching.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from booking.models import StylistAvailability
+from booking import availability_cache
+
+Interval = Tuple[datetime, datetime]
+
+def minutes_from_hhmm(value: str) -> int:
+    """Convert a "HH:MM" schedule string into minutes after midnight."""
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def hhmm_from_minutes(value: int) -> str:
+    """Format minutes after midnight back as "HH:MM"."""
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+def at_minute(day: date, minute: int) -> datetime:
+    """Build the datetime for a minute-of-day offset on the given day."""
+    return datetime(day.year, day.month, day.day) + timedelta(minutes=minute)
+
+def minute_of_day(value: datetime) -> int:
+    """Minutes after midnight for a datetime, ignoring seconds."""
+    return value.hour * 60 + value.minute
+
+class DayTemplate:
+    """Working hours and optional break for one weekday, in minutes after midnight."""
+
+    __slots__ = ("start", "end", "break_start", "break_end")
+
+    def __init__(self, start: int, end: int, break_start: Optional[int] = None, break_end: Optional[int] = None):
+        self.start = start
+        self.end = end
+        self.break_start = break_start
+        self.break_end = break_end
+
+    @classmethod
+    def from_row(cls, row: StylistAvailability) -> "DayTemplate":
+        has_break = bool(row.break_start and row.break_end)
+        return cls(
+            minutes_from_hhmm(row.start_time),
+            minutes_from_hhmm(row.end_time),
+            minutes_from_hhmm(row.break_start) if has_break else None,
+            minutes_from_hhmm(row.break_end) if has_break else None
+        )
+
+    @property
+    def has_break(self) -> bool:
+        return self.break_start is not None and self.break_end is not None
+
+    def working_intervals(self, day: date) -> List[Interval]:
+        """Working hours on the given day with the break cut out."""
+        if self.start >= self.end:
+            return []
+        if self.has_break and self.break_start < self.end and self.break_end > self.start:
+            intervals = []
+            if self.break_start > self.start:
+                intervals.append((at_minute(day, self.start), at_minute(day, self.break_start)))
+            if self.break_end < self.end:
+                intervals.append((at_minute(day, self.break_end), at_minute(day, self.end)))
+            return intervals
+        return [(at_minute(day, self.start), at_minute(day, self.end))]
+
+    def check(self, start_time: datetime, end_time: datetime) -> Optional[Dict[str, Any]]:
+        """Return the schedule conflict for a booking on this day, if any."""
+        day_start = datetime(start_time.year, start_time.month, start_time.day)
+        start = (start_time - day_start).total_seconds() / 60
+        end = (end_time - day_start).total_seconds() / 60
+
+        if start < self.start or end > self.end:
+            return {
+                "type": "outside_availability",
+                "details": f"Booking must be between {hhmm_from_minutes(self.start)} and {hhmm_from_minutes(self.end)}"
+            }
+
+        if self.has_break and start < self.break_end and end > self.break_start:
+            return {
+                "type": "break_time",
+                "details": f"Booking overlaps with stylist's break time ({hhmm_from_minutes(self.break_start)}-{hhmm_from_minutes(self.break_end)})"
+            }
+
+        return None
+
+class WeeklyTemplate:
+    """A stylist's compiled weekly schedule, indexed by weekday (0 = Monday)."""
+
+    __slots__ = ("stylist_id", "days", "generation", "loaded_at")
+
+    def __init__(self, stylist_id: int, days: Tuple[Optional[DayTemplate], ...], generation: int = 0):
+        self.stylist_id = stylist_id
+        self.days = days
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+
+    def __bool__(self) -> bool:
+        return any(self.days)
+
+    def for_weekday(self, weekday: int) -> Optional[DayTemplate]:
+        return self.days[weekday]
+
+    def for_date(self, value: date) -> Optional[DayTemplate]:
+        return self.days[value.weekday()]
+
+    def working_intervals(self, day: date) -> List[Interval]:
+        day_template = self.days[day.weekday()]
+        return day_template.working_intervals(day) if day_template else []
+
+    def check(self, start_time: datetime, end_time: datetime) -> Optional[Dict[str, Any]]:
+        """Return the schedule conflict for a booking, if any."""
+        day_template = self.days[start_time.weekday()]
+        if not day_template:
+            return {
+                "type": "stylist_unavailable",
+                "details": "Stylist is not available on this day"
+            }
+        return day_template.check(start_time, end_time)
+
+def compile_template(stylist_id: int, rows: Iterable[StylistAvailability], generation: int = 0) -> WeeklyTemplate:
+    """Compile a stylist's available schedule rows into a weekly template."""
+    days: List[Optional[DayTemplate]] = [None] * 7
+    for row in rows:
+        # Keep the first row per weekday, matching the previous .first() lookups
+        if row.is_available and 0 <= row.day_of_week < 7 and days[row.day_of_week] is None:
+            days[row.day_of_week] = DayTemplate.from_row(row)
+    return WeeklyTemplate(stylist_id, tuple(days), generation)
+
+_templates: Dict[int, WeeklyTemplate] = {}
+_templates_lock = threading.Lock()
+
+def get_templates(db: Session, stylist_ids: Iterable[int]) -> Dict[int, WeeklyTemplate]:
+    """Compiled templates for the stylists, loading the missing ones in one query.
+
+    Templates are tagged with the stylist's availability cache generation. A
+    schedule rewrite bumps it, which every worker sees with the Redis backend;
+    with the memory backend only the writing worker sees it, so templates are
+    also recompiled once older than ``AVAILABILITY_CACHE_LOCAL_TTL_SECONDS``.
+    """
+    cache = availability_cache.get_cache()
+    generations = {stylist_id: cache.generation(stylist_id) for stylist_id in stylist_ids}
+    ttl = cache.local_ttl()
+    now = time.monotonic()
+    templates: Dict[int, WeeklyTemplate] = {}
+    missing: List[int] = []
+    for stylist_id, generation in generations.items():
+        template = _templates.get(stylist_id)
+        if (
+            template is not None
+            and template.generation == generation
+            and (ttl is None or now - template.loaded_at < ttl)
+        ):
+            templates[stylist_id] = template
+        else:
+            missing.append(stylist_id)
+
+    if missing:
+        rows_by_stylist: Dict[int, List[StylistAvailability]] = {stylist_id: [] for stylist_id in missing}
+        rows = db.query(StylistAvailability).filter(
+            and_(
+                StylistAvailability.stylist_id.in_(missing),
+                StylistAvailability.is_available == True
+            )
+        ).all()
+        for row in rows:
+            rows_by_stylist[row.stylist_id].append(row)
+        with _templates_lock:
+            for stylist_id, stylist_rows in rows_by_stylist.items():
+                template = compile_template(stylist_id, stylist_rows, generations[stylist_id])
+                _templates[stylist_id] = template
+                templates[stylist_id] = template
+
+    return templates
+
+def get_template(db: Session, stylist_id: int) -> WeeklyTemplate:
+    """Compiled template for a single stylist."""
+    return get_templates(db, [stylist_id])[stylist_id]
+
+def invalidate_template(stylist_id: int) -> None:
+    """Drop the compiled template for a stylist in this process."""
+    with _templates_lock:
+        _templates.pop(stylist_id, None)
@@ -1,12 +1,12 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, extract
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 import uuid
 import json
 from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
-from dateutil.parser import parse
 
 from booking.models import (
     Booking, BookingStatus, RecurrenceType,
@@ -25,6 +25,9 @@ from stylists.models import Stylist
 from services.models import Service
 from notifications import services as notification_services
 from calendar_integration import services as calendar_services
+from booking import availability, availability_cache, day_sheets, holds, occupancy, schedule, slot_claims, slot_events, time_off_index, waitlist_index
+from booking.optimized_services import get_consumable_hold
+from utils import loaders, pagination
 
 # Booking Management
 def create_booking(db: Session, booking_data: BookingCreate, user_id: int) -> Booking:
@@ -45,12 +48,23 @@ def create_booking(db: Session, booking_data: BookingCreate, user_id: int) -> Bo
             detail="Stylist not found"
         )
     
+    # A hold taken during checkout must still be live and cover this booking
+    if booking_data.hold_id:
+        get_consumable_hold(
+            booking_data.hold_id,
+            user_id,
+            booking_data.stylist_id,
+            booking_data.start_time,
+            booking_data.end_time
+        )
+    
     # Check for conflicts
     conflicts = check_booking_conflicts(
         db,
         booking_data.stylist_id,
         booking_data.start_time,
-        booking_data.end_time
+        booking_data.end_time,
+        exclude_hold_id=booking_data.hold_id
     )
     if conflicts:
         raise HTTPException(
@@ -76,28 +90,42 @@ def create_booking(db: Session, booking_data: BookingCreate, user_id: int) -> Bo
     
     try:
         db.add(booking)
+        slot_claims.claim(db, [booking])
         db.commit()
         db.refresh(booking)
-        
-        # Create calendar event
-        try:
-            calendar_event = calendar_services.create_calendar_event(booking)
-            booking.calendar_event_id = calendar_event.event_id
-            db.commit()
-        except Exception as e:
-            # Log calendar integration error but don't fail the booking
-            print(f"Calendar integration failed: {str(e)}")
-        
-        # Send notification
-        notification_services.send_booking_confirmation(booking)
-        
-        return booking
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise slot_claims.overlap_exception()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create booking"
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create booking"
         )
+    
+    # The booking is committed; nothing below may report it as failed
+    slot_events.after_write(db, [(booking.stylist_id, booking.start_time, booking.end_time)])
+    if booking_data.hold_id:
+        holds.discard(booking_data.hold_id)
+    
+    # Create calendar event
+    try:
+        calendar_event = calendar_services.create_calendar_event(booking)
+        booking.calendar_event_id = calendar_event.event_id
+        db.commit()
+    except Exception as e:
+        # Log calendar integration error but don't fail the booking
+        print(f"Calendar integration failed: {str(e)}")
+    
+    # Send notification
+    notification_services.send_booking_confirmation(booking)
+    
+    return booking
 
 def create_recurring_bookings(
     db: Session,
@@ -212,6 +240,9 @@ def update_booking(
             detail="Cannot modify completed or cancelled booking"
         )
     
+    # Remember the old slot so both it and the new one are invalidated
+    previous_slot = (booking.stylist_id, booking.start_time, booking.end_time)
+    
     # Update fields
     update_data = booking_data.dict(exclude_unset=True)
     for field, value in update_data.items():
@@ -236,26 +267,43 @@ def update_booking(
     booking.last_modified_by = user_id
     
     try:
+        slot_claims.sync(db, [booking])
         db.commit()
         db.refresh(booking)
-        
-        # Update calendar event
-        if booking.calendar_event_id:
-            try:
-                calendar_services.update_calendar_event(booking)
-            except Exception as e:
-                print(f"Calendar update failed: {str(e)}")
-        
-        # Send notification
-        notification_services.send_booking_update(booking)
-        
-        return booking
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise slot_claims.overlap_exception()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update booking"
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update booking"
         )
+    
+    # The update is committed; nothing below may report it as failed
+    current_slot = (booking.stylist_id, booking.start_time, booking.end_time)
+    slot_events.after_write(
+        db,
+        [previous_slot, current_slot],
+        freed=[previous_slot] if previous_slot != current_slot else []
+    )
+    
+    # Update calendar event
+    if booking.calendar_event_id:
+        try:
+            calendar_services.update_calendar_event(booking)
+        except Exception as e:
+            print(f"Calendar update failed: {str(e)}")
+    
+    # Send notification
+    notification_services.send_booking_update(booking)
+    
+    return booking
 
 def cancel_booking(
     db: Session,
@@ -278,6 +326,7 @@ def cancel_booking(
             detail="Booking is already cancelled"
         )
     
+    cancelled_bookings = [booking]
     if cancel_recurring and booking.recurrence_type != RecurrenceType.NONE:
         # Cancel all recurring bookings
         recurring_bookings = db.query(Booking).filter(
@@ -286,6 +335,7 @@ def cancel_booking(
                 Booking.parent_booking_id == booking_id
             )
         ).all()
+        cancelled_bookings = recurring_bookings
         
         for recurring_booking in recurring_bookings:
             recurring_booking.status = BookingStatus.CANCELLED
@@ -320,15 +370,21 @@ def cancel_booking(
         notification_services.send_booking_cancellation(booking)
     
     try:
+        slot_claims.release(db, [cancelled.id for cancelled in cancelled_bookings])
         db.commit()
         db.refresh(booking)
-        return booking
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to cancel booking"
         )
+    
+    freed_slots = [
+        (cancelled.stylist_id, cancelled.start_time, cancelled.end_time) for cancelled in cancelled_bookings
+    ]
+    slot_events.after_write(db, freed_slots, freed=freed_slots)
+    return booking
 
 # Waitlist Management
 def create_waitlist_entry(
@@ -368,6 +424,7 @@ def create_waitlist_entry(
         db.add(waitlist_entry)
         db.commit()
         db.refresh(waitlist_entry)
+        waitlist_index.index_entry(db, waitlist_entry)
         
         # Send waitlist confirmation
         notification_services.send_waitlist_confirmation(waitlist_entry)
@@ -387,27 +444,29 @@ def process_waitlist(
     start_time: datetime,
     end_time: datetime
 ) -> Optional[WaitlistEntry]:
-    """Process waitlist entries when a slot becomes available."""
-    # Find matching waitlist entries
-    matching_entries = db.query(WaitlistEntry).filter(
-        and_(
-            WaitlistEntry.status == BookingStatus.WAITLISTED,
-            WaitlistEntry.expires_at > datetime.utcnow(),
-            or_(
-                WaitlistEntry.preferred_stylist_id == stylist_id,
-                WaitlistEntry.preferred_stylist_id.is_(None)
-            )
-        )
-    ).order_by(WaitlistEntry.priority.desc(), WaitlistEntry.created_at.asc()).all()
-    
-    for entry in matching_entries:
-        # Check if the time slot matches preferences
-        if entry.preferred_date_range:
-            preferred_start = parse(entry.preferred_date_range["start"])
-            preferred_end = parse(entry.preferred_date_range["end"])
-            if not (preferred_start <= start_time <= preferred_end and
-                   preferred_start <= end_time <= preferred_end):
-                continue
+    """Process waitlist entries when a slot becomes available.
+
+    Candidates come from the in-memory waitlist index, already ordered by
+    priority and age, so only entries whose stylist and dates cover the freed
+    slot are considered.
+    """
+    matches = waitlist_index.get_index(db).match(stylist_id, start_time, end_time)
+    if not matches:
+        return None
+    
+    entries = {
+        entry.id: entry
+        for entry in db.query(WaitlistEntry).filter(
+            WaitlistEntry.id.in_([indexed.entry_id for indexed, _ in matches])
+        ).all()
+    }
+    
+    for indexed, slot_start in matches:
+        entry = entries.get(indexed.entry_id)
+        if not entry or entry.status != BookingStatus.WAITLISTED:
+            # Stale index entry, e.g. fulfilled by another worker
+            waitlist_index.unindex_entry(indexed.entry_id)
+            continue
         
         # Create booking for the waitlist entry
         try:
@@ -417,8 +476,8 @@ def process_waitlist(
                     user_id=entry.user_id,
                     stylist_id=stylist_id,
                     service_id=entry.service_id,
-                    start_time=start_time,
-                    end_time=end_time
+                    start_time=slot_start,
+                    end_time=slot_start + indexed.duration
                 ),
                 entry.user_id
             )
@@ -429,6 +488,7 @@ def process_waitlist(
             entry.notification_sent = True
             
             db.commit()
+            waitlist_index.unindex_entry(entry.id)
             
             # Send notification
             notification_services.send_waitlist_fulfilled(entry, booking)
@@ -447,22 +507,14 @@ def check_booking_conflicts(
     stylist_id: int,
     start_time: datetime,
     end_time: datetime,
-    exclude_booking_id: Optional[str] = None
+    exclude_booking_id: Optional[str] = None,
+    exclude_hold_id: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """Check for booking conflicts."""
     conflicts = []
     
     # Check stylist availability
-    day_of_week = start_time.weekday()
-    availability = db.query(StylistAvailability).filter(
-        and_(
-            StylistAvailability.stylist_id == stylist_id,
-            StylistAvailability.day_of_week == day_of_week,
-            StylistAvailability.is_available == True
-        )
-    ).first()
-    
-    if not availability:
+    if not schedule.get_template(db, stylist_id).for_date(start_time):
         conflicts.append({
             "type": "stylist_unavailable",
             "details": "Stylist is not available on this day"
@@ -470,27 +522,24 @@ def check_booking_conflicts(
         return conflicts
     
     # Check time off
-    time_off = db.query(StylistTimeOff).filter(
-        and_(
-            StylistTimeOff.stylist_id == stylist_id,
-            StylistTimeOff.is_approved == True,
-            or_(
-                and_(
-                    StylistTimeOff.start_date <= start_time,
-                    StylistTimeOff.end_date >= start_time
-                ),
-                and_(
-                    StylistTimeOff.start_date <= end_time,
-                    StylistTimeOff.end_date >= end_time
-                )
-            )
-        )
-    ).first()
-    
+    time_off = time_off_index.get_index(db, stylist_id).find(start_time, end_time)
     if time_off:
+        time_off_start, time_off_end, _ = time_off
         conflicts.append({
             "type": "stylist_time_off",
-            "details": f"Stylist is on time off from {time_off.start_date} to {time_off.end_date}"
+            "details": f"Stylist is on time off from {time_off_start} to {time_off_end}"
+        })
+        return conflicts
+    
+    # Check slots held by other customers during checkout
+    held = [
+        hold for hold in holds.active_holds([stylist_id], start_time, end_time)
+        if hold.id != exclude_hold_id
+    ]
+    if held:
+        conflicts.append({
+            "type": "slot_held",
+            "details": f"Slot is held until {held[0].expires_at.isoformat()}"
         })
         return conflicts
     
@@ -556,74 +605,66 @@ def get_available_slots(
     else:
         stylists = db.query(Stylist).all()
     
-    available_slots = []
-    current_time = params.start_date
+    stylist_ids = [stylist.id for stylist in stylists]
+    slot_length = timedelta(minutes=duration)
+    day_intervals = availability.get_day_intervals(
+        db, stylist_ids, params.start_date, params.end_date
+    )
     
-    while current_time < params.end_date:
-        for stylist in stylists:
-            # Check stylist availability
-            day_of_week = current_time.weekday()
-            availability = db.query(StylistAvailability).filter(
-                and_(
-                    StylistAvailability.stylist_id == stylist.id,
-                    StylistAvailability.day_of_week == day_of_week,
-                    StylistAvailability.is_available == True
-                )
-            ).first()
-            
-            if not availability:
-                continue
-            
-            # Check time off
-            time_off = db.query(StylistTimeOff).filter(
-                and_(
-                    StylistTimeOff.stylist_id == stylist.id,
-                    StylistTimeOff.is_approved == True,
-                    or_(
-                        and_(
-                            StylistTimeOff.start_date <= current_time,
-                            StylistTimeOff.end_date >= current_time
-                        ),
-                        and_(
-                            StylistTimeOff.start_date <= current_time + timedelta(minutes=duration),
-                            StylistTimeOff.end_date >= current_time + timedelta(minutes=duration)
-                        )
-                    )
-                )
-            ).first()
-            
-            if time_off:
-                continue
-            
-            # Check existing bookings
-            end_time = current_time + timedelta(minutes=duration)
-            conflicts = check_booking_conflicts(
-                db,
-                stylist.id,
-                current_time,
-                end_time
-            )
-            
-            slot = TimeSlotResponse(
-                start_time=current_time,
-                end_time=end_time,
-                stylist_id=stylist.id,
-                is_available=len(conflicts) == 0,
-                conflicting_bookings=[
-                    BookingResponse.from_orm(booking)
-                    for conflict in conflicts
-                    if conflict["type"] == "double_booking"
-                    for booking in [db.query(Booking).filter(
-                        Booking.id == conflict["details"]["booking_id"]
-                    ).first()]
-                    if booking
-                ] if conflicts else None
-            )
-            
-            available_slots.append(slot)
+    # Group the 30-minute candidate grid by day so each day is one bitmap pass
+    candidates_by_day: Dict[Any, List[datetime]] = {}
+    for slot_start in occupancy.slot_grid(params.start_date, params.end_date, timedelta(minutes=30)):
+        candidates_by_day.setdefault(slot_start.date(), []).append(slot_start)
+    
+    candidates = []
+    for day, slot_starts in candidates_by_day.items():
+        day_start = datetime(day.year, day.month, day.day)
+        # Slots inside working hours and outside time off are reported even
+        # when booked, so compare against the open intervals as well
+        open_fit = occupancy.fit_matrix(
+            occupancy.build_day_bitmaps(
+                [day_intervals[(stylist_id, day)][0] for stylist_id in stylist_ids], day
+            ),
+            day_start, slot_starts, slot_length
+        )
+        free_fit = occupancy.fit_matrix(
+            occupancy.build_day_bitmaps(
+                [day_intervals[(stylist_id, day)][1] for stylist_id in stylist_ids], day
+            ),
+            day_start, slot_starts, slot_length
+        )
+        
+        for column, slot_start in enumerate(slot_starts):
+            for row, stylist_id in enumerate(stylist_ids):
+                if open_fit[row, column]:
+                    candidates.append((slot_start, stylist_id, bool(free_fit[row, column])))
+    
+    # Conflicts are only needed for blocked slots, so load them in one query on demand
+    blocked = [candidate for candidate in candidates if not candidate[2]]
+    bookings = availability.load_bookings(
+        db,
+        sorted({candidate[1] for candidate in blocked}),
+        min(candidate[0] for candidate in blocked),
+        max(candidate[0] for candidate in blocked) + slot_length
+    ) if blocked else {}
+    
+    available_slots = []
+    for slot_start, stylist_id, is_available in candidates:
+        end_time = slot_start + slot_length
+        conflicting = [] if is_available else [
+            booking for booking in bookings.get(stylist_id, [])
+            if booking.start_time < end_time and booking.end_time > slot_start
+        ]
         
-        # Move to next time slot (30-minute intervals)
-        current_time += timedelta(minutes=30)
+        available_slots.append(TimeSlotResponse(
+            start_time=slot_start,
+            end_time=end_time,
+            stylist_id=stylist_id,
+            is_available=is_available,
+            conflicting_bookings=[
+                BookingResponse.from_orm(booking) for booking in conflicting
+            ] if conflicting else None
+        ))
     
     return available_slots
 
@@ -657,6 +698,9 @@ def update_stylist_availability(
     try:
         db.add_all(availability_entries)
         db.commit()
+        availability_cache.get_cache().invalidate_stylist(stylist_id)
+        schedule.invalidate_template(stylist_id)
+        day_sheets.refresh_stylist(db, stylist_id)
         
         for entry in availability_entries:
             db.refresh(entry)
@@ -687,16 +731,8 @@ def request_time_off(
         and_(
             Booking.stylist_id == stylist_id,
             Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED]),
-            or_(
-                and_(
-                    Booking.start_time <= time_off_data.start_date,
-                    Booking.end_time > time_off_data.start_date
-                ),
-                and_(
-                    Booking.start_time < time_off_data.end_date,
-                    Booking.end_time >= time_off_data.end_date
-                )
-            )
+            Booking.start_time < time_off_data.end_date,
+            Booking.end_time > time_off_data.start_date
         )
     ).all()
     
@@ -727,6 +763,7 @@ def request_time_off(
         db.add(time_off)
         db.commit()
         db.refresh(time_off)
+        time_off_index.invalidate(stylist_id)
         
         # Notify admin
         notification_services.send_time_off_request(time_off)
@@ -763,16 +800,8 @@ def approve_time_off(
         and_(
             Booking.stylist_id == time_off.stylist_id,
             Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED]),
-            or_(
-                and_(
-                    Booking.start_time <= time_off.start_date,
-                    Booking.end_time > time_off.start_date
-                ),
-                and_(
-                    Booking.start_time < time_off.end_date,
-                    Booking.end_time >= time_off.end_date
-                )
-            )
+            Booking.start_time < time_off.end_date,
+            Booking.end_time > time_off.start_date
         )
     ).all()
     
@@ -796,6 +825,10 @@ def approve_time_off(
     try:
         db.commit()
         db.refresh(time_off)
+        # Bumping the generation makes other workers' time-off indexes stale (after the local TTL on the memory backend)
+        availability_cache.get_cache().invalidate_stylist(time_off.stylist_id)
+        time_off_index.invalidate(time_off.stylist_id)
+        day_sheets.refresh(db, time_off.stylist_id, time_off.start_date, time_off.end_date)
         
         # Notify stylist
         notification_services.send_time_off_approval(time_off)
@@ -813,10 +846,11 @@ def search_bookings(
     db: Session,
     params: BookingSearchParams,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[Booking]:
-    """Search bookings with various filters."""
-    query = db.query(Booking)
+    """Search bookings with various filters, newest first; ``cursor`` takes precedence over ``skip``."""
+    query = loaders.with_profile(db.query(Booking), "booking_response")
     
     if params.start_date:
         query = query.filter(Booking.start_time >= params.start_date)
@@ -834,34 +868,36 @@ def search_bookings(
     if not params.include_recurring:
         query = query.filter(Booking.parent_booking_id.is_(None))
     
-    return query.order_by(Booking.start_time.desc()).offset(skip).limit(limit).all()
+    return pagination.paginate(query, Booking.start_time, Booking.id, cursor, skip, limit)
 
 def get_user_bookings(
     db: Session,
     user_id: int,
     include_past: bool = False,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[Booking]:
     """Get all bookings for a user."""
-    query = db.query(Booking).filter(Booking.user_id == user_id)
+    query = loaders.with_profile(db.query(Booking), "booking_response").filter(Booking.user_id == user_id)
     
     if not include_past:
         query = query.filter(Booking.start_time >= datetime.utcnow())
     
-    return query.order_by(Booking.start_time.desc()).offset(skip).limit(limit).all()
+    return pagination.paginate(query, Booking.start_time, Booking.id, cursor, skip, limit)
 
 def get_stylist_bookings(
     db: Session,
     stylist_id: int,
     include_past: bool = False,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[Booking]:
     """Get all bookings for a stylist."""
-    query = db.query(Booking).filter(Booking.stylist_id == stylist_id)
+    query = loaders.with_profile(db.query(Booking), "booking_response").filter(Booking.stylist_id == stylist_id)
     
     if not include_past:
         query = query.filter(Booking.start_time >= datetime.utcnow())
     
-    return query.order_by(Booking.start_time.desc()).offset(skip).limit(limit).all() 
\ No newline at end of file
+    return pagination.paginate(query, Booking.start_time, Booking.id, cursor, skip, limit) 
\ No newline at end of file
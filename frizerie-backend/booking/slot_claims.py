@@ -0,0 +1,104 @@
+"""
+Storage-level guarantee that active bookings for a stylist never overlap.
+
+On PostgreSQL the ``bookings_no_overlap`` exclusion constraint (see
+migrations/add_booking_overlap_guard.py) rejects overlapping rows directly.
+Other databases get the same guarantee from ``booking_slot_claims``: every
+active booking claims the one-minute buckets it covers, and the unique
+(stylist_id, slot_start) constraint makes the second of two overlapping
+inserts fail inside its own transaction. Claimed bookings must start and end
+on whole minutes, so back-to-back bookings never share a bucket whatever
+their durations. Either way the application-level
+overlap query is only a fast path for friendly errors, not the guard itself.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, List
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from booking.models import Booking, BookingSlotClaim, BookingStatus
+
+# Width of a claimed bucket; claimed bookings must start and end on this grid
+CLAIM_MINUTES = 1
+EXCLUSION_CONSTRAINT = "bookings_no_overlap"
+UNIQUE_CONSTRAINT = "uq_booking_slot_claims_stylist_slot"
+
+def uses_exclusion_constraint(db: Session) -> bool:
+    """Whether the database enforces non-overlap itself (PostgreSQL)."""
+    return db.get_bind().dialect.name == "postgresql"
+
+def _is_active(booking: Booking) -> bool:
+    # bookings/services stores the enum name as a plain string
+    return booking.status not in (BookingStatus.CANCELLED, "CANCELLED")
+
+def claim_starts(start_time: datetime, end_time: datetime) -> List[datetime]:
+    """Bucket starts covered by [start_time, end_time)."""
+    step = timedelta(minutes=CLAIM_MINUTES)
+    day_start = datetime(start_time.year, start_time.month, start_time.day)
+    current = day_start + ((start_time - day_start) // step) * step
+    starts = []
+    while current < end_time:
+        starts.append(current)
+        current += step
+    return starts
+
+def is_aligned(moment: datetime) -> bool:
+    """Whether ``moment`` falls on the claim grid."""
+    day_start = datetime(moment.year, moment.month, moment.day)
+    return (moment - day_start) % timedelta(minutes=CLAIM_MINUTES) == timedelta(0)
+
+def claim(db: Session, bookings: Iterable[Booking]) -> None:
+    """Add slot claims for active bookings to the current transaction."""
+    if uses_exclusion_constraint(db):
+        return
+    bookings = [booking for booking in bookings if _is_active(booking)]
+    if not bookings:
+        return
+    for booking in bookings:
+        if not (is_aligned(booking.start_time) and is_aligned(booking.end_time)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Bookings must start and end on whole minutes"
+            )
+    # Claims reference their bookings, so those rows (and ids) must exist first
+    db.flush()
+    db.bulk_insert_mappings(BookingSlotClaim, [
+        {"booking_id": booking.id, "stylist_id": booking.stylist_id, "slot_start": slot_start}
+        for booking in bookings
+        for slot_start in claim_starts(booking.start_time, booking.end_time)
+    ])
+
+def release(db: Session, booking_ids: Iterable[str]) -> None:
+    """Remove the slot claims of the bookings in the current transaction."""
+    if uses_exclusion_constraint(db):
+        return
+    booking_ids = list(booking_ids)
+    if booking_ids:
+        db.query(BookingSlotClaim).filter(
+            BookingSlotClaim.booking_id.in_(booking_ids)
+        ).delete(synchronize_session=False)
+
+def sync(db: Session, bookings: Iterable[Booking]) -> None:
+    """Re-claim slots for bookings whose time, stylist or status changed."""
+    bookings = list(bookings)
+    release(db, [booking.id for booking in bookings])
+    claim(db, bookings)
+
+def is_overlap_error(error: IntegrityError) -> bool:
+    """Whether an IntegrityError came from the non-overlap guard."""
+    message = str(error.orig)
+    return (
+        EXCLUSION_CONSTRAINT in message
+        or UNIQUE_CONSTRAINT in message
+        or "booking_slot_claims.stylist_id, booking_slot_claims.slot_start" in message
+        or getattr(error.orig, "pgcode", None) == "23P01"
+    )
+
+def overlap_exception() -> HTTPException:
+    """The 409 raised when the database rejects an overlapping booking."""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="The selected time slot is already booked"
+    )
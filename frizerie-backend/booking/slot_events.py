@@ -0,0 +1,102 @@
+"""
+"Slot freed" events emitted when a cancellation or reschedule releases time.
+
+Events are handed to a Celery task so the waitlist matcher runs within
+seconds of the change instead of on the next periodic scan. Each freed slot is
+deduplicated for a short window before it is enqueued, so a burst of
+cancellations touching the same slot triggers a single match.
+
+``after_write`` bundles these events with the other post-commit work of a
+booking write (cache invalidation and day sheet refresh).
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from booking import availability_cache, day_sheets
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+_recent: Dict[str, float] = {}
+_recent_lock = threading.Lock()
+_redis_client = None
+
+def _dedup_key(stylist_id: int, start_time: datetime, end_time: datetime) -> str:
+    return f"slot_freed:{stylist_id}:{start_time.isoformat()}:{end_time.isoformat()}"
+
+def _claim_locally(key: str, ttl_seconds: int) -> bool:
+    now = time.monotonic()
+    with _recent_lock:
+        # Drop stale keys so the map only holds the current window
+        for stale in [k for k, expires in _recent.items() if expires <= now]:
+            del _recent[stale]
+        if key in _recent:
+            return False
+        _recent[key] = now + ttl_seconds
+        return True
+
+def _claim(key: str, ttl_seconds: int) -> bool:
+    """Claim the key for the dedup window; shared across workers through Redis when available."""
+    global _redis_client
+    try:
+        if _redis_client is None:
+            import redis
+
+            _redis_client = redis.Redis.from_url(get_settings().CELERY_BROKER_URL)
+        return bool(_redis_client.set(key, 1, nx=True, ex=ttl_seconds))
+    except Exception as e:
+        logger.warning(f"Slot event dedup via Redis failed, using local dedup: {str(e)}")
+        return _claim_locally(key, ttl_seconds)
+
+def emit_slot_freed(
+    stylist_id: Optional[int],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime]
+) -> bool:
+    """Queue waitlist matching for a freed slot; returns False if it was a duplicate or dropped."""
+    if stylist_id is None or start_time is None or end_time is None:
+        return False
+    if end_time <= datetime.utcnow():
+        return False
+
+    key = _dedup_key(stylist_id, start_time, end_time)
+    if not _claim(key, get_settings().WAITLIST_EVENT_DEDUP_SECONDS):
+        return False
+
+    try:
+        from tasks.booking_tasks import promote_waitlist_for_freed_slot
+
+        promote_waitlist_for_freed_slot.delay(stylist_id, start_time.isoformat(), end_time.isoformat())
+        return True
+    except Exception as e:
+        # The periodic waitlist job still replays recent cancellations
+        logger.warning(f"Failed to enqueue slot freed event: {str(e)}")
+        return False
+
+Span = Tuple[Optional[int], Optional[datetime], Optional[datetime]]
+
+def after_write(db: Session, changed: Iterable[Span], freed: Iterable[Span] = ()) -> None:
+    """Best-effort side effects of a committed booking write.
+
+    ``changed`` are the (stylist_id, start, end) spans whose cached
+    availability and day sheets are stale, ``freed`` the ones released to the
+    waitlist. Failures are logged and never reach the caller; the cache TTL and
+    the nightly day sheet roll repair whatever was missed.
+    """
+    changed = list(changed)
+    for span in changed:
+        try:
+            availability_cache.invalidate_booking(*span)
+        except Exception as e:
+            logger.warning(f"Availability cache invalidation failed: {str(e)}")
+    try:
+        day_sheets.refresh_spans(db, changed)
+    except Exception as e:
+        logger.warning(f"Day sheet refresh failed: {str(e)}")
+    for span in freed:
+        emit_slot_freed(*span)
@@ -0,0 +1,120 @@
+"""
+Per-stylist index of approved time off.
+
+Booking validation used to query ``StylistTimeOff`` once per candidate slot
+and only tested whether the slot's start or end fell inside a period, so time
+off lying entirely within a slot went unnoticed. Each stylist's approved
+periods are now loaded once into a ``TimeOffIndex`` sorted by start, with a
+running maximum of the end times, which answers "does [start, end) overlap
+any period?" with one binary search for every overlap case.
+
+Indexes are tagged with the stylist's availability cache generation, like the
+compiled schedule templates. Approving time off bumps it, which every worker
+sees with the Redis backend; with the memory backend the other workers only
+reload once their copy is older than ``AVAILABILITY_CACHE_LOCAL_TTL_SECONDS``.
+"""
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from booking.models import StylistTimeOff
+from booking import availability_cache
+
+# (start_date, end_date, time_off_id)
+Period = Tuple[datetime, datetime, str]
+
+class TimeOffIndex:
+    """Approved time off for one stylist, sorted by start."""
+
+    __slots__ = ("stylist_id", "generation", "loaded_at", "periods", "_starts", "_max_end_at")
+
+    def __init__(self, stylist_id: int, periods: Iterable[Period], generation: int = 0):
+        self.stylist_id = stylist_id
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        self.periods: List[Period] = sorted(periods)
+        self._starts = [period[0] for period in self.periods]
+        # Index of the period with the latest end among periods[:i + 1]
+        self._max_end_at: List[int] = []
+        for i, period in enumerate(self.periods):
+            if not self._max_end_at or period[1] > self.periods[self._max_end_at[-1]][1]:
+                self._max_end_at.append(i)
+            else:
+                self._max_end_at.append(self._max_end_at[-1])
+
+    def __len__(self) -> int:
+        return len(self.periods)
+
+    def find(self, start_time: datetime, end_time: datetime) -> Optional[Period]:
+        """A period overlapping [start_time, end_time), or None.
+
+        Only periods starting before ``end_time`` can overlap; among those the
+        one ending last overlaps exactly when any of them does.
+        """
+        i = bisect_left(self._starts, end_time) - 1
+        if i < 0:
+            return None
+        period = self.periods[self._max_end_at[i]]
+        return period if period[1] > start_time else None
+
+    def overlaps(self, start_time: datetime, end_time: datetime) -> bool:
+        return self.find(start_time, end_time) is not None
+
+_indexes: Dict[int, TimeOffIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_indexes(db: Session, stylist_ids: Iterable[int]) -> Dict[int, TimeOffIndex]:
+    """Time-off indexes for the stylists, loading the missing or stale ones in one query."""
+    cache = availability_cache.get_cache()
+    generations = {stylist_id: cache.generation(stylist_id) for stylist_id in stylist_ids}
+    ttl = cache.local_ttl()
+    now = time.monotonic()
+    indexes: Dict[int, TimeOffIndex] = {}
+    missing: List[int] = []
+    for stylist_id, generation in generations.items():
+        index = _indexes.get(stylist_id)
+        if (
+            index is not None
+            and index.generation == generation
+            and (ttl is None or now - index.loaded_at < ttl)
+        ):
+            indexes[stylist_id] = index
+        else:
+            missing.append(stylist_id)
+
+    if missing:
+        periods: Dict[int, List[Period]] = {stylist_id: [] for stylist_id in missing}
+        rows = db.query(
+            StylistTimeOff.stylist_id,
+            StylistTimeOff.start_date,
+            StylistTimeOff.end_date,
+            StylistTimeOff.id
+        ).filter(
+            and_(
+                StylistTimeOff.stylist_id.in_(missing),
+                StylistTimeOff.is_approved == True
+            )
+        ).all()
+        for stylist_id, start_date, end_date, time_off_id in rows:
+            periods[stylist_id].append((start_date, end_date, time_off_id))
+        with _indexes_lock:
+            for stylist_id, stylist_periods in periods.items():
+                index = TimeOffIndex(stylist_id, stylist_periods, generations[stylist_id])
+                _indexes[stylist_id] = index
+                indexes[stylist_id] = index
+
+    return indexes
+
+def get_index(db: Session, stylist_id: int) -> TimeOffIndex:
+    """Time-off index for a single stylist."""
+    return get_indexes(db, [stylist_id])[stylist_id]
+
+def invalidate(stylist_id: int) -> None:
+    """Drop the index for a stylist in this process."""
+    with _indexes_lock:
+        _indexes.pop(stylist_id, None)
@@ -0,0 +1,254 @@
+"""
+In-memory index of pending waitlist entries for matching freed slots.
+
+Entries are bucketed by (preferred stylist, day) for every day their preferred
+date range covers, with "any stylist" entries in a shared bucket per day. A
+freed slot only looks at the buckets for its own stylist and days, so the
+cost of matching follows the number of freed slots rather than the size of
+the waitlist. Each bucket is kept sorted by priority (desc) then created_at
+(asc), which is the order matches are offered in.
+
+Writes in this process update the buckets directly. Other workers' writes are
+picked up on read by applying, entry by entry, the rows whose ``updated_at``
+is past the last sync, so the cost of staying current follows the number of
+changes too.
+"""
+import threading
+import time
+from bisect import insort
+from datetime import datetime, timedelta, date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dateutil.parser import parse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from booking.models import WaitlistEntry, BookingStatus
+from services.models import Service
+from config.settings import get_settings
+
+# Bucket key used for entries without a preferred stylist
+ANY_STYLIST = None
+
+# Entries without a date range are indexed for this many days ahead
+DEFAULT_RANGE_DAYS = 30
+
+class IndexedEntry:
+    """The parts of a waitlist entry needed to match it against a freed slot."""
+
+    __slots__ = (
+        "entry_id", "user_id", "service_id", "stylist_id", "duration",
+        "range_start", "range_end", "priority", "created_at", "expires_at"
+    )
+
+    def __init__(
+        self,
+        entry_id: str,
+        user_id: int,
+        service_id: int,
+        stylist_id: Optional[int],
+        duration: timedelta,
+        range_start: datetime,
+        range_end: datetime,
+        priority: int,
+        created_at: datetime,
+        expires_at: Optional[datetime]
+    ):
+        self.entry_id = entry_id
+        self.user_id = user_id
+        self.service_id = service_id
+        self.stylist_id = stylist_id
+        self.duration = duration
+        self.range_start = range_start
+        self.range_end = range_end
+        self.priority = priority
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    @property
+    def sort_key(self) -> Tuple[int, datetime, str]:
+        return (-self.priority, self.created_at, self.entry_id)
+
+    def __lt__(self, other: "IndexedEntry") -> bool:
+        return self.sort_key < other.sort_key
+
+    def fit(self, start_time: datetime, end_time: datetime) -> Optional[datetime]:
+        """Earliest start inside the freed window and the preferred range, if the service fits."""
+        slot_start = max(start_time, self.range_start)
+        if slot_start + self.duration <= min(end_time, self.range_end):
+            return slot_start
+        return None
+
+def _date_range(entry: WaitlistEntry) -> Tuple[datetime, datetime]:
+    """Preferred date range of an entry, defaulting to the coming weeks."""
+    preferred = entry.preferred_date_range or {}
+    start = parse(preferred["start"]) if preferred.get("start") else datetime.utcnow()
+    end = parse(preferred["end"]) if preferred.get("end") else start + timedelta(days=DEFAULT_RANGE_DAYS)
+    return start.replace(tzinfo=None), end.replace(tzinfo=None)
+
+def _days(start: datetime, end: datetime) -> Iterator[date]:
+    day = start.date()
+    while day <= end.date():
+        yield day
+        day += timedelta(days=1)
+
+class WaitlistIndex:
+    """Day-bucketed index of pending waitlist entries."""
+
+    def __init__(self):
+        self._entries: Dict[str, IndexedEntry] = {}
+        self._buckets: Dict[Tuple[Optional[int], date], List[IndexedEntry]] = {}
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        # Latest updated_at applied; rows written after it are read by sync()
+        self.synced_until: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: WaitlistEntry, duration_minutes: int) -> None:
+        """Index (or re-index) a pending entry."""
+        range_start, range_end = _date_range(entry)
+        indexed = IndexedEntry(
+            entry.id,
+            entry.user_id,
+            entry.service_id,
+            entry.preferred_stylist_id,
+            timedelta(minutes=duration_minutes),
+            range_start,
+            range_end,
+            entry.priority or 0,
+            entry.created_at or datetime.utcnow(),
+            entry.expires_at
+        )
+        with self._lock:
+            self._remove(entry.id)
+            self._entries[entry.id] = indexed
+            for day in _days(range_start, range_end):
+                insort(self._buckets.setdefault((indexed.stylist_id, day), []), indexed)
+
+    def remove(self, entry_id: str) -> None:
+        with self._lock:
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: str) -> None:
+        indexed = self._entries.pop(entry_id, None)
+        if not indexed:
+            return
+        for day in _days(indexed.range_start, indexed.range_end):
+            bucket = self._buckets.get((indexed.stylist_id, day))
+            if bucket is None:
+                continue
+            bucket[:] = [other for other in bucket if other.entry_id != entry_id]
+            if not bucket:
+                del self._buckets[(indexed.stylist_id, day)]
+
+    def match(
+        self,
+        stylist_id: int,
+        start_time: datetime,
+        end_time: datetime,
+        limit: Optional[int] = None
+    ) -> List[Tuple[IndexedEntry, datetime]]:
+        """Entries that fit the freed window, best first, with their slot start."""
+        now = datetime.utcnow()
+        candidates: Dict[str, IndexedEntry] = {}
+        with self._lock:
+            for day in _days(start_time, end_time):
+                for key in ((stylist_id, day), (ANY_STYLIST, day)):
+                    for indexed in self._buckets.get(key, []):
+                        candidates[indexed.entry_id] = indexed
+
+        matches = []
+        for indexed in sorted(candidates.values()):
+            if indexed.expires_at and indexed.expires_at <= now:
+                continue
+            slot_start = indexed.fit(start_time, end_time)
+            if slot_start is not None:
+                matches.append((indexed, slot_start))
+                if limit and len(matches) >= limit:
+                    break
+        return matches
+
+    def apply(self, entry: WaitlistEntry, duration_minutes: int) -> None:
+        """Index an entry that is still pending, drop one that is not."""
+        if entry.status == BookingStatus.WAITLISTED and (
+            entry.expires_at is None or entry.expires_at > datetime.utcnow()
+        ):
+            self.add(entry, duration_minutes)
+        else:
+            self.remove(entry.id)
+
+    def load(self, db: Session) -> None:
+        """Rebuild the index from every pending, unexpired entry in one query."""
+        # Taken first, so rows written during the load are applied by the next sync
+        synced_until = db.query(func.max(WaitlistEntry.updated_at)).scalar()
+        rows = db.query(WaitlistEntry, Service.duration_minutes).join(
+            Service, Service.id == WaitlistEntry.service_id
+        ).filter(
+            WaitlistEntry.status == BookingStatus.WAITLISTED,
+            WaitlistEntry.expires_at > datetime.utcnow()
+        ).all()
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+        for entry, duration_minutes in rows:
+            self.add(entry, duration_minutes)
+        self.loaded_at = time.monotonic()
+        self.synced_until = synced_until
+
+    def sync(self, db: Session) -> int:
+        """Apply the entries written since the last sync; returns how many were applied.
+
+        Timestamps come from each writer's transaction, so one that commits
+        late can carry an older ``updated_at``. Rows within the overlap before
+        the last sync are read again to catch those.
+        """
+        query = db.query(WaitlistEntry, Service.duration_minutes).join(
+            Service, Service.id == WaitlistEntry.service_id
+        )
+        if self.synced_until is not None:
+            overlap = timedelta(seconds=get_settings().WAITLIST_INDEX_SYNC_OVERLAP_SECONDS)
+            query = query.filter(WaitlistEntry.updated_at > self.synced_until - overlap)
+        rows = query.all()
+        for entry, duration_minutes in rows:
+            self.apply(entry, duration_minutes)
+            if self.synced_until is None or entry.updated_at > self.synced_until:
+                self.synced_until = entry.updated_at
+        return len(rows)
+
+_index: Optional[WaitlistIndex] = None
+
+def get_index(db: Session) -> WaitlistIndex:
+    """Return the process-wide index, synced with the entries written since the last read.
+
+    The full rebuild only runs on first use and, as a backstop for writes
+    committed later than the sync overlap, once the index is older than the
+    refresh interval.
+    """
+    global _index
+    if _index is None:
+        _index = WaitlistIndex()
+    refresh_seconds = get_settings().WAITLIST_INDEX_REFRESH_SECONDS
+    if _index.loaded_at is None or time.monotonic() - _index.loaded_at > refresh_seconds:
+        _index.load(db)
+    else:
+        _index.sync(db)
+    return _index
+
+def index_entry(db: Session, entry: WaitlistEntry) -> None:
+    """Add or refresh an entry in the index after it was written."""
+    if _index is None or _index.loaded_at is None:
+        # The first lookup loads everything, including this entry
+        return
+    if entry.status != BookingStatus.WAITLISTED:
+        _index.remove(entry.id)
+        return
+    service = db.query(Service).filter(Service.id == entry.service_id).first()
+    if service:
+        _index.apply(entry, service.duration_minutes)
+
+def unindex_entry(entry_id: str) -> None:
+    """Drop an entry that was fulfilled, cancelled or expired."""
+    if _index is not None:
+        _index.remove(entry_id)
@@ -9,16 +9,23 @@ from typing import List, Optional, Dict, Any
 import uuid
 
 from booking.models import (
-    WaitlistEntry, WaitlistNotification, Booking,
+    WaitlistEntry, WaitlistNotification, WaitlistWatermark, Booking,
     BookingStatus, StylistAvailability
 )
 from validation.schemas import (
     WaitlistEntryCreate, WaitlistEntryUpdate,
-    WaitlistEntryResponse, TimeSlotResponse
+    WaitlistEntryResponse, TimeSlotResponse, BookingCreate
 )
 from users.models import User
 from services.models import Service
 from notifications import services as notification_services
+from booking import schedule, waitlist_index
+from booking import optimized_services as booking_services
+from utils import loaders
+from config.settings import get_settings
+
+# Watermark row of process_waitlist_entries
+PROCESS_WATERMARK = "process_waitlist_entries"
 
 def create_waitlist_entry(
     db: Session,
@@ -72,6 +79,7 @@ def create_waitlist_entry(
         db.add(entry)
         db.commit()
         db.refresh(entry)
+        waitlist_index.index_entry(db, entry)
         
         # Create notification for the waitlist entry
         notification_services.create_notification(
@@ -127,6 +135,7 @@ def update_waitlist_entry(
     try:
         db.commit()
         db.refresh(entry)
+        waitlist_index.index_entry(db, entry)
         return entry
     except Exception as e:
         db.rollback()
@@ -167,6 +176,7 @@ def cancel_waitlist_entry(
     try:
         db.commit()
         db.refresh(entry)
+        waitlist_index.unindex_entry(entry.id)
         
         # Create notification for the cancellation
         notification_services.create_notification(
@@ -202,58 +212,33 @@ def check_waitlist_availability(
     else:
         stylists = db.query(User).filter(User.is_stylist == True).all()
     
+    # Compile schedules and the preferred window once instead of per candidate slot
+    templates = schedule.get_templates(db, [stylist.id for stylist in stylists])
+    preferred_window = None
+    if entry.preferred_time_start and entry.preferred_time_end:
+        preferred_window = (
+            schedule.minutes_from_hhmm(entry.preferred_time_start),
+            schedule.minutes_from_hhmm(entry.preferred_time_end)
+        )
+    slot_length = timedelta(minutes=service.duration_minutes)
+    
     current_time = entry.preferred_date_start
     while current_time < entry.preferred_date_end:
         for stylist in stylists:
             # Skip if stylist is not available for this day
-            availability = db.query(StylistAvailability).filter(
-                and_(
-                    StylistAvailability.stylist_id == stylist.id,
-                    StylistAvailability.day_of_week == current_time.weekday(),
-                    StylistAvailability.is_available == True
-                )
-            ).first()
-            
-            if not availability:
+            day_template = templates[stylist.id].for_date(current_time)
+            if not day_template:
                 continue
             
-            # Convert availability times to datetime
-            avail_start = datetime.strptime(
-                f"{current_time.strftime('%Y-%m-%d')} {availability.start_time}",
-                "%Y-%m-%d %H:%M"
-            )
-            avail_end = datetime.strptime(
-                f"{current_time.strftime('%Y-%m-%d')} {availability.end_time}",
-                "%Y-%m-%d %H:%M"
-            )
-            
             # Check if time is within preferred time range
-            if entry.preferred_time_start and entry.preferred_time_end:
-                preferred_start = datetime.strptime(
-                    f"{current_time.strftime('%Y-%m-%d')} {entry.preferred_time_start}",
-                    "%Y-%m-%d %H:%M"
-                )
-                preferred_end = datetime.strptime(
-                    f"{current_time.strftime('%Y-%m-%d')} {entry.preferred_time_end}",
-                    "%Y-%m-%d %H:%M"
-                )
-                
-                if current_time < preferred_start or current_time + timedelta(minutes=service.duration_minutes) > preferred_end:
+            if preferred_window:
+                start_minute = schedule.minute_of_day(current_time)
+                if start_minute < preferred_window[0] or start_minute + service.duration_minutes > preferred_window[1]:
                     continue
             
-            # Check for breaks
-            if availability.break_start and availability.break_end:
-                break_start = datetime.strptime(
-                    f"{current_time.strftime('%Y-%m-%d')} {availability.break_start}",
-                    "%Y-%m-%d %H:%M"
-                )
-                break_end = datetime.strptime(
-                    f"{current_time.strftime('%Y-%m-%d')} {availability.break_end}",
-                    "%Y-%m-%d %H:%M"
-                )
-                
-                if (current_time < break_end and current_time + timedelta(minutes=service.duration_minutes) > break_start):
-                    continue
+            # Check working hours and breaks
+            if day_template.check(current_time, current_time + slot_length):
+                continue
             
             # Check for existing bookings
             existing_booking = db.query(Booking).filter(
@@ -290,23 +275,132 @@ def check_waitlist_availability(
     
     return None
 
-def process_waitlist_entries(db: Session) -> None:
-    """Process all pending waitlist entries to check for availability."""
-    # Get all pending entries that haven't expired
-    entries = db.query(WaitlistEntry).filter(
+def promote_waitlist_for_slot(
+    db: Session,
+    stylist_id: int,
+    start_time: datetime,
+    end_time: datetime
+) -> Optional[WaitlistEntry]:
+    """Book a freed slot for the best matching waitlist entry.
+
+    Candidates come from the waitlist index ordered by priority (desc) then
+    created_at (asc); the first one that can still be booked wins.
+    """
+    for indexed, slot_start in waitlist_index.get_index(db).match(stylist_id, start_time, end_time):
+        entry = db.query(WaitlistEntry).filter(WaitlistEntry.id == indexed.entry_id).first()
+        if not entry or entry.status != BookingStatus.WAITLISTED:
+            waitlist_index.unindex_entry(indexed.entry_id)
+            continue
+        
+        try:
+            booking = booking_services.create_booking(
+                db,
+                BookingCreate(
+                    user_id=entry.user_id,
+                    stylist_id=stylist_id,
+                    service_id=entry.service_id,
+                    start_time=slot_start,
+                    end_time=slot_start + indexed.duration
+                ),
+                entry.user_id
+            )
+        except HTTPException as e:
+            if e.status_code in (status.HTTP_400_BAD_REQUEST, status.HTTP_409_CONFLICT):
+                continue
+            raise e
+        
+        entry.status = BookingStatus.CONFIRMED
+        entry.booking_id = booking.id
+        entry.notification_sent = True
+        
+        try:
+            db.commit()
+            waitlist_index.unindex_entry(entry.id)
+            
+            notification_services.create_notification(
+                db=db,
+                user_id=entry.user_id,
+                type="WAITLIST_SLOT_BOOKED",
+                title="Waitlist Slot Booked",
+                message=f"A slot opened up and was booked for you at {slot_start.strftime('%Y-%m-%d %H:%M')}",
+                data={
+                    "waitlist_entry_id": entry.id,
+                    "booking_id": booking.id
+                }
+            )
+            return entry
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to promote waitlist entry"
+            )
+    
+    return None
+
+def _has_outstanding_offer(db: Session, entry_id: str, now: datetime) -> bool:
+    """Whether the entry was offered a slot within the offer window."""
+    offered_after = now - timedelta(minutes=get_settings().WAITLIST_OFFER_TTL_MINUTES)
+    return db.query(WaitlistNotification.id).filter(
         and_(
-            WaitlistEntry.status == "PENDING",
-            WaitlistEntry.expires_at > datetime.utcnow()
+            WaitlistNotification.waitlist_entry_id == entry_id,
+            WaitlistNotification.notification_type == "SLOT_AVAILABLE",
+            WaitlistNotification.sent_at > offered_after
         )
-    ).all()
+    ).first() is not None
+
+def process_waitlist_entries(db: Session, since: Optional[datetime] = None) -> None:
+    """Offer slots freed since the last run to the best waitlist match.
+
+    Each run picks up bookings cancelled after the watermark the previous run
+    stored (``since`` if given, the last hour on the first run) and moves the
+    watermark forward in the same commit, so a cancellation is only looked at
+    once. Entries whose last offer is still outstanding (sent within
+    ``WAITLIST_OFFER_TTL_MINUTES``) are passed over for the next match.
+    """
+    now = datetime.utcnow()
+    watermark = db.query(WaitlistWatermark).filter(
+        WaitlistWatermark.name == PROCESS_WATERMARK
+    ).first()
+    if since is None:
+        since = watermark.processed_until if watermark else now - timedelta(hours=1)
+    freed_bookings = db.query(Booking).filter(
+        and_(
+            Booking.status == BookingStatus.CANCELLED,
+            Booking.updated_at >= since,
+            Booking.updated_at < now,
+            Booking.start_time > now
+        )
+    ).order_by(Booking.start_time).all()
     
-    for entry in entries:
-        # Check if a slot is available
-        slot = check_waitlist_availability(db, entry)
-        if slot:
-            # Update entry status
-            entry.status = "NOTIFIED"
-            entry.notified_at = datetime.utcnow()
+    index = waitlist_index.get_index(db)
+    offered = set()
+    for freed in freed_bookings:
+        for indexed, slot_start in index.match(freed.stylist_id, freed.start_time, freed.end_time):
+            if indexed.entry_id in offered:
+                continue
+            slot_end = slot_start + indexed.duration
+            # The slot may have been re-booked or held since it was freed
+            if booking_services.validate_booking_time(db, freed.stylist_id, slot_start, slot_end):
+                continue
+            
+            entry = db.query(WaitlistEntry).filter(WaitlistEntry.id == indexed.entry_id).first()
+            if not entry or entry.status != BookingStatus.WAITLISTED:
+                waitlist_index.unindex_entry(indexed.entry_id)
+                continue
+            if entry.notification_sent and _has_outstanding_offer(db, entry.id, now):
+                continue
+            
+            slot = TimeSlotResponse(
+                start_time=slot_start,
+                end_time=slot_end,
+                stylist_id=freed.stylist_id,
+                is_available=True
+            )
+            
+            # Offer the slot to the best match only
+            entry.notification_sent = True
+            offered.add(entry.id)
             
             # Create notification
             notification_services.create_notification(
@@ -329,6 +423,7 @@ def process_waitlist_entries(db: Session) -> None:
                 status="SENT"
             )
             db.add(waitlist_notification)
+            break
     
     # Update expired entries
     expired_entries = db.query(WaitlistEntry).filter(
@@ -340,6 +435,7 @@ def process_waitlist_entries(db: Session) -> None:
     
     for entry in expired_entries:
         entry.status = "EXPIRED"
+        waitlist_index.unindex_entry(entry.id)
         
         # Create notification
         notification_services.create_notification(
@@ -360,6 +456,11 @@ def process_waitlist_entries(db: Session) -> None:
         )
         db.add(waitlist_notification)
     
+    if watermark:
+        watermark.processed_until = now
+    else:
+        db.add(WaitlistWatermark(name=PROCESS_WATERMARK, processed_until=now))
+    
     try:
         db.commit()
     except Exception as e:
@@ -377,7 +478,7 @@ def get_waitlist_entries(
     limit: int = 100
 ) -> List[WaitlistEntry]:
     """Get waitlist entries with optional filtering."""
-    query = db.query(WaitlistEntry)
+    query = loaders.with_profile(db.query(WaitlistEntry), "waitlist_entry_response")
     
     if user_id:
         query = query.filter(WaitlistEntry.user_id == user_id)
@@ -0,0 +1,442 @@
+"""
+Bulk rebooking of bookings displaced by a stylist's time off.
+
+Approving time off over existing bookings used to be refused outright. Here
+the displaced bookings are reassigned in one pass: every booking gets
+candidate slots (the same stylist at a nearby time, or another stylist at or
+near the original time) from the free intervals of a single availability
+snapshot, each scored by how far it moves the appointment and whether it
+changes the stylist, and a min-cost assignment picks one slot per booking.
+Two picks can still overlap on the same stylist, so picks are accepted
+cheapest first against the shrinking free intervals and the losers are
+re-planned in the next round.
+
+The plan is applied together with the approval in one transaction, with the
+customers' notification rows inserted in the same batch. Customers who allow
+emails also get an EMAIL row, sent by the ``send_email_batch`` task.
+"""
+import heapq
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from booking.models import Booking, BookingStatus, StylistTimeOff
+from booking import availability, availability_cache, day_sheets, slot_claims, time_off_index
+from booking.optimized_services import SLOT_INTERVAL_MINUTES
+from booking.schedule import at_minute
+from config.settings import get_settings
+from notifications.fanout import record_delivery_results
+from notifications.models import Notification, NotificationChannel, NotificationStatus, NotificationType
+from stylists.models import Stylist
+from tasks.email_tasks import send_email_batch
+from users.models import User, UserSetting
+
+logger = logging.getLogger(__name__)
+
+Slot = Tuple[int, datetime]
+
+# Cost of leaving a booking unplaced; above any real candidate's cost
+UNPLACED_COST = 1e6
+# Cost of a slot that is not a candidate for the booking
+INFEASIBLE_COST = 1e9
+
+def _min_cost_assignment(cost: np.ndarray) -> List[int]:
+    """Column assigned to each row of an n x m (n <= m) cost matrix.
+
+    Hungarian method with potentials (shortest augmenting paths), O(n^2 m),
+    with the inner column scan vectorized.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)  # row (1-based) matched to each column, 0 = none
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = match[column]
+            free = ~used[1:]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = column
+            reachable = np.where(free, min_slack[1:], np.inf)
+            next_column = int(np.argmin(reachable)) + 1
+            delta = reachable[next_column - 1]
+            used_columns = np.nonzero(used)[0]
+            u[match[used_columns]] += delta
+            v[used_columns] -= delta
+            min_slack[1:][free] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    assignment = [-1] * n
+    for column in range(1, m + 1):
+        if match[column]:
+            assignment[match[column] - 1] = column - 1
+    return assignment
+
+def _get_time_off(db: Session, time_off_id: str) -> StylistTimeOff:
+    time_off = db.query(StylistTimeOff).filter(StylistTimeOff.id == time_off_id).first()
+    if not time_off:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Time off request not found"
+        )
+    if time_off.is_approved:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Time off request is already approved"
+        )
+    return time_off
+
+def displaced_bookings(db: Session, time_off: StylistTimeOff) -> List[Booking]:
+    """Active bookings of the stylist that overlap the time off."""
+    return db.query(Booking).filter(
+        and_(
+            Booking.stylist_id == time_off.stylist_id,
+            Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED]),
+            Booking.start_time < time_off.end_date,
+            Booking.end_time > time_off.start_date
+        )
+    ).order_by(Booking.start_time).all()
+
+def _preferred_stylists(db: Session, user_ids: List[int], excluded_stylist_id: int) -> Dict[int, int]:
+    """Each customer's most booked stylist other than the one going on time off."""
+    rows = db.query(
+        Booking.user_id,
+        Booking.stylist_id,
+        func.count(Booking.id)
+    ).filter(
+        and_(
+            Booking.user_id.in_(user_ids),
+            Booking.stylist_id != excluded_stylist_id,
+            Booking.status != BookingStatus.CANCELLED
+        )
+    ).group_by(Booking.user_id, Booking.stylist_id).all()
+    counts: Dict[int, Counter] = defaultdict(Counter)
+    for user_id, stylist_id, count in rows:
+        counts[user_id][stylist_id] = count
+    return {user_id: counter.most_common(1)[0][0] for user_id, counter in counts.items()}
+
+class _Planner:
+    """Free intervals of every active stylist around the displaced bookings."""
+
+    def __init__(self, db: Session, time_off: StylistTimeOff, bookings: List[Booking]):
+        settings = get_settings()
+        self.window = timedelta(days=settings.REBOOKING_WINDOW_DAYS)
+        self.change_cost = settings.REBOOKING_STYLIST_CHANGE_MINUTES
+        self.candidates_per_booking = settings.REBOOKING_CANDIDATES_PER_BOOKING
+        self.step = timedelta(minutes=SLOT_INTERVAL_MINUTES)
+        self.not_before = datetime.utcnow()
+        self.stylist_id = time_off.stylist_id
+
+        self.stylist_ids = [
+            stylist_id for (stylist_id,) in db.query(Stylist.id).filter(Stylist.is_active == True).all()
+        ]
+        if self.stylist_id not in self.stylist_ids:
+            self.stylist_ids.append(self.stylist_id)
+        self.preferred = _preferred_stylists(db, list({booking.user_id for booking in bookings}), self.stylist_id)
+
+        range_start = at_minute((min(booking.start_time for booking in bookings) - self.window).date(), 0)
+        range_end = at_minute((max(booking.end_time for booking in bookings) + self.window).date(), 0) + timedelta(days=1)
+        snapshot = availability.load_snapshot(db, self.stylist_ids, range_start, range_end)
+
+        # Plan as if the time off were approved and the displaced bookings gone
+        moving = {booking.id for booking in bookings}
+        snapshot.bookings[self.stylist_id] = [
+            booking for booking in snapshot.bookings.get(self.stylist_id, []) if booking.id not in moving
+        ]
+        snapshot.time_off[self.stylist_id] = availability.merge_intervals(
+            list(snapshot.time_off.get(self.stylist_id, [])) + [(time_off.start_date, time_off.end_date)]
+        )
+        self.free = {
+            stylist_id: availability.compute_free_intervals(snapshot, stylist_id, range_start, range_end)
+            for stylist_id in self.stylist_ids
+        }
+
+    def stylist_cost(self, booking: Booking, stylist_id: int) -> float:
+        if stylist_id == booking.stylist_id:
+            return 0.0
+        if self.preferred.get(booking.user_id) == stylist_id:
+            return self.change_cost / 2
+        return float(self.change_cost)
+
+    def candidates(self, booking: Booking) -> List[Tuple[float, Slot]]:
+        """Cheapest feasible (cost, slot) pairs for a booking; cost is minutes moved plus stylist change."""
+        duration = booking.end_time - booking.start_time
+        low = max(booking.start_time - self.window, self.not_before)
+        high = booking.end_time + self.window
+        found = []
+        for stylist_id in self.stylist_ids:
+            stylist_cost = self.stylist_cost(booking, stylist_id)
+            intervals = availability.clip_intervals(self.free[stylist_id], low, high)
+            origin = at_minute(low.date(), 0)
+            for slot_start in availability.iter_slot_starts(intervals, duration, self.step, origin):
+                shift = abs((slot_start - booking.start_time).total_seconds()) / 60
+                found.append((shift + stylist_cost, (stylist_id, slot_start)))
+        return heapq.nsmallest(self.candidates_per_booking, found)
+
+    def take(self, stylist_id: int, start: datetime, end: datetime) -> bool:
+        """Reserve a slot if it is still free."""
+        if not availability.contains_slot(self.free[stylist_id], start, end):
+            return False
+        self.free[stylist_id] = availability.subtract_intervals(self.free[stylist_id], [(start, end)])
+        return True
+
+def _plan(db: Session, time_off: StylistTimeOff, bookings: List[Booking]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Moves and unplaced booking ids for the displaced bookings."""
+    if not bookings:
+        return [], []
+    planner = _Planner(db, time_off, bookings)
+    moves: List[Dict[str, Any]] = []
+    unplaced: List[str] = []
+    pending = list(bookings)
+
+    while pending:
+        options = {booking.id: planner.candidates(booking) for booking in pending}
+        unplaced.extend(booking.id for booking in pending if not options[booking.id])
+        pending = [booking for booking in pending if options[booking.id]]
+        if not pending:
+            break
+
+        columns: Dict[Slot, int] = {}
+        for booking in pending:
+            for _, slot in options[booking.id]:
+                columns.setdefault(slot, len(columns))
+        # One "unplaced" column per booking keeps the matrix rectangular (n <= m)
+        cost = np.full((len(pending), len(columns) + len(pending)), INFEASIBLE_COST)
+        cost[:, len(columns):] = UNPLACED_COST
+        for row, booking in enumerate(pending):
+            for slot_cost, slot in options[booking.id]:
+                cost[row, columns[slot]] = slot_cost
+        slots = list(columns)
+        assignment = _min_cost_assignment(cost)
+
+        picks = sorted(
+            (cost[row, column], row, slots[column])
+            for row, column in enumerate(assignment)
+            if column < len(slots)
+        )
+        unplaced.extend(
+            pending[row].id for row, column in enumerate(assignment) if column >= len(slots)
+        )
+        deferred = []
+        for slot_cost, row, (stylist_id, slot_start) in picks:
+            booking = pending[row]
+            slot_end = slot_start + (booking.end_time - booking.start_time)
+            if planner.take(stylist_id, slot_start, slot_end):
+                moves.append({
+                    "booking_id": booking.id,
+                    "user_id": booking.user_id,
+                    "from_stylist_id": booking.stylist_id,
+                    "from_start_time": booking.start_time,
+                    "to_stylist_id": stylist_id,
+                    "to_start_time": slot_start,
+                    "to_end_time": slot_end,
+                    "cost": float(slot_cost)
+                })
+            else:
+                deferred.append(booking)
+        # The cheapest pick always fits, so every round places at least one booking
+        pending = deferred
+
+    return moves, unplaced
+
+def plan_time_off_rebooking(db: Session, time_off_id: str) -> Dict[str, Any]:
+    """Dry run: how the bookings displaced by a pending time off would be rebooked."""
+    time_off = _get_time_off(db, time_off_id)
+    moves, unplaced = _plan(db, time_off, displaced_bookings(db, time_off))
+    return {
+        "time_off_id": time_off.id,
+        "stylist_id": time_off.stylist_id,
+        "moves": moves,
+        "unplaced": unplaced,
+        "total_cost": sum(move["cost"] for move in moves),
+        "applied": False
+    }
+
+def _notification(user_id: int, notification_type: NotificationType, title: str, message: str, booking_id: str) -> Notification:
+    return Notification(
+        user_id=user_id,
+        type=notification_type,
+        channel=NotificationChannel.IN_APP,
+        status=NotificationStatus.PENDING,
+        title=title,
+        message=message,
+        notification_metadata={"booking_id": booking_id}
+    )
+
+def _email_addresses(db: Session, user_ids: List[int]) -> Dict[int, str]:
+    """Addresses of the customers who allow emails, from one settings query."""
+    if not user_ids:
+        return {}
+    return {
+        user_id: email
+        for user_id, email in db.query(User.id, User.email).join(
+            UserSetting, UserSetting.user_id == User.id
+        ).filter(
+            and_(
+                User.id.in_(user_ids),
+                UserSetting.enable_email_notifications == True
+            )
+        ).all()
+        if email
+    }
+
+def _queue_emails(db: Session, emails: List[Tuple[int, str, str, str]]) -> None:
+    """Queue (notification_id, email, title, message) emails, one batch task per distinct text and batch size."""
+    by_text = defaultdict(list)
+    for notification_id, email, title, message in emails:
+        by_text[(title, message)].append([notification_id, email])
+    batch_size = get_settings().NOTIFICATION_DELIVERY_BATCH_SIZE
+    for (title, message), deliveries in by_text.items():
+        for start in range(0, len(deliveries), batch_size):
+            batch = deliveries[start:start + batch_size]
+            try:
+                send_email_batch.delay(batch, title, message)
+            except Exception as e:
+                logger.warning(f"Failed to queue {len(batch)} rebooking emails: {str(e)}")
+                record_delivery_results(db, [], [notification_id for notification_id, _ in batch], str(e))
+
+def approve_time_off_with_rebooking(
+    db: Session,
+    time_off_id: str,
+    admin_id: int,
+    cancel_unplaced: bool = False
+) -> Dict[str, Any]:
+    """Approve time off and move its displaced bookings in one transaction.
+
+    Bookings that cannot be placed anywhere make the request fail with 409
+    unless ``cancel_unplaced`` is set, in which case they are cancelled.
+    """
+    time_off = _get_time_off(db, time_off_id)
+    stylist_id = time_off.stylist_id
+    time_off_span = (stylist_id, time_off.start_date, time_off.end_date)
+    bookings = displaced_bookings(db, time_off)
+    moves, unplaced = _plan(db, time_off, bookings)
+
+    if unplaced and not cancel_unplaced:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{len(unplaced)} displaced bookings could not be rebooked",
+            headers={"X-Unplaced-Bookings": ",".join(unplaced)}
+        )
+
+    by_id = {booking.id: booking for booking in bookings}
+    stylist_names = {
+        stylist_id: name
+        for stylist_id, name in db.query(Stylist.id, Stylist.name).filter(
+            Stylist.id.in_({move["to_stylist_id"] for move in moves} | {stylist_id})
+        ).all()
+    }
+    previous_slots = [(booking.stylist_id, booking.start_time, booking.end_time) for booking in bookings]
+    now = datetime.utcnow()
+    notifications = []
+
+    for move in moves:
+        booking = by_id[move["booking_id"]]
+        booking.stylist_id = move["to_stylist_id"]
+        booking.start_time = move["to_start_time"]
+        booking.end_time = move["to_end_time"]
+        booking.last_modified_by = admin_id
+        notifications.append(_notification(
+            booking.user_id,
+            NotificationType.BOOKING_MODIFICATION,
+            "Your booking has been moved",
+            f"{stylist_names.get(stylist_id, 'Your stylist')} is unavailable, so your booking is now on "
+            f"{booking.start_time.strftime('%Y-%m-%d at %H:%M')} with {stylist_names.get(booking.stylist_id, 'another stylist')}.",
+            booking.id
+        ))
+    for booking_id in unplaced:
+        booking = by_id[booking_id]
+        booking.status = BookingStatus.CANCELLED
+        booking.cancellation_reason = "Stylist time off"
+        booking.cancellation_time = now
+        booking.last_modified_by = admin_id
+        notifications.append(_notification(
+            booking.user_id,
+            NotificationType.BOOKING_CANCELLATION,
+            "Your booking has been cancelled",
+            f"{stylist_names.get(stylist_id, 'Your stylist')} is unavailable and no other slot was free for your "
+            f"booking on {booking.start_time.strftime('%Y-%m-%d at %H:%M')}. Please book a new time.",
+            booking.id
+        ))
+
+    time_off.is_approved = True
+    time_off.approved_by = admin_id
+
+    # Sent by the batch task, so stored QUEUED like a fan-out's
+    addresses = _email_addresses(db, list({notification.user_id for notification in notifications}))
+    email_notifications = [
+        Notification(
+            user_id=notification.user_id,
+            type=notification.type,
+            channel=NotificationChannel.EMAIL,
+            status=NotificationStatus.QUEUED,
+            title=notification.title,
+            message=notification.message,
+            notification_metadata=notification.notification_metadata
+        )
+        for notification in notifications
+        if notification.user_id in addresses
+    ]
+
+    try:
+        slot_claims.sync(db, bookings)
+        db.add_all(notifications + email_notifications)
+        db.flush()
+        emails = [
+            (notification.id, addresses[notification.user_id], notification.title, notification.message)
+            for notification in email_notifications
+        ]
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Availability changed while rebooking; review the plan and try again"
+            )
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to apply rebooking plan for time off {time_off_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to approve time off request"
+        )
+
+    new_slots = [(move["to_stylist_id"], move["to_start_time"], move["to_end_time"]) for move in moves]
+    # Bumping the generation makes other workers' time-off indexes stale (after the local TTL on the memory backend)
+    availability_cache.get_cache().invalidate_stylist(stylist_id)
+    time_off_index.invalidate(stylist_id)
+    for slot in previous_slots + new_slots:
+        availability_cache.invalidate_booking(*slot)
+    day_sheets.refresh_spans(db, [time_off_span] + previous_slots + new_slots)
+    _queue_emails(db, emails)
+
+    return {
+        "time_off_id": time_off_id,
+        "stylist_id": stylist_id,
+        "moves": moves,
+        "unplaced": unplaced,
+        "total_cost": sum(move["cost"] for move in moves),
+        "applied": True
+    }
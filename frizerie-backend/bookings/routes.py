@@ -1,20 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 from config.database import get_db
 from config.dependencies import get_current_user
+from auth.dependencies import get_current_admin
 from . import services
 from . import models
+from . import rebooking
 from users.models import User
 from services.models import Service
+from stylists.models import Stylist
 from validation import (
     BookingCreate,
     BookingResponse,
     validate_booking_time,
     validate_vip_booking
 )
+from validation.schemas import (
+    DaySheetResponse, RebookingPlanResponse, RecurringBookingCreate, RecurringBookingResponse,
+    SlotHoldCreate, SlotHoldResponse, TimeSlotResponse
+)
+from booking import optimized_services as booking_services
+from booking import recurring_services
+from booking import availability_cache, calendar_feed, day_sheets
+from utils import pagination
 
 router = APIRouter(prefix="/bookings", tags=["Bookings"])
 
@@ -32,6 +44,36 @@ def get_stylists(db: Session = Depends(get_db)):
         } for stylist in stylists
     ]
 
+@router.get("/available-slots/earliest", response_model=List[TimeSlotResponse])
+def get_earliest_available_slots(
+    service_id: int,
+    start_time: Optional[datetime] = None,
+    stylist_ids: Optional[List[int]] = Query(None),
+    count: int = Query(5, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the next available slots for a service across all or selected stylists."""
+    return booking_services.get_earliest_slots(db, service_id, start_time, stylist_ids, count)
+
+@router.get("/available-slots/any/{date}", response_model=List[Dict[str, Any]])
+def get_available_slots_any_stylist(
+    date: str,
+    service_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get available slots on a date across all stylists."""
+    try:
+        date_obj = datetime.fromisoformat(date.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)"
+        )
+    
+    return services.get_available_slots_any_stylist(db, date_obj, service_id)
+
 @router.get("/available-slots/{stylist_id}/{date}", response_model=List[Dict[str, Any]])
 def get_available_slots(
     stylist_id: int, 
@@ -75,18 +117,89 @@ def create_booking(
         current_user.id,
         booking_data.stylist_id,
         booking_data.service_id,
-        booking_data.start_time
+        booking_data.start_time,
+        hold_id=booking_data.hold_id
     )
     
     return booking
 
+@router.post("/recurring", response_model=RecurringBookingResponse)
+def create_recurring_bookings(
+    booking_data: RecurringBookingCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a series of recurring bookings; dates that conflict are skipped and listed with the reason."""
+    parent_booking, recurring_bookings, skipped_dates = recurring_services.create_recurring_bookings(
+        db, booking_data, current_user.id
+    )
+    return RecurringBookingResponse(
+        parent_booking=parent_booking,
+        recurring_bookings=recurring_bookings,
+        skipped_dates=skipped_dates
+    )
+
+@router.put("/recurring/{booking_id}", response_model=RecurringBookingResponse)
+def update_recurring_bookings(
+    booking_id: str,
+    booking_data: RecurringBookingCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Replace the future occurrences of the series whose parent is ``booking_id``."""
+    parent_booking, recurring_bookings, skipped_dates = recurring_services.update_recurring_bookings(
+        db, booking_id, booking_data, current_user.id
+    )
+    return RecurringBookingResponse(
+        parent_booking=parent_booking,
+        recurring_bookings=recurring_bookings,
+        skipped_dates=skipped_dates
+    )
+
+@router.delete("/recurring/{booking_id}", response_model=List[BookingResponse])
+def cancel_recurring_bookings(
+    booking_id: str,
+    cancel_future_only: bool = True,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cancel the series whose parent is ``booking_id``; returns the cancelled bookings."""
+    _, cancelled = recurring_services.cancel_recurring_bookings(
+        db, booking_id, current_user.id, cancel_future_only
+    )
+    return cancelled
+
+@router.post("/holds", response_model=SlotHoldResponse)
+def create_slot_hold(
+    hold_data: SlotHoldCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Hold a slot for a few minutes while the user completes checkout."""
+    return booking_services.create_slot_hold(db, hold_data, current_user.id)
+
+@router.delete("/holds/{hold_id}")
+def release_slot_hold(
+    hold_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Release a slot hold before it expires."""
+    booking_services.release_slot_hold(hold_id, current_user.id)
+    return {"message": "Slot hold released"}
+
 @router.get("/my-bookings", response_model=List[BookingResponse])
 def get_user_bookings(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all bookings for the current user."""
-    return services.get_user_bookings(db, current_user.id)
+    """Get the current user's bookings, newest first; pass the X-Next-Cursor header back as ``cursor`` for the next page."""
+    bookings = services.get_user_bookings(db, current_user.id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_page_headers(response, bookings, limit, "start_time")
+    return bookings
 
 @router.delete("/{booking_id}", response_model=BookingResponse)
 def cancel_booking(
@@ -99,23 +212,161 @@ def cancel_booking(
 
 @router.get("/my-bookings/history", response_model=List[BookingResponse])
 def get_user_booking_history(
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get booking history for the current user."""
-    return services.get_user_booking_history(db, current_user.id, skip=skip, limit=limit)
+    """Get booking history for the current user; pass the X-Next-Cursor header back as ``cursor`` for the next page."""
+    bookings = services.get_user_booking_history(db, current_user.id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_page_headers(response, bookings, limit, "start_time")
+    return bookings
 
 @router.get("/my-bookings/upcoming", response_model=List[BookingResponse])
 def get_user_upcoming_bookings(
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get upcoming bookings for the current user, soonest first."""
+    bookings = services.get_user_upcoming_bookings(db, current_user.id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_page_headers(response, bookings, limit, "start_time")
+    return bookings
+
+def _calendar_response(request: Request, db: Session, calendar_name: str, stylist_id: Optional[int] = None, user_id: Optional[int] = None):
+    """304 when the client's copy is current, otherwise the streamed feed."""
+    etag = calendar_feed.feed_etag(db, stylist_id=stylist_id, user_id=user_id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if calendar_feed.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return StreamingResponse(
+        calendar_feed.iter_feed(calendar_name, stylist_id=stylist_id, user_id=user_id),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers
+    )
+
+def get_feed_user(token: Optional[str] = Query(None), db: Session = Depends(get_db)) -> User:
+    """The owner of the feed token in the URL; calendar apps cannot send a bearer header."""
+    user = calendar_feed.feed_user(db, token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or revoked calendar feed token"
+        )
+    return user
+
+@router.post("/calendar/token")
+def create_calendar_feed_token(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Issue a calendar feed token for the feed URLs, revoking the previous one."""
+    token = calendar_feed.issue_feed_token(db, current_user)
+    return {
+        "token": token,
+        "feed_url": str(request.url_for("get_my_calendar_feed").include_query_params(token=token))
+    }
+
+@router.delete("/calendar/token")
+def revoke_calendar_feed_token(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke the current calendar feed token."""
+    calendar_feed.revoke_feed_token(db, current_user)
+    return {"message": "Calendar feed token revoked"}
+
+@router.get("/calendar/me.ics")
+def get_my_calendar_feed(
+    request: Request,
+    feed_user: User = Depends(get_feed_user),
+    db: Session = Depends(get_db)
+):
+    """iCalendar feed of the token owner's bookings."""
+    return _calendar_response(request, db, "My bookings", user_id=feed_user.id)
+
+@router.get("/calendar/stylists/{stylist_id}.ics")
+def get_stylist_calendar_feed(
+    stylist_id: int,
+    request: Request,
+    feed_user: User = Depends(get_feed_user),
+    db: Session = Depends(get_db)
+):
+    """iCalendar feed of a stylist's bookings, for that stylist or an admin."""
+    stylist = services.get_stylist(db, stylist_id)
+    if not calendar_feed.can_read_stylist_feed(feed_user, stylist):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to read this stylist's calendar"
+        )
+    return _calendar_response(request, db, stylist.name, stylist_id=stylist_id)
+
+# Longest range a single day sheet request may cover
+MAX_DAY_SHEET_RANGE_DAYS = 62
+
+@router.get("/day-sheets", response_model=List[DaySheetResponse])
+def get_day_sheets(
+    day: date,
+    stylist_ids: Optional[List[int]] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get upcoming bookings for the current user."""
-    return services.get_user_upcoming_bookings(db, current_user.id, skip=skip, limit=limit)
+    """Day sheets of all active (or the selected) stylists for one day."""
+    if not stylist_ids:
+        stylist_ids = [
+            stylist_id for (stylist_id,) in db.query(Stylist.id).filter(Stylist.is_active == True).all()
+        ]
+    return day_sheets.get_sheets(db, stylist_ids, day, day)
+
+@router.get("/day-sheets/stylists/{stylist_id}", response_model=List[DaySheetResponse])
+def get_stylist_day_sheets(
+    stylist_id: int,
+    start_day: date,
+    end_day: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Day sheets of one stylist for a range of days."""
+    services.get_stylist(db, stylist_id)
+    end_day = end_day or start_day
+    if end_day < start_day or end_day - start_day >= timedelta(days=MAX_DAY_SHEET_RANGE_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Day range must be ordered and at most {MAX_DAY_SHEET_RANGE_DAYS} days"
+        )
+    return day_sheets.get_sheets(db, [stylist_id], start_day, end_day)
+
+@router.get("/admin/time-off/{time_off_id}/rebooking-plan", response_model=RebookingPlanResponse)
+def get_time_off_rebooking_plan(
+    time_off_id: str,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Preview how bookings displaced by a time off request would be rebooked (admin only)."""
+    return rebooking.plan_time_off_rebooking(db, time_off_id)
+
+@router.post("/admin/time-off/{time_off_id}/approve-with-rebooking", response_model=RebookingPlanResponse)
+def approve_time_off_with_rebooking(
+    time_off_id: str,
+    cancel_unplaced: bool = False,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Approve a time off request and rebook its displaced bookings in one go (admin only)."""
+    return rebooking.approve_time_off_with_rebooking(db, time_off_id, current_user.id, cancel_unplaced)
+
+@router.get("/admin/availability-cache/stats")
+def get_availability_cache_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Availability cache hit/miss statistics of this worker (admin only)."""
+    return availability_cache.get_cache().stats()
 
 @router.post("/setup-test-data", status_code=status.HTTP_201_CREATED)
 async def setup_test_data(db: Session = Depends(get_db)):
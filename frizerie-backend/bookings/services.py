@@ -5,14 +5,21 @@ from datetime import datetime, time, timedelta
 import json
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 import logging # Import logging 
+import numpy as np
 
 from . import models
+from booking import availability, holds, occupancy, slot_claims, slot_events
+from booking.optimized_services import get_consumable_hold
+from utils import loaders, pagination
 from users.models import User, UserSetting # Import User and UserSetting models
 from services.models import Service # Import Service model
-from notifications.services import create_notification # Import create_notification
+from notifications.services import create_notification, send_last_minute_availability_notifications
 from notifications.models import NotificationType # Import NotificationType enum
+from notifications import push
+from tasks.push_tasks import send_push_batch
 
 # In a real app, these would interact with the database
 # These are just placeholders
@@ -230,14 +237,60 @@ def get_available_slots(
 
     return available_slots
 
+def get_available_slots_any_stylist(
+    db: Session,
+    date: datetime,
+    service_id: int
+) -> List[Dict[str, Any]]:
+    """Get slots on a date where at least one stylist can fit the service.
+
+    All stylists are checked at once against per-day occupancy bitmaps built
+    from cached free intervals, so the cost does not grow with the number of
+    candidate slots times stylists.
+    """
+    service = db.query(Service).filter(Service.id == service_id).first()
+    if not service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    
+    service_duration = timedelta(minutes=service.duration_minutes)
+    stylist_ids = [stylist.id for stylist in get_stylists(db)]
+    
+    # Slots are naive wall-clock times; an offset on the request only names the day
+    start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    end_of_day = start_of_day + timedelta(days=1)
+    day = start_of_day.date()
+    day_intervals = availability.get_day_intervals(db, stylist_ids, start_of_day, start_of_day)
+    
+    slot_starts = occupancy.slot_grid(start_of_day, end_of_day, timedelta(minutes=15))
+    fits = occupancy.fit_matrix(
+        occupancy.build_day_bitmaps(
+            [day_intervals[(stylist_id, day)][1] for stylist_id in stylist_ids], day
+        ),
+        start_of_day, slot_starts, service_duration
+    )
+    
+    now = datetime.now()
+    available_slots = []
+    for column, slot_start in enumerate(slot_starts):
+        if slot_start < now or not fits[:, column].any():
+            continue
+        available_slots.append({
+            "start_time": slot_start.isoformat(),
+            "end_time": (slot_start + service_duration).isoformat(),
+            "stylist_ids": [stylist_ids[row] for row in np.flatnonzero(fits[:, column])]
+        })
+    
+    return available_slots
+
 def create_booking(
     db: Session, 
     user_id: int, 
     stylist_id: int, 
     service_id: int,
-    start_time: datetime
+    start_time: datetime,
+    hold_id: Optional[str] = None
 ) -> Booking:
-    """Create a new booking."""
+    """Create a new booking, consuming the user's checkout hold on the slot."""
     # Check if the stylist and service exist
     stylist = get_stylist(db, stylist_id)
     service = db.query(Service).filter(Service.id == service_id).first()
@@ -245,7 +298,19 @@ def create_booking(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
 
     # Calculate end time based on service duration
-    end_time = start_time + timedelta(minutes=service.duration)
+    end_time = start_time + timedelta(minutes=service.duration_minutes)
+    
+    # A hold taken during checkout must still be live and cover this booking
+    if hold_id:
+        get_consumable_hold(hold_id, user_id, stylist_id, start_time, end_time)
+    
+    # Slots held by other customers during checkout are not available
+    slot_holds = holds.active_holds([stylist_id], start_time, end_time)
+    if any(hold.user_id != user_id for hold in slot_holds):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The selected time slot is not available"
+        )
     
     # Check for overlapping bookings for the stylist in the requested time range
     overlapping_bookings = get_bookings_for_time_range(db, stylist_id, start_time, end_time)
@@ -265,9 +330,19 @@ def create_booking(
         status="CONFIRMED"
     )
     
-    db.add(booking)
-    db.commit()
+    try:
+        db.add(booking)
+        slot_claims.claim(db, [booking])
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if slot_claims.is_overlap_error(e):
+            raise slot_claims.overlap_exception()
+        raise
     db.refresh(booking)
+    slot_events.after_write(db, [(stylist_id, start_time, end_time)])
+    for hold in slot_holds:
+        holds.discard(hold.id)
 
     # --- Notification Triggering ---
     # Get user settings
@@ -319,9 +394,16 @@ def create_booking(
     
     return booking
 
-def get_user_bookings(db: Session, user_id: int) -> List[Booking]:
-    """Get all bookings for a user."""
-    return db.query(Booking).filter(Booking.user_id == user_id).all()
+def get_user_bookings(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> List[Booking]:
+    """Get a page of a user's bookings, newest first."""
+    query = loaders.with_profile(db.query(Booking), "booking_response").filter(Booking.user_id == user_id)
+    return pagination.paginate(query, Booking.start_time, Booking.id, cursor, skip, limit)
 
 def cancel_booking(db: Session, booking_id: int, user_id: int) -> Booking:
     """Cancel a booking."""
@@ -348,8 +430,11 @@ def cancel_booking(db: Session, booking_id: int, user_id: int) -> Booking:
     
     # Update booking status
     booking.status = "CANCELLED"
+    slot_claims.release(db, [booking.id])
     db.commit()
     db.refresh(booking)
+    freed_slot = (booking.stylist_id, booking.start_time, booking.end_time)
+    slot_events.after_write(db, [freed_slot], freed=[freed_slot])
     
     # --- Notification Triggering ---
     # Get user settings
@@ -489,29 +574,33 @@ def get_user_booking_history(
     db: Session,
     user_id: int,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    cursor: Optional[str] = None
 ) -> List[Booking]:
-    """Get past bookings for a user."""
-    return db.query(Booking).filter(
+    """Get past bookings for a user, newest first."""
+    query = loaders.with_profile(db.query(Booking), "booking_response").filter(
         and_(
             Booking.user_id == user_id,
             Booking.end_time < datetime.now()
         )
-    ).order_by(Booking.start_time.desc()).offset(skip).limit(limit).all()
+    )
+    return pagination.paginate(query, Booking.start_time, Booking.id, cursor, skip, limit)
 
 def get_user_upcoming_bookings(
     db: Session,
     user_id: int,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    cursor: Optional[str] = None
 ) -> List[Booking]:
-    """Get upcoming bookings for a user."""
-    return db.query(Booking).filter(
+    """Get upcoming bookings for a user, soonest first."""
+    query = loaders.with_profile(db.query(Booking), "booking_response").filter(
         and_(
             Booking.user_id == user_id,
             Booking.end_time >= datetime.now()
         )
-    ).order_by(Booking.start_time.asc()).offset(skip).limit(limit).all()
+    )
+    return pagination.paginate(query, Booking.start_time, Booking.id, cursor, skip, limit, descending=False)
 
 def send_booking_reminder(db: Session, booking_id: int) -> bool:
     """
@@ -584,6 +673,20 @@ def send_booking_reminder(db: Session, booking_id: int) -> bool:
         )
         notifications_sent = True
     
+    if user_settings.enable_notifications:
+        push_data = {"type": "booking_reminder", "booking_id": booking.id}
+        notification_id = push.queue_push(
+            db,
+            booking.user_id,
+            NotificationType.BOOKING_REMINDER,
+            notification_title,
+            notification_message,
+            data=push_data
+        )
+        if notification_id:
+            send_push_batch.delay([[notification_id, booking.user_id]], notification_title, notification_message, push_data)
+            notifications_sent = True
+    
     return notifications_sent
 
 def send_booking_feedback_request(db: Session, booking_id: int) -> bool:
@@ -2,7 +2,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 import os
 import secrets
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import EmailStr
 
 class Settings(BaseSettings):
@@ -51,19 +51,105 @@ class Settings(BaseSettings):
     MAIL_SSL: bool = False
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
+    MAIL_TIMEOUT_SECONDS: int = 30
+    MAIL_POOL_SIZE: int = 4
+    MAIL_POOL_MAX_MESSAGES_PER_SESSION: int = 100
+    MAIL_POOL_IDLE_SECONDS: int = 60
     
     # SMS settings (Twilio)
     TWILIO_ACCOUNT_SID: str
     TWILIO_AUTH_TOKEN: str
     TWILIO_PHONE_NUMBER: str
+    TWILIO_API_BASE_URL: str = "https://api.twilio.com"
+    SMS_RATE_PER_SECOND: float = 1.0  # per sender number and worker process
+    SMS_BURST: float = 1.0
+    SMS_CONCURRENCY: int = 10
+    SMS_MAX_RETRIES: int = 5
+    SMS_BACKOFF_BASE_SECONDS: float = 1.0
+    SMS_BACKOFF_MAX_SECONDS: float = 30.0
+    SMS_TIMEOUT_SECONDS: float = 10.0
     
     # Firebase settings
     FIREBASE_CREDENTIALS_PATH: Optional[str] = None
+    FCM_API_URL: Optional[str] = None  # Stand-in FCM v1 messages:send URL for offline testing
+    PUSH_DRY_RUN: bool = False
+    PUSH_DISPATCH_BATCH_SIZE: int = 2000
+    PUSH_MAX_ATTEMPTS: int = 5
     
     # Celery settings
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
     
+    # Availability cache settings
+    AVAILABILITY_CACHE_BACKEND: str = "memory"  # memory, redis
+    AVAILABILITY_CACHE_MAX_ENTRIES: int = 10000
+    AVAILABILITY_CACHE_TTL_SECONDS: int = 3600
+    AVAILABILITY_CACHE_REDIS_URL: str = "redis://localhost:6379/1"
+    # Lifetime of per-process copies (cached days, compiled schedules, time-off indexes) when the backend is memory
+    AVAILABILITY_CACHE_LOCAL_TTL_SECONDS: int = 60
+
+    # Slot hold settings
+    SLOT_HOLD_BACKEND: str = "memory"  # memory, redis
+    SLOT_HOLD_TTL_MINUTES: int = 10
+    SLOT_HOLD_REDIS_URL: str = "redis://localhost:6379/1"
+
+    # Waitlist matching settings
+    WAITLIST_INDEX_REFRESH_SECONDS: int = 3600  # Full rebuild backstop; reads sync changed rows
+    WAITLIST_INDEX_SYNC_OVERLAP_SECONDS: int = 60
+    WAITLIST_EVENT_DEDUP_SECONDS: int = 30
+    WAITLIST_OFFER_TTL_MINUTES: int = 60
+
+    # Stylist day sheet settings
+    DAY_SHEET_HORIZON_DAYS: int = 45
+
+    # Time-off rebooking settings
+    REBOOKING_WINDOW_DAYS: int = 3
+    REBOOKING_STYLIST_CHANGE_MINUTES: int = 120
+    REBOOKING_CANDIDATES_PER_BOOKING: int = 30
+
+    # Utilization analytics settings
+    UTILIZATION_CACHE_TTL_SECONDS: int = 900
+    UTILIZATION_MAX_RANGE_DAYS: int = 366
+
+    # Notification fan-out settings
+    NOTIFICATION_FANOUT_CHUNK_SIZE: int = 1000
+    NOTIFICATION_DELIVERY_BATCH_SIZE: int = 100
+
+    # Notification delivery worker settings
+    NOTIFICATION_DELIVERY_MODE: str = "in_process"  # in_process, process
+    NOTIFICATION_DELIVERY_REDIS_URL: str = "redis://localhost:6379/0"
+    NOTIFICATION_CHANNEL_CONCURRENCY: Dict[str, int] = {
+        "email": 8,
+        "sms": 10,
+        "push": 4,
+        "web_push": 8,
+        "whatsapp": 4,
+        "telegram": 4,
+        "in_app": 50
+    }
+    NOTIFICATION_CHANNEL_TIMEOUT_SECONDS: Dict[str, float] = {
+        "email": 30.0,
+        "sms": 60.0,
+        "push": 30.0,
+        "web_push": 15.0,
+        "whatsapp": 15.0,
+        "telegram": 15.0,
+        "in_app": 5.0
+    }
+    NOTIFICATION_DELIVERY_MAX_RETRIES: int = 3
+    NOTIFICATION_DELIVERY_BACKOFF_SECONDS: float = 5.0
+    NOTIFICATION_DELIVERY_CLAIM_BATCH_SIZE: int = 200
+    NOTIFICATION_DELIVERY_STALE_SECONDS: int = 600
+    NOTIFICATION_DELIVERY_METRICS_SECONDS: int = 30
+
+    # Deferred notification scheduler settings
+    NOTIFICATION_SCHEDULER_HORIZON_SECONDS: int = 3600  # How far ahead deferred notifications are held in memory
+    NOTIFICATION_SCHEDULER_BATCH_SIZE: int = 500
+
+    # Notification preference cache settings
+    NOTIFICATION_PREFERENCE_CACHE_MAX_ENTRIES: int = 10000
+    NOTIFICATION_PREFERENCE_CACHE_TTL_SECONDS: int = 300
+
     # Stripe settings
     STRIPE_SECRET_KEY: str
     STRIPE_PUBLISHABLE_KEY: str
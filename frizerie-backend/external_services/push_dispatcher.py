@@ -0,0 +1,170 @@
+"""
+Push delivery through FCM multicast sends.
+
+Pushes that share a payload (title, body and data) are grouped and sent as
+one ``MulticastMessage`` per ``MAX_MULTICAST_TOKENS`` device tokens through
+``messaging.send_each_for_multicast``, instead of one ``messaging.send`` per
+token. FCM answers per token. Tokens it reports as unregistered, from
+another sender, or not valid registration tokens come back flagged
+``invalid`` so the caller can stop sending to them; transient failures
+(FCM unavailable, internal errors, timeouts, quota) come back flagged
+``retryable`` so the caller can send them again later.
+
+``fcm_url`` redirects the Admin SDK to a stand-in of the FCM v1 endpoint for
+offline testing. The SDK has no public option for that, so it relies on a
+private attribute of the pinned firebase-admin release (see ``_use_fcm_url``).
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import firebase_admin
+from firebase_admin import exceptions, messaging
+
+logger = logging.getLogger(__name__)
+
+# FCM's limit for a single multicast send
+MAX_MULTICAST_TOKENS = 500
+
+# Failures that say nothing about the token or message and may pass on a later try
+TRANSIENT_ERRORS = (
+    exceptions.UnavailableError,
+    exceptions.InternalError,
+    exceptions.DeadlineExceededError,
+    exceptions.ResourceExhaustedError
+)
+
+@dataclass
+class PushRequest:
+    token: str
+    title: str
+    body: str
+    data: Optional[Dict[str, str]] = None
+    reference: Any = None
+
+    def payload_key(self) -> Tuple:
+        return (self.title, self.body, tuple(sorted((self.data or {}).items())))
+
+@dataclass
+class PushResult:
+    token: str
+    reference: Any
+    success: bool
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    # FCM will never deliver to this token again; it should be pruned
+    invalid: bool = False
+    # The failure was transient; the same push may be sent again later
+    retryable: bool = False
+
+def is_invalid_token_error(error: Exception) -> bool:
+    """Whether an FCM error means the token itself is dead."""
+    if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    return isinstance(error, exceptions.InvalidArgumentError) and "registration token" in str(error).lower()
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether an FCM error is worth retrying later."""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+def _use_fcm_url(app, fcm_url: str) -> None:
+    """Point the Admin SDK's messaging service for ``app`` at ``fcm_url``.
+
+    Testing only. The FCM endpoint is fixed per messaging service instance,
+    so this sets its private ``_fcm_url``; firebase-admin is pinned in
+    requirements.txt and this fails loudly if the attribute goes away.
+    """
+    service = messaging._get_messaging_service(app)
+    if not hasattr(service, "_fcm_url"):
+        raise RuntimeError(
+            f"FCM_API_URL is not supported with firebase-admin {firebase_admin.__version__}"
+        )
+    service._fcm_url = fcm_url
+
+class PushDispatcher:
+    """Groups pushes by payload and sends each group as FCM multicasts."""
+
+    def __init__(
+        self,
+        app=None,
+        dry_run: bool = False,
+        max_tokens: int = MAX_MULTICAST_TOKENS,
+        fcm_url: Optional[str] = None
+    ):
+        self.app = app
+        self.dry_run = dry_run
+        self.max_tokens = min(max_tokens, MAX_MULTICAST_TOKENS)
+        if fcm_url:
+            _use_fcm_url(app, fcm_url)
+        self.calls = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "PushDispatcher":
+        """A dispatcher on the default Firebase app, initializing it if needed."""
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_admin.initialize_app()
+        return cls(dry_run=settings.PUSH_DRY_RUN, fcm_url=settings.FCM_API_URL)
+
+    @staticmethod
+    def group(requests: Sequence[PushRequest]) -> Dict[Tuple, List[PushRequest]]:
+        groups: Dict[Tuple, List[PushRequest]] = {}
+        for request in requests:
+            groups.setdefault(request.payload_key(), []).append(request)
+        return groups
+
+    def _send_chunk(self, chunk: List[PushRequest]) -> List[PushResult]:
+        first = chunk[0]
+        message = messaging.MulticastMessage(
+            tokens=[request.token for request in chunk],
+            notification=messaging.Notification(title=first.title, body=first.body),
+            data=first.data or {}
+        )
+        self.calls += 1
+        try:
+            response = messaging.send_each_for_multicast(message, dry_run=self.dry_run, app=self.app)
+        except (exceptions.FirebaseError, ValueError) as e:
+            logger.error(f"FCM multicast of {len(chunk)} tokens failed: {str(e)}")
+            return [
+                PushResult(
+                    token=request.token,
+                    reference=request.reference,
+                    success=False,
+                    error=str(e),
+                    retryable=is_transient_error(e)
+                )
+                for request in chunk
+            ]
+
+        results = []
+        for request, send_response in zip(chunk, response.responses):
+            if send_response.success:
+                results.append(PushResult(
+                    token=request.token,
+                    reference=request.reference,
+                    success=True,
+                    message_id=send_response.message_id
+                ))
+            else:
+                error = send_response.exception
+                results.append(PushResult(
+                    token=request.token,
+                    reference=request.reference,
+                    success=False,
+                    error=str(error),
+                    invalid=is_invalid_token_error(error),
+                    retryable=is_transient_error(error)
+                ))
+        return results
+
+    def send(self, requests: Sequence[PushRequest]) -> List[PushResult]:
+        """Send every request; results are returned in request order."""
+        results: Dict[int, PushResult] = {}
+        positions = {id(request): index for index, request in enumerate(requests)}
+        for group in self.group(requests).values():
+            for start in range(0, len(group), self.max_tokens):
+                chunk = group[start:start + self.max_tokens]
+                for request, result in zip(chunk, self._send_chunk(chunk)):
+                    results[positions[id(request)]] = result
+        return [results[index] for index in range(len(requests))]
@@ -0,0 +1,232 @@
+"""
+Rate-aware SMS dispatch over Twilio's Messages REST API.
+
+Messages are queued and sent by a fixed number of workers sharing one
+``httpx.AsyncClient``, so TLS connections to the API are reused instead of
+opened per message. Each sender number has its own token bucket
+(``rate_per_second`` with bursts of up to ``burst``), matching how Twilio
+meters throughput per number. A 429 is retried after ``Retry-After`` or an
+exponential backoff with jitter; other errors fail the message at once.
+
+Buckets are per dispatcher, i.e. per worker process: size the rate so that
+rate x worker processes stays within the provider's limit.
+"""
+import asyncio
+import logging
+import random
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TOO_MANY_REQUESTS = 429
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, ``capacity`` at once."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        # The lock hands tokens out in arrival order
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+@dataclass
+class SMSJob:
+    to: str
+    body: str
+    from_: Optional[str] = None
+    reference: Any = None
+
+@dataclass
+class SMSResult:
+    reference: Any
+    to: str
+    sent: bool
+    sid: Optional[str] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    attempts: int = 0
+    # Attempts answered with 429
+    throttled: int = 0
+    # From dequeue to final response, including throttling and backoff
+    latency_ms: float = 0.0
+    # Time spent in the successful or final HTTP request alone
+    request_ms: float = 0.0
+
+def summarize(results: Sequence[SMSResult]) -> Dict[str, Any]:
+    """Totals and latency percentiles of a dispatch."""
+    latencies = sorted(result.latency_ms for result in results)
+    sent = sum(1 for result in results if result.sent)
+    return {
+        "sent": sent,
+        "failed": len(results) - sent,
+        "throttled": sum(result.throttled for result in results),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2) if latencies else None,
+            "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+            "max": round(latencies[-1], 2) if latencies else None
+        }
+    }
+
+class SMSDispatcher:
+    """Queue-fed Twilio sender with per-number throttling."""
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        default_from: str,
+        base_url: str = "https://api.twilio.com",
+        rate_per_second: float = 1.0,
+        burst: float = 1.0,
+        concurrency: int = 10,
+        max_retries: int = 5,
+        backoff_base_seconds: float = 1.0,
+        backoff_max_seconds: float = 30.0,
+        timeout: float = 10.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.account_sid = account_sid
+        self.default_from = default_from
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self._client = httpx.AsyncClient(
+            auth=(account_sid, auth_token),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            transport=transport
+        )
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_settings(cls, settings) -> "SMSDispatcher":
+        """A dispatcher for the configured Twilio account and SMS_* limits."""
+        return cls(
+            account_sid=settings.TWILIO_ACCOUNT_SID,
+            auth_token=settings.TWILIO_AUTH_TOKEN,
+            default_from=settings.TWILIO_PHONE_NUMBER,
+            base_url=settings.TWILIO_API_BASE_URL,
+            rate_per_second=settings.SMS_RATE_PER_SECOND,
+            burst=settings.SMS_BURST,
+            concurrency=settings.SMS_CONCURRENCY,
+            max_retries=settings.SMS_MAX_RETRIES,
+            backoff_base_seconds=settings.SMS_BACKOFF_BASE_SECONDS,
+            backoff_max_seconds=settings.SMS_BACKOFF_MAX_SECONDS,
+            timeout=settings.SMS_TIMEOUT_SECONDS
+        )
+
+    def _bucket(self, sender: str) -> TokenBucket:
+        if sender not in self._buckets:
+            self._buckets[sender] = TokenBucket(self.rate_per_second, self.burst)
+        return self._buckets[sender]
+
+    def _backoff(self, attempt: int, response: httpx.Response) -> float:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max_seconds)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base_seconds * 2 ** (attempt - 1), self.backoff_max_seconds)
+        return random.uniform(delay / 2, delay)
+
+    @staticmethod
+    def _error(response: httpx.Response) -> str:
+        try:
+            payload = response.json()
+            return f"Twilio error {payload.get('code')}: {payload.get('message')}"
+        except ValueError:
+            return f"Twilio HTTP {response.status_code}"
+
+    async def _send(self, job: SMSJob) -> SMSResult:
+        sender = job.from_ or self.default_from
+        result = SMSResult(reference=job.reference, to=job.to, sent=False)
+        started = time.perf_counter()
+        while True:
+            await self._bucket(sender).acquire()
+            result.attempts += 1
+            request_started = time.perf_counter()
+            try:
+                response = await self._client.post(
+                    self._url, data={"To": job.to, "From": sender, "Body": job.body}
+                )
+            except httpx.ConnectError as e:
+                # Nothing reached the API, so resending cannot duplicate the SMS
+                if result.attempts > self.max_retries:
+                    result.error = f"Connection failed: {str(e)}"
+                    break
+                await asyncio.sleep(min(self.backoff_base_seconds * 2 ** (result.attempts - 1), self.backoff_max_seconds))
+                continue
+            except httpx.HTTPError as e:
+                result.error = f"Request failed: {str(e)}"
+                break
+            finally:
+                result.request_ms = (time.perf_counter() - request_started) * 1000
+            result.status_code = response.status_code
+            if response.status_code == TOO_MANY_REQUESTS and result.attempts <= self.max_retries:
+                result.throttled += 1
+                await asyncio.sleep(self._backoff(result.attempts, response))
+                continue
+            if response.is_success:
+                result.sent = True
+                result.sid = response.json().get("sid")
+            else:
+                result.error = self._error(response)
+            break
+        result.latency_ms = (time.perf_counter() - started) * 1000
+        if not result.sent:
+            logger.warning(f"SMS to {job.to} failed after {result.attempts} attempts: {result.error}")
+        return result
+
+    async def _worker(self, queue: "asyncio.Queue[tuple]", results: List[Optional[SMSResult]]) -> None:
+        while True:
+            try:
+                index, job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                results[index] = await self._send(job)
+            except Exception as e:
+                results[index] = SMSResult(reference=job.reference, to=job.to, sent=False, error=str(e))
+
+    async def dispatch(self, jobs: Sequence[SMSJob]) -> List[SMSResult]:
+        """Send every job; results are returned in job order."""
+        queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        for index, job in enumerate(jobs):
+            queue.put_nowait((index, job))
+        results: List[Optional[SMSResult]] = [None] * len(jobs)
+        await asyncio.gather(*(
+            self._worker(queue, results) for _ in range(min(self.concurrency, len(jobs)))
+        ))
+        return results
+
+    async def send(self, to: str, body: str, from_: Optional[str] = None) -> SMSResult:
+        """Send a single SMS, still throttled with every other send from the same number."""
+        return await self._send(SMSJob(to=to, body=body, from_=from_))
+
+    async def close(self) -> None:
+        await self._client.aclose()
@@ -0,0 +1,213 @@
+"""
+Pool of persistent, authenticated SMTP sessions.
+
+Opening an SMTP connection costs a TCP handshake, STARTTLS and AUTH before
+the first byte of mail, which dominates the cost of a single notification
+email. The pool keeps up to ``size`` logged-in ``aiosmtplib`` sessions and
+hands them out one at a time. A session is reconnected when the server drops
+it, when it has sat idle longer than ``idle_seconds`` (servers close idle
+connections), or after ``max_messages`` messages (servers cap messages per
+connection).
+
+A pool belongs to the event loop it is first used on.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.message import Message
+from typing import AsyncIterator, List, Optional, Sequence
+
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the session cannot be trusted and is reconnected
+CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+    OSError
+)
+
+# "Service not available, closing transmission channel"
+SERVICE_CLOSING = 421
+
+class _Session:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+class SMTPPool:
+    """Reusable SMTP sessions for one server and account."""
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = False,
+        start_tls: Optional[bool] = None,
+        validate_certs: bool = True,
+        timeout: float = 30,
+        size: int = 4,
+        max_messages: int = 100,
+        idle_seconds: float = 60
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.validate_certs = validate_certs
+        self.timeout = timeout
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self._idle: List[_Session] = []
+        self._slots = asyncio.Semaphore(size)
+        self.connects = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "SMTPPool":
+        """A pool for the configured MAIL_* server and account."""
+        return cls(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            username=settings.MAIL_USERNAME if settings.USE_CREDENTIALS else None,
+            password=settings.MAIL_PASSWORD if settings.USE_CREDENTIALS else None,
+            use_tls=settings.MAIL_SSL,
+            start_tls=settings.MAIL_TLS and not settings.MAIL_SSL,
+            validate_certs=settings.VALIDATE_CERTS,
+            timeout=settings.MAIL_TIMEOUT_SECONDS,
+            size=settings.MAIL_POOL_SIZE,
+            max_messages=settings.MAIL_POOL_MAX_MESSAGES_PER_SESSION,
+            idle_seconds=settings.MAIL_POOL_IDLE_SECONDS
+        )
+
+    async def _connect(self) -> _Session:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            validate_certs=self.validate_certs,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        if self.username:
+            await smtp.login(self.username, self.password)
+        self.connects += 1
+        return _Session(smtp)
+
+    def _is_usable(self, session: _Session) -> bool:
+        return (
+            session.smtp.is_connected
+            and session.messages < self.max_messages
+            and time.monotonic() - session.last_used < self.idle_seconds
+        )
+
+    async def _discard(self, session: _Session) -> None:
+        try:
+            if session.smtp.is_connected:
+                await session.smtp.quit()
+        except Exception:
+            session.smtp.close()
+
+    async def _checkout(self) -> _Session:
+        # Most recently used first: it is the least likely to have timed out
+        while self._idle:
+            session = self._idle.pop()
+            if self._is_usable(session):
+                return session
+            await self._discard(session)
+        return await self._connect()
+
+    async def _checkin(self, session: _Session, broken: bool = False) -> None:
+        """Return a healthy session to the pool and quit a broken one."""
+        if broken or not session.smtp.is_connected:
+            await self._discard(session)
+            return
+        session.last_used = time.monotonic()
+        self._idle.append(session)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[_Session]:
+        """Borrow a connected session.
+
+        It goes back to the pool however the block exits, including on
+        refused recipients or other protocol errors, unless the connection
+        itself failed.
+        """
+        async with self._slots:
+            session = await self._checkout()
+            broken = False
+            try:
+                yield session
+            except CONNECTION_ERRORS:
+                broken = True
+                raise
+            finally:
+                await self._checkin(session, broken)
+
+    async def _reconnect(self, session: _Session) -> None:
+        """Replace the session's connection in place, so the borrower keeps a live one."""
+        await self._discard(session)
+        fresh = await self._connect()
+        session.smtp = fresh.smtp
+        session.messages = 0
+
+    async def _send_on(self, session: _Session, message: Message) -> None:
+        """Send over ``session``, reconnecting it once if it was dropped."""
+        for attempt in range(2):
+            try:
+                if attempt or not self._is_usable(session):
+                    await self._reconnect(session)
+                await session.smtp.send_message(message)
+                session.messages += 1
+                return
+            except aiosmtplib.SMTPResponseException as e:
+                if e.code != SERVICE_CLOSING or attempt:
+                    raise
+                logger.info(f"SMTP server closing session, reconnecting: {e.message}")
+            except CONNECTION_ERRORS as e:
+                if attempt:
+                    raise
+                logger.info(f"SMTP session lost, reconnecting: {str(e)}")
+
+    async def send(self, message: Message) -> None:
+        """Send one message over a pooled session."""
+        async with self.session() as session:
+            await self._send_on(session, message)
+
+    async def send_batch(self, messages: Sequence[Message]) -> List[Optional[Exception]]:
+        """Send messages one after another over a single session.
+
+        Returns one entry per message: ``None`` if it was sent, otherwise the
+        error. A refused message does not stop the batch; a connection that
+        cannot be re-established fails the remaining messages.
+        """
+        results: List[Optional[Exception]] = [None] * len(messages)
+        index = 0
+        try:
+            async with self.session() as session:
+                for index, message in enumerate(messages):
+                    try:
+                        await self._send_on(session, message)
+                    except CONNECTION_ERRORS:
+                        raise
+                    except aiosmtplib.SMTPException as e:
+                        results[index] = e
+        except CONNECTION_ERRORS as e:
+            for remaining in range(index, len(messages)):
+                results[remaining] = e
+        return results
+
+    async def close(self) -> None:
+        """Quit every idle session."""
+        while self._idle:
+            await self._discard(self._idle.pop())
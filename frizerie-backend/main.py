@@ -58,6 +58,7 @@ try:
         PerformanceMonitoringMiddleware
     )
     from error_logging.routes import router as error_logging_router
+    from notifications import delivery_worker
 except Exception as e:
     print("IMPORT ERROR:", e)
     traceback.print_exc()
@@ -235,6 +236,15 @@ async def root():
 async def health_check():
     return {"status": "healthy", "database": settings.DATABASE_URL}
 
+# Notification delivery runs on the app's loop unless it has its own process
+@app.on_event("startup")
+async def start_delivery_worker():
+    await delivery_worker.start_in_process()
+
+@app.on_event("shutdown")
+async def stop_delivery_worker():
+    await delivery_worker.stop_in_process()
+
 # Custom OpenAPI schema
 def custom_openapi():
     if app.openapi_schema:
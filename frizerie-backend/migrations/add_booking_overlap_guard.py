@@ -0,0 +1,93 @@
+"""
+Migration to enforce non-overlapping active bookings per stylist in the database.
+On PostgreSQL this adds a GiST exclusion constraint over tsrange(start_time, end_time);
+elsewhere it creates booking_slot_claims and backfills it from active bookings.
+"""
+from sqlalchemy import create_engine, text
+from dateutil.parser import parse
+from config.database import SQLALCHEMY_DATABASE_URL
+from booking.slot_claims import CLAIM_MINUTES, claim_starts
+
+def add_booking_overlap_guard():
+    """
+    Add the exclusion constraint or the slot-claim table for bookings.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    if engine.dialect.name == "postgresql":
+        statements = [
+            # btree_gist lets the integer stylist_id take part in a GiST index
+            "CREATE EXTENSION IF NOT EXISTS btree_gist",
+
+            """
+            ALTER TABLE bookings
+            ADD CONSTRAINT bookings_no_overlap
+            EXCLUDE USING gist (
+                stylist_id WITH =,
+                tsrange(start_time, end_time, '[)') WITH &&
+            )
+            WHERE (status <> 'CANCELLED')
+            """
+        ]
+    else:
+        statements = [
+            """
+            CREATE TABLE IF NOT EXISTS booking_slot_claims (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                booking_id VARCHAR(36) NOT NULL,
+                stylist_id INTEGER NOT NULL,
+                slot_start TIMESTAMP NOT NULL,
+                FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE,
+                FOREIGN KEY (stylist_id) REFERENCES stylists(id),
+                CONSTRAINT uq_booking_slot_claims_stylist_slot UNIQUE (stylist_id, slot_start)
+            )
+            """,
+
+            """
+            CREATE INDEX IF NOT EXISTS idx_booking_slot_claims_booking
+            ON booking_slot_claims(booking_id)
+            """
+        ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+        if engine.dialect.name != "postgresql":
+            # Backfill claims for bookings that are already active; existing
+            # overlaps would violate the unique constraint and are reported
+            bookings = conn.execute(text(
+                "SELECT id, stylist_id, start_time, end_time FROM bookings "
+                "WHERE status <> 'CANCELLED' AND id NOT IN (SELECT booking_id FROM booking_slot_claims)"
+            )).fetchall()
+            print(f"Backfilling {CLAIM_MINUTES}-minute slot claims for {len(bookings)} bookings...")
+            for booking_id, stylist_id, start_time, end_time in bookings:
+                # SQLite hands DATETIME columns back as strings on raw queries
+                if isinstance(start_time, str):
+                    start_time, end_time = parse(start_time), parse(end_time)
+                try:
+                    for slot_start in claim_starts(start_time, end_time):
+                        conn.execute(
+                            text(
+                                "INSERT INTO booking_slot_claims (booking_id, stylist_id, slot_start) "
+                                "VALUES (:booking_id, :stylist_id, :slot_start)"
+                            ),
+                            {"booking_id": booking_id, "stylist_id": stylist_id, "slot_start": slot_start}
+                        )
+                    conn.commit()
+                except Exception as e:
+                    print(f"Booking {booking_id} overlaps an existing claim, skipped: {str(e)}")
+                    conn.rollback()
+
+if __name__ == "__main__":
+    print("Starting booking overlap guard migration...")
+    add_booking_overlap_guard()
+    print("Booking overlap guard migration completed.")
@@ -0,0 +1,51 @@
+"""
+Migration for calendar feed access: the hashed per-user feed token that
+calendar apps put in the feed URL instead of a bearer header, and the link
+from a stylist to their own user account.
+"""
+from sqlalchemy import create_engine, inspect, text
+from config.database import SQLALCHEMY_DATABASE_URL
+
+def add_calendar_feed_access():
+    """
+    Add users.calendar_token_hash and stylists.user_id.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    inspector = inspect(engine)
+
+    columns = [
+        ("users", "calendar_token_hash", "VARCHAR(64)"),
+        ("stylists", "user_id", "INTEGER REFERENCES users(id)"),
+    ]
+    statements = [
+        f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+        for table, column, definition in columns
+        if column not in {existing["name"] for existing in inspector.get_columns(table)}
+    ]
+    statements += [
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_calendar_token_hash
+        ON users(calendar_token_hash)
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_stylists_user_id
+        ON stylists(user_id)
+        """
+    ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    print("Starting calendar feed access migration...")
+    add_calendar_feed_access()
+    print("Calendar feed access migration completed.")
@@ -0,0 +1,90 @@
+"""
+Migration to add the notification_analytics_hourly rollup table, index raw
+analytics events by time, and backfill the rollup from the events already
+recorded. The backfill only runs while the rollup is empty.
+"""
+from sqlalchemy import create_engine, text
+from config.database import SQLALCHEMY_DATABASE_URL
+
+def add_notification_analytics_rollup():
+    """
+    Add the hourly notification analytics rollup and backfill it.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    if engine.dialect.name == "postgresql":
+        id_column = "id SERIAL PRIMARY KEY"
+        hour = "date_trunc('hour', a.event_time)"
+        seconds = "EXTRACT(EPOCH FROM a.event_time - {base})"
+    else:
+        id_column = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+        hour = "strftime('%Y-%m-%d %H:00:00.000000', a.event_time)"
+        seconds = "(julianday(a.event_time) - julianday({base})) * 86400.0"
+
+    latency = seconds.format(base="""
+        CASE
+            WHEN a.event_type IN ('sent', 'failed') THEN n.created_at
+            WHEN a.event_type = 'delivered' THEN n.sent_at
+            WHEN a.event_type = 'read' THEN COALESCE(n.delivered_at, n.sent_at)
+        END
+    """)
+
+    statements = [
+        f"""
+        CREATE TABLE IF NOT EXISTS notification_analytics_hourly (
+            {id_column},
+            hour TIMESTAMP NOT NULL,
+            channel VARCHAR(8) NOT NULL,
+            type VARCHAR(24) NOT NULL,
+            event_type VARCHAR(50) NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            latency_count INTEGER NOT NULL DEFAULT 0,
+            latency_seconds FLOAT NOT NULL DEFAULT 0,
+            CONSTRAINT uq_notification_analytics_hourly_key UNIQUE (hour, channel, type, event_type)
+        )
+        """,
+
+        """
+        CREATE INDEX IF NOT EXISTS ix_notification_analytics_hourly_hour
+        ON notification_analytics_hourly(hour)
+        """,
+
+        """
+        CREATE INDEX IF NOT EXISTS ix_notification_analytics_event_time
+        ON notification_analytics(event_time)
+        """,
+
+        f"""
+        INSERT INTO notification_analytics_hourly
+            (hour, channel, type, event_type, count, latency_count, latency_seconds)
+        SELECT
+            {hour},
+            a.channel,
+            n.type,
+            a.event_type,
+            COUNT(*),
+            COUNT({latency}),
+            COALESCE(SUM({latency}), 0)
+        FROM notification_analytics a
+        JOIN notifications n ON n.id = a.notification_id
+        WHERE NOT EXISTS (SELECT 1 FROM notification_analytics_hourly)
+        GROUP BY {hour}, a.channel, n.type, a.event_type
+        """
+    ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    print("Starting notification analytics rollup migration...")
+    add_notification_analytics_rollup()
+    print("Notification analytics rollup migration completed.")
@@ -0,0 +1,37 @@
+"""
+Migration to index notifications by (status, scheduled_for), so the delivery
+worker's scheduler can load the deferred notifications due within its window
+without scanning the table.
+"""
+from sqlalchemy import create_engine, text
+from config.database import SQLALCHEMY_DATABASE_URL
+
+def add_notification_schedule_index():
+    """
+    Add the index over deferred notifications' due times.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    statements = [
+        """
+        CREATE INDEX IF NOT EXISTS idx_notifications_status_scheduled_for
+        ON notifications(status, scheduled_for)
+        """
+    ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    print("Starting notification schedule index migration...")
+    add_notification_schedule_index()
+    print("Notification schedule index migration completed.")
@@ -0,0 +1,59 @@
+"""
+Migration to add the push_device_tokens table holding users' FCM
+registration tokens. Tokens FCM reports as unregistered or invalid are
+deactivated rather than deleted.
+"""
+from sqlalchemy import create_engine, text
+from config.database import SQLALCHEMY_DATABASE_URL
+
+def add_push_device_tokens():
+    """
+    Add the push device token table and its indexes.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    id_column = (
+        "id SERIAL PRIMARY KEY"
+        if engine.dialect.name == "postgresql"
+        else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    )
+
+    statements = [
+        f"""
+        CREATE TABLE IF NOT EXISTS push_device_tokens (
+            {id_column},
+            user_id INTEGER NOT NULL,
+            token VARCHAR(512) NOT NULL,
+            platform VARCHAR(20),
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            invalidated_at TIMESTAMP,
+            last_used_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            CONSTRAINT uq_push_device_tokens_token UNIQUE (token)
+        )
+        """,
+
+        """
+        CREATE INDEX IF NOT EXISTS idx_push_device_tokens_user_active
+        ON push_device_tokens(user_id, is_active)
+        """
+    ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    print("Starting push device token migration...")
+    add_push_device_tokens()
+    print("Push device token migration completed.")
@@ -0,0 +1,60 @@
+"""
+Migration to add the stylist_day_sheets table, the materialized per-stylist
+day view over the rolling horizon (busy/free intervals and utilization).
+Rows are filled by the nightly roll or on first read.
+"""
+from sqlalchemy import create_engine, text
+from config.database import SQLALCHEMY_DATABASE_URL
+
+def add_stylist_day_sheets():
+    """
+    Add the stylist day sheet table and its indexes.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    id_column = (
+        "id SERIAL PRIMARY KEY"
+        if engine.dialect.name == "postgresql"
+        else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    )
+
+    statements = [
+        f"""
+        CREATE TABLE IF NOT EXISTS stylist_day_sheets (
+            {id_column},
+            stylist_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            open_intervals JSON NOT NULL,
+            busy_intervals JSON NOT NULL,
+            free_intervals JSON NOT NULL,
+            open_minutes INTEGER NOT NULL DEFAULT 0,
+            busy_minutes INTEGER NOT NULL DEFAULT 0,
+            utilization FLOAT NOT NULL DEFAULT 0,
+            computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (stylist_id) REFERENCES stylists(id) ON DELETE CASCADE,
+            CONSTRAINT uq_stylist_day_sheets_stylist_day UNIQUE (stylist_id, day)
+        )
+        """,
+
+        """
+        CREATE INDEX IF NOT EXISTS idx_stylist_day_sheets_day
+        ON stylist_day_sheets(day)
+        """
+    ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    print("Starting stylist day sheet migration...")
+    add_stylist_day_sheets()
+    print("Stylist day sheet migration completed.")
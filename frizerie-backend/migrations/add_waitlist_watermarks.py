@@ -0,0 +1,38 @@
+"""
+Migration to add the waitlist_watermarks table, where periodic waitlist jobs
+record how far they have processed so the next run resumes from there.
+"""
+from sqlalchemy import create_engine, text
+from config.database import SQLALCHEMY_DATABASE_URL
+
+def add_waitlist_watermarks():
+    """
+    Add the waitlist watermark table.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    statements = [
+        """
+        CREATE TABLE IF NOT EXISTS waitlist_watermarks (
+            name VARCHAR(50) PRIMARY KEY,
+            processed_until TIMESTAMP NOT NULL
+        )
+        """
+    ]
+
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Successfully executed: {statement[:100]}...")
+            except Exception as e:
+                print(f"Error executing statement: {statement[:100]}...")
+                print(f"Error: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    print("Starting waitlist watermark migration...")
+    add_waitlist_watermarks()
+    print("Waitlist watermark migration completed.")
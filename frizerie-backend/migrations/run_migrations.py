@@ -15,6 +15,13 @@ from migrations.add_waitlist import add_waitlist
 from migrations.add_analytics import add_analytics
 from migrations.add_security import add_security
 from migrations.add_error_logging import add_error_logging
+from migrations.add_booking_overlap_guard import add_booking_overlap_guard
+from migrations.add_stylist_day_sheets import add_stylist_day_sheets
+from migrations.add_push_device_tokens import add_push_device_tokens
+from migrations.add_notification_analytics_rollup import add_notification_analytics_rollup
+from migrations.add_notification_schedule_index import add_notification_schedule_index
+from migrations.add_waitlist_watermarks import add_waitlist_watermarks
+from migrations.add_calendar_feed_access import add_calendar_feed_access
 
 def run_migrations():
     """
@@ -47,6 +54,27 @@ def run_migrations():
     print("\n8. Setting up error logging and monitoring...")
     add_error_logging()
     
+    print("\n9. Enforcing non-overlapping bookings...")
+    add_booking_overlap_guard()
+    
+    print("\n10. Setting up stylist day sheets...")
+    add_stylist_day_sheets()
+    
+    print("\n11. Setting up push device tokens...")
+    add_push_device_tokens()
+    
+    print("\n12. Setting up notification analytics rollup...")
+    add_notification_analytics_rollup()
+    
+    print("\n13. Indexing deferred notifications...")
+    add_notification_schedule_index()
+    
+    print("\n14. Setting up waitlist watermarks...")
+    add_waitlist_watermarks()
+    
+    print("\n15. Setting up calendar feed access...")
+    add_calendar_feed_access()
+    
     print("\nAll migrations completed successfully!")
 
 if __name__ == "__main__":
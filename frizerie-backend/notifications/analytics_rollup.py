@@ -0,0 +1,302 @@
+"""
+Hourly rollup of notification analytics events.
+
+Events written through ``record_events`` also add to their (hour, channel,
+type, event_type) row of ``notification_analytics_hourly`` in the same
+transaction, together with their latency: for sent and failed events the
+time since the notification was created, for delivered events the time
+since it was sent, for read events the time since it was delivered (or
+sent). Reports read whole hours from the rollup and only the partial hours
+at the edges of a range from the raw events, grouped in the database, so
+their cost depends on the length of the range rather than on volume.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, func, insert, update
+from sqlalchemy.orm import Session
+
+from notifications.models import (
+    Notification, NotificationAnalytics, NotificationAnalyticsHourly, NotificationChannel, NotificationType
+)
+
+EVENT_TYPES = ("sent", "delivered", "read", "failed")
+
+# Notification timestamp each event type's latency is measured from
+LATENCY_BASES = {
+    "sent": ("created_at",),
+    "failed": ("created_at",),
+    "delivered": ("sent_at",),
+    "read": ("delivered_at", "sent_at")
+}
+
+# (hour, channel, type, event_type) -> [count, latency_count, latency_seconds]
+Increments = Dict[Tuple[datetime, NotificationChannel, NotificationType, str], List]
+
+def _hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _latency(notification: Any, event_type: str, event_time: datetime) -> Optional[float]:
+    for attribute in LATENCY_BASES.get(event_type, ()):
+        base = getattr(notification, attribute)
+        if base is not None:
+            return (event_time - base).total_seconds()
+    return None
+
+def record_events(db: Session, events: Sequence[Dict[str, Any]]) -> None:
+    """Insert analytics events and add them to the hourly rollup; the caller commits.
+
+    Each event is a dict of ``notification_id``, ``channel``, ``event_type``,
+    ``event_time`` and optionally ``notification_metadata``.
+    """
+    if not events:
+        return
+    notification_ids = {event["notification_id"] for event in events}
+    notifications = {
+        row.id: row
+        for row in db.query(
+            Notification.id,
+            Notification.type,
+            Notification.created_at,
+            Notification.sent_at,
+            Notification.delivered_at
+        ).filter(Notification.id.in_(notification_ids)).all()
+    }
+
+    rows, increments = [], defaultdict(lambda: [0, 0, 0.0])
+    for event in events:
+        rows.append({
+            "notification_id": event["notification_id"],
+            "channel": event["channel"],
+            "event_type": event["event_type"],
+            "event_time": event["event_time"],
+            "notification_metadata": event.get("notification_metadata")
+        })
+        notification = notifications.get(event["notification_id"])
+        if notification is None:
+            continue
+        totals = increments[(_hour(event["event_time"]), event["channel"], notification.type, event["event_type"])]
+        totals[0] += 1
+        latency = _latency(notification, event["event_type"], event["event_time"])
+        if latency is not None:
+            totals[1] += 1
+            totals[2] += latency
+
+    db.execute(insert(NotificationAnalytics), rows)
+    _add_to_rollup(db, increments)
+
+def _add_to_rollup(db: Session, increments: Increments) -> None:
+    if not increments:
+        return
+    values = [
+        {
+            "hour": hour,
+            "channel": channel,
+            "type": notification_type,
+            "event_type": event_type,
+            "count": count,
+            "latency_count": latency_count,
+            "latency_seconds": latency_seconds
+        }
+        for (hour, channel, notification_type, event_type), (count, latency_count, latency_seconds) in increments.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        statement = upsert(NotificationAnalyticsHourly).values(values)
+        table = NotificationAnalyticsHourly.__table__
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["hour", "channel", "type", "event_type"],
+            set_={
+                "count": table.c.count + statement.excluded.count,
+                "latency_count": table.c.latency_count + statement.excluded.latency_count,
+                "latency_seconds": table.c.latency_seconds + statement.excluded.latency_seconds
+            }
+        ))
+        return
+
+    # No portable upsert: update each key, inserting the ones that did not exist
+    for value in values:
+        updated = db.execute(
+            update(NotificationAnalyticsHourly).where(
+                and_(
+                    NotificationAnalyticsHourly.hour == value["hour"],
+                    NotificationAnalyticsHourly.channel == value["channel"],
+                    NotificationAnalyticsHourly.type == value["type"],
+                    NotificationAnalyticsHourly.event_type == value["event_type"]
+                )
+            ).values(
+                count=NotificationAnalyticsHourly.count + value["count"],
+                latency_count=NotificationAnalyticsHourly.latency_count + value["latency_count"],
+                latency_seconds=NotificationAnalyticsHourly.latency_seconds + value["latency_seconds"]
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.execute(insert(NotificationAnalyticsHourly), [value])
+
+# Reports
+
+# (hour, channel, type, event_type, count, latency_count, latency_seconds)
+Bucket = Tuple[datetime, NotificationChannel, NotificationType, str, int, int, float]
+
+def _seconds_between(db: Session, later, earlier):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", later - earlier)
+    return (func.julianday(later) - func.julianday(earlier)) * 86400.0
+
+def _rollup_query(
+    db: Session,
+    keys: Sequence,
+    sums: Sequence,
+    start_hour: datetime,
+    end_hour: datetime,
+    channel: Optional[NotificationChannel],
+    notification_type: Optional[NotificationType]
+) -> List[Tuple]:
+    """Rollup sums over the whole hours in [start_hour, end_hour), grouped by ``keys``."""
+    query = db.query(*keys, *(func.sum(column) for column in sums)).filter(
+        and_(NotificationAnalyticsHourly.hour >= start_hour, NotificationAnalyticsHourly.hour < end_hour)
+    )
+    if channel:
+        query = query.filter(NotificationAnalyticsHourly.channel == channel)
+    if notification_type:
+        query = query.filter(NotificationAnalyticsHourly.type == notification_type)
+    return [tuple(row) for row in query.group_by(*keys).all()]
+
+def _raw_buckets(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    include_end: bool,
+    channel: Optional[NotificationChannel],
+    notification_type: Optional[NotificationType]
+) -> List[Bucket]:
+    """Raw events of [start, end) (or [start, end]) within one hour, grouped in the database."""
+    base = case(
+        (NotificationAnalytics.event_type.in_(["sent", "failed"]), Notification.created_at),
+        (NotificationAnalytics.event_type == "delivered", Notification.sent_at),
+        (NotificationAnalytics.event_type == "read", func.coalesce(Notification.delivered_at, Notification.sent_at)),
+        else_=None
+    )
+    latency = _seconds_between(db, NotificationAnalytics.event_time, base)
+    query = db.query(
+        NotificationAnalytics.channel,
+        Notification.type,
+        NotificationAnalytics.event_type,
+        func.count(NotificationAnalytics.id),
+        func.count(latency),
+        func.coalesce(func.sum(latency), 0.0)
+    ).join(
+        Notification, Notification.id == NotificationAnalytics.notification_id
+    ).filter(
+        and_(
+            NotificationAnalytics.event_time >= start,
+            NotificationAnalytics.event_time <= end if include_end else NotificationAnalytics.event_time < end
+        )
+    )
+    if channel:
+        query = query.filter(NotificationAnalytics.channel == channel)
+    if notification_type:
+        query = query.filter(Notification.type == notification_type)
+    rows = query.group_by(NotificationAnalytics.channel, Notification.type, NotificationAnalytics.event_type).all()
+    hour = _hour(start)
+    return [
+        (hour, row_channel, row_type, event_type, count, latency_count or 0, float(latency_seconds or 0))
+        for row_channel, row_type, event_type, count, latency_count, latency_seconds in rows
+    ]
+
+def _empty_totals() -> Dict[str, float]:
+    return {event_type: 0 for event_type in EVENT_TYPES}
+
+def _stats(totals: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "total_sent": totals["sent"],
+        "total_delivered": totals["delivered"],
+        "total_read": totals["read"],
+        "total_failed": totals["failed"],
+        "delivery_rate": totals["delivered"] / totals["sent"] if totals["sent"] > 0 else 0
+    }
+
+def _period(hour: datetime, group_by: str) -> str:
+    if group_by == "day":
+        return hour.date().isoformat()
+    if group_by == "week":
+        year, week = hour.isocalendar()[:2]
+        return f"{year}-W{week:02d}"
+    return f"{hour.year}-{hour.month:02d}"
+
+def report(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    channel: Optional[NotificationChannel] = None,
+    notification_type: Optional[NotificationType] = None,
+    group_by: str = "day"
+) -> Dict[str, Any]:
+    """Totals, rates, average latencies and per-channel, per-type and per-period stats."""
+    totals = _empty_totals()
+    latency: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    by_channel = {member: _empty_totals() for member in NotificationChannel}
+    by_type = {member: _empty_totals() for member in NotificationType}
+    by_period: Dict[str, Dict[str, float]] = defaultdict(_empty_totals)
+
+    def add(row_channel, row_type, event_type, count, latency_count, latency_seconds) -> None:
+        latency[event_type][0] += latency_count or 0
+        latency[event_type][1] += latency_seconds or 0
+        if event_type in totals:
+            totals[event_type] += count
+            by_channel[row_channel][event_type] += count
+            by_type[row_type][event_type] += count
+
+    def add_to_period(hour: datetime, event_type: str, count: int) -> None:
+        if event_type in totals:
+            by_period[_period(hour, group_by)][event_type] += count
+
+    # Whole hours from the rollup, the partial hours at either end from raw events
+    first_whole = _hour(start) if start == _hour(start) else _hour(start) + timedelta(hours=1)
+    last_whole = _hour(end)
+    if first_whole >= last_whole:
+        edges = [(start, end, True)]
+    else:
+        edges = [(start, first_whole, False)] if start < first_whole else []
+        edges.append((last_whole, end, True))
+        rollup = NotificationAnalyticsHourly
+        for row in _rollup_query(
+            db,
+            (rollup.channel, rollup.type, rollup.event_type),
+            (rollup.count, rollup.latency_count, rollup.latency_seconds),
+            first_whole, last_whole, channel, notification_type
+        ):
+            add(*row)
+        for row in _rollup_query(
+            db, (rollup.hour, rollup.event_type), (rollup.count,), first_whole, last_whole, channel, notification_type
+        ):
+            add_to_period(*row)
+    for edge_start, edge_end, include_end in edges:
+        for hour, *row in _raw_buckets(db, edge_start, edge_end, include_end, channel, notification_type):
+            add(*row)
+            add_to_period(hour, row[2], row[3])
+
+    def average(event_type: str) -> float:
+        known, seconds = latency[event_type]
+        return seconds / known if known else 0
+
+    return {
+        "total_sent": totals["sent"],
+        "total_delivered": totals["delivered"],
+        "total_read": totals["read"],
+        "total_failed": totals["failed"],
+        "delivery_rate": totals["delivered"] / totals["sent"] if totals["sent"] > 0 else 0,
+        "read_rate": totals["read"] / totals["delivered"] if totals["delivered"] > 0 else 0,
+        "average_delivery_time": average("delivered"),
+        "average_read_time": average("read"),
+        "channel_stats": {member: _stats(counts) for member, counts in by_channel.items()},
+        "type_stats": {member: _stats(counts) for member, counts in by_type.items()},
+        "time_series": [
+            {"period": period, **_stats(counts)} for period, counts in sorted(by_period.items())
+        ]
+    }
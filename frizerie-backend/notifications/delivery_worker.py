@@ -0,0 +1,783 @@
+"""
+Asynchronous delivery of notifications across their channels.
+
+A notification handed to the worker is claimed (PENDING -> SENDING) and
+loaded on the worker's own database session, then split into one job per
+channel the user's preferences allow. Every channel has its own queue and
+semaphore, so a slow SMS provider holds up SMS and nothing else. Sends run
+under a per-channel timeout. Failures that may pass later (timeouts, lost
+connections, throttling, provider 5xx) wait in the channel's retry queue
+with exponential backoff; other failures are final. Once every channel of a
+notification is done, its status, error details and one analytics row per
+channel are written in batches.
+
+The worker runs on the API's event loop (``NOTIFICATION_DELIVERY_MODE`` =
+"in_process") or on its own (= "process", started with
+``python -m notifications.delivery_worker``), in which case the API hands
+notification ids over through a Redis list. Delivery is at least once:
+notifications left in SENDING by a worker that died are picked up again
+after ``NOTIFICATION_DELIVERY_STALE_SECONDS``. Notifications deferred by quiet
+hours or scheduled for later wait in the worker's ``DeferredScheduler`` and
+come back through intake when due.
+
+The worker delivers notifications created one at a time through
+``NotificationService``. Fan-outs (``notifications.fanout``) and the push
+method of ``create_notification`` hand their rows to the Celery batch tasks
+instead, and the two paths never take each other's rows: the worker only
+claims PENDING rows it was handed, and its scheduler only loads QUEUED rows
+with a ``scheduled_for``. A QUEUED row is therefore either deferred (has a
+``scheduled_for``; the scheduler's) or waiting for a batch task (none; the
+task's, with ``push.dispatch_pending`` as the sweep for pushes).
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiosmtplib
+from sqlalchemy import and_, update
+from sqlalchemy.orm import Session
+
+from config.database import SessionLocal
+from config.settings import get_settings
+from external_services.push_dispatcher import PushDispatcher, PushRequest
+from external_services.sms_dispatcher import SMSDispatcher
+from external_services.smtp_pool import CONNECTION_ERRORS, SMTPPool
+from notifications.models import (
+    Notification, NotificationChannel, NotificationStatus
+)
+from notifications import analytics_rollup
+from notifications.preferences import preference_cache
+from notifications.push import active_tokens, prune_tokens
+from notifications.scheduler import DeferredScheduler
+from users.models import User
+from utils.telegram import send_telegram_message
+from utils.webpush import send_web_push
+from utils.whatsapp import send_whatsapp_message
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "notifications:delivery"
+SCHEDULE_KEY = "notifications:delivery:scheduled"
+METRICS_KEY = "notifications:delivery:metrics"
+MAX_BACKOFF_SECONDS = 300
+
+@dataclass
+class DeliveryJob:
+    """One notification on one channel, with everything needed to send it."""
+    notification_id: int
+    user_id: int
+    channel: NotificationChannel
+    title: str
+    message: str
+    email: Optional[str] = None
+    phone_number: Optional[str] = None
+    push_tokens: List[str] = field(default_factory=list)
+    telegram_chat_id: Optional[str] = None
+    data: Dict[str, str] = field(default_factory=dict)
+    attempt: int = 1
+
+@dataclass
+class ChannelOutcome:
+    channel: NotificationChannel
+    success: bool
+    attempts: int
+    error: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+
+class DeliveryError(Exception):
+    """A failed send; ``retryable`` if trying again later may succeed."""
+
+    def __init__(self, message: str, retryable: bool = False, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.details = details
+
+class EmailSender:
+    def __init__(self):
+        self._pool: Optional[SMTPPool] = None
+
+    async def send(self, job: DeliveryJob) -> Optional[Dict[str, Any]]:
+        if not job.email:
+            raise DeliveryError("User has no email address")
+        if self._pool is None:
+            self._pool = SMTPPool.from_settings(settings)
+        message = MIMEText(job.message, "plain")
+        message["Subject"] = job.title
+        message["From"] = settings.MAIL_FROM
+        message["To"] = job.email
+        try:
+            await self._pool.send(message)
+        except aiosmtplib.SMTPResponseException as e:
+            # 4xx replies are temporary by definition
+            raise DeliveryError(f"SMTP {e.code}: {e.message}", retryable=400 <= e.code < 500)
+        except CONNECTION_ERRORS as e:
+            raise DeliveryError(f"SMTP connection failed: {str(e)}", retryable=True)
+        return None
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+
+class SMSSender:
+    def __init__(self):
+        self._dispatcher: Optional[SMSDispatcher] = None
+
+    async def send(self, job: DeliveryJob) -> Optional[Dict[str, Any]]:
+        if not job.phone_number:
+            raise DeliveryError("User has no phone number")
+        if self._dispatcher is None:
+            self._dispatcher = SMSDispatcher.from_settings(settings)
+        result = await self._dispatcher.send(job.phone_number, job.message)
+        details = {"sms_sid": result.sid, "sms_attempts": result.attempts, "latency_ms": round(result.latency_ms, 1)}
+        if not result.sent:
+            # No status means the request never got an answer; 429 means throttling outlasted the dispatcher's retries
+            retryable = result.status_code is None or result.status_code == 429 or result.status_code >= 500
+            raise DeliveryError(result.error or "SMS not accepted", retryable=retryable, details=details)
+        return details
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            await self._dispatcher.close()
+
+class PushSender:
+    def __init__(self, session_factory: Callable[[], Session]):
+        self.session_factory = session_factory
+        self._dispatcher: Optional[PushDispatcher] = None
+
+    def _prune(self, tokens: List[str]) -> None:
+        db = self.session_factory()
+        try:
+            prune_tokens(db, tokens)
+        finally:
+            db.close()
+
+    async def send(self, job: DeliveryJob) -> Optional[Dict[str, Any]]:
+        if not job.push_tokens:
+            raise DeliveryError("User has no active device tokens")
+        if self._dispatcher is None:
+            self._dispatcher = PushDispatcher.from_settings(settings)
+        requests = [
+            PushRequest(token=token, title=job.title, body=job.message, data=job.data, reference=job.notification_id)
+            for token in job.push_tokens
+        ]
+        # The Admin SDK is blocking
+        results = await asyncio.to_thread(self._dispatcher.send, requests)
+        invalid = [result.token for result in results if result.invalid]
+        if invalid:
+            await asyncio.to_thread(self._prune, invalid)
+        details = {
+            "push_results": [
+                {"token": result.token[-12:], "success": result.success, "error": result.error}
+                for result in results
+            ]
+        }
+        if not any(result.success for result in results):
+            # Only transient FCM failures (unavailable, internal, quota) are worth another try
+            retryable = any(result.retryable for result in results)
+            raise DeliveryError("No device accepted the push", retryable=retryable, details=details)
+        return details
+
+    async def close(self) -> None:
+        return None
+
+class StubSender:
+    """Channels whose clients are blocking ``(recipient, message)`` functions."""
+
+    def __init__(self, function: Callable[[Any, str], Any], recipient: Callable[[DeliveryJob], Any], missing: str):
+        self.function = function
+        self.recipient = recipient
+        self.missing = missing
+
+    async def send(self, job: DeliveryJob) -> Optional[Dict[str, Any]]:
+        recipient = self.recipient(job)
+        if not recipient:
+            raise DeliveryError(self.missing)
+        await asyncio.to_thread(self.function, recipient, job.message)
+        return None
+
+    async def close(self) -> None:
+        return None
+
+class InAppSender:
+    """The notification row is the in-app notification; there is nothing to send."""
+
+    async def send(self, job: DeliveryJob) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+def default_senders(session_factory: Callable[[], Session]) -> Dict[NotificationChannel, Any]:
+    return {
+        NotificationChannel.EMAIL: EmailSender(),
+        NotificationChannel.SMS: SMSSender(),
+        NotificationChannel.PUSH: PushSender(session_factory),
+        NotificationChannel.WEB_PUSH: StubSender(send_web_push, lambda job: job.user_id, "No web push recipient"),
+        NotificationChannel.WHATSAPP: StubSender(send_whatsapp_message, lambda job: job.phone_number, "User has no phone number"),
+        NotificationChannel.TELEGRAM: StubSender(send_telegram_message, lambda job: job.telegram_chat_id, "User has no Telegram chat"),
+        NotificationChannel.IN_APP: InAppSender()
+    }
+
+class _Lane:
+    """Queue, retry heap, concurrency limit and counters of one channel."""
+
+    def __init__(self, channel: NotificationChannel, concurrency: int, timeout: float):
+        self.channel = channel
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue: "asyncio.Queue[DeliveryJob]" = asyncio.Queue()
+        self.slots = asyncio.Semaphore(concurrency)
+        self.retries: List[Tuple[float, int, DeliveryJob]] = []
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.timed_out = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "retrying": len(self.retries),
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "timed_out": self.timed_out
+        }
+
+class _InProgress:
+    def __init__(self, channels: Iterable[NotificationChannel]):
+        self.remaining = set(channels)
+        self.outcomes: List[ChannelOutcome] = []
+
+class DeliveryWorker:
+    """Delivers notifications concurrently per channel on the running event loop."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        senders: Optional[Dict[NotificationChannel, Any]] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_retries: int = 3,
+        backoff_seconds: float = 5.0,
+        claim_batch_size: int = 200,
+        stale_seconds: int = 600,
+        scheduler_horizon_seconds: int = 3600,
+        scheduler_batch_size: int = 500
+    ):
+        self.session_factory = session_factory
+        self.senders = senders or default_senders(session_factory)
+        concurrency = concurrency or {}
+        timeouts = timeouts or {}
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.claim_batch_size = claim_batch_size
+        self.stale_seconds = stale_seconds
+        self.lanes = {
+            channel: _Lane(channel, concurrency.get(channel.value, 4), timeouts.get(channel.value, 30.0))
+            for channel in self.senders
+        }
+        self._intake: "asyncio.Queue[int]" = asyncio.Queue()
+        self._in_progress: Dict[int, _InProgress] = {}
+        self._finished: List[Tuple[int, List[ChannelOutcome]]] = []
+        # Finished notifications taken off ``_finished`` whose results are being written
+        self._writing = 0
+        self._finished_event = asyncio.Event()
+        self._retry_event = asyncio.Event()
+        self._sequence = itertools.count()
+        self.scheduler = DeferredScheduler(
+            session_factory, self.submit, horizon_seconds=scheduler_horizon_seconds, batch_size=scheduler_batch_size
+        )
+        self._tasks: List[asyncio.Task] = []
+        self._deliveries: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.claimed = 0
+        self.completed = 0
+        self.running = False
+
+    @classmethod
+    def from_settings(cls, session_factory: Callable[[], Session] = SessionLocal) -> "DeliveryWorker":
+        return cls(
+            session_factory=session_factory,
+            concurrency=settings.NOTIFICATION_CHANNEL_CONCURRENCY,
+            timeouts=settings.NOTIFICATION_CHANNEL_TIMEOUT_SECONDS,
+            max_retries=settings.NOTIFICATION_DELIVERY_MAX_RETRIES,
+            backoff_seconds=settings.NOTIFICATION_DELIVERY_BACKOFF_SECONDS,
+            claim_batch_size=settings.NOTIFICATION_DELIVERY_CLAIM_BATCH_SIZE,
+            stale_seconds=settings.NOTIFICATION_DELIVERY_STALE_SECONDS,
+            scheduler_horizon_seconds=settings.NOTIFICATION_SCHEDULER_HORIZON_SECONDS,
+            scheduler_batch_size=settings.NOTIFICATION_SCHEDULER_BATCH_SIZE
+        )
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Start the worker's tasks on the running loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.running = True
+        self._tasks = [
+            asyncio.create_task(self._run_intake()),
+            asyncio.create_task(self._run_retries()),
+            asyncio.create_task(self._run_results()),
+            asyncio.create_task(self._run_recovery())
+        ] + [asyncio.create_task(self._run_lane(lane)) for lane in self.lanes.values()]
+        self.scheduler.start()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop taking work, give deliveries in progress up to ``timeout`` to finish, then shut down.
+
+        Notifications still unfinished stay SENDING and are recovered later.
+        """
+        if not self.running:
+            return
+        self.running = False
+        await self.scheduler.stop()
+        self._tasks[0].cancel()
+        deadline = time.monotonic() + timeout
+        while (self._in_progress or self._writing) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks[1:]:
+            task.cancel()
+        for task in list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._deliveries, return_exceptions=True)
+        await self._flush()
+        for sender in self.senders.values():
+            try:
+                await sender.close()
+            except Exception as e:
+                logger.warning(f"Failed to close {type(sender).__name__}: {str(e)}")
+
+    def submit(self, notification_id: int) -> None:
+        """Queue a committed PENDING notification; safe to call from any thread."""
+        if self._loop is None:
+            raise RuntimeError("Delivery worker is not running")
+        self._loop.call_soon_threadsafe(self._intake.put_nowait, notification_id)
+
+    async def wait_idle(self, timeout: float = 30.0) -> bool:
+        """Wait until nothing is queued, in flight or unwritten; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._intake.empty() and not self._in_progress and not self._finished and not self._writing:
+                return True
+            await asyncio.sleep(0.02)
+        return False
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depths and counters, overall and per channel."""
+        return {
+            "running": self.running,
+            "intake": self._intake.qsize(),
+            "in_progress": len(self._in_progress),
+            "unwritten": len(self._finished) + self._writing,
+            "claimed": self.claimed,
+            "completed": self.completed,
+            "preference_cache": preference_cache.stats(),
+            "scheduler": self.scheduler.metrics(),
+            "channels": {channel.value: lane.metrics() for channel, lane in self.lanes.items()}
+        }
+
+    # Claiming and planning, on the worker's own sessions in a thread
+
+    def _claim(self, notification_ids: List[int]) -> Tuple[List[DeliveryJob], List[int]]:
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                update(Notification).where(
+                    and_(Notification.id.in_(notification_ids), Notification.status == NotificationStatus.PENDING)
+                ).values(
+                    status=NotificationStatus.SENDING, updated_at=datetime.utcnow()
+                ).returning(Notification.id).execution_options(synchronize_session=False)
+            ).scalars().all()
+            db.commit()
+            return self._plan(db, claimed)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _recover(self) -> Tuple[List[DeliveryJob], List[int]]:
+        """Take over notifications a dead worker left in SENDING."""
+        db = self.session_factory()
+        now = datetime.utcnow()
+        try:
+            recovered = db.execute(
+                update(Notification).where(
+                    and_(
+                        Notification.status == NotificationStatus.SENDING,
+                        Notification.updated_at < now - timedelta(seconds=self.stale_seconds)
+                    )
+                ).values(updated_at=now).returning(Notification.id).execution_options(synchronize_session=False)
+            ).scalars().all()
+            db.commit()
+            if recovered:
+                logger.warning(f"Recovering {len(recovered)} notifications stuck in delivery")
+            return self._plan(db, recovered)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _plan(self, db: Session, notification_ids: List[int]) -> Tuple[List[DeliveryJob], List[int]]:
+        """Jobs for claimed notifications, and those with no channel to deliver through.
+
+        Expired and quiet-hour notifications are settled here instead.
+        """
+        if not notification_ids:
+            return [], []
+        notifications = db.query(Notification).filter(Notification.id.in_(notification_ids)).all()
+        user_ids = {notification.user_id for notification in notifications}
+        users = {
+            user.id: user
+            for user in db.query(User.id, User.email, User.phone_number).filter(User.id.in_(user_ids)).all()
+        }
+        preferences = preference_cache.get_many(db, user_ids)
+        now = datetime.utcnow()
+
+        settled, plans = [], []
+        for notification in notifications:
+            preference = preferences.get(notification.user_id)
+            if notification.expires_at and notification.expires_at < now:
+                settled.append({"id": notification.id, "status": NotificationStatus.EXPIRED, "scheduled_for": notification.scheduled_for})
+            elif preference is not None and preference.in_quiet_hours(notification.priority, now):
+                settled.append({
+                    "id": notification.id,
+                    "status": NotificationStatus.QUEUED,
+                    "scheduled_for": preference.quiet_hours_end(now)
+                })
+            else:
+                channels = preference.channels(notification.priority) if preference is not None else [NotificationChannel.IN_APP]
+                plans.append((notification, [channel for channel in channels if channel in self.lanes]))
+
+        tokens = active_tokens(db, [
+            notification.user_id for notification, channels in plans if NotificationChannel.PUSH in channels
+        ])
+        jobs, channelless = [], []
+        for notification, channels in plans:
+            user = users.get(notification.user_id)
+            metadata = notification.notification_metadata or {}
+            for channel in channels:
+                jobs.append(DeliveryJob(
+                    notification_id=notification.id,
+                    user_id=notification.user_id,
+                    channel=channel,
+                    title=notification.title,
+                    message=notification.message,
+                    email=user.email if user else None,
+                    phone_number=user.phone_number if user else None,
+                    push_tokens=tokens.get(notification.user_id, []) if channel == NotificationChannel.PUSH else [],
+                    telegram_chat_id=metadata.get("telegram_chat_id"),
+                    # FCM data values must be strings
+                    data={str(key): str(value) for key, value in (metadata.get("data") or {}).items()}
+                ))
+            if not channels:
+                # The row itself stays visible in the app
+                channelless.append(notification.id)
+
+        if settled:
+            db.execute(update(Notification), settled)
+            db.commit()
+            for row in settled:
+                if row["status"] == NotificationStatus.QUEUED:
+                    self.scheduler.add(row["id"], row["scheduled_for"])
+        return jobs, channelless
+
+    # Tasks
+
+    def _track(self, jobs: List[DeliveryJob], channelless: List[int]) -> None:
+        by_notification: Dict[int, List[DeliveryJob]] = {}
+        for job in jobs:
+            by_notification.setdefault(job.notification_id, []).append(job)
+        for notification_id, notification_jobs in by_notification.items():
+            self._in_progress[notification_id] = _InProgress(job.channel for job in notification_jobs)
+            for job in notification_jobs:
+                self.lanes[job.channel].queue.put_nowait(job)
+        if channelless:
+            self._finished.extend((notification_id, []) for notification_id in channelless)
+            self._finished_event.set()
+
+    async def _run_intake(self) -> None:
+        while True:
+            notification_ids = [await self._intake.get()]
+            while len(notification_ids) < self.claim_batch_size and not self._intake.empty():
+                notification_ids.append(self._intake.get_nowait())
+            try:
+                jobs, channelless = await asyncio.to_thread(self._claim, notification_ids)
+            except Exception as e:
+                # The rows stay PENDING; nothing was sent
+                logger.error(f"Failed to claim notifications {notification_ids}: {str(e)}")
+                continue
+            self.claimed += len({job.notification_id for job in jobs}) + len(channelless)
+            self._track(jobs, channelless)
+
+    async def _run_recovery(self) -> None:
+        while True:
+            try:
+                self._track(*await asyncio.to_thread(self._recover))
+            except Exception as e:
+                logger.error(f"Failed to recover stale notifications: {str(e)}")
+            await asyncio.sleep(max(self.stale_seconds / 4, 1))
+
+    async def _run_lane(self, lane: _Lane) -> None:
+        while True:
+            job = await lane.queue.get()
+            await lane.slots.acquire()
+            lane.in_flight += 1
+            task = asyncio.create_task(self._deliver(lane, job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, lane: _Lane, job: DeliveryJob) -> None:
+        sender = self.senders[lane.channel]
+        outcome = ChannelOutcome(channel=lane.channel, success=False, attempts=job.attempt)
+        retryable = False
+        try:
+            outcome.details = await asyncio.wait_for(sender.send(job), lane.timeout)
+            outcome.success = True
+        except asyncio.TimeoutError:
+            lane.timed_out += 1
+            outcome.error = f"Timed out after {lane.timeout}s"
+            retryable = True
+        except DeliveryError as e:
+            outcome.error = str(e)
+            outcome.details = e.details
+            retryable = e.retryable
+        except Exception as e:
+            outcome.error = str(e)
+            retryable = isinstance(e, (ConnectionError, OSError))
+        finally:
+            lane.in_flight -= 1
+            lane.slots.release()
+
+        if not outcome.success and retryable and job.attempt <= self.max_retries:
+            delay = min(self.backoff_seconds * 2 ** (job.attempt - 1), MAX_BACKOFF_SECONDS)
+            job.attempt += 1
+            lane.retried += 1
+            heapq.heappush(lane.retries, (time.monotonic() + random.uniform(delay / 2, delay), next(self._sequence), job))
+            self._retry_event.set()
+            return
+        if outcome.success:
+            lane.sent += 1
+        else:
+            lane.failed += 1
+            logger.warning(f"Notification {job.notification_id} failed on {lane.channel.value} after {job.attempt} attempts: {outcome.error}")
+        self._complete(job.notification_id, outcome)
+
+    def _complete(self, notification_id: int, outcome: ChannelOutcome) -> None:
+        progress = self._in_progress.get(notification_id)
+        if progress is None:
+            return
+        progress.remaining.discard(outcome.channel)
+        progress.outcomes.append(outcome)
+        if not progress.remaining:
+            del self._in_progress[notification_id]
+            self._finished.append((notification_id, progress.outcomes))
+            self._finished_event.set()
+
+    async def _run_retries(self) -> None:
+        while True:
+            now = time.monotonic()
+            next_due = None
+            for lane in self.lanes.values():
+                while lane.retries and lane.retries[0][0] <= now:
+                    lane.queue.put_nowait(heapq.heappop(lane.retries)[2])
+                if lane.retries:
+                    next_due = lane.retries[0][0] if next_due is None else min(next_due, lane.retries[0][0])
+            self._retry_event.clear()
+            try:
+                await asyncio.wait_for(self._retry_event.wait(), None if next_due is None else next_due - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_results(self) -> None:
+        while True:
+            await self._finished_event.wait()
+            self._finished_event.clear()
+            await self._flush()
+
+    # Results
+
+    async def _flush(self) -> None:
+        while self._finished:
+            batch, self._finished = self._finished[:self.claim_batch_size], self._finished[self.claim_batch_size:]
+            self._writing += len(batch)
+            try:
+                await asyncio.to_thread(self._write_results, batch)
+                self.completed += len(batch)
+            except Exception as e:
+                # Left in SENDING, so recovery delivers them again
+                logger.error(f"Failed to record delivery of {len(batch)} notifications: {str(e)}")
+            finally:
+                self._writing -= len(batch)
+
+    def _write_results(self, batch: List[Tuple[int, List[ChannelOutcome]]]) -> None:
+        now = datetime.utcnow()
+        updates, analytics = [], []
+        for notification_id, outcomes in batch:
+            delivered = not outcomes or any(outcome.success for outcome in outcomes)
+            errors = {outcome.channel.value: outcome.error for outcome in outcomes if not outcome.success}
+            updates.append({
+                "id": notification_id,
+                "status": NotificationStatus.SENT if delivered else NotificationStatus.FAILED,
+                "sent_at": now if delivered else None,
+                "error_details": errors or None,
+                "updated_at": now
+            })
+            for outcome in outcomes:
+                analytics.append({
+                    "notification_id": notification_id,
+                    "channel": outcome.channel,
+                    "event_type": "sent" if outcome.success else "failed",
+                    "event_time": now,
+                    "notification_metadata": {"attempts": outcome.attempts, "error": outcome.error, **(outcome.details or {})}
+                })
+        db = self.session_factory()
+        try:
+            db.execute(update(Notification), updates)
+            analytics_rollup.record_events(db, analytics)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+# The worker of this process, when it runs in-process
+_worker: Optional[DeliveryWorker] = None
+_redis_client = None
+
+def _redis():
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(settings.NOTIFICATION_DELIVERY_REDIS_URL)
+    return _redis_client
+
+def get_delivery_worker() -> Optional[DeliveryWorker]:
+    return _worker
+
+async def start_in_process() -> Optional[DeliveryWorker]:
+    """Start this process's worker on the running loop, unless delivery runs in its own process."""
+    global _worker
+    if settings.NOTIFICATION_DELIVERY_MODE != "in_process":
+        return None
+    if _worker is None:
+        _worker = DeliveryWorker.from_settings()
+    _worker.start()
+    return _worker
+
+async def stop_in_process() -> None:
+    global _worker
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
+
+def submit(notification_id: int) -> None:
+    """Hand a committed notification to the delivery worker."""
+    try:
+        if settings.NOTIFICATION_DELIVERY_MODE == "process":
+            _redis().rpush(QUEUE_KEY, notification_id)
+        elif _worker is not None:
+            _worker.submit(notification_id)
+        else:
+            logger.warning(f"No delivery worker running; notification {notification_id} stays pending")
+    except Exception as e:
+        logger.error(f"Failed to hand notification {notification_id} to the delivery worker: {str(e)}")
+
+def schedule(notification_id: int, scheduled_for: datetime) -> None:
+    """Hand a committed QUEUED notification to the scheduler, to be delivered at ``scheduled_for`` (naive UTC)."""
+    try:
+        if settings.NOTIFICATION_DELIVERY_MODE == "process":
+            _redis().rpush(SCHEDULE_KEY, json.dumps([notification_id, scheduled_for.isoformat()]))
+        elif _worker is not None:
+            _worker.scheduler.add(notification_id, scheduled_for)
+        else:
+            logger.warning(f"No delivery worker running; notification {notification_id} waits for the next scheduler start")
+    except Exception as e:
+        # The scheduler's next refill still finds it
+        logger.error(f"Failed to hand notification {notification_id} to the scheduler: {str(e)}")
+
+def current_metrics() -> Dict[str, Any]:
+    """Metrics of the in-process worker, or the last ones a delivery process published."""
+    if settings.NOTIFICATION_DELIVERY_MODE == "process":
+        try:
+            published = _redis().get(METRICS_KEY)
+            metrics = json.loads(published) if published else {"running": False}
+            metrics["waiting"] = _redis().llen(QUEUE_KEY)
+        except Exception as e:
+            return {"mode": "process", "error": str(e)}
+        return {"mode": "process", **metrics}
+    if _worker is None:
+        return {"mode": "in_process", "running": False}
+    return {"mode": "in_process", **_worker.metrics()}
+
+# Separate process
+
+async def _forward_from_redis(worker: DeliveryWorker) -> None:
+    import redis.asyncio
+
+    client = redis.asyncio.Redis.from_url(settings.NOTIFICATION_DELIVERY_REDIS_URL)
+    try:
+        while worker.running:
+            try:
+                item = await client.blpop([QUEUE_KEY, SCHEDULE_KEY], timeout=1)
+            except Exception as e:
+                logger.error(f"Reading the delivery queue failed: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if not item:
+                continue
+            if item[0].decode() == SCHEDULE_KEY:
+                notification_id, scheduled_for = json.loads(item[1])
+                worker.scheduler.add(notification_id, datetime.fromisoformat(scheduled_for))
+            else:
+                worker.submit(int(item[1]))
+    finally:
+        await client.aclose()
+
+async def _publish_metrics(worker: DeliveryWorker) -> None:
+    while worker.running:
+        await asyncio.sleep(settings.NOTIFICATION_DELIVERY_METRICS_SECONDS)
+        metrics = worker.metrics()
+        logger.info(f"Delivery worker: {json.dumps(metrics)}")
+        try:
+            await asyncio.to_thread(
+                _redis().set, METRICS_KEY, json.dumps(metrics), ex=settings.NOTIFICATION_DELIVERY_METRICS_SECONDS * 3
+            )
+        except Exception as e:
+            logger.warning(f"Failed to publish delivery metrics: {str(e)}")
+
+async def run_forever() -> None:
+    """Run a worker fed from the Redis delivery queue until cancelled."""
+    worker = DeliveryWorker.from_settings()
+    worker.start()
+    try:
+        await asyncio.gather(_forward_from_redis(worker), _publish_metrics(worker))
+    finally:
+        await worker.stop()
+
+if __name__ == "__main__":
+    # Registers every model the notification and user mappers refer to
+    import main  # noqa: F401
+    from notifications import delivery_worker
+
+    try:
+        asyncio.run(delivery_worker.run_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,296 @@
+"""
+Batched fan-out of one notification to many users.
+
+Mass notifications used to load every user, lazy-load each user's settings
+and call ``create_notification`` once per channel, committing every row:
+up to 3 x N commits for N users. Here recipients are streamed in keyset
+chunks of ``NOTIFICATION_FANOUT_CHUNK_SIZE`` users with their settings joined
+into the same query. Each chunk's notification rows go in with one
+executemany and one commit, and email, SMS and push delivery is queued as
+one Celery task per ``NOTIFICATION_DELIVERY_BATCH_SIZE`` recipients. Memory
+stays bounded by the chunk size however many users there are.
+
+Recipients whose notification preferences switch the type off are skipped,
+using the compiled type bitmask from ``preference_cache`` (one query per
+chunk at most, none once cached); users who never saved preferences are
+governed by their settings alone.
+
+Rows for sending channels are stored QUEUED without a ``scheduled_for``, so
+the delivery worker's scheduler leaves them to the batch tasks.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, exists, insert, update
+from sqlalchemy.orm import Session
+
+from config.settings import get_settings
+from notifications.models import (
+    Notification, NotificationChannel, NotificationPriority,
+    NotificationStatus, NotificationType, PushDeviceToken
+)
+from notifications.preferences import preference_cache
+from tasks.email_tasks import send_email_batch
+from tasks.push_tasks import send_push_batch
+from tasks.sms_tasks import send_sms_batch
+from users.models import User, UserSetting
+
+logger = logging.getLogger(__name__)
+
+ChannelSelector = Callable[[Any], Iterable[NotificationChannel]]
+
+def settings_channels(recipient) -> List[NotificationChannel]:
+    """Channels the recipient has enabled in their settings."""
+    channels = []
+    if recipient.enable_notifications:
+        channels.append(NotificationChannel.IN_APP)
+    if recipient.enable_email_notifications and recipient.email:
+        channels.append(NotificationChannel.EMAIL)
+    if recipient.enable_sms_notifications and recipient.phone_number:
+        channels.append(NotificationChannel.SMS)
+    if recipient.enable_notifications and recipient.has_push_device:
+        channels.append(NotificationChannel.PUSH)
+    return channels
+
+def all_channels(recipient) -> List[NotificationChannel]:
+    """Every channel the recipient can be reached on, ignoring their settings."""
+    channels = [NotificationChannel.IN_APP]
+    if recipient.email:
+        channels.append(NotificationChannel.EMAIL)
+    if recipient.phone_number:
+        channels.append(NotificationChannel.SMS)
+    if recipient.has_push_device:
+        channels.append(NotificationChannel.PUSH)
+    return channels
+
+def email_only(recipient) -> List[NotificationChannel]:
+    return [NotificationChannel.EMAIL] if recipient.email else []
+
+class FanoutProgress:
+    """Running totals of a fan-out, passed to the progress callback after every chunk."""
+
+    def __init__(self, notification_type: NotificationType):
+        self.notification_type = notification_type
+        self.started_at = datetime.utcnow()
+        self.chunks = 0
+        self.recipients = 0
+        self.notifications = 0
+        self.queued: Dict[str, int] = {
+            NotificationChannel.EMAIL.value: 0,
+            NotificationChannel.SMS.value: 0,
+            NotificationChannel.PUSH.value: 0
+        }
+        self.failed = 0
+        self.opted_out = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "notification_type": self.notification_type.value,
+            "chunks": self.chunks,
+            "recipients": self.recipients,
+            "notifications": self.notifications,
+            "queued": dict(self.queued),
+            "failed": self.failed,
+            "opted_out": self.opted_out,
+            "elapsed_seconds": round((datetime.utcnow() - self.started_at).total_seconds(), 3)
+        }
+
+def _recipient_chunk(db: Session, criteria: Sequence, after_id: int, limit: int) -> List[Any]:
+    """The next chunk of recipients after ``after_id``, with their settings joined."""
+    return db.query(
+        User.id,
+        User.email,
+        User.phone_number,
+        UserSetting.enable_notifications,
+        UserSetting.enable_email_notifications,
+        UserSetting.enable_sms_notifications,
+        exists().where(
+            and_(PushDeviceToken.user_id == User.id, PushDeviceToken.is_active == True)
+        ).label("has_push_device")
+    ).outerjoin(
+        UserSetting, UserSetting.user_id == User.id
+    ).filter(
+        User.id > after_id, *criteria
+    ).order_by(User.id).limit(limit).all()
+
+def _batches(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _enqueue(
+    db: Session,
+    task,
+    deliveries: List[Tuple[int, str]],
+    args: Tuple,
+    progress: FanoutProgress,
+    channel: NotificationChannel
+) -> None:
+    """Queue deliveries in batches; rows of a batch that cannot be queued are marked failed."""
+    for batch in _batches(deliveries, get_settings().NOTIFICATION_DELIVERY_BATCH_SIZE):
+        try:
+            task.delay([list(delivery) for delivery in batch], *args)
+            progress.queued[channel.value] += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to queue {channel.value} batch of {len(batch)}: {str(e)}")
+            record_delivery_results(db, [], [notification_id for notification_id, _ in batch], str(e))
+            progress.failed += len(batch)
+
+def _fan_out_chunk(
+    db: Session,
+    recipients: List[Any],
+    notification_type: NotificationType,
+    title: str,
+    message: str,
+    channel_selector: ChannelSelector,
+    priority: NotificationPriority,
+    progress: FanoutProgress,
+    respect_preferences: bool = True
+) -> None:
+    now = datetime.utcnow()
+    if respect_preferences:
+        preferences = preference_cache.get_many(db, [recipient.id for recipient in recipients])
+        allowed = [
+            recipient for recipient in recipients
+            if recipient.id not in preferences or preferences[recipient.id].allows(notification_type)
+        ]
+        progress.opted_out += len(recipients) - len(allowed)
+        recipients = allowed
+    targets = [
+        (recipient, channel)
+        for recipient in recipients
+        for channel in channel_selector(recipient)
+    ]
+    if not targets:
+        return
+    # The ORM starts a new INSERT whenever the set of NULL columns changes,
+    # so keep same-channel rows (in-app ones carry sent_at) together.
+    targets.sort(key=lambda target: target[1].value)
+
+    rows = [
+        {
+            "user_id": recipient.id,
+            "type": notification_type,
+            "channel": channel,
+            "priority": priority,
+            "title": title,
+            "message": message,
+            # In-app notifications are delivered by being stored
+            "status": NotificationStatus.SENT if channel == NotificationChannel.IN_APP else NotificationStatus.QUEUED,
+            "sent_at": now if channel == NotificationChannel.IN_APP else None,
+            "created_at": now,
+            "updated_at": now
+        }
+        for recipient, channel in targets
+    ]
+    try:
+        # Each recipient gets a channel at most once, so (user_id, channel)
+        # identifies the row without asking for ordered RETURNING, which
+        # some backends can only honour one row per statement.
+        inserted = db.execute(
+            insert(Notification).returning(Notification.id, Notification.user_id, Notification.channel),
+            rows
+        ).all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    progress.notifications += len(inserted)
+
+    contacts = {recipient.id: recipient for recipient in recipients}
+    emails = []
+    phones = []
+    pushes = []
+    for notification_id, user_id, channel in inserted:
+        if channel == NotificationChannel.EMAIL:
+            emails.append((notification_id, contacts[user_id].email))
+        elif channel == NotificationChannel.SMS:
+            phones.append((notification_id, contacts[user_id].phone_number))
+        elif channel == NotificationChannel.PUSH:
+            pushes.append((notification_id, user_id))
+    _enqueue(db, send_email_batch, emails, (title, message), progress, NotificationChannel.EMAIL)
+    _enqueue(db, send_sms_batch, phones, (message,), progress, NotificationChannel.SMS)
+    _enqueue(db, send_push_batch, pushes, (title, message), progress, NotificationChannel.PUSH)
+
+def fan_out(
+    db: Session,
+    notification_type: NotificationType,
+    title: str,
+    message: str,
+    criteria: Sequence = (),
+    channel_selector: ChannelSelector = settings_channels,
+    priority: NotificationPriority = NotificationPriority.MEDIUM,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[FanoutProgress], None]] = None,
+    respect_preferences: bool = True
+) -> Dict[str, Any]:
+    """Send one notification to every user matching ``criteria``.
+
+    ``criteria`` are filters over ``User`` and ``UserSetting``;
+    ``channel_selector`` picks each recipient's channels. Unless
+    ``respect_preferences`` is False, users whose preferences disable the
+    type are skipped. Returns the final progress totals.
+    """
+    chunk_size = chunk_size or get_settings().NOTIFICATION_FANOUT_CHUNK_SIZE
+    progress = FanoutProgress(notification_type)
+    last_id = 0
+    while True:
+        recipients = _recipient_chunk(db, criteria, last_id, chunk_size)
+        if not recipients:
+            break
+        last_id = recipients[-1].id
+        _fan_out_chunk(
+            db, recipients, notification_type, title, message, channel_selector, priority, progress, respect_preferences
+        )
+        progress.chunks += 1
+        progress.recipients += len(recipients)
+        logger.info(
+            f"Fan-out {notification_type.value}: {progress.recipients} recipients, "
+            f"{progress.notifications} notifications after {progress.chunks} chunks"
+        )
+        if on_progress:
+            on_progress(progress)
+        if len(recipients) < chunk_size:
+            break
+    return progress.as_dict()
+
+def record_delivery_results(
+    db: Session,
+    sent_ids: List[int],
+    failed_ids: List[int],
+    error: Optional[str] = None,
+    details: Optional[Dict[int, Dict[str, Any]]] = None
+) -> None:
+    """Mark delivered and failed notifications with one UPDATE each.
+
+    ``details`` (per-message delivery data such as latency) becomes the
+    metadata of the fan-out rows, which carry none of their own.
+    """
+    now = datetime.utcnow()
+    try:
+        if details:
+            db.execute(
+                update(Notification),
+                [
+                    {"id": notification_id, "notification_metadata": values}
+                    for notification_id, values in details.items()
+                ]
+            )
+        if sent_ids:
+            db.execute(
+                update(Notification).where(Notification.id.in_(sent_ids)).values(
+                    status=NotificationStatus.SENT, sent_at=now, updated_at=now
+                )
+            )
+        if failed_ids:
+            db.execute(
+                update(Notification).where(Notification.id.in_(failed_ids)).values(
+                    status=NotificationStatus.FAILED,
+                    error_details={"error": error or "Delivery failed"},
+                    updated_at=now
+                )
+            )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to record delivery results: {str(e)}")
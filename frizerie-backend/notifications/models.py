@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, func, Enum, Boolean, JSON, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, func, Enum, Boolean, JSON, Table, Float, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from config.database import Base
 import enum
@@ -54,6 +54,7 @@ class NotificationType(str, enum.Enum):
 
 class NotificationStatus(str, enum.Enum):
     PENDING = "pending"
+    # Deferred when scheduled_for is set, otherwise waiting for a Celery batch task
     QUEUED = "queued"
     SENDING = "sending"
     SENT = "sent"
@@ -96,6 +97,10 @@ class NotificationTemplate(Base):
 class Notification(Base):
     """Enhanced notification model for user notifications."""
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Deferred notifications by due time, for the scheduler
+        Index("idx_notifications_status_scheduled_for", "status", "scheduled_for"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -260,7 +265,7 @@ class NotificationAnalytics(Base):
     notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=False)
     channel = Column(Enum(NotificationChannel), nullable=False)
     event_type = Column(String(50), nullable=False)  # sent, delivered, opened, clicked, etc.
-    event_time = Column(DateTime, nullable=False)
+    event_time = Column(DateTime, nullable=False, index=True)
     notification_metadata = Column(JSON)  # Additional analytics data
     created_at = Column(DateTime, default=func.now())
     
@@ -268,4 +273,43 @@ class NotificationAnalytics(Base):
     notification = relationship("Notification", back_populates="analytics")
     
     def __repr__(self):
-        return f"<NotificationAnalytics {self.id} for notification {self.notification_id}>" 
\ No newline at end of file
+        return f"<NotificationAnalytics {self.id} for notification {self.notification_id}>" 
+
+class NotificationAnalyticsHourly(Base):
+    """Analytics event counts and latency sums per hour, channel, type and event type."""
+    __tablename__ = "notification_analytics_hourly"
+    __table_args__ = (
+        UniqueConstraint("hour", "channel", "type", "event_type", name="uq_notification_analytics_hourly_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    hour = Column(DateTime, nullable=False, index=True)  # Start of the hour, UTC
+    channel = Column(Enum(NotificationChannel), nullable=False)
+    type = Column(Enum(NotificationType), nullable=False)
+    event_type = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0)  # Events whose latency is known
+    latency_seconds = Column(Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f"<NotificationAnalyticsHourly {self.hour} {self.channel} {self.type} {self.event_type}: {self.count}>"
+
+class PushDeviceToken(Base):
+    """FCM registration token of one of a user's devices."""
+    __tablename__ = "push_device_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token = Column(String(512), unique=True, nullable=False)
+    platform = Column(String(20), nullable=True)  # android, ios, web
+    is_active = Column(Boolean, default=True, nullable=False)
+    invalidated_at = Column(DateTime, nullable=True)  # Set when FCM reports the token as invalid
+    last_used_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    # Relationships
+    user = relationship("User")
+    
+    def __repr__(self):
+        return f"<PushDeviceToken {self.id} for user {self.user_id}>"
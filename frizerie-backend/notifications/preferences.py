@@ -0,0 +1,245 @@
+"""
+Notification preferences compiled for the delivery hot path.
+
+A ``NotificationPreference`` row is turned once into a ``CompiledPreferences``:
+the enabled notification types as a bitmask, quiet hours as minutes of the
+day, the user's tz object, and the channel lists for urgent and other
+notifications. Compiled preferences live in a per-process LRU keyed by user;
+users without a row are cached as such, so they cost no query either.
+Writes through ``NotificationService`` invalidate the user's entry; the TTL
+bounds how long another process (e.g. a separate delivery worker) can serve
+a stale entry.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, tzinfo
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pytz
+from sqlalchemy.orm import Session
+
+from config.settings import get_settings
+from notifications.models import NotificationChannel, NotificationPreference, NotificationPriority, NotificationType
+
+settings = get_settings()
+
+# Cache lookup result for users not cached at all, as opposed to cached without preferences
+_MISSING = object()
+
+# Preference column that switches each notification type on or off
+TYPE_CATEGORIES: Dict[NotificationType, str] = {
+    NotificationType.BOOKING_CONFIRMATION: "booking_notifications",
+    NotificationType.BOOKING_CANCELLATION: "booking_notifications",
+    NotificationType.BOOKING_REMINDER: "booking_notifications",
+    NotificationType.BOOKING_MODIFICATION: "booking_notifications",
+    NotificationType.BOOKING_WAITLIST: "booking_notifications",
+    NotificationType.BOOKING_FEEDBACK_REQUEST: "booking_notifications",
+    NotificationType.PAYMENT_CONFIRMATION: "payment_notifications",
+    NotificationType.PAYMENT_FAILED: "payment_notifications",
+    NotificationType.PAYMENT_REFUND: "payment_notifications",
+    NotificationType.PAYMENT_DISPUTE: "payment_notifications",
+    NotificationType.INVOICE_AVAILABLE: "payment_notifications",
+    NotificationType.LOYALTY_POINT_UPDATE: "loyalty_notifications",
+    NotificationType.LOYALTY_TIER_UPGRADE: "loyalty_notifications",
+    NotificationType.LOYALTY_REWARD_AVAILABLE: "loyalty_notifications",
+    NotificationType.LOYALTY_POINT_EXPIRING: "loyalty_notifications",
+    NotificationType.STYLIST_REVIEW: "stylist_notifications",
+    NotificationType.STYLIST_AVAILABILITY: "stylist_notifications",
+    NotificationType.STYLIST_TIME_OFF: "stylist_notifications",
+    NotificationType.STYLIST_CANCELLATION: "stylist_notifications",
+    NotificationType.SYSTEM_UPDATE: "system_notifications",
+    NotificationType.SECURITY_ALERT: "system_notifications",
+    NotificationType.ACCOUNT_UPDATE: "system_notifications",
+    NotificationType.PASSWORD_CHANGE: "system_notifications",
+    NotificationType.EMAIL_VERIFICATION: "system_notifications",
+    NotificationType.PHONE_VERIFICATION: "system_notifications",
+    NotificationType.PROMOTIONAL_OFFER: "marketing_notifications",
+    NotificationType.SPECIAL_EVENT: "marketing_notifications",
+    NotificationType.NEW_SERVICE: "marketing_notifications",
+    NotificationType.PRICE_UPDATE: "marketing_notifications",
+    NotificationType.HOLIDAY_HOURS: "marketing_notifications",
+    NotificationType.URGENT_ALERT: "urgent_notifications",
+    NotificationType.EMERGENCY_CLOSURE: "urgent_notifications",
+    NotificationType.LAST_MINUTE_AVAILABILITY: "urgent_notifications"
+}
+
+TYPE_BITS: Dict[NotificationType, int] = {
+    notification_type: 1 << index for index, notification_type in enumerate(NotificationType)
+}
+
+# Types without a category are always enabled
+ALWAYS_ENABLED = sum(bit for notification_type, bit in TYPE_BITS.items() if notification_type not in TYPE_CATEGORIES)
+
+CATEGORY_MASKS: Dict[str, int] = {}
+for _type, _category in TYPE_CATEGORIES.items():
+    CATEGORY_MASKS[_category] = CATEGORY_MASKS.get(_category, 0) | TYPE_BITS[_type]
+
+# Channels in the order they are delivered, with the preference switching each on
+URGENT_CHANNELS = (
+    (NotificationChannel.IN_APP, "in_app_enabled"),
+    (NotificationChannel.SMS, "sms_enabled"),
+    (NotificationChannel.PUSH, "push_enabled"),
+    (NotificationChannel.WEB_PUSH, "web_push_enabled")
+)
+OTHER_CHANNELS = (
+    (NotificationChannel.IN_APP, "in_app_enabled"),
+    (NotificationChannel.EMAIL, "email_enabled"),
+    (NotificationChannel.WHATSAPP, "whatsapp_enabled"),
+    (NotificationChannel.TELEGRAM, "telegram_enabled")
+)
+
+_timezones: Dict[str, tzinfo] = {}
+
+def _timezone(name: Optional[str]) -> tzinfo:
+    name = name or "UTC"
+    if name not in _timezones:
+        _timezones[name] = pytz.timezone(name)
+    return _timezones[name]
+
+def _minutes(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+@dataclass(frozen=True)
+class CompiledPreferences:
+    user_id: int
+    enabled_types: int
+    # Minutes since local midnight; both None when there are no quiet hours
+    quiet_start: Optional[int]
+    quiet_end: Optional[int]
+    tz: tzinfo
+    urgent_channels: Tuple[NotificationChannel, ...]
+    other_channels: Tuple[NotificationChannel, ...]
+
+    @classmethod
+    def compile(cls, preference: NotificationPreference) -> "CompiledPreferences":
+        enabled = ALWAYS_ENABLED
+        for category, mask in CATEGORY_MASKS.items():
+            if getattr(preference, category):
+                enabled |= mask
+        quiet_start, quiet_end = _minutes(preference.quiet_hours_start), _minutes(preference.quiet_hours_end)
+        if quiet_start is None or quiet_end is None:
+            quiet_start = quiet_end = None
+        return cls(
+            user_id=preference.user_id,
+            enabled_types=enabled,
+            quiet_start=quiet_start,
+            quiet_end=quiet_end,
+            tz=_timezone(preference.timezone),
+            urgent_channels=tuple(channel for channel, flag in URGENT_CHANNELS if getattr(preference, flag)),
+            other_channels=tuple(channel for channel, flag in OTHER_CHANNELS if getattr(preference, flag))
+        )
+
+    def allows(self, notification_type: NotificationType) -> bool:
+        return bool(self.enabled_types & TYPE_BITS[notification_type])
+
+    def _local_now(self, now: Optional[datetime]) -> datetime:
+        return pytz.UTC.localize(now or datetime.utcnow()).astimezone(self.tz)
+
+    @staticmethod
+    def _minute_of_day(local: datetime) -> float:
+        return local.hour * 60 + local.minute + local.second / 60
+
+    def in_quiet_hours(self, priority: Optional[NotificationPriority], now: Optional[datetime] = None) -> bool:
+        """Whether a notification sent at ``now`` (naive UTC) falls in quiet hours; urgent ones never do."""
+        if self.quiet_start is None or priority == NotificationPriority.URGENT:
+            return False
+        minute = self._minute_of_day(self._local_now(now))
+        if self.quiet_start <= self.quiet_end:
+            return self.quiet_start <= minute <= self.quiet_end
+        # Overnight quiet hours
+        return minute >= self.quiet_start or minute <= self.quiet_end
+
+    def quiet_hours_end(self, now: Optional[datetime] = None) -> datetime:
+        """The first second after the quiet hours ``now`` falls in, as naive UTC."""
+        local = self._local_now(now)
+        midnight = local.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        # Quiet hours include their end time itself
+        end = midnight + timedelta(minutes=self.quiet_end, seconds=1)
+        if self._minute_of_day(local) > self.quiet_end:
+            end += timedelta(days=1)
+        return self.tz.localize(end).astimezone(pytz.UTC).replace(tzinfo=None)
+
+    def channels(self, priority: Optional[NotificationPriority]) -> Tuple[NotificationChannel, ...]:
+        return self.urgent_channels if priority == NotificationPriority.URGENT else self.other_channels
+
+class PreferenceCache:
+    """LRU of compiled preferences by user id, with a TTL per entry."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, Optional[CompiledPreferences]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, user_id: int, now: float):
+        """The user's cached preferences (``None`` if they have none), or ``_MISSING``."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= now:
+            return _MISSING
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def _put(self, user_id: int, compiled: Optional[CompiledPreferences], now: float) -> None:
+        self._entries[user_id] = (now + self.ttl_seconds, compiled)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, CompiledPreferences]:
+        """Compiled preferences of the users that have any, loading every miss in one query."""
+        now = time.monotonic()
+        found: Dict[int, CompiledPreferences] = {}
+        missing: List[int] = []
+        with self._lock:
+            for user_id in set(user_ids):
+                compiled = self._get(user_id, now)
+                if compiled is _MISSING:
+                    missing.append(user_id)
+                    continue
+                self.hits += 1
+                if compiled is not None:
+                    found[user_id] = compiled
+            self.misses += len(missing)
+        if missing:
+            rows = db.query(NotificationPreference).filter(NotificationPreference.user_id.in_(missing)).all()
+            compiled_rows = {row.user_id: CompiledPreferences.compile(row) for row in rows}
+            with self._lock:
+                for user_id in missing:
+                    # Users without a row are cached as None until they save preferences
+                    compiled = compiled_rows.get(user_id)
+                    self._put(user_id, compiled, now)
+                    if compiled is not None:
+                        found[user_id] = compiled
+        return found
+
+    def get(self, db: Session, user_id: int) -> Optional[CompiledPreferences]:
+        return self.get_many(db, [user_id]).get(user_id)
+
+    def put(self, preference: NotificationPreference) -> CompiledPreferences:
+        compiled = CompiledPreferences.compile(preference)
+        with self._lock:
+            self._put(compiled.user_id, compiled, time.monotonic())
+        return compiled
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+preference_cache = PreferenceCache(
+    max_entries=settings.NOTIFICATION_PREFERENCE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.NOTIFICATION_PREFERENCE_CACHE_TTL_SECONDS
+)
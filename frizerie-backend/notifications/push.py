@@ -0,0 +1,293 @@
+"""
+Device tokens and delivery of queued push notifications.
+
+Push notifications are stored QUEUED (by fan-outs and ``queue_push``) and
+sent by the ``send_push_batch`` task, with the ``dispatch_pending_pushes``
+sweep as a backstop. Each is expanded to one request per active device
+token of its user and handed to the ``PushDispatcher``, which groups equal
+payloads into FCM multicasts. Per-token results are stored on each
+notification, tokens FCM rejects as invalid are deactivated, and each
+notification is marked SENT if any of its devices accepted it.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, update
+from sqlalchemy.orm import Session
+
+from config.settings import get_settings
+from external_services.push_dispatcher import PushDispatcher, PushRequest
+from notifications.fanout import record_delivery_results
+from notifications.models import (
+    Notification, NotificationChannel, NotificationStatus, NotificationType, PushDeviceToken
+)
+
+logger = logging.getLogger(__name__)
+
+def register_device_token(db: Session, user_id: int, token: str, platform: str = None) -> PushDeviceToken:
+    """Register a device token for the user, taking it over if another account had it."""
+    try:
+        device = db.query(PushDeviceToken).filter(PushDeviceToken.token == token).first()
+        if device is None:
+            device = PushDeviceToken(user_id=user_id, token=token, platform=platform)
+            db.add(device)
+        else:
+            device.user_id = user_id
+            device.platform = platform or device.platform
+            device.is_active = True
+            device.invalidated_at = None
+        db.commit()
+        db.refresh(device)
+        return device
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to register device token: {str(e)}"
+        )
+
+def unregister_device_token(db: Session, user_id: int, token: str) -> None:
+    device = db.query(PushDeviceToken).filter(
+        and_(PushDeviceToken.token == token, PushDeviceToken.user_id == user_id)
+    ).first()
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device token not found"
+        )
+    try:
+        db.delete(device)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to unregister device token: {str(e)}"
+        )
+
+def active_tokens(db: Session, user_ids: Iterable[int]) -> Dict[int, List[str]]:
+    """Active device tokens per user, in one query."""
+    tokens: Dict[int, List[str]] = defaultdict(list)
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return tokens
+    for user_id, token in db.query(PushDeviceToken.user_id, PushDeviceToken.token).filter(
+        and_(PushDeviceToken.user_id.in_(user_ids), PushDeviceToken.is_active == True)
+    ).all():
+        tokens[user_id].append(token)
+    return tokens
+
+def prune_tokens(db: Session, tokens: Iterable[str]) -> int:
+    """Deactivate tokens FCM reported as invalid; returns how many were active."""
+    tokens = list(set(tokens))
+    if not tokens:
+        return 0
+    now = datetime.utcnow()
+    try:
+        pruned = db.execute(
+            update(PushDeviceToken).where(
+                and_(PushDeviceToken.token.in_(tokens), PushDeviceToken.is_active == True)
+            ).values(is_active=False, invalidated_at=now, updated_at=now)
+        ).rowcount
+        db.commit()
+        return pruned
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to prune push tokens: {str(e)}")
+        return 0
+
+class QueuedPush(NamedTuple):
+    """A QUEUED push notification, as needed to send it."""
+    id: int
+    user_id: int
+    title: str
+    message: str
+    metadata: Optional[Dict[str, Any]] = None
+
+def _push_data(notification: QueuedPush) -> Dict[str, str]:
+    # FCM data values must be strings
+    data = (notification.metadata or {}).get("data") or {}
+    return {str(key): str(value) for key, value in data.items()}
+
+def queue_push(
+    db: Session,
+    user_id: int,
+    notification_type: NotificationType,
+    title: str,
+    message: str,
+    data: Optional[Dict[str, Any]] = None
+) -> Optional[int]:
+    """Store a QUEUED push for the user if they have an active device; returns its id.
+
+    The caller hands the id to the ``send_push_batch`` task.
+    """
+    if not active_tokens(db, [user_id]):
+        return None
+    notification = Notification(
+        user_id=user_id,
+        type=notification_type,
+        channel=NotificationChannel.PUSH,
+        title=title,
+        message=message,
+        status=NotificationStatus.QUEUED,
+        notification_metadata={"data": data} if data else None
+    )
+    try:
+        db.add(notification)
+        db.commit()
+        return notification.id
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to queue push for user {user_id}: {str(e)}")
+        return None
+
+def _claim(db: Session, notification_ids: List[int]) -> List[int]:
+    """Flip QUEUED pushes to PENDING; only the ids claimed here may be sent by the caller."""
+    if not notification_ids:
+        return []
+    try:
+        claimed = db.execute(
+            update(Notification).where(
+                and_(
+                    Notification.id.in_(notification_ids),
+                    Notification.status == NotificationStatus.QUEUED
+                )
+            ).values(
+                status=NotificationStatus.PENDING, updated_at=datetime.utcnow()
+            ).returning(Notification.id).execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.commit()
+        return claimed
+    except Exception:
+        db.rollback()
+        raise
+
+def _requeue(db: Session, notification_ids: List[int]) -> None:
+    if not notification_ids:
+        return
+    try:
+        db.execute(
+            update(Notification).where(Notification.id.in_(notification_ids)).values(
+                status=NotificationStatus.QUEUED, updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to requeue {len(notification_ids)} pushes: {str(e)}")
+
+def send_queued(db: Session, dispatcher: PushDispatcher, notifications: Sequence[QueuedPush]) -> Dict[str, Any]:
+    """Send queued push notifications to every active device of their users.
+
+    Each notification is claimed first, so the ``send_push_batch`` task and
+    the ``dispatch_pending`` sweep never send the same one twice. A
+    notification is SENT if any device accepted it. If every failure was
+    transient it goes back to QUEUED for the next sweep, up to
+    ``PUSH_MAX_ATTEMPTS`` attempts; otherwise it is FAILED.
+    """
+    claimed = set(_claim(db, [notification.id for notification in notifications]))
+    notifications = [notification for notification in notifications if notification.id in claimed]
+    if not notifications:
+        return {
+            "notifications": 0, "sent": 0, "failed": 0, "retrying": 0, "tokens": 0, "pruned": 0, "fcm_calls": 0
+        }
+
+    now = datetime.utcnow()
+    tokens = active_tokens(db, [notification.user_id for notification in notifications])
+    requests = [
+        PushRequest(
+            token=token,
+            title=notification.title,
+            body=notification.message,
+            data=_push_data(notification),
+            reference=notification.id
+        )
+        for notification in notifications
+        for token in tokens.get(notification.user_id, [])
+    ]
+    calls_before = dispatcher.calls
+    results = dispatcher.send(requests)
+
+    per_notification: Dict[int, List] = defaultdict(list)
+    for result in results:
+        per_notification[result.reference].append(result)
+    max_attempts = get_settings().PUSH_MAX_ATTEMPTS
+    sent_ids, failed_ids, retry_ids, details = [], [], [], {}
+    for notification in notifications:
+        token_results = per_notification.get(notification.id, [])
+        attempts = (notification.metadata or {}).get("push_attempts", 0) + 1
+        if any(result.success for result in token_results):
+            sent_ids.append(notification.id)
+        elif (
+            token_results
+            and attempts < max_attempts
+            and any(result.retryable for result in token_results)
+            and all(result.retryable or result.invalid for result in token_results)
+        ):
+            retry_ids.append(notification.id)
+        else:
+            failed_ids.append(notification.id)
+        details[notification.id] = {
+            **(notification.metadata or {}),
+            "push_attempts": attempts,
+            "push_results": [
+                {
+                    "token": result.token[-12:],
+                    "success": result.success,
+                    "message_id": result.message_id,
+                    "error": result.error
+                }
+                for result in token_results
+            ]
+        }
+    record_delivery_results(db, sent_ids, failed_ids, "No device accepted the push", details)
+    _requeue(db, retry_ids)
+
+    delivered_tokens = list({result.token for result in results if result.success})
+    if delivered_tokens:
+        try:
+            db.execute(
+                update(PushDeviceToken).where(
+                    PushDeviceToken.token.in_(delivered_tokens)
+                ).values(last_used_at=now)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Failed to update push token usage: {str(e)}")
+    pruned = prune_tokens(db, [result.token for result in results if result.invalid])
+
+    return {
+        "notifications": len(notifications),
+        "sent": len(sent_ids),
+        "failed": len(failed_ids),
+        "retrying": len(retry_ids),
+        "tokens": len(requests),
+        "pruned": pruned,
+        "fcm_calls": dispatcher.calls - calls_before
+    }
+
+def dispatch_pending(db: Session, dispatcher: PushDispatcher, limit: int) -> Dict[str, Any]:
+    """Send up to ``limit`` queued push notifications.
+
+    Picks up pushes being retried after a transient failure and any whose
+    ``send_push_batch`` task was lost. Deferred ones (with a
+    ``scheduled_for``) are left to the delivery worker's scheduler.
+    """
+    rows = db.query(
+        Notification.id,
+        Notification.user_id,
+        Notification.title,
+        Notification.message,
+        Notification.notification_metadata
+    ).filter(
+        and_(
+            Notification.channel == NotificationChannel.PUSH,
+            Notification.status == NotificationStatus.QUEUED,
+            Notification.scheduled_for == None
+        )
+    ).order_by(Notification.id).limit(limit).all()
+    return send_queued(db, dispatcher, [QueuedPush(*row) for row in rows])
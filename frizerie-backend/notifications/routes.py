@@ -1,5 +1,5 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
@@ -11,9 +11,12 @@ from .schemas import (
     NotificationTemplateCreate, NotificationTemplateResponse, NotificationTemplateUpdate,
     NotificationPreferenceCreate, NotificationPreferenceResponse, NotificationPreferenceUpdate,
     NotificationDigestCreate, NotificationDigestResponse,
-    NotificationSearchParams, NotificationAnalyticsParams
+    NotificationSearchParams, NotificationAnalyticsParams,
+    PushDeviceTokenCreate, PushDeviceTokenResponse
 )
 from .services import NotificationService, notify_breach_all_users
+from . import delivery_worker, push
+from utils import pagination
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -31,6 +34,7 @@ async def create_notification(
 
 @router.get("/search", response_model=List[NotificationResponse])
 async def search_notifications(
+    response: Response,
     params: NotificationSearchParams = Depends(),
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -38,14 +42,17 @@ async def search_notifications(
     """Search notifications with various filters."""
     service = NotificationService(db)
     notifications, total = await service.search_notifications(params)
+    pagination.set_page_headers(response, notifications, params.limit, "created_at", total)
     return notifications
 
 @router.get("/me", response_model=List[NotificationResponse])
 async def get_my_notifications(
+    response: Response,
     include_read: bool = False,
     include_expired: bool = False,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -56,9 +63,11 @@ async def get_my_notifications(
         include_read=include_read,
         include_expired=include_expired,
         limit=limit,
-        offset=offset
+        offset=offset,
+        cursor=cursor
     )
     notifications, _ = await service.search_notifications(params)
+    pagination.set_page_headers(response, notifications, limit, "created_at")
     return notifications
 
 @router.get("/{notification_id}", response_model=NotificationResponse)
@@ -167,6 +176,26 @@ async def update_my_preferences(
     service = NotificationService(db)
     return await service.update_notification_preference(current_user.id, preference_update)
 
+# Push device token endpoints
+@router.post("/push-tokens", response_model=PushDeviceTokenResponse)
+async def register_push_token(
+    device: PushDeviceTokenCreate,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Register the FCM token of one of the current user's devices."""
+    return push.register_device_token(db, current_user.id, device.token, device.platform)
+
+@router.delete("/push-tokens/{token}")
+async def unregister_push_token(
+    token: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stop sending push notifications to one of the current user's devices."""
+    push.unregister_device_token(db, current_user.id, token)
+    return {"detail": "Device token removed"}
+
 # Digest endpoints
 @router.post("/digests", response_model=NotificationDigestResponse)
 async def create_digest(
@@ -263,6 +292,13 @@ async def get_analytics_dashboard(
         }
     }
 
+@router.get("/admin/delivery-metrics")
+async def get_delivery_metrics(
+    current_user = Depends(get_current_admin)
+):
+    """Queue depths and counters of the notification delivery worker (admin only)."""
+    return delivery_worker.current_metrics()
+
 @router.post("/admin/breach-notification", response_model=dict)
 async def send_breach_notification(
     message: str,
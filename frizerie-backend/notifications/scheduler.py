@@ -0,0 +1,204 @@
+"""
+Release of deferred notifications when they fall due.
+
+Notifications held back for later (quiet hours, or a ``scheduled_for`` in the
+future at creation) are QUEUED with a ``scheduled_for``. The scheduler keeps
+the ones due within ``NOTIFICATION_SCHEDULER_HORIZON_SECONDS`` in a min-heap,
+loaded on start and refilled every half horizon through the
+``(status, scheduled_for)`` index; those due later are only read once they
+come within the horizon. New deferrals inside the window are added directly.
+At each due time the scheduler flips the due rows back to PENDING in batches
+and hands them to delivery. Releasing only rows still QUEUED and due makes
+the flip a claim, so several schedulers (one per API process) never release
+a notification twice, and a notification rescheduled later stays put.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, update
+from sqlalchemy.orm import Session
+
+from notifications.models import Notification, NotificationStatus
+
+logger = logging.getLogger(__name__)
+
+# Longest sleep between checks, so a clock change never stalls the scheduler
+MAX_SLEEP_SECONDS = 60
+
+class DeferredScheduler:
+    """Min-heap of deferred notifications, released to ``release`` when due."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        release: Callable[[int], None],
+        horizon_seconds: int = 3600,
+        batch_size: int = 500
+    ):
+        self.session_factory = session_factory
+        self.release = release
+        self.horizon = timedelta(seconds=horizon_seconds)
+        self.batch_size = batch_size
+        self._heap: List[Tuple[datetime, int]] = []
+        # Current due time of each notification in the heap; older heap entries are stale
+        self._due: Dict[int, datetime] = {}
+        # Every deferred notification due before this is in the heap
+        self._loaded_until: Optional[datetime] = None
+        self._wake = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loaded = 0
+        self.released = 0
+
+    def start(self) -> None:
+        """Load the window and start releasing on the running loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def add(self, notification_id: int, scheduled_for: datetime) -> None:
+        """Track a committed deferral (naive UTC); safe to call from any thread."""
+        if self._loop is None:
+            raise RuntimeError("Scheduler is not running")
+        self._loop.call_soon_threadsafe(self._push, notification_id, scheduled_for)
+
+    def metrics(self) -> Dict[str, Any]:
+        next_due = self._next_due()
+        return {
+            "waiting": len(self._due),
+            "next_due": next_due.isoformat() if next_due else None,
+            "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            "loaded": self.loaded,
+            "released": self.released
+        }
+
+    def _push(self, notification_id: int, scheduled_for: datetime) -> None:
+        # Later ones are picked up by the refill that reaches them
+        if self._loaded_until is None or scheduled_for >= self._loaded_until:
+            return
+        if self._due.get(notification_id) == scheduled_for:
+            return
+        self._due[notification_id] = scheduled_for
+        heapq.heappush(self._heap, (scheduled_for, notification_id))
+        self._wake.set()
+
+    def _next_due(self) -> Optional[datetime]:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        due = []
+        while len(due) < self.batch_size:
+            next_due = self._next_due()
+            if next_due is None or next_due > now:
+                break
+            notification_id = heapq.heappop(self._heap)[1]
+            del self._due[notification_id]
+            due.append(notification_id)
+        return due
+
+    # Database work, on the scheduler's own sessions in a thread
+
+    def _load(self, until: datetime) -> List[Tuple[int, datetime]]:
+        """Deferred notifications due before ``until``, overdue ones included."""
+        db = self.session_factory()
+        try:
+            return [
+                (row.id, row.scheduled_for)
+                for row in db.query(Notification.id, Notification.scheduled_for).filter(
+                    and_(
+                        Notification.status == NotificationStatus.QUEUED,
+                        Notification.scheduled_for != None,
+                        Notification.scheduled_for < until
+                    )
+                ).all()
+            ]
+        finally:
+            db.close()
+
+    def _claim(self, notification_ids: List[int], now: datetime) -> List[int]:
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                update(Notification).where(
+                    and_(
+                        Notification.id.in_(notification_ids),
+                        Notification.status == NotificationStatus.QUEUED,
+                        Notification.scheduled_for <= now
+                    )
+                ).values(
+                    status=NotificationStatus.PENDING, updated_at=now
+                ).returning(Notification.id).execution_options(synchronize_session=False)
+            ).scalars().all()
+            db.commit()
+            return claimed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # Task
+
+    async def _refill(self, now: datetime) -> None:
+        until, previous = now + self.horizon, self._loaded_until
+        # Advance first, so deferrals committed while loading are added directly
+        self._loaded_until = until
+        try:
+            rows = await asyncio.to_thread(self._load, until)
+        except Exception:
+            self._loaded_until = previous
+            raise
+        for notification_id, scheduled_for in rows:
+            self._push(notification_id, scheduled_for)
+        self.loaded += len(rows)
+
+    async def _release_due(self, now: datetime) -> bool:
+        """Release everything due by ``now``; False if a batch could not be released."""
+        while True:
+            due = self._pop_due(now)
+            if not due:
+                return True
+            try:
+                claimed = await asyncio.to_thread(self._claim, due, now)
+            except Exception as e:
+                # Still QUEUED and due, so the next refill loads them again
+                logger.error(f"Failed to release {len(due)} deferred notifications: {str(e)}")
+                return False
+            for notification_id in claimed:
+                self.release(notification_id)
+            self.released += len(claimed)
+
+    async def _run(self) -> None:
+        next_refill = datetime.utcnow()
+        while True:
+            now = datetime.utcnow()
+            if now >= next_refill:
+                try:
+                    await self._refill(now)
+                    next_refill = now + self.horizon / 2
+                except Exception as e:
+                    logger.error(f"Failed to load deferred notifications: {str(e)}")
+                    next_refill = now + timedelta(seconds=MAX_SLEEP_SECONDS)
+            if not await self._release_due(datetime.utcnow()):
+                next_refill = min(next_refill, datetime.utcnow() + timedelta(seconds=MAX_SLEEP_SECONDS))
+
+            wake_at = min(next_refill, self._next_due() or next_refill)
+            self._wake.clear()
+            timeout = min(max((wake_at - datetime.utcnow()).total_seconds(), 0), MAX_SLEEP_SECONDS)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
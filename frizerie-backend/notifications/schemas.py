@@ -160,6 +160,27 @@ class NotificationPreferenceResponse(NotificationPreferenceBase):
     class Config:
         from_attributes = True
 
+class PushDeviceTokenCreate(BaseModel):
+    token: str
+    platform: Optional[str] = None  # android, ios, web
+
+    @validator("token")
+    def token_not_blank(cls, v):
+        if not v.strip() or len(v) > 512:
+            raise ValueError("token must be 1-512 characters")
+        return v.strip()
+
+class PushDeviceTokenResponse(BaseModel):
+    id: int
+    token: str
+    platform: Optional[str] = None
+    is_active: bool
+    last_used_at: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class NotificationDigestBase(BaseModel):
     user_id: int
     frequency: str  # daily, weekly
@@ -208,6 +229,8 @@ class NotificationSearchParams(BaseModel):
     include_expired: bool = False
     limit: int = 50
     offset: int = 0
+    cursor: Optional[str] = None
+    include_total: bool = False
 
 class NotificationAnalyticsParams(BaseModel):
     start_date: datetime
@@ -1,5 +1,5 @@
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import stripe
@@ -21,6 +21,7 @@ from notifications.schemas import NotificationType
 from payments.analytics import get_payment_analytics, get_user_payment_analytics, track_payment_event
 from analytics.models import EventType
 from core.security import check_permissions
+from utils import pagination
 from payments.models import Payment, PaymentStatus, PaymentMethod, PaymentGateway
 from users.models import User, UserRole
 
@@ -95,20 +96,26 @@ async def get_payment_endpoint(
 
 @router.get("/user/me", response_model=List[PaymentResponse])
 async def get_my_payments(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     status: Optional[PaymentStatus] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
 ):
     """Get all payments for the current user."""
     payment_service = PaymentService(db)
     params = PaymentSearchParams(
         status=status,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        limit=limit,
+        cursor=cursor
     )
     payments, _ = payment_service.search_payments(params, current_user.id)
+    pagination.set_page_headers(response, payments, limit, "created_at")
     return payments
 
 @router.post("/{payment_id}/refund", response_model=RefundResponse)
@@ -175,13 +182,15 @@ async def add_bank_payment_method(
 
 @router.get("/search", response_model=List[PaymentResponse])
 async def search_payments(
+    response: Response,
     params: PaymentSearchParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Search payments with various filters."""
     payment_service = PaymentService(db)
-    payments, _ = payment_service.search_payments(params, current_user.id)
+    payments, total = payment_service.search_payments(params, current_user.id)
+    pagination.set_page_headers(response, payments, params.limit, "created_at", total)
     return payments
 
 @router.get("/analytics")
@@ -200,13 +209,17 @@ async def get_payment_analytics(
 
 @router.get("/admin/all", response_model=List[PaymentResponse])
 async def get_all_payments(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
     status: Optional[PaymentStatus] = None,
     method: Optional[PaymentMethod] = None,
     gateway: Optional[PaymentGateway] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
     """Get all payments (admin only)."""
     # Check if user has admin role
@@ -219,9 +232,13 @@ async def get_all_payments(
         method=method,
         gateway=gateway,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total
     )
-    payments, _ = payment_service.search_payments(params)
+    payments, total = payment_service.search_payments(params)
+    pagination.set_page_headers(response, payments, limit, "created_at", total)
     return payments
 
 @router.get("/admin/analytics/dashboard")
@@ -5,7 +5,7 @@ from payments.models import PaymentStatus, PaymentMethod, PaymentGateway, Paymen
 
 # Base Payment Schemas
 class PaymentBase(BaseModel):
-    booking_id: int
+    booking_id: str
     amount: float = Field(gt=0)
     currency: str = "RON"
     method: PaymentMethod
@@ -52,7 +52,7 @@ class PaymentIntentCreate(BaseModel):
     amount: float = Field(gt=0)
     currency: str = "RON"
     payment_method: str
-    booking_id: int
+    booking_id: str
     gateway: PaymentGateway
     payment_metadata: Optional[Dict[str, Any]] = None
 
@@ -241,6 +241,10 @@ class PaymentSearchParams(BaseModel):
     currency: Optional[str] = None
     include_refunds: bool = True
     include_disputes: bool = True
+    limit: int = 100
+    offset: int = 0
+    cursor: Optional[str] = None
+    include_total: bool = False
 
 class PaymentAnalyticsParams(BaseModel):
     start_date: datetime
@@ -17,6 +17,7 @@ from booking.models import Booking
 from users.models import User
 from core.config import settings
 from core.security import get_fraud_score, get_risk_level
+from utils import loaders, pagination
 from core.utils import generate_invoice_number, create_pdf_invoice
 
 # Set up logging
@@ -325,9 +326,12 @@ class PaymentService:
         except PaymentGatewayError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-    def search_payments(self, params: PaymentSearchParams, user_id: Optional[int] = None) -> Tuple[List[Payment], int]:
-        """Search payments with various filters."""
-        query = self.db.query(Payment)
+    def search_payments(self, params: PaymentSearchParams, user_id: Optional[int] = None) -> Tuple[List[Payment], Optional[int]]:
+        """Search payments with various filters.
+
+        Returns one page, newest first, and a total estimate when ``params.include_total`` is set.
+        """
+        query = loaders.with_profile(self.db.query(Payment), "payment_response")
 
         if user_id:
             query = query.filter(Payment.user_id == user_id)
@@ -349,8 +353,11 @@ class PaymentService:
         if params.currency:
             query = query.filter(Payment.currency == params.currency)
 
-        total = query.count()
-        payments = query.order_by(Payment.created_at.desc()).all()
+        total = pagination.estimate_count(query) if params.include_total else None
+        payments = pagination.paginate(
+            query, Payment.created_at, Payment.id,
+            params.cursor, params.offset, params.limit
+        )
 
         return payments, total
 
@@ -714,7 +721,7 @@ async def get_user_payments(
     Returns:
         List[Payment]: List of payment records
     """
-    return db.query(Payment)\
+    return loaders.with_profile(db.query(Payment), "payment_response")\
         .filter(Payment.user_id == user_id)\
         .offset(skip)\
         .limit(limit)\
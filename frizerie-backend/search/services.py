@@ -9,6 +9,7 @@ from ..users.models import User
 from ..bookings.models import Booking, Stylist
 from ..services.models import Service
 from ..payments.models import Payment
+from ..utils import loaders
 
 async def search_users(
     db: Session,
@@ -58,7 +59,7 @@ async def search_bookings(
     """
     Search bookings based on query string.
     """
-    search_query = db.query(Booking).join(User).filter(
+    search_query = loaders.with_profile(db.query(Booking), "booking_detail").join(Booking.user).filter(
         or_(
             User.email.ilike(f"%{query}%"),
             User.first_name.ilike(f"%{query}%"),
@@ -143,7 +144,7 @@ async def search_payments(
     """
     Search payments based on query string.
     """
-    search_query = db.query(Payment).join(User).filter(
+    search_query = loaders.with_profile(db.query(Payment), "payment_detail").join(Payment.user).filter(
         or_(
             User.email.ilike(f"%{query}%"),
             User.first_name.ilike(f"%{query}%"),
@@ -46,6 +46,7 @@ class Stylist(Base):
     avatar_url = Column(String(255), nullable=True)
     is_active = Column(Boolean, default=True)
     average_rating = Column(Float, default=0.0) # New field for average rating
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=True)  # The stylist's own account
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
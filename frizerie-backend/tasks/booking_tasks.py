@@ -4,6 +4,9 @@ from config.database import SessionLocal
 from bookings import models # Import booking models
 from bookings.services import send_booking_reminder, send_booking_feedback_request
 from notifications.services import send_last_minute_availability_notifications # Import the new notification function
+from booking import day_sheets
+from utils import loaders
+from booking.waitlist_services import promote_waitlist_for_slot, process_waitlist_entries
 from .celery_app import celery_app
 import logging
 
@@ -80,7 +83,7 @@ def check_for_last_minute_availability():
         # Query for bookings cancelled within the last hour
         # Assuming you have a 'cancelled_at' timestamp on the Booking model
         # If not, you might need to track cancellations differently
-        recently_cancelled_bookings = db.query(models.Booking).filter(
+        recently_cancelled_bookings = loaders.with_profile(db.query(models.Booking), "booking_detail").filter(
             models.Booking.status == "CANCELLED",
             models.Booking.updated_at >= time_window # Using updated_at as a proxy for cancellation time
         ).all()
@@ -108,4 +111,60 @@ def check_for_last_minute_availability():
         logger.error(f"Error checking for last-minute availability: {str(e)}")
     finally:
         if db:
-            db.close() 
\ No newline at end of file
+            db.close() 
+
+@celery_app.task(name="tasks.booking_tasks.promote_waitlist_for_freed_slot")
+def promote_waitlist_for_freed_slot(stylist_id: int, start_time: str, end_time: str):
+    """
+    Offer a slot freed by a cancellation or reschedule to the waitlist.
+    Enqueued by booking.slot_events as soon as the slot is released.
+    """
+    db = None
+    try:
+        db = SessionLocal()
+        entry = promote_waitlist_for_slot(
+            db,
+            stylist_id,
+            datetime.fromisoformat(start_time),
+            datetime.fromisoformat(end_time)
+        )
+        if entry:
+            logger.info(f"Waitlist entry {entry.id} booked into freed slot {start_time} for stylist {stylist_id}")
+    except Exception as e:
+        logger.error(f"Error promoting waitlist for freed slot: {str(e)}")
+    finally:
+        if db:
+            db.close()
+
+@celery_app.task(name="tasks.booking_tasks.process_waitlist_offers")
+def process_waitlist_offers():
+    """
+    Offer slots freed since the last run to the waitlist and expire old entries.
+    Catches freed slots the per-cancellation promotion could not fill.
+    """
+    db = None
+    try:
+        db = SessionLocal()
+        process_waitlist_entries(db)
+    except Exception as e:
+        logger.error(f"Error processing waitlist entries: {str(e)}")
+    finally:
+        if db:
+            db.close()
+
+@celery_app.task(name="tasks.booking_tasks.roll_stylist_day_sheets")
+def roll_stylist_day_sheets():
+    """
+    Move the stylist day sheet horizon forward one day.
+    Drops past days and rebuilds the rest, repairing any missed refresh.
+    """
+    db = None
+    try:
+        db = SessionLocal()
+        count = day_sheets.roll_horizon(db)
+        logger.info(f"Rebuilt {count} stylist day sheets")
+    except Exception as e:
+        logger.error(f"Error rolling stylist day sheets: {str(e)}")
+    finally:
+        if db:
+            db.close()
@@ -41,5 +41,17 @@ celery_app.conf.update(
             'task': 'tasks.booking_tasks.check_for_last_minute_availability',
             'schedule': 3600.0,  # Run hourly (3600 seconds)
         },
+        'process-waitlist-entries': {
+            'task': 'tasks.booking_tasks.process_waitlist_offers',
+            'schedule': 900.0,  # Run every 15 minutes
+        },
+        'roll-stylist-day-sheets': {
+            'task': 'tasks.booking_tasks.roll_stylist_day_sheets',
+            'schedule': 86400.0,  # Run daily (24 hours)
+        },
+        'dispatch-pending-pushes': {
+            'task': 'tasks.push_tasks.dispatch_pending_pushes',
+            'schedule': 60.0,  # Run every minute
+        },
     }
 ) 
\ No newline at end of file
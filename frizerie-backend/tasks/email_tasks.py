@@ -1,20 +1,37 @@
-import aiosmtplib
+import html
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import List
 from config.settings import get_settings
+from external_services.smtp_pool import SMTPPool
+from . import worker_loop
 from .celery_app import celery_app
 
 settings = get_settings()
 
+def get_smtp_pool() -> SMTPPool:
+    """This worker process's SMTP pool; only use it inside ``worker_loop.run``."""
+    return worker_loop.resource("smtp_pool", lambda: SMTPPool.from_settings(settings))
+
+def _build_message(to_email: str, subject: str, html_content: str, text_content: str = None) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = settings.MAIL_FROM
+    message["To"] = to_email
+    message.attach(MIMEText(html_content, "html"))
+    if text_content:
+        message.attach(MIMEText(text_content, "plain"))
+    return message
+
 @celery_app.task(name="send_email_notification")
-async def send_email_notification(
+def send_email_notification(
     to_email: str,
     subject: str,
     html_content: str,
     text_content: str = None
 ) -> bool:
     """
-    Send an email notification using SMTP.
+    Send an email notification over a pooled SMTP session.
     
     Args:
         to_email: Recipient email address
@@ -26,29 +43,7 @@ async def send_email_notification(
         bool: True if email was sent successfully, False otherwise
     """
     try:
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = settings.SMTP_FROM_EMAIL
-        message["To"] = to_email
-
-        # Attach HTML content
-        html_part = MIMEText(html_content, "html")
-        message.attach(html_part)
-
-        # Attach text content if provided
-        if text_content:
-            text_part = MIMEText(text_content, "plain")
-            message.attach(text_part)
-
-        # Send email
-        async with aiosmtplib.SMTP(
-            hostname=settings.SMTP_HOST,
-            port=settings.SMTP_PORT,
-            use_tls=settings.SMTP_USE_TLS
-        ) as smtp:
-            await smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            await smtp.send_message(message)
-
+        worker_loop.run(get_smtp_pool().send(_build_message(to_email, subject, html_content, text_content)))
         return True
     except Exception as e:
         # Log the error
@@ -56,7 +51,7 @@ async def send_email_notification(
         return False
 
 @celery_app.task(name="send_booking_confirmation")
-async def send_booking_confirmation(
+def send_booking_confirmation(
     to_email: str,
     booking_details: dict
 ) -> bool:
@@ -86,10 +81,10 @@ async def send_booking_confirmation(
     </html>
     """
     
-    return await send_email_notification(to_email, subject, html_content)
+    return send_email_notification(to_email, subject, html_content)
 
 @celery_app.task(name="send_booking_reminder")
-async def send_booking_reminder(
+def send_booking_reminder(
     to_email: str,
     booking_details: dict
 ) -> bool:
@@ -119,4 +114,51 @@ async def send_booking_reminder(
     </html>
     """
     
-    return await send_email_notification(to_email, subject, html_content) 
\ No newline at end of file
+    return send_email_notification(to_email, subject, html_content)
+
+@celery_app.task(name="tasks.email_tasks.send_email_batch")
+def send_email_batch(
+    deliveries: List[List],
+    subject: str,
+    message: str
+) -> int:
+    """
+    Send the same notification email to a batch of recipients over one pooled session.
+    
+    Args:
+        deliveries: [notification_id, email] pairs queued by notifications.fanout
+        subject: Email subject
+        message: Plain text body, also sent as escaped HTML
+    
+    Returns:
+        int: Number of emails sent
+    """
+    from config.database import SessionLocal
+    from notifications.fanout import record_delivery_results
+
+    html_content = f"<p>{html.escape(message)}</p>"
+    sent, failed = [], []
+    error = None
+    try:
+        results = worker_loop.run(get_smtp_pool().send_batch([
+            _build_message(to_email, subject, html_content, message)
+            for _, to_email in deliveries
+        ]))
+        for (notification_id, _), result in zip(deliveries, results):
+            if result is None:
+                sent.append(notification_id)
+            else:
+                failed.append(notification_id)
+                error = str(result)
+    except Exception as e:
+        sent, failed, error = [], [notification_id for notification_id, _ in deliveries], str(e)
+    if error:
+        print(f"Failed to send {len(failed)} of {len(deliveries)} batch emails: {error}")
+
+    db = SessionLocal()
+    try:
+        record_delivery_results(db, sent, failed, error)
+    finally:
+        db.close()
+    return len(sent)
+
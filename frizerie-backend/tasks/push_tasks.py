@@ -1,6 +1,7 @@
 import firebase_admin
-from firebase_admin import messaging
+from typing import List, Optional
 from config.settings import get_settings
+from external_services.push_dispatcher import PushDispatcher, PushRequest
 from .celery_app import celery_app
 
 settings = get_settings()
@@ -11,6 +12,26 @@ try:
 except ValueError:
     firebase_admin.initialize_app()
 
+_dispatcher: Optional[PushDispatcher] = None
+
+def get_push_dispatcher() -> PushDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = PushDispatcher.from_settings(settings)
+    return _dispatcher
+
+def _prune(tokens: List[str]) -> None:
+    if not tokens:
+        return
+    from config.database import SessionLocal
+    from notifications.push import prune_tokens
+
+    db = SessionLocal()
+    try:
+        prune_tokens(db, tokens)
+    finally:
+        db.close()
+
 @celery_app.task(name="send_push_notification")
 def send_push_notification(
     token: str,
@@ -30,22 +51,13 @@ def send_push_notification(
     Returns:
         bool: True if notification was sent successfully, False otherwise
     """
-    try:
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body
-            ),
-            data=data or {},
-            token=token
-        )
-        
-        response = messaging.send(message)
-        return True
-    except Exception as e:
+    result = get_push_dispatcher().send([PushRequest(token=token, title=title, body=body, data=data)])[0]
+    if not result.success:
         # Log the error
-        print(f"Failed to send push notification: {str(e)}")
-        return False
+        print(f"Failed to send push notification: {result.error}")
+        if result.invalid:
+            _prune([token])
+    return result.success
 
 @celery_app.task(name="send_booking_push_confirmation")
 def send_booking_push_confirmation(
@@ -105,4 +117,47 @@ def send_booking_push_reminder(
         "booking_time": booking_details['booking_time']
     }
     
-    return send_push_notification(token, title, body, data) 
\ No newline at end of file
+    return send_push_notification(token, title, body, data)
+
+@celery_app.task(name="tasks.push_tasks.send_push_batch")
+def send_push_batch(
+    deliveries: List[List],
+    title: str,
+    body: str,
+    data: dict = None
+) -> dict:
+    """
+    Send the same push notification to a batch of users as FCM multicasts.
+    
+    Args:
+        deliveries: [notification_id, user_id] pairs of QUEUED push notifications
+        title: Notification title
+        body: Notification body
+        data: Additional data to send with the notification
+    
+    Returns:
+        dict: Sent, failed, retrying and pruned-token counts
+    """
+    from config.database import SessionLocal
+    from notifications.push import QueuedPush, send_queued
+
+    db = SessionLocal()
+    try:
+        return send_queued(db, get_push_dispatcher(), [
+            QueuedPush(notification_id, user_id, title, body, {"data": data} if data else None)
+            for notification_id, user_id in deliveries
+        ])
+    finally:
+        db.close()
+
+@celery_app.task(name="tasks.push_tasks.dispatch_pending_pushes")
+def dispatch_pending_pushes() -> dict:
+    """Send queued push notifications left over or being retried, grouped into FCM multicasts."""
+    from config.database import SessionLocal
+    from notifications.push import dispatch_pending
+
+    db = SessionLocal()
+    try:
+        return dispatch_pending(db, get_push_dispatcher(), settings.PUSH_DISPATCH_BATCH_SIZE)
+    finally:
+        db.close()
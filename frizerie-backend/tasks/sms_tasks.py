@@ -1,9 +1,16 @@
-from twilio.rest import Client
+import logging
+from typing import List
 from config.settings import get_settings
+from external_services.sms_dispatcher import SMSDispatcher, SMSJob, summarize
+from . import worker_loop
 from .celery_app import celery_app
 
 settings = get_settings()
-twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+logger = logging.getLogger(__name__)
+
+def get_sms_dispatcher() -> SMSDispatcher:
+    """This worker process's SMS dispatcher; only use it inside ``worker_loop.run``."""
+    return worker_loop.resource("sms_dispatcher", lambda: SMSDispatcher.from_settings(settings))
 
 @celery_app.task(name="send_sms_notification")
 def send_sms_notification(
@@ -11,7 +18,7 @@ def send_sms_notification(
     message: str
 ) -> bool:
     """
-    Send an SMS notification using Twilio.
+    Send an SMS notification using Twilio, throttled per sender number.
     
     Args:
         to_phone: Recipient phone number
@@ -20,17 +27,11 @@ def send_sms_notification(
     Returns:
         bool: True if SMS was sent successfully, False otherwise
     """
-    try:
-        message = twilio_client.messages.create(
-            body=message,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=to_phone
-        )
-        return True
-    except Exception as e:
+    result = worker_loop.run(get_sms_dispatcher().send(to_phone, message))
+    if not result.sent:
         # Log the error
-        print(f"Failed to send SMS: {str(e)}")
-        return False
+        print(f"Failed to send SMS: {result.error}")
+    return result.sent
 
 @celery_app.task(name="send_booking_sms_confirmation")
 def send_booking_sms_confirmation(
@@ -78,4 +79,49 @@ def send_booking_sms_reminder(
         f"Duration: {booking_details['duration']} minutes"
     )
     
-    return send_sms_notification(to_phone, message) 
\ No newline at end of file
+    return send_sms_notification(to_phone, message)
+
+@celery_app.task(name="tasks.sms_tasks.send_sms_batch")
+def send_sms_batch(
+    deliveries: List[List],
+    message: str
+) -> int:
+    """
+    Send the same notification SMS to a batch of recipients through the
+    throttled dispatcher, recording each message's latency.
+    
+    Args:
+        deliveries: [notification_id, phone] pairs queued by notifications.fanout
+        message: SMS message content
+    
+    Returns:
+        int: Number of SMS sent
+    """
+    from config.database import SessionLocal
+    from notifications.fanout import record_delivery_results
+
+    results = worker_loop.run(get_sms_dispatcher().dispatch([
+        SMSJob(to=to_phone, body=message, reference=notification_id)
+        for notification_id, to_phone in deliveries
+    ]))
+    sent = [result.reference for result in results if result.sent]
+    failed = [result.reference for result in results if not result.sent]
+    error = next((result.error for result in results if not result.sent), None)
+    details = {
+        result.reference: {
+            "sms_sid": result.sid,
+            "attempts": result.attempts,
+            "latency_ms": round(result.latency_ms, 1),
+            "request_ms": round(result.request_ms, 1)
+        }
+        for result in results
+    }
+    logger.info(f"SMS batch of {len(deliveries)}: {summarize(results)}")
+
+    db = SessionLocal()
+    try:
+        record_delivery_results(db, sent, failed, error, details)
+    finally:
+        db.close()
+    return len(sent)
+
@@ -0,0 +1,56 @@
+"""
+Event loop shared by the async code of one worker process.
+
+Connection pools (SMTP sessions, HTTP clients) are bound to the event loop
+they were opened on, so running every task under its own ``asyncio.run``
+would throw them away after each task. Tasks run their coroutines with
+``run`` instead and keep pools as per-process ``resource``s. Both are
+created lazily in the process that uses them, never inherited across the
+prefork fork, and resources are closed when the worker process exits.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from celery.signals import worker_process_shutdown
+
+logger = logging.getLogger(__name__)
+
+_pid: Optional[int] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_resources: Dict[str, Any] = {}
+
+def _ensure_process_state() -> None:
+    global _pid, _loop
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _loop = asyncio.new_event_loop()
+        _resources.clear()
+
+def run(coroutine: Coroutine) -> Any:
+    """Run a coroutine to completion on this process's loop."""
+    _ensure_process_state()
+    return _loop.run_until_complete(coroutine)
+
+def resource(name: str, factory: Callable[[], Any]) -> Any:
+    """This process's instance of a named resource, created on first use."""
+    _ensure_process_state()
+    if name not in _resources:
+        _resources[name] = factory()
+    return _resources[name]
+
+def close_resources() -> None:
+    """Await ``close()`` on every resource created by this process."""
+    if _pid != os.getpid():
+        return
+    for name, value in list(_resources.items()):
+        try:
+            run(value.close())
+        except Exception as e:
+            logger.warning(f"Failed to close worker resource {name}: {str(e)}")
+    _resources.clear()
+
+@worker_process_shutdown.connect
+def _close_on_shutdown(**kwargs) -> None:
+    close_resources()
@@ -25,6 +25,7 @@ class User(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     terms_accepted = Column(Boolean, default=False)
     terms_accepted_at = Column(DateTime, nullable=True)
+    calendar_token_hash = Column(String(64), unique=True, nullable=True)  # SHA-256 of the calendar feed token
     
     # Relationships
     bookings = relationship("Booking", back_populates="user")
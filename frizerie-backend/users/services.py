@@ -11,6 +11,7 @@ from .models import UserSetting, User, Role, Permission, RolePermission, UserRol
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_
 from datetime import datetime
+from utils import loaders, pagination
 
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """Get a user by email."""
@@ -1077,10 +1078,11 @@ def get_audit_logs(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[AuditLog]:
-    """Get audit logs with optional filtering."""
-    query = db.query(AuditLog)
+    """Get audit logs with optional filtering, newest first."""
+    query = loaders.with_profile(db.query(AuditLog), "audit_log_response")
     
     if user_id:
         query = query.filter(AuditLog.user_id == user_id)
@@ -1093,4 +1095,4 @@ def get_audit_logs(
     if end_date:
         query = query.filter(AuditLog.created_at <= end_date)
     
-    return query.order_by(AuditLog.created_at.desc()).offset(skip).limit(limit).all() 
\ No newline at end of file
+    return pagination.paginate(query, AuditLog.created_at, AuditLog.id, cursor, skip, limit) 
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Named relationship loader profiles for list queries.
+
+Each profile declares, in one place, what a consumer of a query reads from
+the loaded rows:
+
+* ``*_response`` profiles back the flat response schemas (BookingResponse,
+  PaymentResponse, ...). Those schemas only read columns, so relationships
+  are set to ``raiseload``: a page costs exactly one query, and a schema that
+  starts reading a relationship fails loudly until its profile eager-loads it.
+  The raise stays on the loaded instances until the session expires them, so
+  these profiles are for rows that are serialized and not touched again in
+  the same transaction; a ``*_detail`` query still loads their relationships.
+* ``*_detail`` profiles eager-load the relationships that search results and
+  background jobs read per row (user, stylist, service, payment), with
+  ``joinedload`` for many-to-one and ``selectinload`` for the rest.
+
+Model imports happen on first use so any module can import this one.
+"""
+from typing import Callable, Dict, List
+
+from sqlalchemy.orm import Query, joinedload, raiseload, selectinload
+
+def _flat_response() -> List:
+    # Flat schemas only read columns
+    return [raiseload("*")]
+
+def _booking_detail() -> List:
+    from booking.models import Booking
+
+    return [
+        joinedload(Booking.user),
+        joinedload(Booking.stylist),
+        joinedload(Booking.service),
+        selectinload(Booking.payment)
+    ]
+
+def _payment_detail() -> List:
+    from payments.models import Payment
+
+    return [
+        joinedload(Payment.user),
+        joinedload(Payment.booking)
+    ]
+
+def _notification_detail() -> List:
+    from notifications.models import Notification
+
+    return [joinedload(Notification.user)]
+
+_PROFILES: Dict[str, Callable[[], List]] = {
+    "booking_response": _flat_response,
+    "booking_detail": _booking_detail,
+    "payment_response": _flat_response,
+    "payment_detail": _payment_detail,
+    "notification_response": _flat_response,
+    "notification_detail": _notification_detail,
+    "audit_log_response": _flat_response,
+    "waitlist_entry_response": _flat_response,
+}
+
+_built: Dict[str, List] = {}
+
+def loader_options(profile: str) -> List:
+    """Loader options of a named profile."""
+    if profile not in _built:
+        try:
+            _built[profile] = _PROFILES[profile]()
+        except KeyError:
+            raise ValueError(f"Unknown loader profile: {profile}")
+    return _built[profile]
+
+def with_profile(query: Query, profile: str) -> Query:
+    """Attach a named loader profile to a query."""
+    return query.options(*loader_options(profile))
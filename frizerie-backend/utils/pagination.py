@@ -0,0 +1,120 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints.
+
+Pages are ordered by (sort column, id) and a cursor is the opaque encoding of
+the last row's pair, so fetching the next page is an index range scan no
+matter how deep it is. ``skip``/``offset`` still works when no cursor is
+given. Totals come from ``estimate_count`` instead of an exact ``count()``.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Query
+
+# Non-PostgreSQL estimates count at most this many rows
+ESTIMATE_COUNT_CAP = 10000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_ESTIMATE_HEADER = "X-Total-Count-Estimate"
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """Opaque cursor for the row after which the next page starts."""
+    if isinstance(sort_value, datetime):
+        sort_value = {"dt": sort_value.isoformat()}
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Inverse of ``encode_cursor``; malformed cursors are a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["dt"])
+        return sort_value, row_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def paginate(
+    query: Query,
+    sort_column,
+    id_column,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    descending: bool = True
+) -> List[Any]:
+    """One page of ``query`` ordered by (sort_column, id_column).
+
+    With a cursor the page starts strictly after the encoded row and ``skip``
+    is ignored; without one it falls back to offset pagination.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > row_id)
+            ))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    if not cursor and skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def next_cursor(items: List[Any], limit: int, sort_attr: str, id_attr: str = "id") -> Optional[str]:
+    """Cursor for the page after ``items``, or None when this was the last page."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(getattr(last, sort_attr), getattr(last, id_attr))
+
+def estimate_count(query: Query) -> int:
+    """Cheap row count estimate for ``query``.
+
+    PostgreSQL answers from the planner's row estimate; other databases count
+    at most ``ESTIMATE_COUNT_CAP`` rows.
+    """
+    session = query.session
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+        plan = session.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    capped = query.order_by(None).limit(ESTIMATE_COUNT_CAP).subquery()
+    return session.execute(select(func.count()).select_from(capped)).scalar() or 0
+
+def set_page_headers(
+    response: Response,
+    items: List[Any],
+    limit: int,
+    sort_attr: str,
+    total: Optional[int] = None
+) -> None:
+    """Expose the next cursor (and the total estimate, if any) as response headers."""
+    cursor = next_cursor(items, limit, sort_attr)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    if total is not None:
+        response.headers[TOTAL_ESTIMATE_HEADER] = str(total)
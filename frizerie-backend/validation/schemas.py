@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, constr
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from booking.models import BookingStatus, RecurrenceType
 
 # User Schemas
@@ -52,7 +52,7 @@ class BookingBase(BaseModel):
     recurrence_pattern: Optional[Dict[str, Any]] = None
 
 class BookingCreate(BookingBase):
-    pass
+    hold_id: Optional[str] = None
 
 class BookingUpdate(BaseModel):
     stylist_id: Optional[int] = None
@@ -307,6 +307,24 @@ class StylistTimeOffResponse(StylistTimeOffBase):
     class Config:
         from_attributes = True
 
+class RebookingMove(BaseModel):
+    booking_id: str
+    user_id: int
+    from_stylist_id: int
+    from_start_time: datetime
+    to_stylist_id: int
+    to_start_time: datetime
+    to_end_time: datetime
+    cost: float
+
+class RebookingPlanResponse(BaseModel):
+    time_off_id: str
+    stylist_id: int
+    moves: List[RebookingMove]
+    unplaced: List[str]
+    total_cost: float
+    applied: bool
+
 # Booking Conflict Schemas
 class BookingConflictBase(BaseModel):
     booking_id: str
@@ -347,6 +365,22 @@ class CalendarEventResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Slot Hold Schemas
+class SlotHoldCreate(BaseModel):
+    stylist_id: int
+    service_id: int
+    start_time: datetime
+
+class SlotHoldResponse(BaseModel):
+    id: str
+    stylist_id: int
+    start_time: datetime
+    end_time: datetime
+    expires_at: datetime
+    
+    class Config:
+        from_attributes = True
+
 # Recurring Booking Schemas
 class RecurringBookingCreate(BaseModel):
     base_booking: BookingCreate
@@ -354,9 +388,15 @@ class RecurringBookingCreate(BaseModel):
     recurrence_end_date: datetime
     recurrence_pattern: Optional[Dict[str, Any]] = None
 
+class SkippedRecurrenceDate(BaseModel):
+    date: datetime
+    reason: str
+    details: Any
+
 class RecurringBookingResponse(BaseModel):
     parent_booking: BookingResponse
     recurring_bookings: List[BookingResponse]
+    skipped_dates: List[SkippedRecurrenceDate] = []
     
     class Config:
         from_attributes = True
@@ -385,6 +425,21 @@ class TimeSlotResponse(BaseModel):
     is_available: bool
     conflicting_bookings: Optional[List[BookingResponse]] = None
 
+class TimeInterval(BaseModel):
+    start_time: datetime
+    end_time: datetime
+
+class DaySheetResponse(BaseModel):
+    stylist_id: int
+    day: date
+    open_intervals: List[TimeInterval]
+    busy_intervals: List[TimeInterval]
+    free_intervals: List[TimeInterval]
+    open_minutes: int
+    busy_minutes: int
+    utilization: float
+    computed_at: datetime
+
 class LoyaltyRewardBase(BaseModel):
     name: str
     description: Optional[str] = None